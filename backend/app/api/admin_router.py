@@ -0,0 +1,103 @@
+"""Operator endpoints, enabled by setting ADMIN_API_KEY."""
+import hmac
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse
+
+from app.config import get_settings
+from app.core.profiler import profile_event_loop
+from app.services.bulk_grants import get_grant_jobs, run_grants
+from app.services.token_service import get_async_token_service
+
+# Content types accepted for grant files when no format is given
+GRANT_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+    "application/json-lines": "jsonl",
+}
+
+
+def require_admin(x_admin_key: Optional[str] = Header(default=None)) -> None:
+    """Reject requests without the admin key; hide the routes when none is set."""
+    admin_key = get_settings().admin_api_key
+    if not admin_key:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_key or not hmac.compare_digest(x_admin_key, admin_key):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin key")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(default=10.0, gt=0),
+    rate: float = Query(default=100.0, gt=0, le=1000),
+    mode: Literal["cpu", "wall"] = "cpu",
+    include_idle: bool = False,
+) -> PlainTextResponse:
+    """Sample the event loop for ``seconds`` and return collapsed stacks.
+    
+    ``cpu`` mode records what the loop thread is executing, rooted at the
+    running asyncio task; ``wall`` mode also records where every suspended
+    task is waiting. Pipe the output into flamegraph.pl or speedscope.
+    """
+    max_seconds = get_settings().profiler_max_seconds
+    if seconds > max_seconds:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"seconds must be at most {max_seconds}",
+        )
+    try:
+        collapsed = await profile_event_loop(seconds, rate, mode, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'},
+    )
+
+
+@router.post("/grants")
+async def bulk_grants(
+    request: Request,
+    idempotency_key: str = Header(..., min_length=1, max_length=200),
+    format: Optional[Literal["csv", "jsonl"]] = None,
+) -> dict:
+    """Grant tokens and/or unlimited access from a streamed CSV or JSON-lines file.
+    
+    Rows are applied in batches as the body arrives. Resending a file with
+    the same ``Idempotency-Key`` skips the batches already applied; poll
+    ``GET /grants/{key}`` for the progress of a running upload.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        format = GRANT_CONTENT_TYPES.get(content_type)
+        if format is None:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Send text/csv or application/x-ndjson, or pass ?format=",
+            )
+    try:
+        job = get_grant_jobs().start(idempotency_key)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    try:
+        await run_grants(
+            job, request.stream(), format,
+            get_async_token_service(), get_settings().bulk_grant_batch_size,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return job.to_dict()
+
+
+@router.get("/grants/{key}")
+async def bulk_grant_progress(key: str) -> dict:
+    """Progress of the latest upload with this idempotency key."""
+    job = get_grant_jobs().get(key)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No upload with this key")
+    return job.to_dict()
@@ -1,105 +1,260 @@
 """Excuse generation API endpoints."""
-from fastapi import APIRouter, HTTPException, status
+import hashlib
+import json
+import time
+from typing import Union
 
-from app.schemas.excuse import ExcuseRequest, ExcuseResponse
-from app.services.excuse_service import get_excuse_service
-from app.services.token_service import get_token_service
+from fastapi import APIRouter, HTTPException, Request, Response, status
+
+from app.config import get_settings
+from app.core.metrics import record_generation, record_generation_latency, record_token_consumed
+from app.core.tracing import current_span, span
+from app.schemas.excuse import CompactExcuseResponse, ExcuseRequest, ExcuseResponse
+from app.services.context_keys import context_key
+from app.services.excuse_cache import get_excuse_cache, get_single_flight
+from app.services.excuse_index import get_excuse_index
+from app.services.excuse_service import LANGUAGE_NAMES, get_excuse_service, is_fallback
+from app.services.scenarios import resolve_scenario
+from app.services.token_service import get_async_token_service
+from app.services.usage_events import get_usage_log
 
 router = APIRouter()
 
+# A cached pool is served only while this many of its excuses (or all of a
+# smaller pool) are still unseen by the device; otherwise it is a miss
+MIN_SERVED_EXCUSES = 3
+
+
+def _unseen(seen, device_id: str, pooled):
+    """The pool's excuses this device hasn't been served, or None if too few remain."""
+    if not pooled:
+        return None
+    excuses = seen.unseen(device_id, pooled)
+    return excuses if len(excuses) >= min(MIN_SERVED_EXCUSES, len(pooled)) else None
+
 
-@router.post("/generate", response_model=ExcuseResponse)
-async def generate_excuses(request: ExcuseRequest) -> ExcuseResponse:
+@router.post("/generate", response_model=Union[ExcuseResponse, CompactExcuseResponse])
+async def generate_excuses(request: ExcuseRequest) -> Union[ExcuseResponse, CompactExcuseResponse]:
     """Generate creative excuses for a given situation.
     
     Requires a valid device_id and either:
     - Unused free trial
     - Available tokens
     - Unlimited subscription
+    
+    Requests carrying an SEO scenario tuple and no custom context are
+    served from the pre-generated index or the scenario cache when possible.
+    Requests with a custom context are cached by its canonical form, and
+    concurrent misses for the same key share one generation.
+    
+    With ``compact`` set, excuses come back as ``[text, tone, tip]`` lists
+    without the category and urgency echo.
     """
-    token_service = get_token_service()
+    scenario = None
+    if request.scenario:
+        try:
+            scenario = resolve_scenario(request.scenario, request.recipient, request.style, request.industry)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    elif request.recipient or request.style or request.industry:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="recipient, style and industry require a scenario",
+        )
+    
+    started = time.perf_counter()
+    source = "none"
+    
+    def observe(cache: str, outcome: str) -> None:
+        root = current_span()
+        latency = time.perf_counter() - started
+        language = request.language if request.language in LANGUAGE_NAMES else "other"
+        record_generation_latency(
+            latency,
+            category=request.category.value,
+            language=language,
+            urgency=request.urgency.value,
+            cache=cache,
+            outcome=outcome,
+            trace_id=root.trace_id if root is not None else None,
+        )
+        usage = get_usage_log()
+        if usage is not None:
+            usage.record(request.category.value, request.urgency.value, language, source, cache, outcome, latency)
+    
+    token_service = get_async_token_service()
     
     # Check if user can generate
-    if not token_service.can_generate(request.device_id):
+    with span("token.can_generate"):
+        allowed = await token_service.can_generate(request.device_id)
+    if not allowed:
+        observe("none", "payment_required")
         raise HTTPException(
             status_code=status.HTTP_402_PAYMENT_REQUIRED,
             detail="No tokens remaining. Please purchase more to continue.",
         )
     
     # Use a token
-    use_result = token_service.use_token(request.device_id)
+    with span("token.use"):
+        use_result = await token_service.use_token(request.device_id)
     if not use_result.success:
+        observe("none", "payment_required")
         raise HTTPException(
             status_code=status.HTTP_402_PAYMENT_REQUIRED,
             detail=use_result.message,
         )
+    source = use_result.source
+    record_generation(source)
+    if use_result.source == "token":
+        record_token_consumed()
+    
+    # Scenario tuples and custom contexts: pre-generated index (scenarios
+    # without context only), then cache, skipping excuses this device has
+    # already been served and generating when too few are left. A context
+    # that canonicalizes to nothing ("!!!") counts as no context.
+    settings = get_settings()
+    context = context_key(request.context or "", request.language, settings.context_intent_tags)
+    cacheable = settings.context_cache_enabled or not request.context
+    excuses = None
+    cache_key = None
+    cache = "none"
+    if cacheable and (scenario is not None or context):
+        with span("excuse.lookup") as lookup:
+            cache_key = (
+                request.category.value,
+                request.urgency.value,
+                request.language,
+                scenario.key if scenario is not None else "",
+                context,
+            )
+            seen = token_service.seen
+            if scenario is not None and not context:
+                excuses = _unseen(seen, request.device_id, get_excuse_index().lookup(*cache_key[:4]))
+                lookup.attributes["source"] = "index"
+            if excuses is None:
+                excuses = _unseen(seen, request.device_id, get_excuse_cache().get(cache_key))
+                lookup.attributes["source"] = "cache" if excuses is not None else "miss"
+        cache = "miss" if excuses is None else "hit"
     
     # Generate excuses
     excuse_service = get_excuse_service()
-    try:
-        excuses = await excuse_service.generate_excuses(
+    outcome = "ok"
+    
+    async def generate():
+        generated = await excuse_service.generate_excuses(
             category=request.category,
             urgency=request.urgency,
             context=request.context,
             language=request.language,
+            scenario=scenario,
         )
+        if cache_key is not None and not is_fallback(generated):
+            get_excuse_cache().put(cache_key, generated)
+        return generated
+    
+    try:
+        if excuses is None:
+            with span("excuse.generate") as generating:
+                if cache_key is None:
+                    excuses = await generate()
+                else:
+                    excuses, shared = await get_single_flight().run(cache_key, generate)
+                    if shared:
+                        cache = "coalesced"
+                    generating.attributes["coalesced"] = shared
+            if is_fallback(excuses):
+                outcome = "parse_fallback"
     except Exception as e:
+        observe(cache, "upstream_error")
         # Refund the token on error (simplified - in production use proper transaction)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=f"Failed to generate excuses: {str(e)}",
         )
     
+    token_service.seen.mark_seen(request.device_id, excuses)
+    
     # Get updated token status
-    status_info = token_service.get_token_status(request.device_id)
+    with span("token.status"):
+        status_info = await token_service.get_token_status(request.device_id)
+    
+    with span("response.build"):
+        if request.compact:
+            response = CompactExcuseResponse(
+                excuses=[(e.text, e.tone, e.tip) for e in excuses],
+                tokens_remaining=status_info.remaining_tokens,
+            )
+        else:
+            response = ExcuseResponse(
+                excuses=excuses,
+                category=request.category,
+                urgency=request.urgency,
+                tokens_remaining=status_info.remaining_tokens,
+            )
+    observe(cache, outcome)
+    return response
+
+
+class _Catalog:
+    """A static catalog, serialized once with a content ETag."""
+    
+    def __init__(self, data: dict):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()[:16]}"'
     
-    return ExcuseResponse(
-        excuses=excuses,
-        category=request.category,
-        urgency=request.urgency,
-        tokens_remaining=status_info.remaining_tokens,
-    )
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": "public, max-age=3600"}
+        # Weak comparison: compressed responses carry W/ of the same tag
+        tags = (tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(","))
+        if self.etag in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+
+CATEGORIES = _Catalog({
+    "categories": [
+        {"id": "late", "name": "Being Late", "icon": "⏰"},
+        {"id": "sick_leave", "name": "Sick Leave", "icon": "🤒"},
+        {"id": "decline", "name": "Declining Invitations", "icon": "🙅"},
+        {"id": "forgot", "name": "Forgetting Things", "icon": "🤔"},
+        {"id": "deadline", "name": "Missing Deadlines", "icon": "📅"},
+        {"id": "meeting", "name": "Missing Meetings", "icon": "📋"},
+        {"id": "homework", "name": "Homework/Assignments", "icon": "📚"},
+        {"id": "other", "name": "Other", "icon": "💭"},
+    ]
+})
+
+URGENCY_LEVELS = _Catalog({
+    "levels": [
+        {
+            "id": "normal",
+            "name": "Normal",
+            "description": "Believable and reasonable",
+            "icon": "😊",
+        },
+        {
+            "id": "urgent",
+            "name": "Urgent",
+            "description": "Slightly dramatic but plausible",
+            "icon": "😰",
+        },
+        {
+            "id": "extreme",
+            "name": "Extreme",
+            "description": "Wild and dramatic!",
+            "icon": "🤯",
+        },
+    ]
+})
 
 
 @router.get("/categories")
-async def get_categories():
+async def get_categories(request: Request) -> Response:
     """Get available excuse categories with descriptions."""
-    return {
-        "categories": [
-            {"id": "late", "name": "Being Late", "icon": "⏰"},
-            {"id": "sick_leave", "name": "Sick Leave", "icon": "🤒"},
-            {"id": "decline", "name": "Declining Invitations", "icon": "🙅"},
-            {"id": "forgot", "name": "Forgetting Things", "icon": "🤔"},
-            {"id": "deadline", "name": "Missing Deadlines", "icon": "📅"},
-            {"id": "meeting", "name": "Missing Meetings", "icon": "📋"},
-            {"id": "homework", "name": "Homework/Assignments", "icon": "📚"},
-            {"id": "other", "name": "Other", "icon": "💭"},
-        ]
-    }
+    return CATEGORIES.response(request)
 
 
 @router.get("/urgency-levels")
-async def get_urgency_levels():
+async def get_urgency_levels(request: Request) -> Response:
     """Get available urgency levels."""
-    return {
-        "levels": [
-            {
-                "id": "normal",
-                "name": "Normal",
-                "description": "Believable and reasonable",
-                "icon": "😊",
-            },
-            {
-                "id": "urgent",
-                "name": "Urgent",
-                "description": "Slightly dramatic but plausible",
-                "icon": "😰",
-            },
-            {
-                "id": "extreme",
-                "name": "Extreme",
-                "description": "Wild and dramatic!",
-                "icon": "🤯",
-            },
-        ]
-    }
+    return URGENCY_LEVELS.response(request)
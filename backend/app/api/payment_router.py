@@ -6,7 +6,7 @@ from fastapi import APIRouter, HTTPException, status, Request, Header
 from typing import Optional
 
 from app.schemas.payment import CheckoutRequest, CheckoutResponse
-from app.services.token_service import get_token_service
+from app.services.token_service import get_async_token_service
 from app.config import get_settings
 
 router = APIRouter()
@@ -19,13 +19,34 @@ PRODUCTS = {
 }
 
 
-def get_creem_api_base(api_key: str) -> str:
-    """Use test API for test keys, production API for live keys."""
+def get_creem_api_base(api_key: str, api_base: Optional[str] = None) -> str:
+    """Use test API for test keys, production API for live keys, unless overridden."""
+    if api_base:
+        return api_base.rstrip("/")
     if api_key and api_key.startswith("creem_test_"):
         return "https://test-api.creem.io/v1"
     return "https://api.creem.io/v1"
 
 
+# Shared client so checkouts reuse pooled connections to Creem
+_creem_client: httpx.AsyncClient | None = None
+
+
+def get_creem_client() -> httpx.AsyncClient:
+    """Get the shared Creem HTTP client."""
+    global _creem_client
+    if _creem_client is None:
+        _creem_client = httpx.AsyncClient(timeout=30.0)
+    return _creem_client
+
+
+async def close_creem_client() -> None:
+    global _creem_client
+    if _creem_client is not None:
+        await _creem_client.aclose()
+        _creem_client = None
+
+
 def get_creem_product_id(settings, product_type: str) -> Optional[str]:
     """Get Creem product ID for a given product type."""
     product_id_map = {
@@ -63,39 +84,37 @@ async def create_checkout(request: CheckoutRequest) -> CheckoutResponse:
     
     # Call Creem API to create checkout session
     try:
-        async with httpx.AsyncClient() as client:
-            payload = {
-                "product_id": creem_product_id,
-                "success_url": request.success_url or "https://ai-excuse-generator.densematrix.ai/payment/success",
-                "metadata": {
-                    "product_type": request.product_type,
-                    "device_id": request.device_id,
-                    "tokens": str(product["tokens"]),
-                },
-            }
-            
-            response = await client.post(
-                f"{get_creem_api_base(settings.creem_api_key)}/checkouts",
-                headers={
-                    "Content-Type": "application/json",
-                    "x-api-key": settings.creem_api_key,
-                },
-                json=payload,
-                timeout=30.0,
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY,
-                    detail=f"Creem API error: {response.text}",
-                )
-            
-            data = response.json()
-            return CheckoutResponse(
-                checkout_url=data["checkout_url"],
-                session_id=data["id"],
+        payload = {
+            "product_id": creem_product_id,
+            "success_url": request.success_url or "https://ai-excuse-generator.densematrix.ai/payment/success",
+            "metadata": {
+                "product_type": request.product_type,
+                "device_id": request.device_id,
+                "tokens": str(product["tokens"]),
+            },
+        }
+        
+        response = await get_creem_client().post(
+            f"{get_creem_api_base(settings.creem_api_key, settings.creem_api_base)}/checkouts",
+            headers={
+                "Content-Type": "application/json",
+                "x-api-key": settings.creem_api_key,
+            },
+            json=payload,
+        )
+        
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Creem API error: {response.text}",
             )
-            
+        
+        data = response.json()
+        return CheckoutResponse(
+            checkout_url=data["checkout_url"],
+            session_id=data["id"],
+        )
+        
     except httpx.RequestError as e:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
@@ -108,12 +127,21 @@ async def handle_webhook(
     request: Request,
     creem_signature: Optional[str] = Header(None, alias="creem-signature"),
 ):
-    """Handle Creem webhook for payment completion."""
+    """Handle Creem webhook for payment completion.
+    
+    Creem redelivers webhooks until acknowledged, so the same checkout can
+    arrive more than once and in any order; each checkout id is credited once.
+    """
     settings = get_settings()
     body = await request.body()
     
     # Verify webhook signature
-    if settings.creem_webhook_secret and creem_signature:
+    if settings.creem_webhook_secret:
+        if not creem_signature:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Missing webhook signature",
+            )
         expected_signature = hmac.new(
             settings.creem_webhook_secret.encode(),
             body,
@@ -136,14 +164,19 @@ async def handle_webhook(
         product_type = metadata.get("product_type")
         
         if device_id and product_type:
-            token_service = get_token_service()
+            token_service = get_async_token_service()
             product = PRODUCTS.get(product_type)
+            checkout_id = obj.get("id")
             
             if product:
-                if product_type == "unlimited":
-                    token_service.set_unlimited(device_id)
-                else:
-                    token_service.add_tokens(device_id, product["tokens"])
+                tokens, months = (0, 1) if product_type == "unlimited" else (product["tokens"], 0)
+                if not checkout_id:
+                    if months:
+                        await token_service.set_unlimited(device_id, months)
+                    else:
+                        await token_service.add_tokens(device_id, tokens)
+                elif not await token_service.credit_checkout(checkout_id, device_id, tokens, months):
+                    return {"received": True, "duplicate": True}
     
     return {"received": True}
 
@@ -1,41 +1,50 @@
 """Token management API endpoints."""
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
 
 from app.schemas.token import TokenStatus
-from app.services.token_service import get_token_service
+from app.services.token_service import get_async_token_service
 
 router = APIRouter()
 
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def _snapshot_response(request: Request, etag: str, body: bytes) -> Response:
+    """Serve pre-serialized JSON, honouring conditional GETs."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/tokens/{device_id}", response_model=TokenStatus)
-async def get_token_status(device_id: str) -> TokenStatus:
+async def get_token_status(device_id: str, request: Request) -> Response:
     """Get token status for a device."""
-    if len(device_id) < 10:
+    if not 10 <= len(device_id) <= 100:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid device_id",
         )
     
-    token_service = get_token_service()
-    return token_service.get_token_status(device_id)
+    snapshot = await get_async_token_service().get_status_snapshot(device_id)
+    return _snapshot_response(request, snapshot.etag, snapshot.status_json)
 
 
 @router.get("/tokens/{device_id}/can-generate")
-async def can_generate(device_id: str) -> dict:
+async def can_generate(device_id: str, request: Request) -> Response:
     """Check if a device can generate excuses."""
-    if len(device_id) < 10:
+    if not 10 <= len(device_id) <= 100:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid device_id",
         )
     
-    token_service = get_token_service()
-    can_gen = token_service.can_generate(device_id)
-    status_info = token_service.get_token_status(device_id)
-    
-    return {
-        "can_generate": can_gen,
-        "free_trial_available": not status_info.free_trial_used,
-        "tokens_remaining": status_info.remaining_tokens,
-        "is_unlimited": status_info.is_unlimited,
-    }
+    snapshot = await get_async_token_service().get_status_snapshot(device_id)
+    return _snapshot_response(request, snapshot.can_generate_etag, snapshot.can_generate_json)
@@ -24,14 +24,90 @@ class Settings(BaseSettings):
     creem_api_key: Optional[str] = None
     creem_webhook_secret: Optional[str] = None
     creem_product_ids: Optional[str] = None  # JSON string: {"pack_10":"prod_xxx",...}
+    creem_api_base: Optional[str] = None     # override the API URL, e.g. for tools.fake_creem
+    webhook_dedupe_max_entries: int = 100_000  # credited checkout ids remembered
     
     # Individual product IDs (will be parsed from creem_product_ids)
     creem_product_id_3: Optional[str] = None
     creem_product_id_10: Optional[str] = None
     
+    # Pre-generated excuse index (built by tools.build_excuse_index)
+    excuse_index_path: Optional[str] = None
+    excuse_index_check_interval: float = 5.0  # seconds between stat checks for a new build
+    
+    # Scenario excuse cache (for tuples missing from the index)
+    excuse_cache_max_entries: int = 10_000
+    excuse_cache_ttl: float = 3600.0  # seconds
+    context_cache_enabled: bool = True  # also cache requests with a custom context, by canonical key
+    context_intent_tags: bool = False   # key contexts that mention known situations by intent tags only
+    
+    # Diversity filter for generated excuses
+    diversity_threshold: float = 0.5      # estimated 3-gram Jaccard counted as a near-duplicate
+    diversity_recent_items: int = 1_000   # served excuses remembered per (category, language)
+    diversity_max_topups: int = 1         # extra LLM calls per request to replace duplicates
+    
     # Free trial settings
     free_trial_count: int = 1
     
+    # Token ledger settings (in-memory only when no directory is set)
+    token_ledger_dir: Optional[str] = None
+    token_ledger_flush_interval: float = 0.05        # group-commit window in seconds
+    token_ledger_snapshot_events: int = 1_000_000    # compact after this many events
+    token_ledger_checkpoint_interval: float = 30.0   # seconds between background saves of the seen history
+    
+    # Token sharding (consistent hash of device_id; ledgers go in shard-N subdirectories)
+    token_shards: int = 1
+    
+    # Async token API (used by the routes)
+    token_lock_stripes: int = 1024      # per-device asyncio locks, picked by hash(device_id)
+    token_store_offload: bool = False   # run store calls in worker threads, for blocking stores
+    
+    # Bulk token grants (POST /api/admin/grants)
+    bulk_grant_batch_size: int = 5_000                # grants applied per batch under one idempotency key
+    bulk_grant_dedupe_max_entries: int = 100_000      # applied batch keys remembered per store
+    
+    # Per-device history of served excuses (saved in the token ledger directory)
+    seen_history_size: int = 32               # excuses remembered per device
+    seen_history_max_devices: int = 100_000   # least recently active devices are dropped
+    
+    # Usage analytics events (written only when a directory is set; rolled up by tools.usage_rollup)
+    usage_events_dir: Optional[str] = None
+    usage_flush_interval: float = 1.0                 # seconds between buffered writes
+    usage_file_max_bytes: int = 64 * 1024 * 1024      # rotate event files at this size
+    
+    # Tracing settings (spans are always timed; exported only when a path is set)
+    trace_export_path: Optional[str] = None  # JSON-lines file, one span per line
+    trace_flush_interval: float = 1.0        # seconds between buffered writes
+    
+    # Admin endpoints (disabled unless a key is set)
+    admin_api_key: Optional[str] = None
+    profiler_max_seconds: float = 60.0
+    
+    # Event loop monitoring
+    loop_monitor_interval: float = 0.1    # heartbeat period in seconds
+    loop_block_threshold: float = 0.1     # log the loop's stack when stalled this long
+    loop_blocking_check: bool = False     # debug: warn on blocking calls made on the loop
+    
+    # Readiness probe settings
+    readiness_probe_interval: float = 15.0  # seconds between dependency probes
+    readiness_probe_timeout: float = 5.0    # per-check timeout in seconds
+    
+    # Rate limiting settings
+    rate_limit_enabled: bool = True
+    rate_limit_max_keys: int = 100_000             # buckets kept in memory before LRU eviction
+    rate_limit_redis_url: Optional[str] = None     # shared backend for multi-worker deployments
+    rate_limit_trust_proxy: bool = True            # use X-Real-IP set by the nginx frontend
+    
+    # CORS (the frontend calls /api same-origin; this allow-lists other browser origins)
+    cors_allow_origins: str = "https://excuse.demo.densematrix.ai"  # comma-separated; "*" for any
+    cors_max_age: int = 86_400  # seconds browsers may cache a preflight (capped at 2h by Chromium)
+    
+    # Response compression (gzip, or brotli when the brotli package is installed)
+    compression_enabled: bool = True
+    compression_minimum_size: int = 256     # smaller bodies (token status, can-generate) go uncompressed
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4     # 0-11; higher trades CPU per response for bytes
+    
     def model_post_init(self, __context) -> None:
         """Parse creem_product_ids JSON into individual fields."""
         if self.creem_product_ids:
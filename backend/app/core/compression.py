@@ -0,0 +1,143 @@
+"""
+Negotiated response compression.
+
+Responses of at least ``compression_minimum_size`` bytes with a textual
+content type are compressed with the best encoding the client accepts:
+brotli when the ``brotli`` package is installed, else gzip. Smaller bodies,
+such as token status and can-generate snapshots, go out as they are, since
+the framing would outweigh the savings. Compressed responses get
+``Vary: Accept-Encoding`` and a weak ETag, as their bytes differ from the
+identity representation the strong ETag names.
+
+Only single-message bodies are compressed; streamed responses pass through.
+Bodies that carry an ETag (the pre-rendered catalogs) are the same bytes
+on every request, so their compressed forms are kept in a small LRU.
+"""
+import gzip
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.config import get_settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_SUFFIXES = ("json", "xml", "javascript", "openmetrics-text")
+CACHE_MAX_ENTRIES = 64
+
+
+def _compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type.endswith(COMPRESSIBLE_SUFFIXES)
+
+
+def negotiate(accept_encoding: str, brotli_available: bool) -> Optional[str]:
+    """The preferred supported encoding in an Accept-Encoding header, if any.
+
+    Brotli wins ties with gzip; ``q=0`` refuses an encoding and ``*``
+    stands for any encoding not listed.
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for encoding in ("br", "gzip") if brotli_available else ("gzip",):
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing response bodies per Accept-Encoding."""
+
+    def __init__(
+        self,
+        app,
+        minimum_size: Optional[int] = None,
+        gzip_level: Optional[int] = None,
+        brotli_quality: Optional[int] = None,
+    ):
+        self.app = app
+        settings = get_settings()
+        self.minimum_size = minimum_size if minimum_size is not None else settings.compression_minimum_size
+        self.gzip_level = gzip_level if gzip_level is not None else settings.compression_gzip_level
+        self.brotli_quality = brotli_quality if brotli_quality is not None else settings.compression_brotli_quality
+        self.enabled = settings.compression_enabled
+        self._cache: OrderedDict[Tuple[str, bytes], bytes] = OrderedDict()
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def compress_cached(self, body: bytes, encoding: str) -> bytes:
+        key = (encoding, body)
+        compressed = self._cache.get(key)
+        if compressed is None:
+            compressed = self._cache[key] = self.compress(body, encoding)
+            if len(self._cache) > CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return compressed
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), brotli is not None)
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held until the body shows whether it's worth compressing
+                start = message
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            held, start = start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=held["headers"])
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not _compressible(headers.get("content-type", ""))
+            ):
+                await send(held)
+                await send(message)
+                return
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is not None:
+                etag = headers.get("etag")
+                compress = self.compress_cached if etag else self.compress
+                compressed = compress(body, encoding)
+                if len(compressed) < len(body):
+                    body = compressed
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    if etag and not etag.startswith("W/"):
+                        headers["ETag"] = "W/" + etag
+            await send(held)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,205 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+``LoopMonitor`` runs a heartbeat task that sleeps for a fixed interval and
+records how late it wakes up; that overshoot is the time every other
+coroutine waited too. A watchdog thread watches the heartbeat, and when the
+loop has been stuck longer than the threshold it captures the loop thread's
+stack while the offending callback is still running.
+
+``BlockingCallDetector`` is the debug counterpart: a ``sys.audit`` hook that
+flags blocking calls (sleeps, blocking socket connects, DNS lookups,
+subprocesses, file writes) made on a thread that is running an event loop.
+The test suite enables it in raise mode so such calls fail the test.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.config import get_settings
+from app.core.metrics import record_loop_blocked, record_loop_lag
+
+logger = logging.getLogger(__name__)
+
+LAG_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class BlockingCallError(RuntimeError):
+    """A blocking call ran on the event loop thread."""
+
+
+class LoopMonitor:
+    """Measures event-loop lag and reports callbacks that block it."""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, window: int = 600):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: Deque[float] = deque(maxlen=window)
+        self.blocked = 0
+        self._beat = 0.0
+        self._reported_beat = 0.0
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    async def _run(self) -> None:
+        while True:
+            self._beat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - self._beat - self.interval)
+            self.lags.append(lag)
+            record_loop_lag(lag, self.quantiles())
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._beat
+            stalled = time.perf_counter() - beat - self.interval
+            if stalled > self.threshold and beat != self._reported_beat:
+                self._reported_beat = beat
+                self.report_blocked(stalled)
+
+    def report_blocked(self, stalled: float) -> None:
+        """Log the loop thread's current stack as the blocking culprit."""
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unavailable>\n"
+        self.blocked += 1
+        record_loop_blocked("stall")
+        logger.warning("Event loop blocked for %.0fms, current stack:\n%s", stalled * 1000, stack)
+
+    def quantiles(self) -> Dict[float, float]:
+        """Lag percentiles over the recent window."""
+        if not self.lags:
+            return {q: 0.0 for q in LAG_QUANTILES}
+        ordered = sorted(self.lags)
+        last = len(ordered) - 1
+        return {q: ordered[round(q * last)] for q in LAG_QUANTILES}
+
+    async def start(self) -> None:
+        """Start the heartbeat task and the watchdog thread."""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = self._reported_beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stop.set()
+        self._watchdog.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+def _opens_for_write(mode, flags) -> bool:
+    if isinstance(mode, str):
+        return any(c in mode for c in "wax+")
+    return bool(flags & (os.O_WRONLY | os.O_RDWR | os.O_CREAT))
+
+
+# audit event -> predicate over its arguments; True means the call blocks
+BLOCKING_EVENTS = {
+    "time.sleep": lambda args: args[0] > 0,  # audited natively from Python 3.13
+    "socket.connect": lambda args: args[0].gettimeout() != 0,
+    "socket.getaddrinfo": lambda args: True,
+    "socket.gethostbyname": lambda args: True,
+    "subprocess.Popen": lambda args: True,
+    "os.system": lambda args: True,
+    # Reads are left alone: imports and lazy config loads open files too
+    "open": lambda args: _opens_for_write(args[1], args[2]),
+}
+
+
+class BlockingCallDetector:
+    """Audit hook flagging blocking calls made on an event loop thread.
+
+    Audit hooks cannot be removed, so the hook is installed once and the
+    detector is toggled with ``enable``/``disable``. Pythons that don't audit
+    ``time.sleep`` get a wrapper that raises the event itself.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.raise_on_violation = False
+        self.violations = 0
+        self._installed = False
+        self._local = threading.local()
+
+    def install(self) -> None:
+        if self._installed:
+            return
+        sys.addaudithook(self._hook)
+        if sys.version_info < (3, 13):
+            sleep = time.sleep
+
+            def audited_sleep(secs):
+                sys.audit("time.sleep", secs)
+                sleep(secs)
+
+            time.sleep = audited_sleep
+        self._installed = True
+
+    def enable(self, raise_on_violation: bool = False) -> None:
+        self.install()
+        self.raise_on_violation = raise_on_violation
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def _hook(self, event: str, args: tuple) -> None:
+        if not self.enabled:
+            return
+        check = BLOCKING_EVENTS.get(event)
+        if check is None or asyncio._get_running_loop() is None:
+            return
+        # Don't recurse into our own reporting
+        if getattr(self._local, "active", False):
+            return
+        self._local.active = True
+        try:
+            if not check(args):
+                return
+            self.violations += 1
+            record_loop_blocked("call")
+            message = f"Blocking call on the event loop: {event}{args!r}"
+            if self.raise_on_violation:
+                raise BlockingCallError(message)
+            logger.warning("%s\n%s", message, "".join(traceback.format_stack(sys._getframe(1))))
+        finally:
+            self._local.active = False
+
+
+blocking_call_detector = BlockingCallDetector()
+
+
+# Singleton instance
+_loop_monitor: LoopMonitor | None = None
+
+
+def get_loop_monitor() -> LoopMonitor:
+    """Get loop monitor singleton."""
+    global _loop_monitor
+    if _loop_monitor is None:
+        settings = get_settings()
+        _loop_monitor = LoopMonitor(
+            interval=settings.loop_monitor_interval,
+            threshold=settings.loop_block_threshold,
+        )
+        if settings.loop_blocking_check:
+            blocking_call_detector.enable()
+    return _loop_monitor
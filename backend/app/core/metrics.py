@@ -1,8 +1,12 @@
 """
 Prometheus Metrics for DenseMatrix Demo Tools
 """
-from prometheus_client import Counter, Histogram
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.exposition import choose_encoder
+from prometheus_fastapi_instrumentator.middleware import PrometheusInstrumentatorMiddleware
+from typing import Dict, Optional, Sequence, Tuple
 import os
+import re
 
 TOOL_SLUG = os.getenv("TOOL_SLUG", "ai-excuse-generator")
 
@@ -32,11 +36,90 @@ TOKEN_CONSUMED = Counter(
     ['tool']
 )
 
+# Every label is an enum or clamped to a fixed set (languages outside the
+# supported ones are "other"), so the series count stays bounded
 GENERATION_LATENCY = Histogram(
     'generation_latency_seconds',
     'Generation request latency',
+    ['tool', 'category', 'language', 'urgency', 'cache', 'outcome'],
+    # Index and cache hits land in the first bucket; LLM calls spread over 1-20s
+    buckets=[0.01, 0.1, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0]
+)
+
+# Diversity filter: near-duplicates dropped ("response" or "recent") and LLM top-ups
+DUPLICATES_DROPPED = Counter(
+    'excuse_duplicates_dropped_total',
+    'Generated excuses dropped as near-duplicates',
+    ['tool', 'against']
+)
+
+TOPUPS = Counter(
+    'excuse_topups_total',
+    'Extra LLM calls made to replace dropped near-duplicates',
+    ['tool']
+)
+
+# Per-stage latency from tracing spans
+STAGE_LATENCY = Histogram(
+    'generation_stage_seconds',
+    'Latency of each traced request stage',
+    ['tool', 'stage'],
+    buckets=[0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0]
+)
+
+# Event loop health
+LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'How late the event loop heartbeat woke up',
     ['tool'],
-    buckets=[0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0]
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+)
+
+LOOP_LAG_QUANTILE = Gauge(
+    'event_loop_lag_quantile_seconds',
+    'Event loop lag percentiles over the recent window',
+    ['tool', 'quantile']
+)
+
+LOOP_BLOCKED = Counter(
+    'event_loop_blocked_total',
+    'Loop stalls over the threshold ("stall") and blocking calls on the loop ("call")',
+    ['tool', 'kind']
+)
+
+# Readiness metrics
+PROBE_LATENCY = Histogram(
+    'readiness_probe_latency_seconds',
+    'Dependency probe latency',
+    ['tool', 'check'],
+    buckets=[0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+)
+
+PROBE_UP = Gauge(
+    'readiness_probe_up',
+    'Whether the last dependency probe succeeded',
+    ['tool', 'check']
+)
+
+
+SUBSCRIPTION_EXPIRED = Counter(
+    'subscription_expired_total',
+    'Unlimited subscriptions that lapsed',
+    ['tool']
+)
+
+# Bulk grant rows by result ("applied", "skipped" as already applied, "invalid")
+BULK_GRANTS = Counter(
+    'bulk_grants_total',
+    'Rows of bulk token grant uploads',
+    ['tool', 'result']
+)
+
+# Rate limiting metrics
+RATE_LIMITED = Counter(
+    'rate_limited_total',
+    'Requests rejected by the rate limiter',
+    ['tool', 'policy']
 )
 
 
@@ -56,5 +139,83 @@ def record_token_consumed(count: int = 1):
     TOKEN_CONSUMED.labels(tool=TOOL_SLUG).inc(count)
 
 
-def generation_timer():
-    return GENERATION_LATENCY.labels(tool=TOOL_SLUG).time()
+def record_subscription_expired():
+    SUBSCRIPTION_EXPIRED.labels(tool=TOOL_SLUG).inc()
+
+
+def record_generation_latency(
+    seconds: float,
+    category: str,
+    language: str,
+    urgency: str,
+    cache: str,
+    outcome: str,
+    trace_id: Optional[str] = None,
+):
+    """Observe one generation request; the trace id is attached as an exemplar."""
+    GENERATION_LATENCY.labels(
+        tool=TOOL_SLUG, category=category, language=language,
+        urgency=urgency, cache=cache, outcome=outcome,
+    ).observe(seconds, exemplar={"trace_id": trace_id} if trace_id else None)
+
+
+def record_duplicate_dropped(against: str):
+    DUPLICATES_DROPPED.labels(tool=TOOL_SLUG, against=against).inc()
+
+
+def record_topup():
+    TOPUPS.labels(tool=TOOL_SLUG).inc()
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_LATENCY.labels(tool=TOOL_SLUG, stage=stage).observe(seconds)
+
+
+def record_loop_lag(lag: float, quantiles: Dict[float, float]):
+    LOOP_LAG.labels(tool=TOOL_SLUG).observe(lag)
+    for q, value in quantiles.items():
+        LOOP_LAG_QUANTILE.labels(tool=TOOL_SLUG, quantile=str(q)).set(value)
+
+
+def record_loop_blocked(kind: str):
+    LOOP_BLOCKED.labels(tool=TOOL_SLUG, kind=kind).inc()
+
+
+def record_probe(check: str, latency: float, ok: bool):
+    PROBE_LATENCY.labels(tool=TOOL_SLUG, check=check).observe(latency)
+    PROBE_UP.labels(tool=TOOL_SLUG, check=check).set(1 if ok else 0)
+
+
+def record_bulk_grants(result: str, count: int):
+    BULK_GRANTS.labels(tool=TOOL_SLUG, result=result).inc(count)
+
+
+def record_rate_limited(policy: str):
+    RATE_LIMITED.labels(tool=TOOL_SLUG, policy=policy).inc()
+
+
+def render_metrics(accept: Optional[str]) -> Tuple[bytes, str]:
+    """Serialize the registry, in OpenMetrics (with exemplars) when the scraper accepts it."""
+    encoder, content_type = choose_encoder(accept or "")
+    return encoder(REGISTRY), content_type
+
+
+class HttpMetricsMiddleware:
+    """Wraps the instrumentator's HTTP metrics middleware, skipping excluded paths up front.
+
+    The stock middleware resolves each request's route (a scan of every
+    route) before checking its exclusions; probe and scrape paths here go
+    straight through instead.
+    """
+
+    def __init__(self, app, excluded_paths: Sequence[str] = (), **kwargs):
+        self.app = app
+        self.excluded_paths = frozenset(excluded_paths)
+        excluded_handlers = [f"^{re.escape(path)}$" for path in excluded_paths]
+        self.instrumented = PrometheusInstrumentatorMiddleware(app, excluded_handlers=excluded_handlers, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+        await self.instrumented(scope, receive, send)
@@ -0,0 +1,148 @@
+"""
+Sampling profiler for the running event loop.
+
+A background thread reads the event-loop thread's stack at a fixed rate and
+counts identical stacks, producing collapsed-stack output
+(``frame;frame;frame count``) that flamegraph.pl and speedscope read
+directly. Nothing is installed in the profiled thread, so the cost is one
+stack walk per sample under the GIL.
+
+Samples are asyncio-task aware: on-CPU stacks are rooted at the task whose
+step was running, and in ``wall`` mode every suspended task also contributes
+its await chain, which shows where requests spend time waiting.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+# The loop sitting in select() with nothing to run
+IDLE_FRAME = "(idle)"
+
+
+def _frame_label(code, labels: Dict[object, str]) -> str:
+    label = labels.get(code)
+    if label is None:
+        path = code.co_filename.replace("\\", "/").rsplit("/", 2)
+        label = f"{code.co_qualname} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+        labels[code] = label
+    return label
+
+
+def _task_label(task: asyncio.Task) -> str:
+    coro = task.get_coro()
+    return f"task:{getattr(coro, '__qualname__', type(coro).__name__)}"
+
+
+def _await_chain(task: asyncio.Task, labels: Dict[object, str]) -> List[str]:
+    """Frames of a suspended task's coroutine chain, outermost first."""
+    stack = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_frame_label(frame.f_code, labels))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+class SamplingProfiler:
+    """Samples one thread's stack (and its event loop's tasks) at ``rate`` Hz."""
+
+    def __init__(
+        self,
+        thread_id: int,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        rate: float = 100.0,
+        mode: str = "cpu",
+    ):
+        self.thread_id = thread_id
+        self.loop = loop
+        self.interval = 1.0 / rate
+        self.mode = mode
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> None:
+        """Take one sample."""
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame.f_code, self._labels))
+            frame = frame.f_back
+        stack.reverse()
+
+        running = None
+        if self.loop is not None:
+            running = asyncio.tasks._current_tasks.get(self.loop)
+        if running is not None:
+            stack.insert(0, _task_label(running))
+        elif self.loop is not None:
+            stack.insert(0, IDLE_FRAME)
+        self.stacks[tuple(stack)] += 1
+
+        if self.mode == "wall" and self.loop is not None:
+            for task in asyncio.all_tasks(self.loop):
+                if task is running or task.done():
+                    continue
+                self.stacks[(_task_label(task), "(await)", *_await_chain(task, self._labels))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        next_at = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except RuntimeError:
+                # Task set changed size while we iterated it; skip this tick
+                pass
+            next_at += self.interval
+            self._stop.wait(max(0.0, next_at - time.perf_counter()))
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self, include_idle: bool = False) -> str:
+        """Collapsed-stack text, heaviest stacks first."""
+        lines = [
+            f"{';'.join(stack)} {count}"
+            for stack, count in self.stacks.most_common()
+            if include_idle or stack[0] != IDLE_FRAME
+        ]
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+_profile_lock = asyncio.Lock()
+
+
+async def profile_event_loop(
+    seconds: float,
+    rate: float = 100.0,
+    mode: str = "cpu",
+    include_idle: bool = False,
+) -> str:
+    """Profile the calling event loop for ``seconds``; one profile at a time."""
+    if _profile_lock.locked():
+        raise RuntimeError("A profile is already running")
+    async with _profile_lock:
+        profiler = SamplingProfiler(threading.get_ident(), asyncio.get_running_loop(), rate, mode)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+        return profiler.collapsed(include_idle)
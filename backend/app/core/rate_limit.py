@@ -0,0 +1,279 @@
+"""
+Rate limiting middleware with a token-bucket store.
+
+The in-memory store shards buckets across independently locked LRU maps so
+memory stays bounded and lock contention stays low. Multi-worker deployments
+can plug in the Redis backend so all workers share the same buckets.
+Requests whose path carries a malformed device_id are rejected with 400
+before any bucket is touched, so junk ids never take bucket memory.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from starlette.responses import JSONResponse
+
+from app.config import get_settings
+from app.core.metrics import record_rate_limited
+
+try:
+    from redis.exceptions import ConnectionError as RedisConnectionError
+    from redis.exceptions import TimeoutError as RedisTimeoutError
+except ImportError:
+    RedisConnectionError = RedisTimeoutError = OSError
+
+logger = logging.getLogger(__name__)
+
+# Length bounds for device_id, as in the request schemas
+DEVICE_ID_MIN_LENGTH = 10
+DEVICE_ID_MAX_LENGTH = 100
+
+
+class RateLimitPolicy:
+    """A token-bucket policy applied to matching routes.
+
+    ``key`` is either ``"ip"`` (client address) or ``"device"`` (the
+    ``device_id`` group captured by ``pattern``).
+    """
+
+    __slots__ = ("name", "methods", "pattern", "prefix", "key", "rate", "burst")
+
+    def __init__(
+        self,
+        name: str,
+        methods: Tuple[str, ...],
+        pattern: str,
+        key: str,
+        rate: float,
+        burst: int,
+    ):
+        self.name = name
+        self.methods = methods
+        self.pattern: Pattern = re.compile(pattern)
+        # Literal path prefix checked before running the regex
+        self.prefix = re.match(r"\^([\w/-]*)", pattern).group(1)
+        self.key = key
+        self.rate = rate    # tokens refilled per second
+        self.burst = burst  # bucket capacity
+
+
+DEFAULT_POLICIES: List[RateLimitPolicy] = [
+    # Polling endpoints: throttle each device and each client address
+    RateLimitPolicy(
+        "token_status_device", ("GET",),
+        r"^/api/tokens/(?P<device_id>[^/]+)(?:/can-generate)?$", "device", 2.0, 10,
+    ),
+    RateLimitPolicy(
+        "token_status_ip", ("GET",),
+        r"^/api/tokens/[^/]+(?:/can-generate)?$", "ip", 10.0, 30,
+    ),
+    # Generation: per-address so rotating device IDs can't farm free trials
+    RateLimitPolicy("generate_ip", ("POST",), r"^/api/generate$", "ip", 20 / 60, 10),
+    RateLimitPolicy("checkout_ip", ("POST",), r"^/api/checkout$", "ip", 10 / 60, 5),
+]
+
+
+class RateLimitBackend(ABC):
+    """Interface for token-bucket storage backends."""
+
+    @abstractmethod
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        """Take one token from ``key``'s bucket.
+
+        Returns 0.0 when allowed, otherwise the seconds until a token frees up.
+        """
+
+
+class InMemoryBucketStore(RateLimitBackend):
+    """Memory-bounded token-bucket store with sharded locks."""
+
+    def __init__(self, max_keys: int = 100_000, shards: int = 16):
+        # Round shard count up to a power of two so selection is a bit mask
+        shards = 1 << max(0, shards - 1).bit_length()
+        self._mask = shards - 1
+        self._per_shard = max(1, max_keys // shards)
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._buckets: List[OrderedDict] = [OrderedDict() for _ in range(shards)]
+
+    def __len__(self) -> int:
+        return sum(len(b) for b in self._buckets)
+
+    def consume(self, key: str, rate: float, burst: int, now: Optional[float] = None) -> float:
+        """Synchronous bucket decision; see ``RateLimitBackend.acquire``."""
+        if now is None:
+            now = time.monotonic()
+        shard = hash(key) & self._mask
+        buckets = self._buckets[shard]
+        with self._locks[shard]:
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) >= self._per_shard:
+                    buckets.popitem(last=False)
+                buckets[key] = [burst - 1.0, now]
+                return 0.0
+
+            buckets.move_to_end(key)
+            tokens = bucket[0] + (now - bucket[1]) * rate
+            if tokens > burst:
+                tokens = burst
+            bucket[1] = now
+            if tokens >= 1.0:
+                bucket[0] = tokens - 1.0
+                return 0.0
+            bucket[0] = tokens
+            return (1.0 - tokens) / rate
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        return self.consume(key, rate, burst)
+
+
+class RedisBucketStore(RateLimitBackend):
+    """Shared token-bucket store backed by Redis.
+
+    The bucket update runs as a Lua script using the Redis server clock, so
+    workers with skewed clocks still agree on refill timing.
+    """
+
+    SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+  tokens = burst
+  ts = now
+end
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local retry = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(retry)
+"""
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        # Fail open: a Redis outage shouldn't take the rate-limited routes down with it
+        try:
+            retry = await self.client.eval(self.SCRIPT, 1, self.prefix + key, rate, burst)
+        except (RedisConnectionError, RedisTimeoutError, OSError) as e:
+            logger.warning("Rate limit backend unavailable, allowing request: %s", e)
+            return 0.0
+        return float(retry)
+
+
+def get_client_ip(scope, trust_proxy: bool) -> str:
+    """Resolve the client address, honouring X-Real-IP behind the proxy."""
+    if trust_proxy:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-real-ip":
+                return value.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying per-route token-bucket policies."""
+
+    def __init__(self, app, policies: Optional[List[RateLimitPolicy]] = None):
+        self.app = app
+        self.policies = policies if policies is not None else DEFAULT_POLICIES
+        self._by_method: Dict[str, List[RateLimitPolicy]] = {}
+        for policy in self.policies:
+            for method in policy.methods:
+                self._by_method.setdefault(method, []).append(policy)
+        settings = get_settings()
+        self.enabled = settings.rate_limit_enabled
+        self.trust_proxy = settings.rate_limit_trust_proxy
+
+    async def check(self, scope) -> Optional[Tuple[Optional[RateLimitPolicy], float]]:
+        """Return the first violated policy and its retry delay, if any.
+
+        A malformed device_id returns ``(None, 0.0)``.
+        """
+        policies = self._by_method.get(scope["method"])
+        if not policies:
+            return None
+        path = scope["path"]
+        backend = None
+        client_ip = None
+        for policy in policies:
+            if not path.startswith(policy.prefix):
+                continue
+            match = policy.pattern.match(path)
+            if match is None:
+                continue
+            if policy.key == "device":
+                key = match.group("device_id")
+                if not DEVICE_ID_MIN_LENGTH <= len(key) <= DEVICE_ID_MAX_LENGTH:
+                    return None, 0.0
+            else:
+                if client_ip is None:
+                    client_ip = get_client_ip(scope, self.trust_proxy)
+                key = client_ip
+            if backend is None:
+                backend = get_rate_limit_backend()
+            retry_after = await backend.acquire(f"{policy.name}:{key}", policy.rate, policy.burst)
+            if retry_after > 0:
+                return policy, retry_after
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        violation = await self.check(scope)
+        if violation is not None:
+            policy, retry_after = violation
+            if policy is None:
+                response = JSONResponse({"detail": "Invalid device_id"}, status_code=400)
+                await response(scope, receive, send)
+                return
+            record_rate_limited(policy.name)
+            response = JSONResponse(
+                {"detail": "Too many requests. Please slow down."},
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+
+# Singleton instance
+_rate_limit_backend: RateLimitBackend | None = None
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    """Get rate limit backend singleton."""
+    global _rate_limit_backend
+    if _rate_limit_backend is None:
+        settings = get_settings()
+        if settings.rate_limit_redis_url:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError(
+                    "RATE_LIMIT_REDIS_URL is set but the 'redis' package is not installed"
+                ) from e
+            _rate_limit_backend = RedisBucketStore(redis.from_url(settings.rate_limit_redis_url))
+        else:
+            _rate_limit_backend = InMemoryBucketStore(max_keys=settings.rate_limit_max_keys)
+    return _rate_limit_backend
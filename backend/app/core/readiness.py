@@ -0,0 +1,152 @@
+"""
+Background readiness prober.
+
+Dependency checks run on a timer in a background task and their results are
+cached, so the /ready endpoint answers in O(1) without doing any I/O inline.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+import httpx
+
+from app.config import get_settings
+from app.core.metrics import record_probe
+
+ProbeCheck = Callable[[], Awaitable[None]]
+
+
+class ReadinessProber:
+    """Periodically probes dependencies and caches the results.
+
+    Only checks listed in ``critical`` decide readiness; the others are
+    reported for visibility but never take the pod out of rotation.
+    """
+
+    def __init__(
+        self,
+        checks: Dict[str, ProbeCheck],
+        critical: Iterable[str],
+        interval: float = 15.0,
+        timeout: float = 5.0,
+    ):
+        self.checks = checks
+        self.critical = set(critical)
+        self.interval = interval
+        self.timeout = timeout
+        self._results: Dict[str, dict] = {}
+        self._ready = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run_check(self, name: str, check: ProbeCheck) -> Tuple[str, dict]:
+        """Run a single check with a timeout and record its latency."""
+        start = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(check(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            error = f"timed out after {self.timeout}s"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        latency = time.perf_counter() - start
+
+        record_probe(name, latency, error is None)
+        result = {
+            "ok": error is None,
+            "critical": name in self.critical,
+            "latency_ms": round(latency * 1000, 2),
+            "checked_at": time.time(),
+        }
+        if error:
+            result["error"] = error
+        return name, result
+
+    async def probe_once(self) -> None:
+        """Run every check concurrently and swap in the new results."""
+        results = dict(
+            await asyncio.gather(
+                *(self._run_check(name, check) for name, check in self.checks.items())
+            )
+        )
+        self._results = results
+        self._ready = all(
+            results[name]["ok"] for name in self.critical if name in results
+        )
+
+    async def _run(self) -> None:
+        while True:
+            await self.probe_once()
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        """Start the background probe loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background probe loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Tuple[bool, Dict[str, dict]]:
+        """Return the cached readiness verdict and per-check results."""
+        return self._ready, self._results
+
+
+async def check_llm() -> None:
+    """Probe the LLM proxy with a cheap models listing."""
+    from app.services.excuse_service import get_excuse_service
+
+    await get_excuse_service().client.models.list()
+
+
+async def check_token_store() -> None:
+    """Probe the token store."""
+    from app.services.token_service import get_token_service
+
+    get_token_service().ping()
+
+
+async def check_creem() -> None:
+    """Probe the Creem API; skipped when payments are not configured."""
+    from app.api.payment_router import get_creem_api_base, get_creem_product_id
+
+    settings = get_settings()
+    if not settings.creem_api_key:
+        return
+
+    async with httpx.AsyncClient() as client:
+        response = await client.get(
+            f"{get_creem_api_base(settings.creem_api_key, settings.creem_api_base)}/products",
+            params={"product_id": get_creem_product_id(settings, "pack_10") or ""},
+            headers={"x-api-key": settings.creem_api_key},
+        )
+    if response.status_code >= 500:
+        raise RuntimeError(f"Creem API returned {response.status_code}")
+
+
+# Singleton instance
+_readiness_prober: ReadinessProber | None = None
+
+
+def get_readiness_prober() -> ReadinessProber:
+    """Get readiness prober singleton."""
+    global _readiness_prober
+    if _readiness_prober is None:
+        settings = get_settings()
+        _readiness_prober = ReadinessProber(
+            checks={
+                "llm": check_llm,
+                "token_store": check_token_store,
+                "creem": check_creem,
+            },
+            critical=["llm", "token_store"],
+            interval=settings.readiness_probe_interval,
+            timeout=settings.readiness_probe_timeout,
+        )
+    return _readiness_prober
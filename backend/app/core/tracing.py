@@ -0,0 +1,260 @@
+"""
+Lightweight request tracing.
+
+Spans nest through a context variable, so ``with span("llm.call"):`` works
+anywhere below a request, sync or async. Every finished span is observed in
+the ``generation_stage_seconds`` histogram under its name. When
+``TRACE_EXPORT_PATH`` is set, a trace's spans are queued once its root span
+ends and a background thread appends them to that file as JSON lines
+(OpenTelemetry field names, one span per line), ready for a collector's file
+receiver. Probe and scrape requests are neither timed nor exported.
+
+Trace context is read from and written to W3C ``traceparent`` headers; the
+trace id is also returned as ``X-Trace-Id``.
+"""
+import json
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.config import get_settings
+from app.core.metrics import record_stage
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """One timed stage of a trace."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes",
+                 "start_ns", "duration", "_started", "_finished")
+
+    def __init__(
+        self,
+        name: str,
+        parent: Optional["Span"] = None,
+        trace_id: Optional[str] = None,
+        parent_id: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.span_id = _new_id(64)
+        if parent is not None:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+            # Finished spans of the whole trace, shared from the root
+            self._finished = parent._finished
+        else:
+            self.trace_id = trace_id or _new_id(128)
+            self.parent_id = parent_id
+            self._finished = []
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.duration = 0.0
+        self._started = time.perf_counter()
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._started
+        record_stage(self.name, self.duration)
+        self._finished.append(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.start_ns + int(self.duration * 1e9),
+            "attributes": self.attributes,
+        }
+
+
+class JsonlExporter:
+    """Buffered writer of finished traces to a JSON-lines file."""
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+
+        # Pending spans, guarded by _lock (held only for the append)
+        self._lock = threading.Lock()
+        self._spans: List[Dict[str, Any]] = []
+
+        # The file, opened by the first flush; guarded by _io_lock
+        self._io_lock = threading.Lock()
+        self._file = None
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self, spans: List[Span]) -> None:
+        """Queue a trace's spans; they are written at the next flush."""
+        records = [s.to_dict() for s in spans]
+        with self._lock:
+            self._spans.extend(records)
+
+    def flush(self) -> None:
+        """Write queued spans."""
+        with self._io_lock:
+            with self._lock:
+                spans, self._spans = self._spans, []
+            if not spans:
+                return
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("".join(json.dumps(s, separators=(",", ":")) + "\n" for s in spans))
+            self._file.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Trace export failed")
+
+    def start(self) -> None:
+        """Start the background writer thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        """Stop the writer thread and write the remaining spans."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def parse_traceparent(header: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Return ``(trace_id, parent_span_id)`` from a traceparent header."""
+    match = TRACEPARENT.match(header or "")
+    if match is None or match.group(1) == "0" * 32:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Time a stage as a child of the current span (or a new trace)."""
+    parent = _current_span.get()
+    current = Span(name, parent, attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+        if parent is None:
+            _export(current)
+
+
+def _export(root: Span) -> None:
+    exporter = get_trace_exporter()
+    if exporter is not None:
+        exporter.export(root._finished)
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a root span per HTTP request.
+
+    Requests to ``excluded_paths`` still get trace headers, but their root
+    span is neither timed in the stage histogram nor exported.
+    """
+
+    def __init__(self, app, excluded_paths: Iterable[str] = ()):
+        self.app = app
+        self.excluded_paths = frozenset(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        trace_id, parent_id = parse_traceparent(traceparent)
+        root = Span(
+            "http.request",
+            trace_id=trace_id,
+            parent_id=parent_id,
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        )
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"x-trace-id", root.trace_id.encode()),
+                    (b"traceparent", root.traceparent.encode()),
+                ]
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as e:
+            root.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            if scope["path"] not in self.excluded_paths:
+                root.finish()
+                _export(root)
+
+
+# Singleton instance
+_trace_exporter: JsonlExporter | None = None
+
+
+def get_trace_exporter() -> Optional[JsonlExporter]:
+    """Get the trace exporter singleton, or None when exporting is disabled."""
+    global _trace_exporter
+    if _trace_exporter is None:
+        settings = get_settings()
+        if not settings.trace_export_path:
+            return None
+        _trace_exporter = JsonlExporter(settings.trace_export_path, settings.trace_flush_interval)
+        _trace_exporter.start()
+    return _trace_exporter
+
+
+def close_trace_exporter() -> None:
+    global _trace_exporter
+    if _trace_exporter is not None:
+        _trace_exporter.close()
+        _trace_exporter = None
@@ -1,21 +1,48 @@
 """Main FastAPI application."""
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
-from prometheus_fastapi_instrumentator import Instrumentator
 
 from app.config import get_settings
-from app.api import excuse_router, token_router, payment_router
-from app.core.metrics import record_generation, record_token_consumed, generation_timer
+from app.api import admin_router, excuse_router, token_router, payment_router
+from app.api.payment_router import close_creem_client
+from app.core.compression import CompressionMiddleware
+from app.core.loop_monitor import get_loop_monitor
+from app.core.metrics import HttpMetricsMiddleware, render_metrics
+from app.core.rate_limit import RateLimitMiddleware
+from app.core.readiness import get_readiness_prober
+from app.core.tracing import TracingMiddleware, close_trace_exporter
+from app.services.token_service import get_token_service
+from app.services.usage_events import close_usage_log
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     # Startup
+    loop_monitor = get_loop_monitor()
+    await loop_monitor.start()
+    prober = get_readiness_prober()
+    await prober.start()
+    token_service = get_token_service()
+    await token_service.expiry.start()
     yield
     # Shutdown
+    await token_service.expiry.stop()
+    await prober.stop()
+    await close_creem_client()
+    # These may open files, so off the loop
+    await asyncio.to_thread(token_service.close)
+    await asyncio.to_thread(close_trace_exporter)
+    await asyncio.to_thread(close_usage_log)
+    await loop_monitor.stop()
+
 
+# Probe and scrape endpoints, kept out of the HTTP metrics and traces
+METRICS_EXCLUDED_PATHS = ["/health", "/ready", "/api/metrics"]
 
 settings = get_settings()
 
@@ -26,13 +53,31 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# CORS middleware
+# Middleware, innermost first: each add_middleware wraps the ones before it,
+# so requests pass CORS -> tracing -> rate limiting -> instrumentation ->
+# compression -> routes.
+
+# Response compression (inside instrumentation so latency includes it)
+app.add_middleware(CompressionMiddleware)
+
+# Prometheus HTTP metrics (inside rate limiting so cheap rejections skip the
+# per-request route matching and histograms; 429s are counted by the limiter)
+app.add_middleware(HttpMetricsMiddleware, excluded_paths=METRICS_EXCLUDED_PATHS)
+
+# Rate limiting and device_id checks (inside CORS so 429 responses stay readable by the browser)
+app.add_middleware(RateLimitMiddleware)
+
+# Tracing (outside rate limiting so rejected requests carry a trace id too)
+app.add_middleware(TracingMiddleware, excluded_paths=METRICS_EXCLUDED_PATHS)
+
+# CORS (outermost, so preflights are answered before anything else runs)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=[origin.strip() for origin in settings.cors_allow_origins.split(",") if origin.strip()],
+    allow_credentials=False,
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type", "If-None-Match"],
+    max_age=settings.cors_max_age,
 )
 
 # Include routers
@@ -40,8 +85,15 @@ app.include_router(excuse_router.router, prefix="/api", tags=["excuses"])
 app.include_router(token_router.router, prefix="/api", tags=["tokens"])
 app.include_router(payment_router.router, prefix="/api", tags=["payment"])
 
-# Prometheus metrics
-Instrumentator().instrument(app).expose(app, endpoint="/api/metrics")
+# Operator endpoints
+app.include_router(admin_router.router, prefix="/api/admin", tags=["admin"], include_in_schema=False)
+
+
+@app.get("/api/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus metrics; OpenMetrics scrapers also receive trace exemplars."""
+    body, content_type = render_metrics(request.headers.get("accept"))
+    return Response(content=body, media_type=content_type)
 
 
 @app.get("/health")
@@ -50,6 +102,16 @@ async def health_check():
     return {"status": "healthy", "service": settings.app_name}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint backed by cached dependency probes."""
+    ready, checks = get_readiness_prober().status()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks},
+    )
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -1,6 +1,6 @@
 """Excuse-related schemas."""
 from pydantic import BaseModel, Field
-from typing import List, Literal
+from typing import List, Literal, Optional, Tuple
 from enum import Enum
 
 
@@ -29,7 +29,12 @@ class ExcuseRequest(BaseModel):
     urgency: UrgencyLevel = Field(default=UrgencyLevel.NORMAL, description="Urgency level")
     context: str = Field(default="", max_length=500, description="Additional context")
     language: str = Field(default="en", description="Output language code")
+    scenario: Optional[str] = Field(default=None, max_length=50, description="SEO scenario id, e.g. late-work")
+    recipient: Optional[str] = Field(default=None, max_length=50, description="SEO recipient id (requires scenario)")
+    style: Optional[str] = Field(default=None, max_length=50, description="SEO style id (requires scenario)")
+    industry: Optional[str] = Field(default=None, max_length=50, description="SEO industry id (requires scenario)")
     device_id: str = Field(..., min_length=10, max_length=100, description="Device fingerprint")
+    compact: bool = Field(default=False, description="Return the compact response shape")
 
 
 class Excuse(BaseModel):
@@ -45,3 +50,9 @@ class ExcuseResponse(BaseModel):
     category: ExcuseCategory
     urgency: UrgencyLevel
     tokens_remaining: int = Field(default=-1, description="Remaining tokens, -1 if unlimited or unknown")
+
+
+class CompactExcuseResponse(BaseModel):
+    """Compact response for mobile clients: excuses as [text, tone, tip], no request echo."""
+    excuses: List[Tuple[str, str, str]] = Field(..., description="Excuses as [text, tone, tip]")
+    tokens_remaining: int = Field(default=-1, description="Remaining tokens, -1 if unlimited or unknown")
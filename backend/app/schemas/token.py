@@ -23,3 +23,4 @@ class TokenUseResponse(BaseModel):
     success: bool
     remaining_tokens: int
     message: str = ""
+    source: str = ""  # what paid for the generation: "unlimited", "free_trial" or "token"
@@ -0,0 +1,56 @@
+"""Little-endian array and string encoding for the binary state files.
+
+Shared by the token ledger, the seen history and the usage log, so every
+file they write reads back the same on any host byte order.
+"""
+import os
+import sys
+from array import array
+from typing import List, Tuple
+
+_BIG_ENDIAN = sys.byteorder == "big"
+
+
+def pack(arr: array) -> bytes:
+    """Serialize an array little-endian."""
+    if _BIG_ENDIAN:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def unpack(typecode: str, data) -> array:
+    """Deserialize a little-endian array."""
+    arr = array(typecode)
+    arr.frombytes(data)
+    if _BIG_ENDIAN:
+        arr.byteswap()
+    return arr
+
+
+def encode_strings(strings: List[str]) -> bytes:
+    """Encode strings as uint16 lengths followed by their utf-8 bytes."""
+    encoded = [s.encode() for s in strings]
+    return pack(array("H", map(len, encoded))) + b"".join(encoded)
+
+
+def decode_strings(view: memoryview, count: int) -> Tuple[List[str], int]:
+    """Decode ``count`` length-prefixed strings; returns them and bytes consumed."""
+    lengths = unpack("H", view[:2 * count])
+    blob = bytes(view[2 * count:2 * count + sum(lengths)])
+    strings = []
+    pos = 0
+    for length in lengths:
+        strings.append(blob[pos:pos + length].decode())
+        pos += length
+    return strings, 2 * count + pos
+
+
+def fsync_dir(directory: str) -> None:
+    """Make renames and new files in ``directory`` durable, where supported."""
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,271 @@
+"""
+Bulk token grants for promo campaigns and refunds.
+
+A grant file is CSV with a header row (``device_id`` plus ``tokens`` and/or
+``unlimited_months``) or JSON lines with the same keys. ``GrantParser``
+parses it from byte chunks as they arrive, so an upload is never held in
+memory whole, and ``run_grants`` applies the rows in batches of
+``bulk_grant_batch_size``. Each batch is one ``apply_grants`` call under
+the locks of all its devices, keyed ``<idempotency key>:<batch number>``:
+resubmitting the same file with the same key skips every batch that was
+already applied, so an interrupted upload can simply be retried. Applied
+keys are recorded in the token ledger with their batch, like credited
+checkouts, so a retry after a restart is skipped too. Rows granting more
+than ``MAX_GRANT_TOKENS`` tokens or ``MAX_GRANT_MONTHS`` months are
+rejected as invalid.
+"""
+import asyncio
+import csv
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import AsyncIterable, List, NamedTuple, Optional
+
+from app.core.metrics import record_bulk_grants
+from app.services.token_service import MAX_GRANT_MONTHS, MAX_GRANT_TOKENS, AsyncTokenService
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "jsonl")
+MAX_ERRORS = 100       # invalid rows reported back in full
+MAX_JOBS = 100         # finished jobs kept for progress lookups
+CHUNK_BYTES = 64 * 1024
+
+
+class Grant(NamedTuple):
+    """One row of a grant file."""
+    device_id: str
+    tokens: int
+    unlimited_months: int
+
+
+def _count(value, name: str, maximum: int) -> int:
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return 0
+        if not value.isdigit():
+            raise ValueError(f"{name} must be a non-negative integer")
+        value = int(value)
+    elif value is None:
+        return 0
+    elif isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f"{name} must be a non-negative integer")
+    if value > maximum:
+        raise ValueError(f"{name} must be at most {maximum}")
+    return value
+
+
+def make_grant(device_id, tokens, unlimited_months) -> Grant:
+    """Validate one row; raises ValueError."""
+    if not isinstance(device_id, str) or not 10 <= len(device_id.strip()) <= 100:
+        raise ValueError("device_id must be 10-100 characters")
+    grant = Grant(
+        device_id.strip(),
+        _count(tokens, "tokens", MAX_GRANT_TOKENS),
+        _count(unlimited_months, "unlimited_months", MAX_GRANT_MONTHS),
+    )
+    if not grant.tokens and not grant.unlimited_months:
+        raise ValueError("grants nothing")
+    return grant
+
+
+class GrantParser:
+    """Incremental parser for grant files.
+
+    ``feed`` takes byte chunks split anywhere and returns the rows completed
+    so far; invalid rows are counted and the first ``MAX_ERRORS`` kept as
+    ``"line N: reason"``. A CSV header without ``device_id`` or a grant
+    column raises ValueError.
+    """
+
+    def __init__(self, format: str):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown grant file format: {format}")
+        self.format = format
+        self.line = 0
+        self.error_count = 0
+        self.errors: List[str] = []
+        self._buffer = b""
+        self._columns: Optional[List[str]] = None
+
+    def feed(self, chunk: bytes) -> List[Grant]:
+        *lines, self._buffer = (self._buffer + chunk).split(b"\n")
+        return self._parse(lines)
+
+    def close(self) -> List[Grant]:
+        lines, self._buffer = [self._buffer], b""
+        return self._parse(lines)
+
+    def _parse(self, lines: List[bytes]) -> List[Grant]:
+        grants = []
+        for raw in lines:
+            self.line += 1
+            try:
+                text = raw.decode("utf-8").strip()
+                if self.line == 1:
+                    text = text.lstrip("\ufeff")
+                if not text:
+                    continue
+                if self.format == "jsonl":
+                    grants.append(self._parse_json(text))
+                elif self._columns is None:
+                    self._parse_header(text)
+                else:
+                    grants.append(self._parse_csv(text))
+            except (UnicodeDecodeError, ValueError) as e:
+                if self._columns is None and self.format == "csv":
+                    raise ValueError(f"line {self.line}: {e}")
+                self.error_count += 1
+                if len(self.errors) < MAX_ERRORS:
+                    self.errors.append(f"line {self.line}: {e}")
+        return grants
+
+    @staticmethod
+    def _split(text: str) -> List[str]:
+        return next(csv.reader([text])) if '"' in text else text.split(",")
+
+    def _parse_header(self, text: str) -> None:
+        columns = [c.strip().lower() for c in self._split(text)]
+        if "device_id" not in columns or not {"tokens", "unlimited_months"} & set(columns):
+            raise ValueError("CSV header needs device_id and tokens and/or unlimited_months")
+        self._columns = columns
+
+    def _parse_csv(self, text: str) -> Grant:
+        values = self._split(text)
+        if len(values) != len(self._columns):
+            raise ValueError(f"expected {len(self._columns)} fields, got {len(values)}")
+        row = dict(zip(self._columns, values))
+        return make_grant(row["device_id"], row.get("tokens"), row.get("unlimited_months"))
+
+    @staticmethod
+    def _parse_json(text: str) -> Grant:
+        try:
+            row = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid JSON ({e.msg})")
+        if not isinstance(row, dict):
+            raise ValueError("expected a JSON object")
+        return make_grant(row.get("device_id"), row.get("tokens"), row.get("unlimited_months"))
+
+
+class GrantJob:
+    """Progress of one bulk grant upload, by idempotency key."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.batches = 0
+        self.applied = 0        # rows applied by this upload
+        self.skipped = 0        # rows in batches an earlier upload already applied
+        self.tokens = 0         # tokens granted by this upload
+        self.parser: Optional[GrantParser] = None
+        self.error: Optional[str] = None
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self.finished is None
+
+    def to_dict(self) -> dict:
+        parser = self.parser
+        return {
+            "key": self.key,
+            "running": self.running,
+            "batches": self.batches,
+            "applied": self.applied,
+            "skipped": self.skipped,
+            "invalid": parser.error_count if parser else 0,
+            "tokens": self.tokens,
+            "errors": parser.errors if parser else [],
+            "error": self.error,
+            "seconds": round((self.finished or time.monotonic()) - self.started, 3),
+        }
+
+
+class GrantJobs:
+    """Running and recently finished uploads; one running upload per key."""
+
+    def __init__(self, max_jobs: int = MAX_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, GrantJob]" = OrderedDict()
+
+    def start(self, key: str) -> GrantJob:
+        """Register a new upload; raises RuntimeError if one with this key is running."""
+        job = self._jobs.get(key)
+        if job is not None and job.running:
+            raise RuntimeError(f"An upload with key {key!r} is already running")
+        job = self._jobs[key] = GrantJob(key)
+        self._jobs.move_to_end(key)
+        while len(self._jobs) > self.max_jobs:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.running:
+                break
+            self._jobs.popitem(last=False)
+        return job
+
+    def get(self, key: str) -> Optional[GrantJob]:
+        return self._jobs.get(key)
+
+
+async def run_grants(
+    job: GrantJob,
+    chunks: AsyncIterable[bytes],
+    format: str,
+    tokens: AsyncTokenService,
+    batch_size: int,
+) -> GrantJob:
+    """Parse a grant file as it streams in and apply it in batches.
+
+    A bad CSV header raises ValueError before anything is applied; the job
+    is marked finished either way.
+    """
+    job.parser = parser = GrantParser(format)
+    pending: List[Grant] = []
+
+    async def apply(batch: List[Grant]) -> None:
+        if await tokens.apply_grants(f"{job.key}:{job.batches}", batch):
+            job.applied += len(batch)
+            job.tokens += sum(grant.tokens for grant in batch)
+        else:
+            job.skipped += len(batch)
+        job.batches += 1
+        # Give the loop a turn between batches
+        await asyncio.sleep(0)
+
+    try:
+        async for chunk in chunks:
+            for start in range(0, len(chunk), CHUNK_BYTES):
+                pending.extend(parser.feed(chunk[start:start + CHUNK_BYTES]))
+                while len(pending) >= batch_size:
+                    await apply(pending[:batch_size])
+                    del pending[:batch_size]
+        pending.extend(parser.close())
+        for start in range(0, len(pending), batch_size):
+            await apply(pending[start:start + batch_size])
+    except ValueError as e:
+        job.error = str(e)
+        raise
+    finally:
+        job.finished = time.monotonic()
+        record_bulk_grants("applied", job.applied)
+        record_bulk_grants("skipped", job.skipped)
+        record_bulk_grants("invalid", parser.error_count)
+        logger.info(
+            "Bulk grant %s: %d applied, %d skipped, %d invalid in %.1fs",
+            job.key, job.applied, job.skipped, parser.error_count, job.finished - job.started,
+        )
+    return job
+
+
+# Singleton instance
+_grant_jobs: GrantJobs | None = None
+
+
+def get_grant_jobs() -> GrantJobs:
+    """Get the bulk grant job registry singleton."""
+    global _grant_jobs
+    if _grant_jobs is None:
+        _grant_jobs = GrantJobs()
+    return _grant_jobs
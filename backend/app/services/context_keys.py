@@ -0,0 +1,85 @@
+"""Canonical keys for the free-text ``context`` of a generation request.
+
+Contexts that differ only in case, punctuation, spacing, full-width forms
+or accents ("Traffic!", " traffic ", "ＴＲＡＦＦＩＣ") get the same key, so
+they share cache entries and in-flight generations. Optionally, contexts
+that mention a known situation ("stuck in a traffic jam", "Stau auf der
+A3") are reduced further to a small set of intent tags.
+"""
+import unicodedata
+from typing import Tuple
+
+# Languages written without spaces between words
+UNSPACED_LANGUAGES = {"zh", "ja"}
+# Languages whose accents are stripped; elsewhere combining marks carry meaning
+# (Japanese dakuten, for one)
+LATIN_LANGUAGES = {"en", "de", "fr", "es"}
+
+# Intent tag -> keywords, matched against canonical text. Latin keywords
+# match whole words; CJK and Korean ones match anywhere
+INTENT_KEYWORDS = {
+    "traffic": ["traffic", "jam", "stau", "embouteillage", "bouchon", "trafico", "atasco",
+                "堵车", "交通", "渋滞", "교통", "차가 막"],
+    "transit": ["train", "bus", "subway", "metro", "tube", "tram", "zug", "bahn", "tren",
+                "地铁", "火车", "公交", "電車", "バス", "지하철", "버스"],
+    "car": ["car", "flat tire", "flat tyre", "breakdown", "broke down", "auto", "panne", "coche",
+            "车坏", "爆胎", "車が", "パンク", "차가 고장"],
+    "sick": ["sick", "ill", "illness", "fever", "flu", "cold", "migraine", "headache", "krank", "fieber",
+             "malade", "fievre", "enfermo", "fiebre", "生病", "发烧", "感冒", "病気", "熱", "風邪", "아파", "감기", "열이"],
+    "family": ["family", "kid", "kids", "child", "children", "son", "daughter", "mom", "mum", "dad", "familie",
+               "famille", "enfant", "familia", "hijo", "家里", "孩子", "家族", "子供", "가족", "아이"],
+    "pet": ["dog", "cat", "pet", "hund", "katze", "chien", "perro", "gato",
+            "狗", "猫", "犬", "강아지", "고양이"],
+    "weather": ["weather", "snow", "storm", "rain", "flood", "wetter", "schnee", "neige", "tempete",
+                "nieve", "tormenta", "下雪", "暴雨", "天气", "雪", "台風", "大雨", "눈이", "폭우", "태풍"],
+    "tech": ["computer", "laptop", "internet", "wifi", "wi fi", "power outage", "update", "rechner",
+             "ordinateur", "电脑", "网络", "停电", "パソコン", "ネット", "停電", "컴퓨터", "인터넷", "정전"],
+    "overslept": ["overslept", "alarm", "woke up late", "verschlafen", "wecker", "reveil",
+                  "me dormi", "despertador", "睡过头", "闹钟", "寝坊", "目覚まし", "늦잠", "알람"],
+}
+
+_PUNCTUATION = {"P", "S"}
+
+
+def _strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFD", text)
+    return unicodedata.normalize("NFC", "".join(c for c in decomposed if unicodedata.category(c) != "Mn"))
+
+
+def canonical_context(text: str, language: str = "en") -> str:
+    """Normalize a context for keying; empty when nothing meaningful is left."""
+    # NFKC folds full-width Latin and digits and half-width katakana
+    text = unicodedata.normalize("NFKC", text).casefold()
+    if language in LATIN_LANGUAGES:
+        text = _strip_accents(text)
+    text = "".join(" " if unicodedata.category(c)[0] in _PUNCTUATION else c for c in text)
+    if language in UNSPACED_LANGUAGES:
+        return "".join(text.split())
+    return " ".join(text.split())
+
+
+_INTENT_OF = {_strip_accents(k): tag for tag, keywords in INTENT_KEYWORDS.items() for k in keywords}
+# Single Latin words are looked up per word; phrases and CJK keywords by substring
+_WORDS = {k: tag for k, tag in _INTENT_OF.items() if k.isascii() and " " not in k}
+_PHRASES = [(f" {k} ", tag) for k, tag in _INTENT_OF.items() if k.isascii() and " " in k]
+_UNSPACED = [(k, tag) for k, tag in _INTENT_OF.items() if not k.isascii()]
+
+
+def intent_tags(canonical: str) -> Tuple[str, ...]:
+    """Sorted intent tags mentioned in a canonical context."""
+    tags = {_WORDS[w] for w in canonical.split() if w in _WORDS}
+    padded = f" {canonical} "
+    tags.update(tag for phrase, tag in _PHRASES if phrase in padded)
+    if not canonical.isascii():
+        tags.update(tag for keyword, tag in _UNSPACED if keyword in canonical)
+    return tuple(sorted(tags))
+
+
+def context_key(text: str, language: str = "en", intents: bool = False) -> str:
+    """Cache key for a context: its intent tags when enabled and found, else its canonical text."""
+    canonical = canonical_context(text or "", language)
+    if intents and canonical:
+        tags = intent_tags(canonical)
+        if tags:
+            return "intent:" + ",".join(tags)
+    return canonical
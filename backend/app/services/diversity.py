@@ -0,0 +1,197 @@
+"""
+Near-duplicate detection for generated excuses.
+
+Excuses are compared by the Jaccard similarity of their character 3-gram
+sets, which needs no tokenizer and works the same for Chinese or Japanese
+as for English. Each text is reduced to a MinHash signature (``num_perm``
+32-bit values; the share of equal positions estimates the similarity), and
+signatures of recently served excuses are kept in a banded LSH index per
+``(category, language)``, so a lookup only compares against the handful of
+items that share a band instead of scanning the whole window.
+"""
+import hashlib
+import itertools
+import re
+from array import array
+from collections import OrderedDict
+from operator import eq
+from typing import Dict, Hashable, List, Optional, Sequence, Set, Tuple, Union
+
+from app.config import get_settings
+from app.core.metrics import record_duplicate_dropped
+from app.schemas.excuse import Excuse
+
+SHINGLE_SIZE = 3
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def shingles(text: str) -> Set[str]:
+    """Character 3-grams of the text, ignoring case, punctuation and spacing."""
+    normalized = " ".join(_NON_WORD.sub(" ", text.lower()).split())
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized}
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def similarity(a: array, b: array) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(map(eq, a, b)) / len(a)
+
+
+class MinHasher:
+    """Computes MinHash signatures of ``num_perm`` values.
+
+    One SHAKE-128 digest per shingle supplies all ``num_perm`` hash values
+    at once, which is several times faster than evaluating that many hash
+    functions in Python.
+    """
+
+    def __init__(self, num_perm: int = 64):
+        self.num_perm = num_perm
+
+    def signature(self, text: str) -> array:
+        size = 4 * self.num_perm
+        rows = [array("I", hashlib.shake_128(s.encode()).digest(size)) for s in shingles(text)]
+        return array("I", map(min, zip(*rows)))
+
+
+class SimilarityIndex:
+    """LSH index over the most recent ``max_items`` signatures.
+
+    Signatures are split into ``bands`` bands; two items become candidates
+    when any band matches exactly, which happens with high probability above
+    a similarity of about ``(1 / bands) ** (bands / num_perm)``. Buckets
+    holding more than ``max_bucket`` items come from very common phrasing
+    ("I was", "the") rather than shared content and are skipped on lookup,
+    which bounds the cost of a query; real near-duplicates still meet in
+    their other bands.
+    """
+
+    def __init__(self, bands: int = 16, max_items: int = 1_000, max_bucket: int = 64):
+        self.bands = bands
+        self.max_items = max_items
+        self.max_bucket = max_bucket
+        self._ids = itertools.count()
+        self._signatures: "OrderedDict[int, array]" = OrderedDict()
+        # One table per band: hash of the band -> item id, or a list of ids
+        # when several share it (most buckets hold one item; this halves memory)
+        self._buckets: List[Dict[int, Union[int, List[int]]]] = [{} for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _band_keys(self, signature: array) -> List[int]:
+        rows = len(signature) // self.bands
+        return [hash(signature[i * rows:(i + 1) * rows].tobytes()) for i in range(self.bands)]
+
+    def add(self, signature: array) -> None:
+        """Index a signature, forgetting the oldest one when full."""
+        item = next(self._ids)
+        self._signatures[item] = signature
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            items = bucket.get(key)
+            if items is None:
+                bucket[key] = item
+            elif isinstance(items, list):
+                items.append(item)
+            else:
+                bucket[key] = [items, item]
+        while len(self._signatures) > self.max_items:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        oldest, signature = self._signatures.popitem(last=False)
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            items = bucket[key]
+            if not isinstance(items, list):
+                del bucket[key]
+                continue
+            items.remove(oldest)
+            if len(items) == 1:
+                bucket[key] = items[0]
+
+    def most_similar(self, signature: array) -> float:
+        """Highest similarity to any indexed item sharing a band, or 0."""
+        candidates = set()
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            items = bucket.get(key)
+            if isinstance(items, list):
+                if len(items) <= self.max_bucket:
+                    candidates.update(items)
+            elif items is not None:
+                candidates.add(items)
+        return max((similarity(signature, self._signatures[c]) for c in candidates), default=0.0)
+
+
+class Selection:
+    """The excuses for one response, kept free of near-duplicates as batches arrive."""
+
+    def __init__(self, diversity: "DiversityFilter", index: Optional[SimilarityIndex]):
+        self._diversity = diversity
+        self._index = index
+        self.kept: List[Tuple[Excuse, array]] = []
+        # (similarity, excuse, signature) of rejected excuses, for back-filling
+        self.dropped: List[Tuple[float, Excuse, array]] = []
+
+    def offer(self, excuses: Sequence[Excuse]) -> None:
+        """Keep each excuse unless it is too close to a kept or recently served one."""
+        threshold = self._diversity.threshold
+        for excuse in excuses:
+            signature = self._diversity.hasher.signature(excuse.text)
+            closest = max((similarity(signature, s) for _, s in self.kept), default=0.0)
+            if closest >= threshold:
+                record_duplicate_dropped("response")
+            elif self._index is not None:
+                closest = self._index.most_similar(signature)
+                if closest >= threshold:
+                    record_duplicate_dropped("recent")
+            if closest >= threshold:
+                self.dropped.append((closest, excuse, signature))
+            else:
+                self.kept.append((excuse, signature))
+
+    def texts(self) -> List[str]:
+        """Texts already kept or rejected, for the top-up prompt to steer away from."""
+        return [e.text for e, _ in self.kept] + [e.text for _, e, _ in self.dropped]
+
+    def result(self, count: int) -> List[Excuse]:
+        """Up to ``count`` excuses, back-filled with the least similar rejects if short.
+
+        The returned excuses are recorded as served.
+        """
+        chosen = self.kept[:count]
+        backfill = sorted(self.dropped, key=lambda d: d[0])[:count - len(chosen)]
+        chosen += [(excuse, signature) for _, excuse, signature in backfill]
+        if self._index is not None:
+            for _, signature in chosen:
+                self._index.add(signature)
+        return [excuse for excuse, _ in chosen]
+
+
+class DiversityFilter:
+    """Drops near-duplicate excuses within a response and against recently served ones."""
+
+    def __init__(self, threshold: float = 0.5, num_perm: int = 64, bands: int = 16, recent_items: int = 1_000):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.recent_items = recent_items
+        self._indexes: Dict[Hashable, SimilarityIndex] = {}
+
+    def selection(self, category: str, language: str, avoid_recent: bool = True) -> Selection:
+        """Start selecting excuses for one response."""
+        index = None
+        if avoid_recent:
+            index = self._indexes.get((category, language))
+            if index is None:
+                index = self._indexes[(category, language)] = SimilarityIndex(self.bands, self.recent_items)
+        return Selection(self, index)
+
+
+def create_diversity_filter() -> DiversityFilter:
+    """Build a diversity filter from settings."""
+    settings = get_settings()
+    return DiversityFilter(
+        threshold=settings.diversity_threshold,
+        recent_items=settings.diversity_recent_items,
+    )
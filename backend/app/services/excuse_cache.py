@@ -0,0 +1,106 @@
+"""In-process cache of generated excuses for scenario and context requests."""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from app.config import get_settings
+from app.schemas.excuse import Excuse
+
+
+class ExcuseCache:
+    """LRU cache with a TTL, keyed by ``(category, urgency, language, scenario key, context key)``.
+
+    Fills the gap between the pre-generated index and the LLM: the first
+    visitor for a scenario tuple or context that isn't in the index pays for
+    the generation, later ones are served from memory until the entry expires.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, List[Excuse]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[List[Excuse]]:
+        """Return cached excuses, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self._clock():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, excuses: List[Excuse]) -> None:
+        """Cache excuses, evicting the least recently used entry when full."""
+        self._entries[key] = (self._clock() + self.ttl, excuses)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into a single call.
+
+    The first caller starts the call as a task; callers arriving while it
+    is running await the same task. The task is shielded, so a caller that
+    disconnects doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """Return ``fn()``'s result and whether it was shared with an earlier caller."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task), shared
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieve the exception so it isn't logged when every caller has gone
+        if not task.cancelled():
+            task.exception()
+
+
+# Singleton instances
+_excuse_cache: ExcuseCache | None = None
+_single_flight: SingleFlight | None = None
+
+
+def get_excuse_cache() -> ExcuseCache:
+    """Get excuse cache singleton."""
+    global _excuse_cache
+    if _excuse_cache is None:
+        settings = get_settings()
+        _excuse_cache = ExcuseCache(
+            max_entries=settings.excuse_cache_max_entries,
+            ttl=settings.excuse_cache_ttl,
+        )
+    return _excuse_cache
+
+
+def get_single_flight() -> SingleFlight:
+    """Get the generation single-flight singleton."""
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
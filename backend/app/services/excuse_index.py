@@ -0,0 +1,174 @@
+"""Read-only, memory-mapped index of pre-generated excuses.
+
+The index maps ``(category, urgency, language, scenario)`` to a packed excuse
+record. It is an open-addressing hash table in a single file::
+
+    header   <4sIIQ   magic, n_slots (power of two), n_records, data_offset
+    slots    <QQ      key hash (0 = empty), record offset; linear probing
+    records  <HI      key length, payload length, then key and payload bytes
+
+The file is opened with ``mmap`` so every worker process shares the same
+page-cache pages instead of holding its own heap copy. Builds are written to
+a temporary file and moved into place with ``os.replace``; readers notice the
+new inode on their next stat check and swap to it atomically.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from app.config import get_settings
+from app.schemas.excuse import Excuse
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b"EXI1"
+HEADER = struct.Struct("<4sIIQ")
+SLOT = struct.Struct("<QQ")
+RECORD = struct.Struct("<HI")
+
+
+def index_key(category: str, urgency: str, language: str, scenario: str) -> bytes:
+    """Encode a lookup key."""
+    return "\x1f".join((category, urgency, language, scenario)).encode()
+
+
+def _hash(key: bytes) -> int:
+    # Stable across processes (unlike hash()); never 0, which marks empty slots
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") | 1
+
+
+def build_index(path: str, entries: Iterable[Tuple[str, str, str, str, str]]) -> int:
+    """Write an index from ``(category, urgency, language, scenario, excuses_json)``.
+
+    The file is built next to ``path`` and atomically moved into place.
+    Returns the number of records.
+    """
+    records = {}
+    for category, urgency, language, scenario, excuses_json in entries:
+        records[index_key(category, urgency, language, scenario)] = excuses_json.encode()
+
+    n_slots = 1
+    while n_slots < 2 * len(records):  # load factor <= 0.5
+        n_slots <<= 1
+    mask = n_slots - 1
+    slots = bytearray(SLOT.size * n_slots)
+    data_offset = HEADER.size + len(slots)
+
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * data_offset)
+        offset = data_offset
+        for key, payload in records.items():
+            h = _hash(key)
+            i = h & mask
+            while SLOT.unpack_from(slots, i * SLOT.size)[0]:
+                i = (i + 1) & mask
+            SLOT.pack_into(slots, i * SLOT.size, h, offset)
+            record = RECORD.pack(len(key), len(payload)) + key + payload
+            f.write(record)
+            offset += len(record)
+        f.seek(0)
+        f.write(HEADER.pack(INDEX_MAGIC, n_slots, len(records), data_offset))
+        f.write(slots)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(records)
+
+
+class _MappedIndex:
+    """One open index file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n_slots, self.n_records, _ = HEADER.unpack_from(self.mm)
+        if magic != INDEX_MAGIC or self.n_slots & (self.n_slots - 1):
+            self.mm.close()
+            raise ValueError(f"Not an excuse index: {path}")
+        self.mask = self.n_slots - 1
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        mm = self.mm
+        h = _hash(key)
+        i = h & self.mask
+        while True:
+            slot_hash, offset = SLOT.unpack_from(mm, HEADER.size + i * SLOT.size)
+            if slot_hash == 0:
+                return None
+            if slot_hash == h:
+                key_len, payload_len = RECORD.unpack_from(mm, offset)
+                start = offset + RECORD.size
+                if mm[start:start + key_len] == key:
+                    return mm[start + key_len:start + key_len + payload_len]
+            i = (i + 1) & self.mask
+
+
+class ExcuseIndex:
+    """Hot-swappable lookup of pre-generated excuses."""
+
+    def __init__(self, path: Optional[str], check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._index: Optional[_MappedIndex] = None
+        self._next_check = 0.0
+
+    def __len__(self) -> int:
+        index = self._current()
+        return index.n_records if index is not None else 0
+
+    def _current(self) -> Optional[_MappedIndex]:
+        """Return the mapped index, reopening it if the file was replaced."""
+        if self.path is None:
+            return None
+        now = time.monotonic()
+        if now < self._next_check:
+            return self._index
+        self._next_check = now + self.check_interval
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._index = None
+            return None
+        current = self._index
+        if current is None or (stat.st_ino, stat.st_mtime_ns, stat.st_size) != (
+            current.stat.st_ino, current.stat.st_mtime_ns, current.stat.st_size
+        ):
+            try:
+                self._index = _MappedIndex(self.path)
+                logger.info("Loaded excuse index %s (%d records)", self.path, self._index.n_records)
+            except (OSError, ValueError, struct.error):
+                logger.exception("Failed to load excuse index %s", self.path)
+        return self._index
+
+    def lookup(self, category: str, urgency: str, language: str, scenario: str) -> Optional[List[Excuse]]:
+        """Return pre-generated excuses for a scenario, or None."""
+        index = self._current()
+        if index is None:
+            return None
+        payload = index.get(index_key(category, urgency, language, scenario))
+        if payload is None:
+            return None
+        return [Excuse(**e) for e in json.loads(payload)]
+
+
+# Singleton instance
+_excuse_index: ExcuseIndex | None = None
+
+
+def get_excuse_index() -> ExcuseIndex:
+    """Get excuse index singleton."""
+    global _excuse_index
+    if _excuse_index is None:
+        settings = get_settings()
+        _excuse_index = ExcuseIndex(
+            settings.excuse_index_path,
+            check_interval=settings.excuse_index_check_interval,
+        )
+    return _excuse_index
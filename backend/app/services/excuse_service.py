@@ -1,10 +1,29 @@
 """Excuse generation service using LLM."""
 import json
-from typing import List
+from typing import Any, List, Optional, Sequence, Tuple
 from openai import AsyncOpenAI
+from openai.types import CompletionUsage
 
 from app.config import get_settings
+from app.core.metrics import record_topup
+from app.core.tracing import span
 from app.schemas.excuse import Excuse, ExcuseCategory, UrgencyLevel
+from app.services.diversity import create_diversity_filter
+from app.services.scenarios import ScenarioTuple, scenario_prompt
+
+# Tone of the single raw-text excuse returned when the LLM output isn't JSON
+FALLBACK_TONE = "generated"
+
+# Supported output languages
+LANGUAGE_NAMES = {
+    "en": "English",
+    "zh": "Chinese (Simplified)",
+    "ja": "Japanese",
+    "de": "German",
+    "fr": "French",
+    "ko": "Korean",
+    "es": "Spanish",
+}
 
 
 class ExcuseService:
@@ -17,6 +36,8 @@ class ExcuseService:
             api_key=settings.llm_proxy_key,
         )
         self.model = settings.llm_model
+        self.diversity = create_diversity_filter()
+        self.max_topups = settings.diversity_max_topups
     
     def _get_category_description(self, category: ExcuseCategory, language: str) -> str:
         """Get human-readable category description."""
@@ -139,74 +160,150 @@ class ExcuseService:
         urgency: UrgencyLevel,
         context: str = "",
         language: str = "en",
+        scenario: Optional[ScenarioTuple] = None,
     ) -> List[Excuse]:
         """Generate creative excuses using LLM."""
+        excuses, _ = await self.generate_excuses_with_usage(category, urgency, context, language, scenario)
+        return excuses
+    
+    def _build_prompt(
+        self,
+        category: ExcuseCategory,
+        urgency: UrgencyLevel,
+        context: str,
+        language: str,
+        scenario: Optional[ScenarioTuple],
+        count: int = 3,
+        avoid: Sequence[str] = (),
+    ) -> str:
+        """Build the generation prompt."""
         category_desc = self._get_category_description(category, language)
         urgency_inst = self._get_urgency_instruction(urgency, language)
         
-        language_names = {
-            "en": "English",
-            "zh": "Chinese (Simplified)",
-            "ja": "Japanese",
-            "de": "German",
-            "fr": "French",
-            "ko": "Korean",
-            "es": "Spanish",
-        }
-        lang_name = language_names.get(language, "English")
+        lang_name = LANGUAGE_NAMES.get(language, "English")
         
+        scenario_part = f"\n{scenario_prompt(scenario)}" if scenario else ""
         context_part = f"\nAdditional context from user: {context}" if context else ""
+        avoid_part = "".join(f"\nDo not repeat this idea: {text}" for text in avoid)
         
-        prompt = f"""You are a creative excuse generator. Generate exactly 3 unique excuses for: {category_desc}
+        return f"""You are a creative excuse generator. Generate exactly {count} unique excuses for: {category_desc}
 
 The excuses should be: {urgency_inst}
-{context_part}
+{scenario_part}{context_part}{avoid_part}
 
 IMPORTANT: Generate all content in {lang_name} language.
 
-Return a JSON array with exactly 3 objects, each with:
+Return a JSON array with exactly {count} objects, each with:
 - "text": The excuse itself (1-3 sentences)
 - "tone": A single word describing the tone (e.g., "sincere", "apologetic", "humorous", "dramatic")
 - "tip": A brief delivery tip (1 short sentence)
 
 Return ONLY the JSON array, no other text."""
-
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.9,
-            max_tokens=1000,
-        )
+    
+    async def _complete(self, prompt: str, count: int = 3) -> Tuple[List[Excuse], Optional[Any]]:
+        """Run one completion and parse up to ``count`` excuses from it."""
+        with span("llm.call", model=self.model):
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.9,
+                max_tokens=1000,
+            )
         
-        content = response.choices[0].message.content.strip()
+        with span("llm.parse"):
+            content = response.choices[0].message.content.strip()
+            
+            # Parse JSON from response
+            if content.startswith("```"):
+                # Remove markdown code blocks
+                lines = content.split("\n")
+                content = "\n".join(lines[1:-1] if lines[-1] == "```" else lines[1:])
+            
+            try:
+                excuses_data = json.loads(content)
+                excuses = [
+                    Excuse(
+                        text=e.get("text", ""),
+                        tone=e.get("tone", "neutral"),
+                        tip=e.get("tip", ""),
+                    )
+                    for e in excuses_data[:count]
+                ]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                # Fallback if JSON parsing fails
+                excuses = [
+                    Excuse(
+                        text=content,
+                        tone=FALLBACK_TONE,
+                        tip="Use with confidence!",
+                    )
+                ]
         
-        # Parse JSON from response
-        if content.startswith("```"):
-            # Remove markdown code blocks
-            lines = content.split("\n")
-            content = "\n".join(lines[1:-1] if lines[-1] == "```" else lines[1:])
+        return excuses, getattr(response, "usage", None)
+    
+    async def generate_excuses_with_usage(
+        self,
+        category: ExcuseCategory,
+        urgency: UrgencyLevel,
+        context: str = "",
+        language: str = "en",
+        scenario: Optional[ScenarioTuple] = None,
+        avoid_recent: bool = True,
+    ) -> Tuple[List[Excuse], Optional[Any]]:
+        """Generate excuses and return them with the completion's token usage.
         
-        try:
-            excuses_data = json.loads(content)
-            excuses = [
-                Excuse(
-                    text=e.get("text", ""),
-                    tone=e.get("tone", "neutral"),
-                    tip=e.get("tip", ""),
-                )
-                for e in excuses_data[:3]
-            ]
-        except (json.JSONDecodeError, KeyError, TypeError):
-            # Fallback if JSON parsing fails
-            excuses = [
-                Excuse(
-                    text=content,
-                    tone="generated",
-                    tip="Use with confidence!",
-                )
-            ]
+        Near-duplicates within the response, and (with ``avoid_recent``) of
+        excuses recently served for the same category and language, are
+        replaced by a smaller top-up completion. Usage covers all calls.
+        """
+        with span("prompt.build"):
+            prompt = self._build_prompt(category, urgency, context, language, scenario)
         
-        return excuses
+        excuses, usage = await self._complete(prompt)
+        if is_fallback(excuses):
+            return excuses, usage
+        
+        wanted = len(excuses)
+        with span("excuse.diversity"):
+            # Requests may name any language; unsupported ones share one index
+            index_language = language if language in LANGUAGE_NAMES else "other"
+            selection = self.diversity.selection(category.value, index_language, avoid_recent)
+            selection.offer(excuses)
+        
+        for _ in range(self.max_topups):
+            missing = wanted - len(selection.kept)
+            if missing <= 0:
+                break
+            record_topup()
+            prompt = self._build_prompt(
+                category, urgency, context, language, scenario, count=missing, avoid=selection.texts()
+            )
+            more, more_usage = await self._complete(prompt, count=missing)
+            usage = _add_usage(usage, more_usage)
+            if is_fallback(more):
+                break
+            with span("excuse.diversity"):
+                selection.offer(more)
+        
+        return selection.result(wanted), usage
+
+
+def is_fallback(excuses: List[Excuse]) -> bool:
+    """Whether a generation result is the single canned fallback excuse."""
+    return len(excuses) == 1 and excuses[0].tone == FALLBACK_TONE
+
+
+def _add_usage(a: Optional[Any], b: Optional[Any]) -> Optional[Any]:
+    """Sum the token usage of two completions."""
+    if a is None or b is None:
+        return a or b
+    prompt_tokens = (getattr(a, "prompt_tokens", 0) or 0) + (getattr(b, "prompt_tokens", 0) or 0)
+    completion_tokens = (getattr(a, "completion_tokens", 0) or 0) + (getattr(b, "completion_tokens", 0) or 0)
+    return CompletionUsage(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+    )
 
 
 # Singleton instance
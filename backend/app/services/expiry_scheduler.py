@@ -0,0 +1,145 @@
+"""Subscription expiry scheduler."""
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Runs fn(*args) under the lock of a device: guard(device_id, fn, *args)
+Guard = Callable[..., Awaitable[None]]
+
+
+class ExpiryScheduler:
+    """Heap-based scheduler that flips device state when subscriptions lapse.
+
+    Deadlines are on the monotonic clock. Rescheduling or cancelling a
+    device leaves its old heap entry in place; stale entries are skipped
+    when popped (lazy deletion), so every operation stays O(log n).
+    Devices may be scheduled from worker threads, so the heap is locked.
+    
+    With a ``guard`` set (``AsyncTokenService`` sets its device locks), the
+    background task fires each expiry through it, so expiries never
+    interleave with other writes to the same device. A failing callback is
+    logged and the remaining expiries still fire.
+    """
+
+    def __init__(self, on_expire: Callable[[str], None], clock: Callable[[], float] = time.monotonic):
+        self._on_expire = on_expire
+        self._clock = clock
+        self._heap: List[Tuple[float, str]] = []
+        self._deadlines: Dict[str, float] = {}
+        self._listeners: List[Callable[[str], None]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._lock = threading.Lock()
+        self.guard: Optional[Guard] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """Register a callback invoked with the device_id of each expiry."""
+        self._listeners.append(callback)
+
+    def schedule(self, device_id: str, deadline: float) -> None:
+        """Schedule (or reschedule) expiry for a device."""
+        with self._lock:
+            self._deadlines[device_id] = deadline
+            heapq.heappush(self._heap, (deadline, device_id))
+            earliest = self._heap[0][0] == deadline
+        if earliest:
+            self._wake()
+
+    def cancel(self, device_id: str) -> None:
+        """Cancel any pending expiry for a device."""
+        with self._lock:
+            self._deadlines.pop(device_id, None)
+
+    def bulk_load(self, entries: Iterable[Tuple[str, float]]) -> None:
+        """Load many deadlines at once with a single O(n) heapify."""
+        with self._lock:
+            for device_id, deadline in entries:
+                self._deadlines[device_id] = deadline
+            self._heap = [(deadline, device_id) for device_id, deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        self._wake()
+
+    def _wake(self) -> None:
+        """Wake the background task; safe to call from worker threads."""
+        if self._wakeup is None:
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _pop_due(self, now: float) -> List[str]:
+        due = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                deadline, device_id = heapq.heappop(heap)
+                if self._deadlines.get(device_id) != deadline:
+                    continue  # rescheduled or cancelled
+                del self._deadlines[device_id]
+                due.append(device_id)
+        return due
+
+    def _fire(self, device_id: str) -> None:
+        if device_id in self._deadlines:
+            return  # rescheduled while waiting for the guard
+        for callback in (self._on_expire, *self._listeners):
+            try:
+                callback(device_id)
+            except Exception:
+                logger.exception("Expiry callback failed for %s", device_id)
+
+    def run_pending(self, now: Optional[float] = None) -> int:
+        """Fire every expiry that is due; returns how many fired."""
+        due = self._pop_due(self._clock() if now is None else now)
+        for device_id in due:
+            self._fire(device_id)
+        return len(due)
+
+    async def _run(self) -> None:
+        while True:
+            # Cleared before firing, so a deadline scheduled meanwhile still wakes us
+            self._wakeup.clear()
+            if self.guard is None:
+                self.run_pending()
+            else:
+                for device_id in self._pop_due(self._clock()):
+                    try:
+                        await self.guard(device_id, self._fire, device_id)
+                    except Exception:
+                        logger.exception("Expiry failed for %s", device_id)
+            with self._lock:
+                timeout = self._heap[0][0] - self._clock() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self) -> None:
+        """Start firing expiries in the background."""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
@@ -0,0 +1,155 @@
+"""SEO scenario dimensions and their precompiled prompt fragments.
+
+Mirrors ``programmatic-seo/dimensions.json`` (which is not part of the
+backend image). Each dimension value compiles to a prompt fragment once at
+import time; a scenario tuple's full fragment is memoized, so building a
+prompt for a landing-page visitor is a dict lookup.
+"""
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional
+
+from app.schemas.excuse import ExcuseCategory, UrgencyLevel
+
+# id: (label, setting, category)
+SCENARIOS = {
+    "late-work": ("Late for Work", "workplace", ExcuseCategory.LATE),
+    "late-school": ("Late for School", "education", ExcuseCategory.LATE),
+    "late-meeting": ("Late for Meeting", "professional", ExcuseCategory.MEETING),
+    "sick-leave": ("Sick Leave", "workplace", ExcuseCategory.SICK_LEAVE),
+    "mental-health-day": ("Mental Health Day", "wellness", ExcuseCategory.SICK_LEAVE),
+    "decline-party": ("Decline Party Invite", "social", ExcuseCategory.DECLINE),
+    "decline-dinner": ("Decline Dinner Invite", "social", ExcuseCategory.DECLINE),
+    "decline-wedding": ("Decline Wedding", "social", ExcuseCategory.DECLINE),
+    "forget-birthday": ("Forgot Birthday", "personal", ExcuseCategory.FORGOT),
+    "forget-anniversary": ("Forgot Anniversary", "relationship", ExcuseCategory.FORGOT),
+    "miss-deadline": ("Missed Deadline", "professional", ExcuseCategory.DEADLINE),
+    "miss-meeting": ("Missed Meeting", "professional", ExcuseCategory.MEETING),
+    "skip-homework": ("No Homework", "education", ExcuseCategory.HOMEWORK),
+    "skip-gym": ("Skip Gym", "fitness", ExcuseCategory.DECLINE),
+    "cancel-date": ("Cancel Date", "dating", ExcuseCategory.DECLINE),
+    "leave-early": ("Leave Early", "workplace", ExcuseCategory.OTHER),
+    "wfh": ("Work From Home", "workplace", ExcuseCategory.OTHER),
+    "avoid-call": ("Avoid Phone Call", "communication", ExcuseCategory.OTHER),
+    "late-reply": ("Late Reply", "communication", ExcuseCategory.OTHER),
+    "no-overtime": ("No Overtime", "workplace", ExcuseCategory.DECLINE),
+}
+
+# id: (label, formality)
+RECIPIENTS = {
+    "boss": ("Boss", "high"),
+    "manager": ("Manager", "high"),
+    "coworker": ("Coworker", "medium"),
+    "client": ("Client", "high"),
+    "teacher": ("Teacher", "high"),
+    "professor": ("Professor", "high"),
+    "parent": ("Parent", "low"),
+    "partner": ("Partner", "low"),
+    "friend": ("Friend", "low"),
+    "landlord": ("Landlord", "medium"),
+    "doctor": ("Doctor", "medium"),
+    "in-laws": ("In-Laws", "medium"),
+    "ex": ("Ex", "low"),
+    "neighbor": ("Neighbor", "medium"),
+    "hr": ("HR Department", "high"),
+}
+
+# id: (label, tone, urgency)
+STYLES = {
+    "believable": ("Believable", "serious", UrgencyLevel.NORMAL),
+    "dramatic": ("Dramatic", "urgent", UrgencyLevel.URGENT),
+    "funny": ("Funny", "humorous", UrgencyLevel.EXTREME),
+    "professional": ("Professional", "formal", UrgencyLevel.NORMAL),
+    "apologetic": ("Apologetic", "remorseful", UrgencyLevel.NORMAL),
+    "creative": ("Creative", "imaginative", UrgencyLevel.EXTREME),
+    "emergency": ("Emergency", "urgent", UrgencyLevel.URGENT),
+    "casual": ("Casual", "relaxed", UrgencyLevel.NORMAL),
+}
+
+# id: (label, common excuses)
+INDUSTRIES = {
+    "tech": ("Tech Industry", ("server down", "deployment issue", "bug fixing")),
+    "finance": ("Finance", ("market emergency", "audit preparation", "client meeting")),
+    "healthcare": ("Healthcare", ("patient emergency", "on-call duty", "medical conference")),
+    "education": ("Education", ("grading papers", "parent conference", "curriculum planning")),
+    "retail": ("Retail", ("inventory count", "supplier meeting", "store emergency")),
+    "hospitality": ("Hospitality", ("event catering", "VIP guest", "kitchen emergency")),
+    "legal": ("Legal", ("court appearance", "client emergency", "document deadline")),
+    "creative": ("Creative", ("client revision", "inspiration block", "portfolio deadline")),
+    "startup": ("Startup", ("investor meeting", "product launch", "pivot planning")),
+    "consulting": ("Consulting", ("client site", "proposal deadline", "travel delay")),
+    "remote": ("Remote Work", ("internet outage", "power failure", "timezone confusion")),
+    "freelance": ("Freelance", ("multiple clients", "creative block", "equipment failure")),
+}
+
+REGISTERS = {"high": "formal", "medium": "neutral", "low": "casual"}
+
+# Precompiled fragments
+SCENARIO_FRAGMENTS: Dict[str, str] = {
+    id_: f"Situation: {label.lower()} ({setting} setting)."
+    for id_, (label, setting, _) in SCENARIOS.items()
+}
+RECIPIENT_FRAGMENTS: Dict[str, str] = {
+    id_: f"The excuse is for my {label.lower()}; use a {REGISTERS[formality]} register."
+    for id_, (label, formality) in RECIPIENTS.items()
+}
+STYLE_FRAGMENTS: Dict[str, str] = {
+    id_: f"Style: {label.lower()}, with a {tone} tone."
+    for id_, (label, tone, _) in STYLES.items()
+}
+INDUSTRY_FRAGMENTS: Dict[str, str] = {
+    id_: f"I work in {label}; plausible details include {', '.join(details)}."
+    for id_, (label, details) in INDUSTRIES.items()
+}
+
+
+class ScenarioTuple(NamedTuple):
+    """A validated scenario/recipient/style/industry combination."""
+    scenario: str
+    recipient: Optional[str] = None
+    style: Optional[str] = None
+    industry: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        """Canonical key used by the excuse index and cache."""
+        return "|".join(value or "" for value in self)
+
+    @property
+    def category(self) -> ExcuseCategory:
+        return SCENARIOS[self.scenario][2]
+
+    @property
+    def urgency(self) -> UrgencyLevel:
+        """Urgency implied by the style (normal without one)."""
+        return STYLES[self.style][2] if self.style else UrgencyLevel.NORMAL
+
+
+def resolve_scenario(
+    scenario: str,
+    recipient: Optional[str] = None,
+    style: Optional[str] = None,
+    industry: Optional[str] = None,
+) -> ScenarioTuple:
+    """Validate dimension ids; raises ValueError on unknown ones."""
+    for value, table, name in (
+        (scenario, SCENARIOS, "scenario"),
+        (recipient, RECIPIENTS, "recipient"),
+        (style, STYLES, "style"),
+        (industry, INDUSTRIES, "industry"),
+    ):
+        if value is not None and value not in table:
+            raise ValueError(f"Unknown {name}: {value}")
+    return ScenarioTuple(scenario, recipient, style, industry)
+
+
+@lru_cache(maxsize=8192)
+def scenario_prompt(scenario: ScenarioTuple) -> str:
+    """The prompt fragment for a scenario tuple."""
+    parts = [SCENARIO_FRAGMENTS[scenario.scenario]]
+    if scenario.recipient:
+        parts.append(RECIPIENT_FRAGMENTS[scenario.recipient])
+    if scenario.industry:
+        parts.append(INDUSTRY_FRAGMENTS[scenario.industry])
+    if scenario.style:
+        parts.append(STYLE_FRAGMENTS[scenario.style])
+    return "\n".join(parts)
@@ -0,0 +1,157 @@
+"""Per-device history of recently served excuses.
+
+Each device keeps a short ring of 64-bit excuse hashes in an ``array('Q')``
+(8 bytes per excuse), so "has this device seen it?" is a scan of at most
+``per_device`` machine words. Devices are kept in LRU order and the least
+recently active ones are dropped past ``max_devices``, which bounds total
+memory at roughly ``max_devices * per_device * 8`` bytes plus per-device
+overhead.
+
+The history is saved next to the token ledger as one CRC-checked file::
+
+    header   <4sIII   magic, n_devices, n_hashes, crc32(payload)
+    payload  name lengths (uint16 x n), names (utf-8),
+             hash counts (uint16 x n), hashes (uint64 x n_hashes), oldest first
+
+The history only avoids repeats, so a corrupt file is logged and skipped
+rather than keeping the service from starting. ``save`` copies the rings
+before writing, so it can run on another thread while requests keep
+marking excuses as seen.
+"""
+import hashlib
+import logging
+import os
+import struct
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+from app.schemas.excuse import Excuse
+from app.services.binary_io import decode_strings, encode_strings, fsync_dir, pack, unpack
+
+logger = logging.getLogger(__name__)
+
+SEEN_MAGIC = b"SEN1"
+SEEN_HEADER = struct.Struct("<4sIII")
+SEEN_FILE = "seen.bin"
+
+
+def excuse_hash(excuse: Excuse) -> int:
+    """Stable 64-bit identity of an excuse's text."""
+    return int.from_bytes(hashlib.blake2b(excuse.text.encode(), digest_size=8).digest(), "little")
+
+
+class SeenHistory:
+    """Bounded map of device id -> ring of recently served excuse hashes."""
+
+    def __init__(self, per_device: int = 32, max_devices: int = 100_000):
+        self.per_device = per_device
+        self.max_devices = max_devices
+        self._devices: "OrderedDict[str, array]" = OrderedDict()
+        # Set by every change, cleared by save
+        self.dirty = False
+        self._save_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def unseen(self, device_id: str, excuses: List[Excuse]) -> List[Excuse]:
+        """The excuses this device hasn't been served recently."""
+        ring = self._devices.get(device_id)
+        if ring is None:
+            return excuses
+        return [e for e in excuses if excuse_hash(e) not in ring]
+
+    def mark_seen(self, device_id: str, excuses: Iterable[Excuse]) -> None:
+        """Record excuses as served to a device."""
+        self.dirty = True
+        ring = self._devices.get(device_id)
+        if ring is None:
+            ring = self._devices[device_id] = array("Q")
+            while len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+        else:
+            self._devices.move_to_end(device_id)
+        for excuse in excuses:
+            h = excuse_hash(excuse)
+            if h in ring:
+                ring.remove(h)
+            ring.append(h)
+        if len(ring) > self.per_device:
+            del ring[:len(ring) - self.per_device]
+
+    def forget(self, device_id: str) -> None:
+        if self._devices.pop(device_id, None) is not None:
+            self.dirty = True
+
+    def history(self, device_id: str) -> Optional[array]:
+        """A copy of a device's ring, oldest first, or None if it has none."""
+        ring = self._devices.get(device_id)
+        return None if ring is None else array("Q", ring)
+
+    def restore(self, device_id: str, ring: array) -> None:
+        """Install a ring taken from another history, e.g. when a device moves shard."""
+        self.dirty = True
+        self._devices[device_id] = array("Q", ring[-self.per_device:])
+        self._devices.move_to_end(device_id)
+        while len(self._devices) > self.max_devices:
+            self._devices.popitem(last=False)
+
+    def save(self, path: str) -> None:
+        """Atomically write the history to ``path``."""
+        with self._save_lock:
+            self.dirty = False
+            items = list(self._devices.items())
+            names = [name for name, _ in items]
+            rings = [array("Q", ring) for _, ring in items]
+            hashes = array("Q")
+            for ring in rings:
+                hashes.extend(ring)
+            payload = b"".join((
+                encode_strings(names),
+                pack(array("H", map(len, rings))),
+                pack(hashes),
+            ))
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(SEEN_HEADER.pack(SEEN_MAGIC, len(names), len(hashes), zlib.crc32(payload)))
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            fsync_dir(os.path.dirname(path))
+
+    def load(self, path: str) -> None:
+        """Replace the history with the contents of ``path``, if it exists.
+
+        A corrupt file leaves the history empty.
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        self._devices.clear()
+        if len(data) < SEEN_HEADER.size:
+            logger.warning("Ignoring truncated seen history %s; starting empty", path)
+            return
+        magic, n, n_hashes, crc = SEEN_HEADER.unpack_from(data)
+        view = memoryview(data)[SEEN_HEADER.size:]
+        if magic != SEEN_MAGIC or zlib.crc32(view) != crc:
+            logger.warning("Ignoring corrupt seen history %s; starting empty", path)
+            return
+        names, p = decode_strings(view, n)
+        counts = unpack("H", view[p:p + 2 * n])
+        p += 2 * n
+        hashes = unpack("Q", view[p:p + 8 * n_hashes])
+        start = 0
+        for name, count in zip(names, counts):
+            self._devices[name] = hashes[start:start + count]
+            start += count
+        # Honour a smaller limit than the one the file was written with
+        while len(self._devices) > self.max_devices:
+            self._devices.popitem(last=False)
+        for ring in self._devices.values():
+            if len(ring) > self.per_device:
+                del ring[:len(ring) - self.per_device]
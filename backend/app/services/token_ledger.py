@@ -0,0 +1,520 @@
+"""Durable token ledger: append-only event log with compacted snapshots.
+
+Mutations are buffered in memory and written by a background thread as one
+block per flush, followed by a single fsync (group commit). Each block is
+columnar and CRC-checked::
+
+    header   <4sIIII  magic, n_events, n_names, payload_len, crc32(payload)
+    payload  name lengths (uint16 x n_names), names (utf-8),
+             ops (uint8 x n), device indexes (uint32 x n), values (float64 x n)
+
+Device IDs are interned per log generation, so each one is written once per
+file and events are fixed-width. Compaction rotates to a new log generation
+and folds the previous snapshot plus the closed logs into a new snapshot.
+It reads only files, so it never touches the live device table.
+
+Besides device events the log records dedupe keys (credited checkout ids
+and applied bulk grant batches),
+which replay as ordered key sets kept in the snapshot up to ``max_keys``
+per kind.
+
+On startup the state is rebuilt from ``snapshot.bin`` plus every log of the
+same or later generation. A torn block at the end of a log (crash mid-write)
+fails its length or CRC check and is ignored. A block whose write fails
+while running is truncated away and written again at the next flush.
+
+State kept beside the ledger (the seen history) is saved from the same
+thread through ``on_checkpoint``, after every compaction and at most every
+``checkpoint_interval`` seconds otherwise.
+"""
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter
+from datetime import datetime
+from itertools import compress
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.services.binary_io import decode_strings, encode_strings, fsync_dir, pack, unpack
+
+logger = logging.getLogger(__name__)
+
+# Event types
+OP_FREE_TRIAL = 1   # free trial consumed
+OP_USE = 2          # paid token consumed
+OP_ADD = 3          # value = tokens added
+OP_UNLIMITED = 4    # value = unlimited_until as a POSIX timestamp
+OP_RESET = 5        # device record deleted
+OP_CLAIM = 6        # checkout id credited (the "device" is the checkout id)
+OP_GRANT = 7        # bulk grant batch applied (the "device" is the batch key)
+
+# Ops that record dedupe keys rather than device state
+KEY_OPS = (OP_CLAIM, OP_GRANT)
+
+BLOCK_MAGIC = b"TLB1"
+BLOCK_HEADER = struct.Struct("<4sIIII")
+SNAPSHOT_MAGIC = b"TSN1"
+SNAPSHOT_HEADER = struct.Struct("<4sQII")  # magic, generation, n_devices, crc32
+
+SNAPSHOT_FILE = "snapshot.bin"
+LOG_PATTERN = re.compile(r"^ledger-(\d{8})\.log$")
+
+
+def _op_mask(op: int) -> bytes:
+    """Translation table mapping ``op`` to 1 and every other byte to 0."""
+    table = bytearray(256)
+    table[op] = 1
+    return bytes(table)
+
+
+_MASKS = {op: _op_mask(op) for op in (OP_FREE_TRIAL, OP_USE, OP_ADD, OP_UNLIMITED, *KEY_OPS)}
+
+
+def encode_block(new_names: List[str], ops: bytes, idx: array, values: array) -> bytes:
+    """Encode one log block."""
+    payload = b"".join((encode_strings(new_names), bytes(ops), pack(idx), pack(values)))
+    header = BLOCK_HEADER.pack(BLOCK_MAGIC, len(ops), len(new_names), len(payload), zlib.crc32(payload))
+    return header + payload
+
+
+def read_blocks(path: str):
+    """Yield ``(new_names, ops, idx, values)`` for each intact block in a log."""
+    with open(path, "rb") as f:
+        data = f.read()
+    view = memoryview(data)
+    pos = 0
+    while pos + BLOCK_HEADER.size <= len(data):
+        magic, n, n_names, payload_len, crc = BLOCK_HEADER.unpack_from(data, pos)
+        start = pos + BLOCK_HEADER.size
+        end = start + payload_len
+        if magic != BLOCK_MAGIC or end > len(data) or zlib.crc32(view[start:end]) != crc:
+            logger.warning("Ignoring torn ledger block at %s:%d", path, pos)
+            return
+        names, p = decode_strings(view[start:end], n_names)
+        p += start
+        ops = bytes(view[p:p + n])
+        p += n
+        idx = unpack("I", view[p:p + 4 * n])
+        p += 4 * n
+        values = unpack("d", view[p:p + 8 * n])
+        yield names, ops, idx, values
+        pos = end
+
+
+# Replay table rows: [total_tokens, used_tokens, free_trial_used, is_unlimited, unlimited_until]
+class LogReplay:
+    """Accumulates one log file's events by device index.
+    
+    Apart from resets, events on a device commute, so counts are aggregated
+    with C-level iterators keyed by the file's integer device indexes and
+    device names are resolved once per file in ``apply``.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.adds: Dict[int, int] = {}
+        self.uses: Counter = Counter()
+        self.free_trials: set = set()
+        self.unlimited: Dict[int, float] = {}
+        self.resets: List[int] = []
+        self.keys: Dict[int, List[int]] = {}
+
+    def _accumulate(self, ops: bytes, idx: array, values: array) -> None:
+        self.uses.update(compress(idx, ops.translate(_MASKS[OP_USE])))
+        self.free_trials.update(compress(idx, ops.translate(_MASKS[OP_FREE_TRIAL])))
+        if OP_ADD in ops:
+            mask = ops.translate(_MASKS[OP_ADD])
+            adds = self.adds
+            for i, value in zip(compress(idx, mask), compress(values, mask)):
+                adds[i] = adds.get(i, 0) + int(value)
+        if OP_UNLIMITED in ops:
+            mask = ops.translate(_MASKS[OP_UNLIMITED])
+            self.unlimited.update(zip(compress(idx, mask), compress(values, mask)))
+        for op in KEY_OPS:
+            if op in ops:
+                self.keys.setdefault(op, []).extend(compress(idx, ops.translate(_MASKS[op])))
+
+    def _reset(self, i: int) -> None:
+        # Forget this file's earlier events; the table row goes in apply()
+        self.adds.pop(i, None)
+        self.uses.pop(i, None)
+        self.free_trials.discard(i)
+        self.unlimited.pop(i, None)
+        self.resets.append(i)
+
+    def add_block(self, new_names: List[str], ops: bytes, idx: array, values: array) -> None:
+        """Accumulate one block, splitting it around order-sensitive resets."""
+        self.names.extend(new_names)
+        reset = ops.find(OP_RESET)
+        if reset == -1:
+            self._accumulate(ops, idx, values)
+            return
+        start = 0
+        while reset != -1:
+            self._accumulate(ops[start:reset], idx[start:reset], values[start:reset])
+            self._reset(idx[reset])
+            start = reset + 1
+            reset = ops.find(OP_RESET, start)
+        self._accumulate(ops[start:], idx[start:], values[start:])
+
+    def apply(self, table: Dict[str, list], keys: Optional[Dict[int, dict]] = None) -> None:
+        """Fold the accumulated events into a replay table and key sets."""
+        names = self.names
+        if keys is not None:
+            for op, indexes in self.keys.items():
+                ordered = keys.setdefault(op, {})
+                for i in indexes:
+                    # Re-recorded keys move to the most recent end
+                    ordered.pop(names[i], None)
+                    ordered[names[i]] = None
+        # A reset device loses its earlier rows; anything it did afterwards
+        # is still in the accumulators
+        for i in self.resets:
+            table.pop(names[i], None)
+        adds, uses, unlimited = self.adds, self.uses, self.unlimited
+        for i in adds.keys() | uses.keys() | self.free_trials | unlimited.keys():
+            name = names[i]
+            row = table.get(name)
+            if row is None:
+                row = table[name] = [0, 0, False, False, 0.0]
+            row[0] += adds.get(i, 0)
+            row[1] += uses.get(i, 0)
+            if i in self.free_trials:
+                row[2] = True
+            if i in unlimited:
+                row[3] = True
+                row[4] = unlimited[i]
+
+
+def apply_block(table: Dict[str, list], names: List[str], ops: bytes, idx: array, values: array) -> None:
+    """Apply one block of events to a replay table."""
+    replay = LogReplay()
+    replay.add_block(names, ops, idx, values)
+    replay.apply(table)
+
+
+def replay_log(table: Dict[str, list], path: str, keys: Optional[Dict[int, dict]] = None) -> int:
+    """Apply every intact block of a log file; returns the event count."""
+    replay = LogReplay()
+    events = 0
+    for new_names, ops, idx, values in read_blocks(path):
+        replay.add_block(new_names, ops, idx, values)
+        events += len(ops)
+    replay.apply(table, keys)
+    return events
+
+
+def write_snapshot(
+    path: str,
+    generation: int,
+    table: Dict[str, list],
+    keys: Optional[Dict[int, dict]] = None,
+) -> None:
+    """Atomically write a columnar snapshot of a replay table and key sets."""
+    names = list(table)
+    rows = table.values()
+    keys = keys or {}
+    payload = b"".join((
+        encode_strings(names),
+        pack(array("q", (r[0] for r in rows))),
+        pack(array("q", (r[1] for r in rows))),
+        bytes(int(r[2]) | int(r[3]) << 1 for r in rows),
+        pack(array("d", (r[4] for r in rows))),
+        pack(array("I", [len(keys)])),
+        *(pack(array("I", [op, len(ordered)])) + encode_strings(list(ordered)) for op, ordered in keys.items()),
+    ))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, generation, len(names), zlib.crc32(payload)))
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(os.path.dirname(path))
+
+
+def read_snapshot(path: str, keys: Optional[Dict[int, dict]] = None) -> Tuple[int, Dict[str, list]]:
+    """Read a snapshot; returns ``(generation, table)`` and fills ``keys`` if given."""
+    if not os.path.exists(path):
+        return 0, {}
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, generation, n, crc = SNAPSHOT_HEADER.unpack_from(data)
+    view = memoryview(data)[SNAPSHOT_HEADER.size:]
+    if magic != SNAPSHOT_MAGIC or zlib.crc32(view) != crc:
+        raise ValueError(f"Corrupt ledger snapshot: {path}")
+    names, p = decode_strings(view, n)
+    totals = unpack("q", view[p:p + 8 * n])
+    p += 8 * n
+    used = unpack("q", view[p:p + 8 * n])
+    p += 8 * n
+    flags = bytes(view[p:p + n])
+    p += n
+    until = unpack("d", view[p:p + 8 * n])
+    p += 8 * n
+    if keys is not None:
+        (n_ops,) = unpack("I", view[p:p + 4])
+        p += 4
+        for _ in range(n_ops):
+            op, count = unpack("I", view[p:p + 8])
+            key_names, consumed = decode_strings(view[p + 8:], count)
+            p += 8 + consumed
+            keys[op] = dict.fromkeys(key_names)
+    table = {
+        name: [total, u, bool(flag & 1), bool(flag & 2), t]
+        for name, total, u, flag, t in zip(names, totals, used, flags, until)
+    }
+    return generation, table
+
+
+class TokenLedger:
+    """Append-only, group-committed event log for ``TokenService``."""
+
+    def __init__(
+        self,
+        directory: str,
+        flush_interval: float = 0.05,
+        snapshot_events: int = 1_000_000,
+        max_keys: int = 100_000,
+        checkpoint_interval: float = 30.0,
+    ):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.snapshot_events = snapshot_events
+        self.max_keys = max_keys
+        self.checkpoint_interval = checkpoint_interval
+        # Called from the flush thread to save state kept beside the ledger
+        self.on_checkpoint: Optional[Callable[[], None]] = None
+        self._last_checkpoint = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+
+        # Pending events, guarded by _lock (held only for in-memory appends;
+        # reentrant so transaction() can wrap several appends)
+        self._lock = threading.RLock()
+        self._names: Dict[str, int] = {}
+        self._new_names: List[str] = []
+        self._ops = bytearray()
+        self._idx = array("I")
+        self._values = array("d")
+        self._events_since_snapshot = 0
+
+        # File writes and rotation, guarded by _io_lock
+        self._io_lock = threading.Lock()
+        self._generation = max([self._snapshot_generation(), *self._log_generations()], default=0) + 1
+        self._file = self._open_log()
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"ledger-{generation:08d}.log")
+
+    def _open_log(self):
+        # Unbuffered, so a failed write leaves nothing queued to follow it
+        return open(self._log_path(self._generation), "ab", buffering=0)
+
+    def _log_generations(self) -> List[int]:
+        return sorted(
+            int(m.group(1))
+            for m in map(LOG_PATTERN.match, os.listdir(self.directory))
+            if m
+        )
+
+    def _snapshot_generation(self) -> int:
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb") as f:
+            return SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))[1]
+
+    def _append(self, op: int, device_id: str, value: float) -> None:
+        # Caller holds _lock
+        i = self._names.get(device_id)
+        if i is None:
+            i = self._names[device_id] = len(self._names)
+            self._new_names.append(device_id)
+        self._ops.append(op)
+        self._idx.append(i)
+        self._values.append(value)
+
+    def append(self, op: int, device_id: str, value: float = 0.0) -> None:
+        """Buffer an event; it becomes durable at the next flush."""
+        with self._lock:
+            self._append(op, device_id, value)
+
+    def transaction(self):
+        """Context manager: events appended inside it are written in the same block."""
+        return self._lock
+
+    def _take_pending(self) -> Optional[tuple]:
+        """Swap out buffered events (caller holds _lock)."""
+        if not self._ops:
+            return None
+        pending = (self._new_names, self._ops, self._idx, self._values)
+        self._events_since_snapshot += len(self._ops)
+        self._new_names = []
+        self._ops = bytearray()
+        self._idx = array("I")
+        self._values = array("d")
+        return pending
+
+    def _requeue(self, pending: tuple) -> None:
+        """Put events back ahead of anything buffered since (caller holds _lock).
+
+        Names interned after the taken block have higher indexes, so the
+        combined buffer is still in interning order.
+        """
+        names, ops, idx, values = pending
+        self._events_since_snapshot -= len(ops)
+        self._new_names = names + self._new_names
+        self._ops = ops + self._ops
+        self._idx = idx + self._idx
+        self._values = values + self._values
+
+    def _rotate(self):
+        """Switch to the next log generation; returns the closed file.
+
+        Buffered events are re-interned against the new generation. Caller
+        holds both locks.
+        """
+        pending = None
+        if self._ops:
+            names = {i: name for name, i in self._names.items()}
+            pending = (self._ops, [names[i] for i in self._idx], self._values)
+        self._names = {}
+        self._new_names = []
+        self._ops = bytearray()
+        self._idx = array("I")
+        self._values = array("d")
+        if pending is not None:
+            for op, device_id, value in zip(*pending):
+                self._append(op, device_id, value)
+        closed = self._file
+        self._generation += 1
+        self._file = self._open_log()
+        return closed
+
+    @staticmethod
+    def _write(f, block: bytes) -> None:
+        view = memoryview(block)
+        while view:
+            view = view[f.write(view):]
+        os.fsync(f.fileno())
+
+    def _flush(self) -> None:
+        """Write buffered events as one block (caller holds _io_lock).
+
+        On a write error the log is truncated back to its last good block
+        and the events go back in the buffer for the next flush. If the log
+        cannot be truncated, writing moves on to a new generation so later
+        blocks never follow torn bytes.
+        """
+        with self._lock:
+            pending = self._take_pending()
+        if pending is None:
+            return
+        offset = self._file.tell()
+        try:
+            self._write(self._file, encode_block(*pending))
+        except OSError:
+            with self._lock:
+                self._requeue(pending)
+            try:
+                self._file.truncate(offset)
+                self._file.seek(offset)
+            except OSError:
+                logger.exception("Cannot truncate token ledger log; rotating")
+                with self._lock:
+                    closed = self._rotate()
+                closed.close()
+            raise
+
+    def flush(self) -> None:
+        """Write buffered events as one block and fsync."""
+        with self._io_lock:
+            self._flush()
+
+    def load(self) -> Dict[str, dict]:
+        """Rebuild the device table from the snapshot plus the log tail."""
+        return self.load_state()[0]
+
+    def load_state(self) -> Tuple[Dict[str, dict], Dict[int, List[str]]]:
+        """Rebuild the device table and the dedupe keys (oldest first, by op)."""
+        keys: Dict[int, dict] = {}
+        generation, table = read_snapshot(os.path.join(self.directory, SNAPSHOT_FILE), keys)
+        for log_generation in self._log_generations():
+            if log_generation >= generation:
+                replay_log(table, self._log_path(log_generation), keys)
+        devices = {
+            device_id: {
+                "total_tokens": total,
+                "used_tokens": used,
+                "free_trial_used": free_trial_used,
+                "is_unlimited": is_unlimited,
+                "unlimited_until": datetime.fromtimestamp(until) if is_unlimited else None,
+            }
+            for device_id, (total, used, free_trial_used, is_unlimited, until) in table.items()
+        }
+        return devices, {op: list(ordered) for op, ordered in keys.items()}
+
+    def compact(self) -> None:
+        """Rotate the log and fold closed logs into a new snapshot."""
+        with self._io_lock:
+            self._flush()
+            with self._lock:
+                self._events_since_snapshot = 0
+                closed_generation = self._generation
+                closed_file = self._rotate()
+            closed_file.close()
+
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        keys: Dict[int, dict] = {}
+        generation, table = read_snapshot(snapshot_path, keys)
+        closed = [g for g in self._log_generations() if g <= closed_generation]
+        for log_generation in closed:
+            if log_generation >= generation:
+                replay_log(table, self._log_path(log_generation), keys)
+        for op, ordered in keys.items():
+            if len(ordered) > self.max_keys:
+                keys[op] = dict.fromkeys(list(ordered)[-self.max_keys:])
+        write_snapshot(snapshot_path, closed_generation + 1, table, keys)
+        # Older logs are already folded in; also clears leftovers of a crash
+        # between a previous snapshot write and its cleanup
+        for log_generation in closed:
+            os.remove(self._log_path(log_generation))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+                compacted = self._events_since_snapshot >= self.snapshot_events
+                if compacted:
+                    self.compact()
+                if self.on_checkpoint is not None and (
+                    compacted or time.monotonic() - self._last_checkpoint >= self.checkpoint_interval
+                ):
+                    self._last_checkpoint = time.monotonic()
+                    self.on_checkpoint()
+            except Exception:
+                logger.exception("Token ledger flush failed")
+
+    def start(self) -> None:
+        """Start the background group-commit thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="token-ledger", daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        """Stop the background thread and flush remaining events."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self._file.close()
@@ -1,22 +1,117 @@
 """Token management service."""
-from typing import Dict, Optional
+import asyncio
+import itertools
+import json
+import os
+import re
+import tempfile
+import time
+from array import array
+from collections import OrderedDict
+from contextlib import AsyncExitStack, nullcontext
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
 from datetime import datetime, timedelta
 
 from app.config import get_settings
+from app.core.metrics import record_subscription_expired
 from app.schemas.token import TokenStatus, TokenUseResponse
+from app.services.expiry_scheduler import ExpiryScheduler
+from app.services.seen_history import SEEN_FILE, SeenHistory
+from app.services.token_ledger import (
+    OP_ADD,
+    OP_CLAIM,
+    OP_FREE_TRIAL,
+    OP_GRANT,
+    OP_RESET,
+    OP_UNLIMITED,
+    OP_USE,
+    LOG_PATTERN,
+    SNAPSHOT_FILE,
+    TokenLedger,
+)
+
+if TYPE_CHECKING:
+    from app.services.token_shards import ShardedTokenService
+
+T = TypeVar("T")
+
+# Largest single grant: keeps subscription end dates in range and token
+# counts exact in the ledger's float values
+MAX_GRANT_MONTHS = 120
+MAX_GRANT_TOKENS = 2 ** 53
+
+
+class StatusSnapshot:
+    """Pre-serialized token status for a device at a given version.
+
+    Built once per write so the polling endpoints can return the bytes
+    directly without constructing models on every read.
+    """
+
+    __slots__ = (
+        "version", "etag", "status_json",
+        "can_generate", "can_generate_etag", "can_generate_json", "expires_at",
+    )
+    
+    def __init__(
+        self,
+        version: int,
+        epoch: str,
+        status_json: bytes,
+        can_generate: bool,
+        can_generate_json: bytes,
+        expires_at: Optional[float],
+    ):
+        self.version = version
+        # Each representation of the same version gets its own validator
+        self.etag = f'W/"{epoch}-{version}"'
+        self.can_generate_etag = f'W/"{epoch}-{version}-c"'
+        self.status_json = status_json
+        self.can_generate = can_generate
+        self.can_generate_json = can_generate_json
+        self.expires_at = expires_at  # monotonic time unlimited access lapses
 
 
 class TokenService:
     """Service for managing generation tokens.
     
-    Note: This is an in-memory implementation for demo purposes.
-    In production, this would use a database.
+    State lives in memory. When a ``TokenLedger`` is attached, every
+    mutation is also recorded in its event log and the state is rebuilt
+    from the ledger on startup.
     """
     
-    def __init__(self):
+    def __init__(self, ledger: Optional[TokenLedger] = None):
         self.settings = get_settings()
         # In-memory storage: device_id -> token data
         self._tokens: Dict[str, dict] = {}
+        # device_id -> status snapshot, rebuilt on every write
+        self._snapshots: Dict[str, StatusSnapshot] = {}
+        self._versions = itertools.count(1)
+        # Distinguishes ETags issued before and after a restart
+        self._epoch = os.urandom(4).hex()
+        # Flips unlimited subscriptions off at expiry time
+        self.expiry = ExpiryScheduler(self._expire_unlimited)
+        # Recently credited checkout ids, so redelivered webhooks don't credit twice
+        self._claimed_checkouts: "OrderedDict[str, None]" = OrderedDict()
+        # Recently applied bulk grant batches, so resubmitted files don't grant twice
+        self._applied_grants: "OrderedDict[str, None]" = OrderedDict()
+        # Excuses recently served to each device, so shared pools don't repeat
+        self.seen = SeenHistory(
+            per_device=self.settings.seen_history_size,
+            max_devices=self.settings.seen_history_max_devices,
+        )
+        
+        self._ledger = ledger
+        if ledger is not None:
+            devices, keys = ledger.load_state()
+            self.load_devices(devices.items())
+            for checkout_id in keys.get(OP_CLAIM, ()):
+                self._remember(self._claimed_checkouts, checkout_id, self.settings.webhook_dedupe_max_entries)
+            for key in keys.get(OP_GRANT, ()):
+                self._remember(self._applied_grants, key, self.settings.bulk_grant_dedupe_max_entries)
+            self.seen.load(os.path.join(ledger.directory, SEEN_FILE))
+            # Saved from the ledger thread too, so a crash loses little of it
+            ledger.on_checkpoint = self._save_seen
     
     def _get_device_data(self, device_id: str) -> dict:
         """Get or create device data."""
@@ -26,20 +121,30 @@ class TokenService:
                 "used_tokens": 0,
                 "free_trial_used": False,
                 "is_unlimited": False,
-                "unlimited_until": None,
+                "unlimited_until": None,     # wall-clock expiry, for persistence
+                "unlimited_deadline": None,  # monotonic expiry, for hot-path checks
             }
         return self._tokens[device_id]
     
+    @staticmethod
+    def _is_unlimited(data: dict) -> bool:
+        """Whether unlimited access is active; never mutates ``data``.
+        
+        The scheduler flips ``is_unlimited`` at expiry time; the monotonic
+        deadline check covers the window before it gets to run.
+        """
+        deadline = data["unlimited_deadline"]
+        return data["is_unlimited"] and (deadline is None or time.monotonic() < deadline)
+    
+    @staticmethod
+    def _deadline_for(until: datetime) -> float:
+        """Convert a wall-clock expiry into a monotonic deadline."""
+        return time.monotonic() + (until - datetime.now()).total_seconds()
+    
     def get_token_status(self, device_id: str) -> TokenStatus:
         """Get token status for a device."""
         data = self._get_device_data(device_id)
-        
-        # Check if unlimited subscription has expired
-        is_unlimited = data["is_unlimited"]
-        if is_unlimited and data["unlimited_until"]:
-            if datetime.now() > data["unlimited_until"]:
-                is_unlimited = False
-                data["is_unlimited"] = False
+        is_unlimited = self._is_unlimited(data)
         
         remaining = data["total_tokens"] - data["used_tokens"]
         if is_unlimited:
@@ -54,17 +159,56 @@ class TokenService:
             is_unlimited=is_unlimited,
         )
     
-    def can_generate(self, device_id: str) -> bool:
-        """Check if device can generate (has tokens or free trial)."""
+    def _record(self, op: int, device_id: str, value: float = 0.0) -> None:
+        """Append a mutation to the ledger, if one is attached."""
+        if self._ledger is not None:
+            self._ledger.append(op, device_id, value)
+    
+    def _transaction(self):
+        """Events recorded inside land in the same ledger block, so they are durable together."""
+        return self._ledger.transaction() if self._ledger is not None else nullcontext()
+    
+    @staticmethod
+    def _remember(keys: "OrderedDict[str, None]", key: str, limit: int) -> None:
+        keys[key] = None
+        if len(keys) > limit:
+            keys.popitem(last=False)
+    
+    def _render_snapshot(self, device_id: str) -> StatusSnapshot:
+        """Build and cache the status snapshot for a device."""
         status = self.get_token_status(device_id)
+        data = self._tokens[device_id]
+        can_gen = status.is_unlimited or not status.free_trial_used or status.remaining_tokens > 0
+        version = next(self._versions)
         
-        if status.is_unlimited:
-            return True
-        
-        if not status.free_trial_used:
-            return True
-        
-        return status.remaining_tokens > 0
+        snapshot = StatusSnapshot(
+            version=version,
+            epoch=self._epoch,
+            status_json=status.model_dump_json().encode(),
+            can_generate=can_gen,
+            can_generate_json=json.dumps({
+                "can_generate": can_gen,
+                "free_trial_available": not status.free_trial_used,
+                "tokens_remaining": status.remaining_tokens,
+                "is_unlimited": status.is_unlimited,
+            }).encode(),
+            expires_at=data["unlimited_deadline"] if status.is_unlimited else None,
+        )
+        self._snapshots[device_id] = snapshot
+        return snapshot
+    
+    def get_status_snapshot(self, device_id: str) -> StatusSnapshot:
+        """Get the cached status snapshot for a device, rendering it if needed."""
+        snapshot = self._snapshots.get(device_id)
+        if snapshot is None or (
+            snapshot.expires_at is not None and time.monotonic() >= snapshot.expires_at
+        ):
+            snapshot = self._render_snapshot(device_id)
+        return snapshot
+    
+    def can_generate(self, device_id: str) -> bool:
+        """Check if device can generate (has tokens or free trial)."""
+        return self.get_status_snapshot(device_id).can_generate
     
     def use_token(self, device_id: str) -> TokenUseResponse:
         """Use a token for generation."""
@@ -76,25 +220,32 @@ class TokenService:
                 success=True,
                 remaining_tokens=999999,
                 message="Unlimited access",
+                source="unlimited",
             )
         
         # Use free trial if available
         if not data["free_trial_used"]:
             data["free_trial_used"] = True
+            self._record(OP_FREE_TRIAL, device_id)
+            self._render_snapshot(device_id)
             return TokenUseResponse(
                 success=True,
                 remaining_tokens=data["total_tokens"] - data["used_tokens"],
                 message="Free trial used",
+                source="free_trial",
             )
         
         # Use paid token
         if status.remaining_tokens > 0:
             data["used_tokens"] += 1
             remaining = data["total_tokens"] - data["used_tokens"]
+            self._record(OP_USE, device_id)
+            self._render_snapshot(device_id)
             return TokenUseResponse(
                 success=True,
                 remaining_tokens=remaining,
                 message=f"{remaining} tokens remaining",
+                source="token",
             )
         
         return TokenUseResponse(
@@ -107,28 +258,396 @@ class TokenService:
         """Add tokens to a device (after successful payment)."""
         data = self._get_device_data(device_id)
         data["total_tokens"] += amount
+        self._record(OP_ADD, device_id, amount)
+        self._render_snapshot(device_id)
         return self.get_token_status(device_id)
     
+    def grant_tokens(self, grants: Iterable[Tuple[str, int]]) -> List[TokenStatus]:
+        """Add tokens to many devices; the statuses come back in order."""
+        return [self.add_tokens(device_id, amount) for device_id, amount in grants]
+    
+    def apply_grants(self, key: str, grants: List[Tuple[str, int, int]]) -> bool:
+        """Apply a batch of ``(device_id, tokens, unlimited_months)`` grants once.
+        
+        Returns False, changing nothing, if a batch with ``key`` was already
+        applied; the most recent ``bulk_grant_dedupe_max_entries`` keys are
+        remembered, and recorded in the ledger in the same block as the
+        grants, so they survive a restart. Snapshots are dropped rather than
+        rendered, so a large batch costs a dict update and a ledger append
+        per grant. Every row is checked before any is applied: one with more
+        than ``MAX_GRANT_TOKENS`` tokens or ``MAX_GRANT_MONTHS`` months
+        raises ValueError and the batch changes nothing.
+        """
+        if key in self._applied_grants:
+            return False
+        for device_id, tokens, months in grants:
+            if not (0 <= tokens <= MAX_GRANT_TOKENS and 0 <= months <= MAX_GRANT_MONTHS):
+                raise ValueError(f"Grant out of range for {device_id}: {tokens} tokens, {months} months")
+        with self._transaction():
+            for device_id, tokens, months in grants:
+                data = self._get_device_data(device_id)
+                if tokens:
+                    data["total_tokens"] += tokens
+                    self._record(OP_ADD, device_id, tokens)
+                if months:
+                    self._start_unlimited(device_id, data, months)
+                self._snapshots.pop(device_id, None)
+            self._record(OP_GRANT, key)
+        self._remember(self._applied_grants, key, self.settings.bulk_grant_dedupe_max_entries)
+        return True
+    
+    def credit_checkout(self, checkout_id: str, device_id: str, tokens: int = 0, months: int = 0) -> bool:
+        """Credit a completed checkout to a device once; False if it already was.
+        
+        The claim is taken only once the credit has been applied, and both
+        are recorded in one ledger block, so a failed credit leaves the
+        checkout unclaimed and a restart can't separate the two. Remembers
+        the most recent ``webhook_dedupe_max_entries`` checkouts, which
+        covers the payment provider's redelivery window.
+        """
+        if checkout_id in self._claimed_checkouts:
+            return False
+        data = self._get_device_data(device_id)
+        with self._transaction():
+            if tokens:
+                data["total_tokens"] += tokens
+                self._record(OP_ADD, device_id, tokens)
+            if months:
+                self._start_unlimited(device_id, data, months)
+            self._record(OP_CLAIM, checkout_id)
+        self._remember(self._claimed_checkouts, checkout_id, self.settings.webhook_dedupe_max_entries)
+        self._render_snapshot(device_id)
+        return True
+    
     def set_unlimited(self, device_id: str, months: int = 1) -> TokenStatus:
         """Set unlimited access for a device."""
-        data = self._get_device_data(device_id)
+        self._start_unlimited(device_id, self._get_device_data(device_id), months)
+        self._render_snapshot(device_id)
+        return self.get_token_status(device_id)
+    
+    def _start_unlimited(self, device_id: str, data: dict, months: int) -> None:
         data["is_unlimited"] = True
         data["unlimited_until"] = datetime.now() + timedelta(days=30 * months)
-        return self.get_token_status(device_id)
+        data["unlimited_deadline"] = self._deadline_for(data["unlimited_until"])
+        self._record(OP_UNLIMITED, device_id, data["unlimited_until"].timestamp())
+        self.expiry.schedule(device_id, data["unlimited_deadline"])
+    
+    def _expire_unlimited(self, device_id: str) -> None:
+        """Scheduler callback: turn off unlimited access that has lapsed."""
+        data = self._tokens.get(device_id)
+        if data is None or not data["is_unlimited"]:
+            return
+        data["is_unlimited"] = False
+        data["unlimited_deadline"] = None
+        record_subscription_expired()
+        self._render_snapshot(device_id)
+    
+    def load_devices(self, devices: Iterable[Tuple[str, dict]]) -> None:
+        """Bulk-load device records, e.g. from a persistent store on restart.
+        
+        Records need ``total_tokens``, ``used_tokens``, ``free_trial_used``,
+        ``is_unlimited`` and ``unlimited_until``. Live subscriptions are
+        handed to the expiry scheduler in a single heapify.
+        """
+        now = datetime.now()
+        pending = []
+        for device_id, record in devices:
+            data = self._get_device_data(device_id)
+            data.update(record)
+            until = data["unlimited_until"]
+            if data["is_unlimited"] and until is not None:
+                if until > now:
+                    data["unlimited_deadline"] = self._deadline_for(until)
+                    pending.append((device_id, data["unlimited_deadline"]))
+                else:
+                    data["is_unlimited"] = False
+                    data["unlimited_deadline"] = None
+            self._snapshots.pop(device_id, None)
+        self.expiry.bulk_load(pending)
     
     def reset_device(self, device_id: str) -> None:
         """Reset device data (for testing)."""
         if device_id in self._tokens:
             del self._tokens[device_id]
+            self._record(OP_RESET, device_id)
+        self._snapshots.pop(device_id, None)
+        self.seen.forget(device_id)
+        self.expiry.cancel(device_id)
+    
+    def device_ids(self) -> List[str]:
+        return list(self._tokens)
+    
+    def export_devices(self, device_ids: Iterable[str]) -> List[Tuple[str, dict, Optional[array]]]:
+        """Device records and seen histories, for moving devices to another shard."""
+        exported = []
+        for device_id in device_ids:
+            data = self._tokens.get(device_id)
+            if data is None:
+                continue
+            record = {key: data[key] for key in (
+                "total_tokens", "used_tokens", "free_trial_used", "is_unlimited", "unlimited_until",
+            )}
+            exported.append((device_id, record, self.seen.history(device_id)))
+        return exported
+    
+    def import_devices(self, devices: List[Tuple[str, dict, Optional[array]]]) -> None:
+        """Adopt devices exported by another shard, recording them in this shard's ledger."""
+        self.load_devices((device_id, record) for device_id, record, _ in devices)
+        for device_id, record, ring in devices:
+            self._record(OP_RESET, device_id)
+            if record["total_tokens"]:
+                self._record(OP_ADD, device_id, record["total_tokens"])
+            # The ledger has no "set used" event; used counts are small
+            for _ in range(record["used_tokens"]):
+                self._record(OP_USE, device_id)
+            if record["free_trial_used"]:
+                self._record(OP_FREE_TRIAL, device_id)
+            if record["is_unlimited"] and record["unlimited_until"] is not None:
+                self._record(OP_UNLIMITED, device_id, record["unlimited_until"].timestamp())
+            if ring is not None:
+                self.seen.restore(device_id, ring)
+    
+    def drop_devices(self, device_ids: Iterable[str]) -> None:
+        """Forget devices that moved to another shard."""
+        for device_id in device_ids:
+            self.reset_device(device_id)
+    
+    def export_keys(self) -> Dict[int, List[str]]:
+        """Remembered dedupe keys by ledger op, oldest first."""
+        return {OP_CLAIM: list(self._claimed_checkouts), OP_GRANT: list(self._applied_grants)}
+    
+    def import_keys(self, keys: Dict[int, List[str]]) -> None:
+        """Adopt dedupe keys from another store, recording the new ones in this ledger."""
+        limits = {
+            OP_CLAIM: (self._claimed_checkouts, self.settings.webhook_dedupe_max_entries),
+            OP_GRANT: (self._applied_grants, self.settings.bulk_grant_dedupe_max_entries),
+        }
+        for op, (remembered, limit) in limits.items():
+            for key in keys.get(op, ()):
+                if key not in remembered:
+                    self._remember(remembered, key, limit)
+                    self._record(op, key)
+    
+    def _save_seen(self) -> None:
+        """Ledger checkpoint: save the seen history if it changed since the last save."""
+        if self.seen.dirty:
+            self.seen.save(os.path.join(self._ledger.directory, SEEN_FILE))
+    
+    def flush(self) -> None:
+        """Make recorded state durable now: flush the ledger and save the seen history."""
+        if self._ledger is not None:
+            self._ledger.flush()
+            self.seen.save(os.path.join(self._ledger.directory, SEEN_FILE))
+    
+    def ping(self) -> int:
+        """Cheap store access used by the readiness prober."""
+        return len(self._tokens)
+    
+    def close(self) -> None:
+        """Flush and close the ledger, if one is attached, saving the seen history with it."""
+        if self._ledger is not None:
+            self.seen.save(os.path.join(self._ledger.directory, SEEN_FILE))
+            self._ledger.close()
 
 
-# Singleton instance
-_token_service: TokenService | None = None
+class AsyncTokenService:
+    """Async API over ``TokenService`` with per-device lock striping.
+    
+    Every call runs under one of ``stripes`` asyncio locks, picked by
+    ``hash(device_id)``, so the read-check-write sequences of one device
+    (``use_token`` seeing the free trial unused, then marking it used) never
+    interleave while other devices go ahead; there is no global lock. Two
+    devices sharing a stripe just wait for each other.
+    
+    With ``offload`` the store calls run in worker threads, for stores that
+    do blocking I/O and must stay off the event loop; the locks are then
+    what keeps balances exact. Subscription expiries go through the same
+    locks (and threads).
+    """
+    
+    def __init__(self, service: TokenService, stripes: int = 1024, offload: bool = False):
+        self.service = service
+        self.offload = offload
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+        service.expiry.guard = self._call
+    
+    @property
+    def seen(self) -> SeenHistory:
+        return self.service.seen
+    
+    def lock(self, key: str) -> asyncio.Lock:
+        """The lock guarding a device (or checkout) id."""
+        return self._locks[hash(key) % len(self._locks)]
+    
+    async def _call(self, key: str, fn: Callable[..., T], *args) -> T:
+        async with self.lock(key):
+            if self.offload:
+                return await asyncio.to_thread(fn, *args)
+            return fn(*args)
+    
+    async def _call_all(self, keys: Iterable[str], fn: Callable[..., T], *args) -> T:
+        """Like ``_call``, holding the locks of every key.
+        
+        The locks are taken in stripe order, so concurrent callers can't
+        deadlock each other.
+        """
+        stripes = sorted({hash(key) % len(self._locks) for key in keys})
+        async with AsyncExitStack() as stack:
+            for stripe in stripes:
+                await stack.enter_async_context(self._locks[stripe])
+            if self.offload:
+                return await asyncio.to_thread(fn, *args)
+            return fn(*args)
+    
+    async def get_token_status(self, device_id: str) -> TokenStatus:
+        return await self._call(device_id, self.service.get_token_status, device_id)
+    
+    async def get_status_snapshot(self, device_id: str) -> StatusSnapshot:
+        return await self._call(device_id, self.service.get_status_snapshot, device_id)
+    
+    async def can_generate(self, device_id: str) -> bool:
+        return await self._call(device_id, self.service.can_generate, device_id)
+    
+    async def use_token(self, device_id: str) -> TokenUseResponse:
+        return await self._call(device_id, self.service.use_token, device_id)
+    
+    async def add_tokens(self, device_id: str, amount: int) -> TokenStatus:
+        return await self._call(device_id, self.service.add_tokens, device_id, amount)
+    
+    async def set_unlimited(self, device_id: str, months: int = 1) -> TokenStatus:
+        return await self._call(device_id, self.service.set_unlimited, device_id, months)
+    
+    async def credit_checkout(self, checkout_id: str, device_id: str, tokens: int = 0, months: int = 0) -> bool:
+        """Credit a checkout holding the locks of both the checkout and the device."""
+        return await self._call_all(
+            (checkout_id, device_id), self.service.credit_checkout, checkout_id, device_id, tokens, months,
+        )
+    
+    async def reset_device(self, device_id: str) -> None:
+        await self._call(device_id, self.service.reset_device, device_id)
+    
+    async def apply_grants(self, key: str, grants: List[Tuple[str, int, int]]) -> bool:
+        """Apply a batch of grants holding the locks of all its devices."""
+        return await self._call_all([grant[0] for grant in grants], self.service.apply_grants, key, grants)
+
+
+# Singleton instances
+_token_service: "TokenService | ShardedTokenService | None" = None
+_async_token_service: AsyncTokenService | None = None
+
+
+def _open_ledger(directory: str) -> TokenLedger:
+    settings = get_settings()
+    ledger = TokenLedger(
+        directory,
+        flush_interval=settings.token_ledger_flush_interval,
+        snapshot_events=settings.token_ledger_snapshot_events,
+        max_keys=max(settings.webhook_dedupe_max_entries, settings.bulk_grant_dedupe_max_entries),
+        checkpoint_interval=settings.token_ledger_checkpoint_interval,
+    )
+    ledger.start()
+    return ledger
+
+
+SHARD_DIR = re.compile(r"^shard-(\d+)$")
+RETIRED_DIR = "retired"
+
+
+def _retired_ledger_dirs(directory: str, shards: int) -> List[str]:
+    """Ledgers in ``directory`` written under a different ``token_shards``.
+    
+    That is the root ledger when sharded, and every ``shard-N`` directory
+    beyond the current count (all of them when unsharded).
+    """
+    if not os.path.isdir(directory):
+        return []
+    names = os.listdir(directory)
+    retired = []
+    if shards > 1 and any(name == SNAPSHOT_FILE or LOG_PATTERN.match(name) for name in names):
+        retired.append(directory)
+    for name in sorted(names):
+        match = SHARD_DIR.match(name)
+        if match and (shards == 1 or int(match.group(1)) >= shards):
+            retired.append(os.path.join(directory, name))
+    return retired
 
 
-def get_token_service() -> TokenService:
-    """Get token service singleton."""
+def _retire(directory: str, path: str, destination: str) -> None:
+    """Move a ledger out of the way, under ``destination``."""
+    if path != directory:
+        os.replace(path, os.path.join(destination, os.path.basename(path)))
+        return
+    # The root ledger shares its directory with the shards
+    target = os.path.join(destination, "root")
+    os.makedirs(target, exist_ok=True)
+    for name in os.listdir(directory):
+        if name in (SNAPSHOT_FILE, SEEN_FILE) or LOG_PATTERN.match(name):
+            os.replace(os.path.join(directory, name), os.path.join(target, name))
+
+
+def _adopt_retired_ledgers(service: "TokenService | ShardedTokenService", directory: str, shards: int) -> int:
+    """Move devices and dedupe keys out of ledgers left by another shard count.
+    
+    Each old ledger is replayed, its state imported into ``service`` (and
+    recorded in the current ledgers, which are flushed) and only then moved
+    under ``retired/``. Returns how many devices were adopted.
+    """
+    retired = _retired_ledger_dirs(directory, shards)
+    if not retired:
+        return 0
+    os.makedirs(os.path.join(directory, RETIRED_DIR), exist_ok=True)
+    destination = tempfile.mkdtemp(prefix=time.strftime("%Y%m%dT%H%M%S-"), dir=os.path.join(directory, RETIRED_DIR))
+    adopted = 0
+    for path in retired:
+        source = TokenService(ledger=TokenLedger(path))
+        devices = source.export_devices(source.device_ids())
+        service.import_devices(devices)
+        service.import_keys(source.export_keys())
+        source.close()
+        service.flush()
+        _retire(directory, path, destination)
+        adopted += len(devices)
+    return adopted
+
+
+def get_token_service() -> "TokenService | ShardedTokenService":
+    """Get token service singleton.
+    
+    With ``token_shards`` above 1 this is a ``ShardedTokenService`` over
+    that many in-process shards, each with its own ledger subdirectory.
+    Ledgers left by a different shard count are adopted on startup.
+    """
     global _token_service
     if _token_service is None:
-        _token_service = TokenService()
+        settings = get_settings()
+        directory = settings.token_ledger_dir
+        if settings.token_shards > 1:
+            from app.services.token_shards import ShardedTokenService
+            
+            shards = {}
+            for i in range(settings.token_shards):
+                name = f"shard-{i}"
+                ledger = _open_ledger(os.path.join(directory, name)) if directory else None
+                shards[name] = TokenService(ledger=ledger)
+            _token_service = ShardedTokenService(shards)
+            # Devices may sit on the wrong shard if the shard count changed
+            _token_service.rebalance()
+        else:
+            _token_service = TokenService(ledger=_open_ledger(directory) if directory else None)
+        if directory:
+            _adopt_retired_ledgers(_token_service, directory, settings.token_shards)
     return _token_service
+
+
+def get_async_token_service() -> AsyncTokenService:
+    """Get the async token API over the token service singleton."""
+    global _async_token_service
+    service = get_token_service()
+    if _async_token_service is None or _async_token_service.service is not service:
+        settings = get_settings()
+        _async_token_service = AsyncTokenService(
+            service,
+            stripes=settings.token_lock_stripes,
+            offload=settings.token_store_offload,
+        )
+    return _async_token_service
@@ -0,0 +1,342 @@
+"""
+Consistent-hash sharding of token state by device id.
+
+``ShardedTokenService`` has the ``TokenService`` API and routes each call
+to the shard owning the device on a ``HashRing``. A shard is either a
+``TokenService`` in this process (``TOKEN_SHARDS`` > 1, which also spreads
+ledger writes over one directory per shard) or a ``ProcessShard``, a
+``TokenService`` in a worker process. Operations over many devices are
+batched: one message per shard, with every shard working at once.
+
+Adding or removing a shard moves only the devices whose owner changes,
+about 1/N of them, with their balances, subscriptions and seen history.
+"""
+import bisect
+import hashlib
+import multiprocessing
+from array import array
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from app.schemas.excuse import Excuse
+from app.schemas.token import TokenStatus, TokenUseResponse
+from app.services.token_service import StatusSnapshot, TokenService
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent-hash ring with ``vnodes`` points per node."""
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 128):
+        self.vnodes = vnodes
+        self.nodes: List[str] = []
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        if node in self.nodes:
+            raise ValueError(f"Node already on the ring: {node}")
+        self.nodes.append(node)
+        self._rebuild()
+
+    def remove(self, node: str) -> None:
+        self.nodes.remove(node)
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        ring = sorted((_point(f"{node}#{i}"), node) for node in self.nodes for i in range(self.vnodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+
+    def node_for(self, key: str) -> str:
+        """The node owning ``key``: the first point clockwise from its hash."""
+        if not self._points:
+            raise LookupError("Hash ring is empty")
+        return self._owners[bisect.bisect(self._points, _point(key)) % len(self._points)]
+
+
+def _serve(conn, ledger_dir: Optional[str]) -> None:
+    """Worker process loop: run batches of ``TokenService`` calls until told to stop."""
+    from app.services.token_service import _open_ledger
+
+    service = TokenService(ledger=_open_ledger(ledger_dir) if ledger_dir else None)
+    while True:
+        message = conn.recv()
+        if message is None:
+            service.close()
+            conn.close()
+            return
+        method, calls = message
+        target = service
+        for name in method.split("."):
+            target = getattr(target, name)
+        try:
+            conn.send([target(*args) for args in calls])
+        except Exception as e:
+            conn.send(e)
+
+
+class _RemoteSeen:
+    """The seen history of a ``ProcessShard``."""
+
+    def __init__(self, shard: "ProcessShard"):
+        self._shard = shard
+
+    def unseen(self, device_id: str, excuses: List[Excuse]) -> List[Excuse]:
+        return self._shard.call("seen.unseen", device_id, excuses)
+
+    def mark_seen(self, device_id: str, excuses: Iterable[Excuse]) -> None:
+        self._shard.call("seen.mark_seen", device_id, list(excuses))
+
+    def __len__(self) -> int:
+        return self._shard.call("seen.__len__")
+
+
+class ProcessShard:
+    """A ``TokenService`` in a worker process, driven over a pipe.
+
+    Any ``TokenService`` method can be called on it directly, one round trip
+    each; ``submit`` sends a whole batch in one message. Calls from several
+    threads at once are not supported. The worker has no event loop, so
+    unlimited subscriptions lapse through the deadline check on access
+    rather than the expiry scheduler.
+    """
+
+    def __init__(self, ledger_dir: Optional[str] = None, start_method: str = "spawn"):
+        context = multiprocessing.get_context(start_method)
+        self._conn, child = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child, ledger_dir), daemon=True)
+        self._process.start()
+        child.close()
+        self.seen = _RemoteSeen(self)
+
+    def submit(self, method: str, calls: List[tuple]) -> Callable[[], list]:
+        """Send a batch of calls; the returned function waits for the results."""
+        self._conn.send((method, calls))
+
+        def results() -> list:
+            reply = self._conn.recv()
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+        return results
+
+    def call(self, method: str, *args):
+        return self.submit(method, [args])()[0]
+
+    def __getattr__(self, method: str):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return lambda *args: self.call(method, *args)
+
+    def close(self) -> None:
+        """Close the worker's ledger and stop it."""
+        if self._process.is_alive():
+            self._conn.send(None)
+            self._process.join()
+        self._conn.close()
+
+
+Shard = Union[TokenService, ProcessShard]
+
+
+def _submit(shard: Shard, method: str, calls: List[tuple]) -> Callable[[], list]:
+    if isinstance(shard, ProcessShard):
+        return shard.submit(method, calls)
+    target = getattr(shard, method)
+    results = [target(*args) for args in calls]
+    return lambda: results
+
+
+class _ShardedSeen:
+    """Routes seen-history calls to each device's shard."""
+
+    def __init__(self, service: "ShardedTokenService"):
+        self._service = service
+
+    def unseen(self, device_id: str, excuses: List[Excuse]) -> List[Excuse]:
+        return self._service.shard_for(device_id).seen.unseen(device_id, excuses)
+
+    def mark_seen(self, device_id: str, excuses: Iterable[Excuse]) -> None:
+        self._service.shard_for(device_id).seen.mark_seen(device_id, excuses)
+
+    def __len__(self) -> int:
+        return sum(len(shard.seen) for shard in self._service.shards.values())
+
+
+class _ShardedExpiry:
+    """Starts and stops the expiry schedulers of in-process shards."""
+
+    def __init__(self, service: "ShardedTokenService"):
+        self._service = service
+        self._guard = None
+
+    def _schedulers(self):
+        return [s.expiry for s in self._service.shards.values() if isinstance(s, TokenService)]
+
+    @property
+    def guard(self):
+        return self._guard
+
+    @guard.setter
+    def guard(self, guard) -> None:
+        self._guard = guard
+        for scheduler in self._schedulers():
+            scheduler.guard = guard
+
+    async def start(self) -> None:
+        for scheduler in self._schedulers():
+            # Shards added since the guard was set get it too
+            scheduler.guard = self._guard
+            await scheduler.start()
+
+    async def stop(self) -> None:
+        for scheduler in self._schedulers():
+            await scheduler.stop()
+
+
+class ShardedTokenService:
+    """``TokenService`` API over shards picked by consistent hashing of the device id."""
+
+    def __init__(self, shards: Dict[str, Shard], vnodes: int = 128):
+        self.shards: Dict[str, Shard] = dict(shards)
+        self.ring = HashRing(self.shards, vnodes)
+        self.seen = _ShardedSeen(self)
+        self.expiry = _ShardedExpiry(self)
+
+    def shard_for(self, key: str) -> Shard:
+        return self.shards[self.ring.node_for(key)]
+
+    # Single-device operations go to the owning shard
+
+    def get_token_status(self, device_id: str) -> TokenStatus:
+        return self.shard_for(device_id).get_token_status(device_id)
+
+    def get_status_snapshot(self, device_id: str) -> StatusSnapshot:
+        return self.shard_for(device_id).get_status_snapshot(device_id)
+
+    def can_generate(self, device_id: str) -> bool:
+        return self.shard_for(device_id).can_generate(device_id)
+
+    def use_token(self, device_id: str) -> TokenUseResponse:
+        return self.shard_for(device_id).use_token(device_id)
+
+    def add_tokens(self, device_id: str, amount: int) -> TokenStatus:
+        return self.shard_for(device_id).add_tokens(device_id, amount)
+
+    def set_unlimited(self, device_id: str, months: int = 1) -> TokenStatus:
+        return self.shard_for(device_id).set_unlimited(device_id, months)
+
+    def reset_device(self, device_id: str) -> None:
+        self.shard_for(device_id).reset_device(device_id)
+
+    def credit_checkout(self, checkout_id: str, device_id: str, tokens: int = 0, months: int = 0) -> bool:
+        # The claim lives with the device, so redeliveries meet it on the same shard
+        return self.shard_for(device_id).credit_checkout(checkout_id, device_id, tokens, months)
+
+    # Multi-device operations are batched per shard
+
+    def batch(self, method: str, calls: List[tuple]) -> list:
+        """Run ``method`` for each argument tuple, routed by its first argument.
+
+        Each shard gets one batch and all batches are in flight at once;
+        results come back in the order of ``calls``.
+        """
+        groups: Dict[str, List[int]] = defaultdict(list)
+        for i, args in enumerate(calls):
+            groups[self.ring.node_for(args[0])].append(i)
+        pending = [
+            (indexes, _submit(self.shards[name], method, [calls[i] for i in indexes]))
+            for name, indexes in groups.items()
+        ]
+        results = [None] * len(calls)
+        for indexes, wait in pending:
+            for i, result in zip(indexes, wait()):
+                results[i] = result
+        return results
+
+    def use_tokens(self, device_ids: List[str]) -> List[TokenUseResponse]:
+        return self.batch("use_token", [(device_id,) for device_id in device_ids])
+
+    def grant_tokens(self, grants: Iterable[Tuple[str, int]]) -> List[TokenStatus]:
+        """Add tokens to many devices; the statuses come back in order."""
+        return self.batch("add_tokens", list(grants))
+
+    def apply_grants(self, key: str, grants: List[Tuple[str, int, int]]) -> bool:
+        """Apply a batch of grants, one sub-batch per shard under the same key.
+        
+        Each shard remembers the key for its own part; False if every part
+        had already been applied.
+        """
+        groups: Dict[str, List[Tuple[str, int, int]]] = defaultdict(list)
+        for grant in grants:
+            groups[self.ring.node_for(grant[0])].append(grant)
+        pending = [_submit(self.shards[name], "apply_grants", [(key, part)]) for name, part in groups.items()]
+        return any([wait()[0] for wait in pending])
+
+    def import_devices(self, devices: List[Tuple[str, dict, Optional[array]]]) -> None:
+        """Adopt exported devices, each on its owning shard."""
+        groups: Dict[str, list] = defaultdict(list)
+        for device in devices:
+            groups[self.ring.node_for(device[0])].append(device)
+        for name, part in groups.items():
+            self.shards[name].import_devices(part)
+
+    def import_keys(self, keys: Dict[int, List[str]]) -> None:
+        """Adopt dedupe keys on every shard, since the devices they belong to are unknown."""
+        for shard in self.shards.values():
+            shard.import_keys(keys)
+
+    def load_devices(self, devices: Iterable[Tuple[str, dict]]) -> None:
+        groups: Dict[str, List[Tuple[str, dict]]] = defaultdict(list)
+        for device_id, record in devices:
+            groups[self.ring.node_for(device_id)].append((device_id, record))
+        for name, records in groups.items():
+            self.shards[name].load_devices(records)
+
+    # Membership
+
+    def rebalance(self) -> int:
+        """Move every device to the shard that owns it; returns how many moved."""
+        moved = 0
+        for name, shard in list(self.shards.items()):
+            moves: Dict[str, List[str]] = defaultdict(list)
+            for device_id in shard.device_ids():
+                owner = self.ring.node_for(device_id)
+                if owner != name:
+                    moves[owner].append(device_id)
+            for owner, device_ids in moves.items():
+                self.shards[owner].import_devices(shard.export_devices(device_ids))
+                # Durable on the new owner before the old one forgets them
+                self.shards[owner].flush()
+                shard.drop_devices(device_ids)
+                moved += len(device_ids)
+        return moved
+
+    def add_shard(self, name: str, shard: Shard) -> int:
+        """Add a shard and move the devices it now owns to it."""
+        self.shards[name] = shard
+        self.ring.add(name)
+        return self.rebalance()
+
+    def remove_shard(self, name: str) -> Shard:
+        """Move a shard's devices to their new owners and take it out; returns it for closing."""
+        self.ring.remove(name)
+        self.rebalance()
+        return self.shards.pop(name)
+
+    def ping(self) -> int:
+        return sum(shard.ping() for shard in self.shards.values())
+
+    def flush(self) -> None:
+        for shard in self.shards.values():
+            shard.flush()
+
+    def close(self) -> None:
+        for shard in self.shards.values():
+            shard.close()
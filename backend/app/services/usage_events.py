@@ -0,0 +1,251 @@
+"""
+Usage analytics events.
+
+Every generation request records one event: its category, urgency,
+language, what paid for it (``source``), cache result, outcome and latency.
+Recording only appends a tuple to an in-memory buffer; a background thread
+writes the buffer once per ``usage_flush_interval`` as one block to a local
+event file. Blocks are columnar and CRC-checked like token ledger blocks::
+
+    header   <4sIIII  magic, n_events, n_names, payload_len, crc32(payload)
+    payload  name lengths (uint16 x n_names), names (utf-8),
+             timestamps (float64 x n), one column of name indexes per
+             dimension (uint16 x n each), latency in ms (float32 x n)
+
+Dimension values are interned per file, so each is written once per file
+and an event takes 24 bytes. Files hold one UTC day each, are named
+``usage-YYYYMMDD-NNNN.evt`` and rotate at the day boundary or at
+``usage_file_max_bytes``; each process writes its own files. The rollup
+job (``tools.usage_rollup``) reads the files and never touches the
+serving process. Unlike the ledger, blocks are not fsynced: a crash may
+lose the last second of analytics.
+"""
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.config import get_settings
+from app.services.binary_io import decode_strings, encode_strings, pack, unpack
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("category", "urgency", "language", "source", "cache", "outcome")
+
+BLOCK_MAGIC = b"UEB1"
+BLOCK_HEADER = struct.Struct("<4sIIII")
+FILE_PATTERN = re.compile(r"^usage-(\d{8})-(\d{4})\.evt$")
+
+# (timestamp, category, urgency, language, source, cache, outcome, latency in seconds)
+Event = Tuple[float, str, str, str, str, str, str, float]
+
+
+class EventColumns(NamedTuple):
+    """The events of one file, column by column."""
+    names: List[str]         # interned dimension values
+    timestamps: array        # float64 POSIX seconds
+    dimensions: List[array]  # uint16 indexes into names, one array per DIMENSIONS entry
+    latency_ms: array        # float32
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m%d")
+
+
+def encode_block(interned: Dict[str, int], events: List[Event]) -> bytes:
+    """Encode events as one block, interning new names into ``interned``."""
+    new_names: List[str] = []
+    timestamps = array("d")
+    columns = [array("H") for _ in DIMENSIONS]
+    latency = array("f")
+    for event in events:
+        timestamps.append(event[0])
+        for column, value in zip(columns, event[1:7]):
+            i = interned.get(value)
+            if i is None:
+                i = interned[value] = len(interned)
+                new_names.append(value)
+            column.append(i)
+        latency.append(event[7] * 1000)
+    payload = b"".join((
+        encode_strings(new_names),
+        pack(timestamps),
+        *map(pack, columns),
+        pack(latency),
+    ))
+    header = BLOCK_HEADER.pack(BLOCK_MAGIC, len(events), len(new_names), len(payload), zlib.crc32(payload))
+    return header + payload
+
+
+def read_event_file(path: str) -> EventColumns:
+    """Read every intact block of an event file; a torn last block is ignored."""
+    with open(path, "rb") as f:
+        data = f.read()
+    view = memoryview(data)
+    result = EventColumns([], array("d"), [array("H") for _ in DIMENSIONS], array("f"))
+    pos = 0
+    while pos + BLOCK_HEADER.size <= len(data):
+        magic, n, n_names, payload_len, crc = BLOCK_HEADER.unpack_from(data, pos)
+        start = pos + BLOCK_HEADER.size
+        end = start + payload_len
+        if magic != BLOCK_MAGIC or end > len(data) or zlib.crc32(view[start:end]) != crc:
+            logger.warning("Ignoring torn usage block at %s:%d", path, pos)
+            break
+        names, p = decode_strings(view[start:end], n_names)
+        p += start
+        result.names.extend(names)
+        result.timestamps.extend(unpack("d", view[p:p + 8 * n]))
+        p += 8 * n
+        for column in result.dimensions:
+            column.extend(unpack("H", view[p:p + 2 * n]))
+            p += 2 * n
+        result.latency_ms.extend(unpack("f", view[p:p + 4 * n]))
+        pos = end
+    return result
+
+
+def event_files(directory: str) -> Dict[str, List[str]]:
+    """Event file paths by UTC day (``YYYYMMDD``), in write order."""
+    days: Dict[str, List[str]] = {}
+    for name in sorted(os.listdir(directory)):
+        match = FILE_PATTERN.match(name)
+        if match:
+            days.setdefault(match.group(1), []).append(os.path.join(directory, name))
+    return days
+
+
+class UsageLog:
+    """Buffered, rotating writer of usage event files."""
+
+    def __init__(
+        self,
+        directory: str,
+        flush_interval: float = 1.0,
+        max_file_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        # Pending events, guarded by _lock (held only for the append)
+        self._lock = threading.Lock()
+        self._events: List[Event] = []
+
+        # The open file and its interned names, guarded by _io_lock
+        self._io_lock = threading.Lock()
+        self._file = None
+        self._file_day: Optional[str] = None
+        self._interned: Dict[str, int] = {}
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(
+        self,
+        category: str,
+        urgency: str,
+        language: str,
+        source: str,
+        cache: str,
+        outcome: str,
+        latency: float,
+    ) -> None:
+        """Buffer one event; it is written at the next flush."""
+        event = (time.time(), category, urgency, language, source, cache, outcome, latency)
+        with self._lock:
+            self._events.append(event)
+
+    def _open(self, day: str) -> None:
+        """Start a new file for ``day``; files are never reopened, as names are interned per file."""
+        if self._file is not None:
+            self._file.close()
+        seq = 1 + sum(1 for name in os.listdir(self.directory) if name.startswith(f"usage-{day}-"))
+        while True:
+            try:
+                self._file = open(os.path.join(self.directory, f"usage-{day}-{seq:04d}.evt"), "xb")
+                break
+            except FileExistsError:
+                # Another process took this one
+                seq += 1
+        self._file_day = day
+        self._interned = {}
+
+    def flush(self) -> None:
+        """Write buffered events, one block per UTC day they fall on."""
+        with self._io_lock:
+            with self._lock:
+                events, self._events = self._events, []
+            start = 0
+            while start < len(events):
+                day = _day(events[start][0])
+                midnight = (events[start][0] // 86400 + 1) * 86400
+                end = start + 1
+                while end < len(events) and midnight - 86400 <= events[end][0] < midnight:
+                    end += 1
+                if day != self._file_day or self._file.tell() >= self.max_file_bytes:
+                    self._open(day)
+                self._file.write(encode_block(self._interned, events[start:end]))
+                start = end
+            if self._file is not None:
+                self._file.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Usage event flush failed")
+
+    def start(self) -> None:
+        """Start the background writer thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="usage-events", daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        """Stop the writer thread and write the remaining events."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._file_day = None
+
+
+# Singleton instance
+_usage_log: UsageLog | None = None
+
+
+def get_usage_log() -> Optional[UsageLog]:
+    """Get the usage log singleton, or None when usage events are disabled."""
+    global _usage_log
+    if _usage_log is None:
+        settings = get_settings()
+        if not settings.usage_events_dir:
+            return None
+        _usage_log = UsageLog(
+            settings.usage_events_dir,
+            flush_interval=settings.usage_flush_interval,
+            max_file_bytes=settings.usage_file_max_bytes,
+        )
+        _usage_log.start()
+    return _usage_log
+
+
+def close_usage_log() -> None:
+    global _usage_log
+    if _usage_log is not None:
+        _usage_log.close()
+        _usage_log = None
+
@@ -0,0 +1,135 @@
+"""
+Checkout-to-credit throughput and correctness harness.
+
+Drives many concurrent checkout -> webhook -> ``TokenService.add_tokens``
+cycles through the real app against ``tools.fake_creem``, in one process
+(no sockets). Webhooks are signed, delayed, duplicated and retried after
+lost acknowledgements; at the end every device's balance must equal exactly
+what it bought. Exits non-zero on any over- or under-credit.
+
+Usage:
+    python -m benchmarks.bench_checkout_webhooks [--devices N] [--purchases N]
+        [--concurrency N] [--delivery-delay uniform:0,0.05]
+        [--duplicate-rate 0.1] [--lost-ack-rate 0.05] [--seed N]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import httpx
+
+# Configure the app before it is imported
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["CREEM_API_KEY"] = "creem_test_bench"
+os.environ["CREEM_WEBHOOK_SECRET"] = "whsec_bench"
+os.environ["CREEM_API_BASE"] = "http://creem/v1"
+os.environ["CREEM_PRODUCT_IDS"] = '{"pack_3": "prod_3", "pack_10": "prod_10"}'
+os.environ.pop("TOKEN_LEDGER_DIR", None)
+
+from app.api import payment_router  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.token_service import get_token_service  # noqa: E402
+from tools.fake_creem import FakeCreem, FakeCreemConfig  # noqa: E402
+
+PACKS = {"pack_3": 3, "pack_10": 10}
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[round(q * (len(ordered) - 1))]
+
+
+async def run(args) -> int:
+    rng = random.Random(args.seed)
+    backend = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://backend")
+    fake = FakeCreem(
+        FakeCreemConfig(
+            webhook_url="http://backend/api/webhook",
+            webhook_secret="whsec_bench",
+            api_key="creem_test_bench",
+            payment_delay=args.payment_delay,
+            delivery_delay=args.delivery_delay,
+            duplicate_rate=args.duplicate_rate,
+            lost_ack_rate=args.lost_ack_rate,
+            retry_backoff=args.retry_backoff,
+        ),
+        webhook_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=app)),
+        seed=args.seed,
+    )
+    payment_router._creem_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake.app))
+
+    devices = [f"bench_device_{i:08d}" for i in range(args.devices)]
+    purchases = [(d, rng.choice(list(PACKS))) for d in devices for _ in range(args.purchases)]
+    rng.shuffle(purchases)
+    expected = {d: 0 for d in devices}
+    started = {}
+    failed = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def purchase(device_id: str, product_type: str) -> None:
+        nonlocal failed
+        async with semaphore:
+            start = time.perf_counter()
+            response = await backend.post(
+                "/api/checkout",
+                json={"product_type": product_type, "device_id": device_id},
+            )
+        if response.status_code != 200:
+            failed += 1
+            return
+        started[response.json()["session_id"]] = start
+        expected[device_id] += PACKS[product_type]
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(purchase(d, p) for d, p in purchases))
+    await fake.drain()
+    elapsed = time.perf_counter() - t0
+
+    service = get_token_service()
+    over = under = 0
+    for device_id, tokens in expected.items():
+        credited = service.get_token_status(device_id).total_tokens
+        over += credited > tokens
+        under += credited < tokens
+    latencies = [fake.acked_at[c] - started[c] for c in fake.acked_at if c in started]
+
+    stats = fake.stats
+    print(f"cycles       {len(purchases):>8,} checkouts over {args.devices:,} devices in {elapsed:.2f}s "
+          f"({len(purchases) / elapsed:,.0f}/s)")
+    print(f"deliveries   {stats['attempts']:>8,} attempts, {stats['duplicated']:,} duplicated, "
+          f"{stats['lost_acks']:,} lost acks, {stats['retries']:,} retries, {stats['gave_up']:,} gave up")
+    print(f"credit lat.  p50 {percentile(latencies, 0.5) * 1000:7.1f}ms  "
+          f"p95 {percentile(latencies, 0.95) * 1000:7.1f}ms  p99 {percentile(latencies, 0.99) * 1000:7.1f}ms")
+    print(f"correctness  {failed} failed checkouts, {over} devices over-credited, {under} under-credited")
+
+    await backend.aclose()
+    await fake.aclose()
+    await payment_router.close_creem_client()
+    if failed or over or under:
+        print("FAIL: tokens were not credited exactly once per purchase")
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--devices", type=int, default=1_000)
+    parser.add_argument("--purchases", type=int, default=5, help="purchases per device")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--payment-delay", default="uniform:0,0.05")
+    parser.add_argument("--delivery-delay", default="lognormal:0.02,0.8")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--lost-ack-rate", type=float, default=0.05)
+    parser.add_argument("--retry-backoff", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Response size and compression-cost benchmark.
+
+Requests each endpoint through the real app (in one process, no sockets)
+with no Accept-Encoding, with gzip and, when the brotli package is
+installed, with br, and reports the bytes each response puts on the wire.
+Generation uses canned excuses of typical length, in the full and the
+compact shape. Then times ``CompressionMiddleware.compress`` on each
+compressed body to give its CPU cost per response. Exits non-zero if any
+compressed response is larger than its identity form, or if token status
+responses get compressed at all.
+
+Usage:
+    python -m benchmarks.bench_compression [--iterations 2000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+
+# Configure the app before it is imported
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ.pop("TOKEN_LEDGER_DIR", None)
+
+from app.core.compression import CompressionMiddleware, brotli  # noqa: E402
+from app.main import app  # noqa: E402
+from app.schemas.excuse import Excuse  # noqa: E402
+
+EXCUSES = [
+    Excuse(
+        text="I'm so sorry, my train was held outside the station for forty minutes because of a signal "
+             "failure, and there was no way to get off and take another route.",
+        tone="sincere",
+        tip="Mention the line and offer to stay late to make up the time.",
+    ),
+    Excuse(
+        text="The building's elevator got stuck between floors with me in it, and it took maintenance "
+             "almost half an hour to get the doors open again.",
+        tone="apologetic",
+        tip="Keep it short and slightly embarrassed; don't over-explain.",
+    ),
+    Excuse(
+        text="My neighbour's car was blocking the driveway and I had to wait for them to wake up and "
+             "move it, which took far longer than I expected.",
+        tone="casual",
+        tip="Say it lightly and move straight on to what you're working on.",
+    ),
+]
+
+DEVICE = "bench_device_0000000001"
+ENDPOINTS = [
+    ("generate", "POST", "/api/generate", {"category": "late", "urgency": "normal"}),
+    ("generate compact", "POST", "/api/generate", {"category": "late", "urgency": "normal", "compact": True}),
+    ("categories", "GET", "/api/categories", None),
+    ("urgency-levels", "GET", "/api/urgency-levels", None),
+    ("token status", "GET", f"/api/tokens/{DEVICE}", None),
+    ("can-generate", "GET", f"/api/tokens/{DEVICE}/can-generate", None),
+    ("metrics", "GET", "/api/metrics", None),
+]
+SMALL = {"token status", "can-generate"}
+
+
+async def measure(encodings) -> dict:
+    """Wire bytes, identity body and content encoding per (endpoint, encoding)."""
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://backend")
+    service = MagicMock()
+    service.generate_excuses = AsyncMock(return_value=EXCUSES)
+    results = {}
+    device = 0
+    with patch("app.api.excuse_router.get_excuse_service", return_value=service):
+        for name, method, path, payload in ENDPOINTS:
+            for encoding in encodings:
+                if payload is not None:
+                    # A fresh device each time, so the free trial pays
+                    device += 1
+                    payload = {**payload, "device_id": f"bench_device_{device:010d}"}
+                response = await client.request(
+                    method, path, json=payload, headers={"Accept-Encoding": encoding},
+                )
+                response.raise_for_status()
+                results[name, encoding] = (
+                    response.num_bytes_downloaded,
+                    response.content,
+                    response.headers.get("content-encoding", "identity"),
+                )
+    await client.aclose()
+    return results
+
+
+def compress_us(middleware: CompressionMiddleware, body: bytes, encoding: str, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        middleware.compress(body, encoding)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2_000)
+    args = parser.parse_args()
+
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    results = asyncio.run(measure(encodings))
+    middleware = CompressionMiddleware(None)
+
+    failures = []
+    print(f"{'endpoint':<18}" + "".join(f"{e + ' bytes':>14}" for e in encodings) + "".join(
+        f"{e + ' us':>10}" for e in encodings[1:]
+    ))
+    for name, *_ in ENDPOINTS:
+        identity, body, _ = results[name, "identity"]
+        row = f"{name:<18}{identity:>14,}"
+        for encoding in encodings[1:]:
+            wire, _, applied = results[name, encoding]
+            row += f"{wire:>14,}"
+            if wire > identity:
+                failures.append(f"{name} is larger with {encoding}")
+            if name in SMALL and applied != "identity":
+                failures.append(f"{name} was compressed with {applied}")
+        for encoding in encodings[1:]:
+            if results[name, encoding][2] == "identity":
+                row += f"{'-':>10}"
+            else:
+                row += f"{compress_us(middleware, body, encoding, args.iterations):>10.1f}"
+        print(row)
+
+    full = results["generate", "identity"][0]
+    compact = results["generate compact", "identity"][0]
+    print(f"compact shape saves {1 - compact / full:.0%} of the generate body before compression")
+    if brotli is None:
+        print("brotli not installed; br not measured")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Context cache hit-rate benchmark.
+
+Replays a log of generation requests (JSON lines of ``/api/generate``
+bodies, one per line) through an ``ExcuseCache`` three times, keying the
+context by its raw text, its canonical form and its intent tags, and
+reports the hit rate and key cost of each. Without ``--traffic`` a
+synthetic log is generated: a Zipf-distributed set of situations, each
+typed with varying case, punctuation, spacing, full-width forms and
+wording, plus a share of one-off contexts that never repeat. Exits
+non-zero if canonical keys don't beat raw keys or cost more than the
+budget.
+
+Usage:
+    python -m benchmarks.bench_context_cache [--traffic requests.jsonl]
+        [--requests N] [--unique-rate 0.3] [--cache-entries N] [--budget-us 50] [--seed N]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from app.services.context_keys import context_key
+from app.services.excuse_cache import ExcuseCache
+
+# Situations by language, each with a few ways of putting it
+SITUATIONS = {
+    "en": [
+        ["traffic", "traffic jam", "stuck in traffic", "heavy traffic on the highway"],
+        ["my train was cancelled", "train cancelled", "the train is delayed"],
+        ["I'm sick", "feeling sick", "I have a fever", "bad flu"],
+        ["my dog ate my homework", "dog ate homework"],
+        ["overslept", "my alarm didn't go off", "I overslept again"],
+        ["internet is down", "my laptop died", "wifi not working"],
+        ["snow storm", "heavy snow", "the roads are flooded"],
+        ["my kid is sick", "family emergency", "had to pick up my daughter"],
+        ["forgot my keys", "locked myself out"],
+        ["flat tire", "my car broke down"],
+    ],
+    "de": [
+        ["Stau", "Stau auf der A3", "im Stau stecken"],
+        ["Zug fällt aus", "die Bahn hat Verspätung"],
+        ["ich bin krank", "Fieber"],
+    ],
+    "zh": [
+        ["堵车", "路上堵车了", "交通堵塞"],
+        ["我发烧了", "生病了"],
+        ["地铁故障", "地铁停运"],
+    ],
+    "ja": [
+        ["渋滞", "渋滞にはまった"],
+        ["寝坊した", "目覚ましが鳴らなかった"],
+    ],
+}
+LANGUAGE_WEIGHTS = {"en": 0.7, "de": 0.1, "zh": 0.1, "ja": 0.1}
+CATEGORIES = ["late", "sick_leave", "meeting", "deadline"]
+_FULLWIDTH = {c: chr(ord(c) + 0xFEE0) for c in map(chr, range(0x21, 0x7F))}
+
+
+def retype(text: str, rng: random.Random) -> str:
+    """The same words as a user might type them."""
+    r = rng.random()
+    if r < 0.2:
+        text = text.lower()
+    elif r < 0.3:
+        text = text.capitalize()
+    elif r < 0.35:
+        text = text.upper()
+    if rng.random() < 0.3:
+        text += rng.choice(["!", "!!", ".", "...", " :(", "?"])
+    if rng.random() < 0.2:
+        text = " " * rng.randint(1, 2) + text + " " * rng.randint(0, 2)
+    if rng.random() < 0.1:
+        text = text.replace(" ", "  ", 1)
+    if rng.random() < 0.03:
+        text = "".join(_FULLWIDTH.get(c, c) for c in text)
+    return text
+
+
+def synthetic_traffic(n: int, rng: random.Random, unique_rate: float) -> list:
+    languages, weights = zip(*LANGUAGE_WEIGHTS.items())
+    requests = []
+    for i in range(n):
+        language = rng.choices(languages, weights)[0]
+        situations = SITUATIONS[language]
+        if rng.random() < unique_rate:
+            context = f"{rng.choice(rng.choice(situations))} because of thing #{i}"
+        else:
+            # Zipf over situations: a few account for most traffic
+            situation = situations[min(int(rng.paretovariate(1.2)) - 1, len(situations) - 1)]
+            context = retype(rng.choice(situation), rng)
+        requests.append({
+            "category": rng.choice(CATEGORIES),
+            "urgency": "normal" if rng.random() < 0.8 else "urgent",
+            "language": language,
+            "context": context,
+        })
+    return requests
+
+
+def load_traffic(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay(requests: list, keying, cache_entries: int):
+    """Hit rate and mean key cost in microseconds."""
+    cache = ExcuseCache(max_entries=cache_entries, ttl=float("inf"))
+    key_seconds = 0.0
+    for request in requests:
+        language = request.get("language", "en")
+        start = time.perf_counter()
+        context = keying(request.get("context") or "", language)
+        key_seconds += time.perf_counter() - start
+        key = (request.get("category"), request.get("urgency", "normal"), language,
+               request.get("scenario") or "", context)
+        if cache.get(key) is None:
+            cache.put(key, [])
+    return cache.hits / len(requests), key_seconds / len(requests) * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--traffic", help="JSON-lines request log; synthetic traffic if omitted")
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--unique-rate", type=float, default=0.3)
+    parser.add_argument("--cache-entries", type=int, default=10_000)
+    parser.add_argument("--budget-us", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.traffic:
+        requests = [r for r in load_traffic(args.traffic) if r.get("context")]
+    else:
+        requests = synthetic_traffic(args.requests, random.Random(args.seed), args.unique_rate)
+    if not requests:
+        print("No requests with a context to replay")
+        return 1
+
+    results = {}
+    for name, keying in (
+        ("raw", lambda text, language: text),
+        ("canonical", lambda text, language: context_key(text, language)),
+        ("intent", lambda text, language: context_key(text, language, intents=True)),
+    ):
+        results[name] = replay(requests, keying, args.cache_entries)
+        hit_rate, key_us = results[name]
+        print(f"{name:<10} hit rate {hit_rate:6.1%}  key {key_us:6.1f} us/request")
+    print(f"{len(requests):,} requests with context, cache of {args.cache_entries:,} entries")
+
+    if results["canonical"][0] <= results["raw"][0]:
+        print("FAIL: canonical keys don't improve the hit rate")
+        return 1
+    if results["intent"][1] > args.budget_us:
+        print(f"FAIL: keying exceeds {args.budget_us} us budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
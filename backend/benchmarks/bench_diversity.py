@@ -0,0 +1,106 @@
+"""
+Diversity filter similarity-lookup benchmark.
+
+Fills one (category, language) similarity index with N synthetic excuses
+and times near-duplicate lookups against it, for both unrelated texts and
+light rewrites of indexed ones. Exits non-zero if the median lookup costs
+more than the budget.
+
+Usage:
+    python -m benchmarks.bench_diversity [--items N] [--queries N] [--budget-us 1000]
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from app.services.diversity import MinHasher, SimilarityIndex
+
+CONSONANTS = "bcdfghklmnprstvw"
+VOWELS = "aeiou"
+COMMON = ["I", "the", "my", "a", "and", "to", "was", "so", "be", "late", "sorry", "today", "at", "in"]
+
+
+def vocabulary(rng: random.Random, size: int = 5_000) -> list:
+    """Pseudo-words, so unrelated texts overlap about as much as real prose."""
+    def word():
+        return "".join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(1, 4)))
+    return [word() for _ in range(size)]
+
+
+def synthetic_excuse(rng: random.Random, words: list) -> str:
+    """Twelve to twenty words, a third of them common function words."""
+    return " ".join(
+        rng.choice(COMMON) if rng.random() < 0.35 else rng.choice(words)
+        for _ in range(rng.randint(12, 20))
+    )
+
+
+def rewrite(text: str, rng: random.Random) -> str:
+    """A light paraphrase: swap the first word and drop a couple of others."""
+    words = text.split()
+    words[0] = rng.choice(COMMON)
+    for _ in range(2):
+        words.pop(rng.randrange(1, len(words)))
+    return " ".join(words)
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[round(q * (len(ordered) - 1))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--budget-us", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    hasher = MinHasher()
+    words = vocabulary(rng)
+    texts = [synthetic_excuse(rng, words) for _ in range(args.items)]
+
+    start = time.perf_counter()
+    signatures = [hasher.signature(t) for t in texts]
+    signature_us = (time.perf_counter() - start) / len(texts) * 1e6
+
+    tracemalloc.start()
+    index = SimilarityIndex(max_items=args.items)
+    start = time.perf_counter()
+    for signature in signatures:
+        index.add(signature)
+    add_us = (time.perf_counter() - start) / len(texts) * 1e6
+    memory_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+
+    results = {}
+    for name, queries in (
+        ("unrelated", [hasher.signature(synthetic_excuse(rng, words)) for _ in range(args.queries)]),
+        ("rewrite", [hasher.signature(rewrite(rng.choice(texts), rng)) for _ in range(args.queries)]),
+    ):
+        timings, flagged = [], 0
+        for signature in queries:
+            start = time.perf_counter()
+            flagged += index.most_similar(signature) >= args.threshold
+            timings.append((time.perf_counter() - start) * 1e6)
+        results[name] = (timings, flagged / len(queries))
+
+    print(f"signature    {signature_us:8.1f} us/excuse")
+    print(f"index.add    {add_us:8.1f} us/excuse  ({len(index):,} items, {memory_mb:.0f} MB)")
+    for name, (timings, rate) in results.items():
+        print(f"lookup {name:<9} p50 {percentile(timings, 0.5):7.1f} us  p99 {percentile(timings, 0.99):7.1f} us  "
+              f"flagged {rate:6.1%}")
+
+    median = percentile(results["unrelated"][0] + results["rewrite"][0], 0.5)
+    if median > args.budget_us:
+        print(f"FAIL: median lookup exceeds {args.budget_us} us budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
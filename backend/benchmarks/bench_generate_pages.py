@@ -0,0 +1,41 @@
+"""
+SEO page build benchmark.
+
+Times a cold build (every page written), a warm incremental build (nothing
+changed, nothing written) and a build after one scenario's keywords change,
+for each worker count.
+
+Usage:
+    python -m benchmarks.bench_generate_pages [--workers 1,4]
+"""
+import argparse
+import copy
+import tempfile
+from pathlib import Path
+
+from tools.generate_pages import build
+from tools.pregenerate import load_dimensions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", default="1,4", help="comma-separated worker counts")
+    args = parser.parse_args()
+
+    dimensions = load_dimensions()
+    edited = copy.deepcopy(dimensions)
+    edited["scenarios"][-1]["keywords"].append("new keyword")
+
+    for workers in map(int, args.workers.split(",")):
+        with tempfile.TemporaryDirectory() as directory:
+            out = Path(directory)
+            cold = build(out, dimensions, workers=workers)
+            warm = build(out, dimensions, workers=workers)
+            partial = build(out, edited, workers=workers)
+        for label, stats in (("cold", cold), ("warm", warm), ("one edit", partial)):
+            print(f"workers={workers:<3} {label:<9} {stats['seconds']:.2f}s  "
+                  f"{stats['written']:>6,} written / {stats['pages']:,} pages")
+
+
+if __name__ == "__main__":
+    main()
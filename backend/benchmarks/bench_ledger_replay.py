@@ -0,0 +1,104 @@
+"""
+Token ledger startup replay benchmark.
+
+Writes a log of N events (mostly paid generations, with free trials, token
+grants, subscriptions and rare resets) across a population of devices, then
+times rebuilding the device table with ``TokenLedger.load``. It then
+compacts and times a steady-state startup: the snapshot plus a log tail of
+``--tail`` events (the compaction threshold, so the worst case).
+
+Usage:
+    python -m benchmarks.bench_ledger_replay [--events N] [--devices N] [--block-size N] [--tail N]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from array import array
+
+from app.services.token_ledger import (
+    OP_ADD,
+    OP_FREE_TRIAL,
+    OP_RESET,
+    OP_UNLIMITED,
+    OP_USE,
+    TokenLedger,
+    encode_block,
+)
+
+
+def write_log(path: str, events: int, devices: int, block_size: int, seed: int = 42) -> None:
+    """Write a synthetic log one block (group commit) at a time."""
+    rng = random.Random(seed)
+    population = [f"device_{i:016x}" for i in range(devices)]
+    ops_pool = (
+        [OP_USE] * 900 + [OP_FREE_TRIAL] * 50 + [OP_ADD] * 40 + [OP_UNLIMITED] * 9 + [OP_RESET] * 1
+    )
+    interned = {}
+    until = time.time() + 30 * 86400
+
+    with open(path, "wb") as f:
+        for start in range(0, events, block_size):
+            n = min(block_size, events - start)
+            new_names = []
+            ops = bytes(rng.choices(ops_pool, k=n))
+            idx = array("I")
+            values = array("d")
+            for op, name in zip(ops, rng.choices(population, k=n)):
+                i = interned.get(name)
+                if i is None:
+                    i = interned[name] = len(interned)
+                    new_names.append(name)
+                idx.append(i)
+                values.append(10.0 if op == OP_ADD else until if op == OP_UNLIMITED else 0.0)
+            f.write(encode_block(new_names, ops, idx, values))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--devices", type=int, default=500_000)
+    parser.add_argument("--block-size", type=int, default=1_000,
+                        help="events per group commit")
+    parser.add_argument("--tail", type=int, default=1_000_000,
+                        help="log tail replayed after the snapshot")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        write_log(os.path.join(directory, "ledger-00000001.log"),
+                  args.events, args.devices, args.block_size)
+        write_s = time.perf_counter() - start
+        size_mb = os.path.getsize(os.path.join(directory, "ledger-00000001.log")) / 1e6
+
+        ledger = TokenLedger(directory)
+        start = time.perf_counter()
+        devices = ledger.load()
+        replay_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ledger.compact()
+        compact_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        TokenLedger(directory).load()
+        snapshot_s = time.perf_counter() - start
+
+        write_log(ledger._log_path(ledger._generation), args.tail, args.devices,
+                  args.block_size, seed=7)
+        ledger.close()
+        start = time.perf_counter()
+        TokenLedger(directory).load()
+        startup_s = time.perf_counter() - start
+
+    print(f"log          {args.events:,} events, {size_mb:.1f} MB, written in {write_s:.1f}s")
+    print(f"replay       {replay_s:.2f}s ({len(devices):,} devices, "
+          f"{args.events / replay_s / 1e6:.1f}M events/s)")
+    print(f"compact      {compact_s:.2f}s")
+    print(f"snapshot     {snapshot_s:.2f}s to load after compaction")
+    print(f"startup      {startup_s:.2f}s for snapshot + {args.tail:,}-event tail")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Per-request middleware overhead benchmark.
+
+Calls the app's ASGI stack directly (no HTTP client or sockets) and times
+representative requests through the full middleware stack and through the
+routes alone; the difference is what the middleware costs each request
+(negative for requests the middleware answers itself, such as preflights
+and malformed device ids).
+Then times each middleware on its own around a trivial endpoint. Exits
+non-zero if a CORS preflight costs more than ``--preflight-budget-us``, or
+if the stack adds more than ``--budget-us`` to a token status poll.
+
+Usage:
+    python -m benchmarks.bench_middleware [--iterations 5000] [--budget-us 150]
+        [--preflight-budget-us 50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Configure the app before it is imported
+os.environ.pop("TOKEN_LEDGER_DIR", None)
+os.environ.pop("TRACE_EXPORT_PATH", None)
+
+from prometheus_client import CollectorRegistry  # noqa: E402
+from starlette.middleware.cors import CORSMiddleware  # noqa: E402
+
+from app.config import get_settings  # noqa: E402
+from app.core.compression import CompressionMiddleware  # noqa: E402
+from app.core.metrics import HttpMetricsMiddleware  # noqa: E402
+from app.core.rate_limit import InMemoryBucketStore, RateLimitMiddleware  # noqa: E402
+from app.core.tracing import TracingMiddleware  # noqa: E402
+from app.main import app  # noqa: E402
+
+ORIGIN = get_settings().cors_allow_origins.split(",")[0].strip()
+DEVICE = "bench_device_0000000001"
+
+# name -> (method, path, extra headers); every request comes from the browser origin
+REQUESTS = {
+    "preflight": ("OPTIONS", "/api/generate", [
+        (b"access-control-request-method", b"POST"),
+        (b"access-control-request-headers", b"content-type"),
+    ]),
+    "health": ("GET", "/health", []),
+    "categories": ("GET", "/api/categories", [(b"accept-encoding", b"gzip")]),
+    "token status": ("GET", f"/api/tokens/{DEVICE}", []),
+    "bad device_id": ("GET", "/api/tokens/short", []),
+}
+
+
+def make_scope(method: str, path: str, headers: list) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "server": ("backend", 80),
+        "client": ("10.0.0.1", 50000),
+        "root_path": "",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [(b"host", b"backend"), (b"origin", ORIGIN.encode()), *headers],
+        "app": app,
+    }
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def time_requests(asgi, scope: dict, iterations: int) -> float:
+    """Mean microseconds per request; the status of the last one is checked by the caller."""
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    await asgi(dict(scope), receive, send)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await asgi(dict(scope), receive, send)
+    elapsed = time.perf_counter() - start
+    time_requests.status = statuses[-1]
+    return elapsed / iterations * 1e6
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b'{"ok":true}'})
+
+
+LAYERS = {
+    "cors": lambda inner: CORSMiddleware(inner, allow_origins=[ORIGIN], allow_methods=["GET", "POST"]),
+    "tracing": TracingMiddleware,
+    "rate limit": RateLimitMiddleware,
+    "http metrics": lambda inner: HttpMetricsMiddleware(inner, registry=CollectorRegistry()),
+    "compression": CompressionMiddleware,
+}
+
+
+async def run(args) -> int:
+    import app.core.rate_limit as rl
+    # Buckets big enough that the polls measured are never throttled
+    rl._rate_limit_backend = InMemoryBucketStore()
+    rl.DEFAULT_POLICIES[0].burst = rl.DEFAULT_POLICIES[1].burst = 10 ** 9
+
+    stack = app.build_middleware_stack()
+    # The same app without user middleware: routing plus Starlette's error handling
+    user_middleware, app.user_middleware = app.user_middleware, []
+    routes = app.build_middleware_stack()
+    app.user_middleware = user_middleware
+
+    failures = []
+    print(f"{'request':<16}{'status':>8}{'stack us':>10}{'routes us':>11}{'overhead us':>13}")
+    for name, (method, path, headers) in REQUESTS.items():
+        scope = make_scope(method, path, headers)
+        full = await time_requests(stack, scope, args.iterations)
+        status = time_requests.status
+        bare = await time_requests(routes, scope, args.iterations)
+        print(f"{name:<16}{status:>8}{full:>10.1f}{bare:>11.1f}{full - bare:>13.1f}")
+        if name == "preflight" and full > args.preflight_budget_us:
+            failures.append(f"preflight costs {full:.1f} us")
+        if name == "token status" and full - bare > args.budget_us:
+            failures.append(f"middleware adds {full - bare:.1f} us to a token status poll")
+
+    print()
+    print(f"{'layer':<16}{'us per request':>16}")
+    scope = make_scope("GET", "/api/categories", [(b"accept-encoding", b"gzip")])
+    baseline = await time_requests(endpoint, scope, args.iterations)
+    for name, wrap in LAYERS.items():
+        cost = await time_requests(wrap(endpoint), scope, args.iterations) - baseline
+        print(f"{name:<16}{cost:>16.1f}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=5_000)
+    parser.add_argument("--budget-us", type=float, default=150.0)
+    parser.add_argument("--preflight-budget-us", type=float, default=50.0)
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
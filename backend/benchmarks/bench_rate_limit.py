@@ -0,0 +1,80 @@
+"""
+Rate limiter decision-cost benchmark.
+
+Measures the in-memory token-bucket store on its own and the full middleware
+decision (policy matching, key extraction, bucket update) for a polling
+request. Exits non-zero if a decision costs more than the budget.
+
+Usage:
+    python -m benchmarks.bench_rate_limit [--iterations N] [--keys N] [--budget-us 10]
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from app.core.rate_limit import InMemoryBucketStore, RateLimitMiddleware
+
+
+def bench_store(iterations: int, keys: int) -> float:
+    """Return mean microseconds per store decision."""
+    store = InMemoryBucketStore(max_keys=keys)
+    names = [f"token_status_device:device_{i:012d}" for i in range(keys)]
+    consume = store.consume
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        consume(names[i % keys], 2.0, 10)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def _bench_middleware(iterations: int, keys: int) -> float:
+    import app.core.rate_limit as rl
+    # Each polling request touches a device bucket and an address bucket
+    rl._rate_limit_backend = InMemoryBucketStore(max_keys=4 * keys)
+
+    middleware = RateLimitMiddleware(app=None)
+    scopes = [
+        {
+            "type": "http",
+            "method": "GET",
+            "path": f"/api/tokens/device_{i:012d}/can-generate",
+            "headers": [(b"x-real-ip", f"10.0.{i // 256 % 256}.{i % 256}".encode())],
+            "client": ("127.0.0.1", 50000),
+        }
+        for i in range(keys)
+    ]
+    check = middleware.check
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        await check(scopes[i % keys])
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_middleware(iterations: int, keys: int) -> float:
+    """Return mean microseconds per middleware decision."""
+    return asyncio.run(_bench_middleware(iterations, keys))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=500_000)
+    parser.add_argument("--keys", type=int, default=50_000)
+    parser.add_argument("--budget-us", type=float, default=10.0)
+    args = parser.parse_args()
+
+    store_us = bench_store(args.iterations, args.keys)
+    middleware_us = bench_middleware(args.iterations, args.keys)
+
+    print(f"store.consume        {store_us:6.2f} us/decision")
+    print(f"middleware.check     {middleware_us:6.2f} us/request (2 buckets per request)")
+
+    if middleware_us > args.budget_us:
+        print(f"FAIL: decision cost exceeds {args.budget_us} us budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
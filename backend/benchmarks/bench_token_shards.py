@@ -0,0 +1,94 @@
+"""
+Sharded use_token throughput benchmark.
+
+Spreads N devices over 1, 2, 4, ... ``ProcessShard`` workers by consistent
+hashing and spends their tokens in batches through
+``ShardedTokenService.use_tokens`` (one message per shard per batch, all
+shards working at once). Reports throughput per shard count, plus the cost
+of routing single calls through in-process shards. Exits non-zero if every
+balance isn't exact, or, when there are enough CPUs, if throughput doesn't
+scale with the shard count.
+
+Usage:
+    python -m benchmarks.bench_token_shards [--shards 1,2,4] [--devices N]
+        [--uses N] [--batch N] [--min-efficiency 0.6]
+"""
+import argparse
+import os
+import sys
+import time
+
+from app.services.token_service import TokenService
+from app.services.token_shards import ProcessShard, ShardedTokenService
+
+
+def run_processes(shards: int, devices: list, uses: int, batch: int):
+    """use_token calls per second, and whether every balance came out exact."""
+    service = ShardedTokenService({f"shard-{i}": ProcessShard() for i in range(shards)})
+    try:
+        service.grant_tokens([(d, uses) for d in devices])
+        calls = devices * uses
+        start = time.perf_counter()
+        spent = 0
+        for i in range(0, len(calls), batch):
+            spent += sum(r.success for r in service.use_tokens(calls[i:i + batch]))
+        elapsed = time.perf_counter() - start
+        # The free trial goes first, so one paid token per device is left over
+        exact = spent == len(calls) and all(
+            s.used_tokens == uses - 1 for s in service.batch("get_token_status", [(d,) for d in devices])
+        )
+        return len(calls) / elapsed, exact
+    finally:
+        service.close()
+
+
+def single_call_us(service, devices: list) -> float:
+    start = time.perf_counter()
+    for device_id in devices:
+        service.use_token(device_id)
+    return (time.perf_counter() - start) / len(devices) * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--shards", default="1,2,4")
+    parser.add_argument("--devices", type=int, default=20_000)
+    parser.add_argument("--uses", type=int, default=5, help="tokens spent per device")
+    parser.add_argument("--batch", type=int, default=10_000, help="use_token calls per batch")
+    parser.add_argument("--min-efficiency", type=float, default=0.6,
+                        help="required speedup per added shard, as a fraction of linear")
+    args = parser.parse_args()
+
+    devices = [f"bench_device_{i:08d}" for i in range(args.devices)]
+    counts = [int(n) for n in args.shards.split(",")]
+    results = {}
+    for shards in counts:
+        rate, exact = run_processes(shards, devices, args.uses, args.batch)
+        results[shards] = (rate, exact)
+        print(f"{shards:>3} process shards  {rate:>10,.0f} use_token/s  "
+              f"x{rate / results[counts[0]][0]:.2f}  {'exact' if exact else 'WRONG BALANCES'}")
+
+    plain = single_call_us(TokenService(), devices)
+    local = single_call_us(ShardedTokenService({f"shard-{i}": TokenService() for i in range(4)}), devices)
+    print(f"single calls: {plain:.1f} us plain, {local:.1f} us routed over 4 in-process shards")
+
+    if not all(exact for _, exact in results.values()):
+        print("FAIL: balances are not exact")
+        return 1
+    cpus = os.cpu_count() or 1
+    base_shards, (base_rate, _) = counts[0], results[counts[0]]
+    for shards, (rate, _) in results.items():
+        if shards <= base_shards:
+            continue
+        if shards > cpus:
+            print(f"skipping the scaling check for {shards} shards: only {cpus} CPUs")
+            continue
+        efficiency = (rate / base_rate) / (shards / base_shards)
+        if efficiency < args.min_efficiency:
+            print(f"FAIL: {shards} shards reach {efficiency:.0%} of linear scaling")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
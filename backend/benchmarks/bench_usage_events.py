@@ -0,0 +1,117 @@
+"""
+Usage event and rollup benchmark.
+
+Measures what recording a usage event costs the request path, then writes
+``--days`` days of synthetic events through ``UsageLog``, rolls them up
+with ``tools.usage_rollup`` and times a report over the whole range.
+Exits non-zero if recording exceeds its budget, if the report takes longer
+than ``--report-budget`` seconds, or if the report doesn't count every
+event.
+
+Usage:
+    python -m benchmarks.bench_usage_events [--days 90] [--events-per-day 30000]
+        [--record-budget-us 5] [--report-budget 2] [--format csv|parquet]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+from app.services.usage_events import UsageLog
+from tools.usage_rollup import load_rollups, pa, report, rollup
+
+CATEGORIES = ["late", "sick_leave", "decline", "forgot", "deadline", "meeting", "homework", "other"]
+LANGUAGES = ["en", "zh", "ja", "de", "fr", "es", "other"]
+SOURCES = ["free_trial", "token", "unlimited", "none"]
+CACHES = ["none", "miss", "hit", "coalesced"]
+OUTCOMES = ["ok", "parse_fallback", "upstream_error", "payment_required"]
+
+
+def synthetic_event(rng: random.Random) -> tuple:
+    return (
+        rng.choice(CATEGORIES),
+        "normal" if rng.random() < 0.8 else "urgent",
+        rng.choices(LANGUAGES, [60, 15, 8, 6, 5, 4, 2])[0],
+        rng.choices(SOURCES, [50, 35, 10, 5])[0],
+        rng.choices(CACHES, [40, 35, 20, 5])[0],
+        rng.choices(OUTCOMES, [90, 3, 2, 5])[0],
+        rng.expovariate(1 / 1.5),
+    )
+
+
+def record_us(directory: str, events: list) -> float:
+    usage = UsageLog(directory, flush_interval=0.05)
+    usage.start()
+    start = time.perf_counter()
+    for event in events:
+        usage.record(*event)
+    elapsed = time.perf_counter() - start
+    usage.close()
+    return elapsed / len(events) * 1e6
+
+
+def write_days(directory: str, days: int, per_day: int, events: list) -> None:
+    """Write ``days`` days of events on a simulated clock, flushing every 1,000 events."""
+    usage = UsageLog(directory)
+    first_day = time.time() // 86400 - days
+    clock = [0.0]
+    with patch("app.services.usage_events.time.time", lambda: clock[0]):
+        for day in range(days):
+            for i in range(per_day):
+                clock[0] = (first_day + day) * 86400 + i * 86400 / per_day
+                usage.record(*events[i % len(events)])
+                if i % 1000 == 999:
+                    usage.flush()
+    usage.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--events-per-day", type=int, default=30_000)
+    parser.add_argument("--record-budget-us", type=float, default=5.0)
+    parser.add_argument("--report-budget", type=float, default=2.0, help="seconds")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="parquet" if pa is not None else "csv")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    events = [synthetic_event(rng) for _ in range(10_000)]
+    total = args.days * args.events_per_day
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cost = record_us(f"{tmp}/record", events * 20)
+        print(f"record       {cost:.2f} us/event on the request path")
+
+        start = time.perf_counter()
+        write_days(f"{tmp}/events", args.days, args.events_per_day, events)
+        print(f"write        {total:,} events over {args.days} days in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        rebuilt = rollup(f"{tmp}/events", f"{tmp}/rollups", args.format)
+        elapsed = time.perf_counter() - start
+        print(f"rollup       {len(rebuilt)} days in {elapsed:.1f}s ({total / elapsed:,.0f} events/s, {args.format})")
+
+        start = time.perf_counter()
+        rows = load_rollups(f"{tmp}/rollups")
+        groups = report(rows, ["category", "paid"])
+        report_seconds = time.perf_counter() - start
+        counted = sum(requests for _, requests, _ in groups)
+        print(f"report       {args.days} days, {len(rows):,} rollup rows in {report_seconds * 1000:.0f} ms")
+
+    if counted != total:
+        print(f"FAIL: report counts {counted:,} of {total:,} events")
+        return 1
+    if cost > args.record_budget_us:
+        print(f"FAIL: recording exceeds {args.record_budget_us} us budget")
+        return 1
+    if report_seconds > args.report_budget:
+        print(f"FAIL: report exceeds {args.report_budget}s budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
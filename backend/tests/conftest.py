@@ -37,6 +37,26 @@ def mock_llm_response():
     ]'''
 
 
+@pytest.fixture(autouse=True)
+def no_blocking_calls():
+    """Fail any test in which a blocking call runs on an event loop thread."""
+    from app.core.loop_monitor import blocking_call_detector
+    
+    blocking_call_detector.enable(raise_on_violation=True)
+    yield
+    blocking_call_detector.disable()
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limiter():
+    """Give every test fresh rate-limit buckets."""
+    import app.core.rate_limit as rl
+    
+    rl._rate_limit_backend = None
+    yield
+    rl._rate_limit_backend = None
+
+
 @pytest.fixture
 def reset_services():
     """Reset singleton services after each test."""
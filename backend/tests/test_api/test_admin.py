@@ -0,0 +1,155 @@
+"""Tests for admin endpoints."""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+
+@pytest.fixture
+def admin_settings():
+    settings = MagicMock(admin_api_key="s3cret", profiler_max_seconds=5.0, bulk_grant_batch_size=2)
+    with patch("app.api.admin_router.get_settings", return_value=settings):
+        yield settings
+
+
+class TestAdminAuth:
+    """Tests for admin authentication."""
+
+    def test_hidden_without_configured_key(self, client):
+        """Admin routes should 404 when no admin key is configured."""
+        response = client.get("/api/admin/profile", headers={"X-Admin-Key": "anything"})
+
+        assert response.status_code == 404
+
+    def test_rejects_wrong_key(self, client, admin_settings):
+        """A missing or wrong key should be rejected."""
+        assert client.get("/api/admin/profile").status_code == 401
+        response = client.get("/api/admin/profile", headers={"X-Admin-Key": "wrong"})
+        assert response.status_code == 401
+
+
+class TestProfileEndpoint:
+    """Tests for GET /api/admin/profile."""
+
+    def test_returns_collapsed_stacks(self, client, admin_settings):
+        """Should return a downloadable collapsed-stack profile."""
+        response = client.get(
+            "/api/admin/profile",
+            params={"seconds": 0.05, "include_idle": True},
+            headers={"X-Admin-Key": "s3cret"},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "profile.collapsed" in response.headers["content-disposition"]
+        assert response.text.rstrip().rsplit(" ", 1)[1].isdigit()
+
+    def test_rejects_long_profiles(self, client, admin_settings):
+        """Durations above the configured maximum should be rejected."""
+        response = client.get(
+            "/api/admin/profile", params={"seconds": 60}, headers={"X-Admin-Key": "s3cret"}
+        )
+
+        assert response.status_code == 422
+
+    def test_conflict_while_running(self, client, admin_settings):
+        """A profile requested while another runs should get 409."""
+        busy = AsyncMock(side_effect=RuntimeError("A profile is already running"))
+        with patch("app.api.admin_router.profile_event_loop", busy):
+            response = client.get(
+                "/api/admin/profile", params={"seconds": 1}, headers={"X-Admin-Key": "s3cret"}
+            )
+
+        assert response.status_code == 409
+
+
+@pytest.fixture
+def grant_state():
+    """Fresh token service and grant job registry."""
+    import app.services.bulk_grants as bg
+    import app.services.token_service as ts
+
+    ts._token_service = None
+    bg._grant_jobs = None
+    yield ts.get_token_service()
+    ts._token_service = None
+    bg._grant_jobs = None
+
+
+GRANTS_CSV = "device_id,tokens,unlimited_months\npromo_device_0001,5,0\npromo_device_0002,0,1\nbad,1,0\n"
+
+
+class TestBulkGrantsEndpoint:
+    """Tests for POST /api/admin/grants."""
+
+    def _post(self, client, body, content_type="text/csv", key="promo-1", **params):
+        headers = {"X-Admin-Key": "s3cret", "Idempotency-Key": key, "Content-Type": content_type}
+        return client.post("/api/admin/grants", content=body, headers=headers, params=params)
+
+    def test_applies_csv(self, client, admin_settings, grant_state):
+        """Should apply a CSV upload and report the result."""
+        response = self._post(client, GRANTS_CSV)
+
+        assert response.status_code == 200
+        summary = response.json()
+        assert (summary["applied"], summary["skipped"], summary["invalid"], summary["tokens"]) == (2, 0, 1, 5)
+        assert summary["errors"] == ["line 4: device_id must be 10-100 characters"]
+        assert grant_state.get_token_status("promo_device_0001").total_tokens == 5
+        assert grant_state.get_token_status("promo_device_0002").is_unlimited == True
+
+    def test_resubmission_is_idempotent(self, client, admin_settings, grant_state):
+        """The same key should not grant twice; another key should."""
+        self._post(client, GRANTS_CSV)
+        again = self._post(client, GRANTS_CSV).json()
+        self._post(client, GRANTS_CSV, key="promo-2")
+
+        assert (again["applied"], again["skipped"]) == (0, 2)
+        assert grant_state.get_token_status("promo_device_0001").total_tokens == 10
+
+    def test_jsonl_by_content_type_or_format(self, client, admin_settings, grant_state):
+        """JSON lines should be accepted by content type or explicit format."""
+        body = '{"device_id": "promo_device_0001", "tokens": 2}\n'
+
+        assert self._post(client, body, "application/x-ndjson").json()["applied"] == 1
+        assert self._post(client, body, "text/plain", key="promo-2", format="jsonl").json()["applied"] == 1
+        assert self._post(client, body, "text/plain", key="promo-3").status_code == 415
+
+    def test_rejects_bad_header(self, client, admin_settings, grant_state):
+        """A CSV without the required columns should get 422."""
+        response = self._post(client, "id,amount\nx,1\n")
+
+        assert response.status_code == 422
+        assert response.json()["detail"].startswith("line 1")
+
+    def test_rejects_huge_months(self, client, admin_settings, grant_state):
+        """An out-of-range subscription length should be an invalid row, not a server error."""
+        body = "device_id,tokens,unlimited_months\npromo_device_0001,5,0\npromo_device_0002,0,500000\n"
+        response = self._post(client, body)
+
+        assert response.status_code == 200
+        assert (response.json()["applied"], response.json()["invalid"]) == (1, 1)
+        assert grant_state.get_token_status("promo_device_0002").is_unlimited == False
+
+    def test_requires_auth_and_key(self, client, admin_settings, grant_state):
+        """Uploads need the admin key and an idempotency key."""
+        assert client.post("/api/admin/grants", content=GRANTS_CSV).status_code == 401
+        response = client.post(
+            "/api/admin/grants", content=GRANTS_CSV,
+            headers={"X-Admin-Key": "s3cret", "Content-Type": "text/csv"},
+        )
+        assert response.status_code == 422
+
+    def test_conflict_while_running(self, client, admin_settings, grant_state):
+        """A second upload with a running key should get 409."""
+        from app.services.bulk_grants import get_grant_jobs
+        get_grant_jobs().start("promo-1")
+
+        assert self._post(client, GRANTS_CSV).status_code == 409
+
+    def test_progress(self, client, admin_settings, grant_state):
+        """The latest upload with a key should be readable."""
+        headers = {"X-Admin-Key": "s3cret"}
+        assert client.get("/api/admin/grants/promo-1", headers=headers).status_code == 404
+        self._post(client, GRANTS_CSV)
+
+        progress = client.get("/api/admin/grants/promo-1", headers=headers).json()
+
+        assert (progress["running"], progress["applied"], progress["batches"]) == (False, 2, 1)
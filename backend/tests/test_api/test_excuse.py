@@ -62,6 +62,26 @@ class TestGenerateExcuses:
         assert "excuses" in data
         assert len(data["excuses"]) == 3
     
+    def test_generate_compact(self, client, test_device_id):
+        """Compact responses should carry [text, tone, tip] lists and no request echo."""
+        with patch("app.api.excuse_router.get_excuse_service") as mock_get_service:
+            mock_service = MagicMock()
+            mock_service.generate_excuses = AsyncMock(
+                return_value=[Excuse(text="Test excuse", tone="sincere", tip="Stay calm")]
+            )
+            mock_get_service.return_value = mock_service
+            
+            response = client.post(
+                "/api/generate",
+                json={"category": "late", "device_id": test_device_id, "compact": True},
+            )
+        
+        assert response.status_code == 200
+        assert response.json() == {
+            "excuses": [["Test excuse", "sincere", "Stay calm"]],
+            "tokens_remaining": 0,
+        }
+    
     def test_generate_without_tokens_after_free_trial(self, client, test_device_id):
         """Should reject generation when no tokens and free trial used."""
         # Use free trial first
@@ -248,6 +268,274 @@ class TestGenerateExcuses:
         assert response.status_code == 503
 
 
+
+class TestPregeneratedScenarios:
+    """Tests for scenario-aware generation."""
+    
+    @pytest.fixture
+    def index(self, tmp_path):
+        from app.services.excuse_index import ExcuseIndex, build_index
+        path = str(tmp_path / "excuse_index.bin")
+        build_index(path, [
+            ("late", "normal", "en", "late-work|boss|believable|",
+             '[{"text": "Pre-generated", "tone": "sincere", "tip": "Smile"}]'),
+        ])
+        return ExcuseIndex(path)
+    
+    @pytest.fixture
+    def cache(self):
+        from app.services.excuse_cache import ExcuseCache
+        return ExcuseCache()
+    
+    @pytest.fixture
+    def mock_service(self):
+        service = MagicMock()
+        service.generate_excuses = AsyncMock(
+            return_value=[Excuse(text="Fresh", tone="test", tip="test")]
+        )
+        return service
+    
+    def _post(self, client, index, cache, mock_service, **fields):
+        with patch("app.api.excuse_router.get_excuse_index", return_value=index), \
+             patch("app.api.excuse_router.get_excuse_cache", return_value=cache), \
+             patch("app.api.excuse_router.get_excuse_service", return_value=mock_service):
+            return client.post("/api/generate", json={
+                "category": "late",
+                "urgency": "normal",
+                "device_id": "test_device_123456789",
+                **fields,
+            })
+    
+    def test_known_scenario_skips_llm(self, client, index, cache, mock_service):
+        """A pre-generated scenario tuple should be served from the index."""
+        response = self._post(
+            client, index, cache, mock_service,
+            scenario="late-work", recipient="boss", style="believable",
+        )
+        
+        assert response.status_code == 200
+        assert response.json()["excuses"][0]["text"] == "Pre-generated"
+        mock_service.generate_excuses.assert_not_called()
+    
+    def test_missing_scenario_is_generated_and_cached(self, client, index, cache, mock_service):
+        """Tuples missing from the index should be generated once, then cached."""
+        first = self._post(client, index, cache, mock_service, scenario="late-work", industry="tech")
+        second = self._post(
+            client, index, cache, mock_service,
+            scenario="late-work", industry="tech", device_id="other_device_123456789",
+        )
+        
+        assert first.json()["excuses"][0]["text"] == "Fresh"
+        assert second.json()["excuses"][0]["text"] == "Fresh"
+        mock_service.generate_excuses.assert_called_once()
+        scenario = mock_service.generate_excuses.call_args.kwargs["scenario"]
+        assert scenario.key == "late-work|||tech"
+    
+    def test_seen_excuses_not_repeated(self, client, index, cache, mock_service):
+        """A device asking again should get fresh excuses instead of the ones it was served."""
+        from app.services.token_service import get_token_service
+        get_token_service().add_tokens("test_device_123456789", 5)
+        fields = dict(scenario="late-work", recipient="boss", style="believable")
+        
+        first = self._post(client, index, cache, mock_service, **fields)
+        second = self._post(client, index, cache, mock_service, **fields)
+        other = self._post(client, index, cache, mock_service, device_id="other_device_123456789", **fields)
+        
+        assert first.json()["excuses"][0]["text"] == "Pre-generated"
+        assert second.json()["excuses"][0]["text"] == "Fresh"
+        assert other.json()["excuses"][0]["text"] == "Pre-generated"
+        mock_service.generate_excuses.assert_called_once()
+    
+    def test_partly_seen_pool_is_a_miss(self, client, index, cache, mock_service):
+        """A pool with fewer than three unseen excuses left should be regenerated, not served short."""
+        from app.services.token_service import get_token_service
+        pool = [Excuse(text=f"Cached {i}", tone="t", tip="t") for i in range(3)]
+        cache.put(("late", "normal", "en", "", "traffic"), pool)
+        get_token_service().seen.mark_seen("test_device_123456789", pool[:1])
+        
+        response = self._post(client, index, cache, mock_service, context="Traffic!")
+        other = self._post(client, index, cache, mock_service, context="Traffic!", device_id="other_device_123456789")
+        
+        assert [e["text"] for e in response.json()["excuses"]] == ["Fresh"]
+        assert other.json()["excuses"][0]["text"] == "Fresh"
+        mock_service.generate_excuses.assert_called_once()
+    
+    def test_fallback_is_not_cached(self, client, index, cache, mock_service):
+        """Unparseable completions should not be cached."""
+        mock_service.generate_excuses.return_value = [Excuse(text="raw", tone="generated", tip="")]
+        
+        self._post(client, index, cache, mock_service, scenario="wfh")
+        
+        assert len(cache) == 0
+    
+    def test_custom_context_bypasses_index(self, client, index, cache, mock_service):
+        """User context should skip the index and be cached by its canonical form."""
+        fields = dict(scenario="late-work", recipient="boss", style="believable")
+        first = self._post(client, index, cache, mock_service, context="My cat hid my keys", **fields)
+        second = self._post(
+            client, index, cache, mock_service,
+            context="  my CAT hid my keys!! ", device_id="other_device_123456789", **fields,
+        )
+        
+        assert first.json()["excuses"][0]["text"] == "Fresh"
+        assert second.json()["excuses"][0]["text"] == "Fresh"
+        mock_service.generate_excuses.assert_called_once()
+        assert mock_service.generate_excuses.call_args.kwargs["context"] == "My cat hid my keys"
+        assert list(cache._entries) == [("late", "normal", "en", "late-work|boss|believable|", "my cat hid my keys")]
+    
+    def test_context_without_scenario_cached(self, client, index, cache, mock_service):
+        """Contexts should be cached without a scenario too; blank ones count as no context."""
+        self._post(client, index, cache, mock_service, context="Traffic!")
+        self._post(client, index, cache, mock_service, context="ＴＲＡＦＦＩＣ", device_id="other_device_123456789")
+        self._post(client, index, cache, mock_service, context="?!", device_id="third_device_123456789")
+        
+        assert mock_service.generate_excuses.call_count == 2
+        assert len(cache) == 1
+    
+    def test_intent_tags(self, client, index, cache, mock_service):
+        """With intent tags on, contexts about the same situation should share an entry."""
+        from app.config import get_settings
+        with patch.object(get_settings(), "context_intent_tags", True):
+            self._post(client, index, cache, mock_service, context="stuck in a traffic jam")
+            self._post(client, index, cache, mock_service, context="Traffic", device_id="other_device_123456789")
+        
+        mock_service.generate_excuses.assert_called_once()
+        assert list(cache._entries)[0][4] == "intent:traffic"
+    
+    def test_context_cache_disabled(self, client, index, cache, mock_service):
+        """With context caching off, every context request should go to the LLM."""
+        from app.config import get_settings
+        fields = dict(scenario="late-work", recipient="boss", style="believable", context="traffic")
+        with patch.object(get_settings(), "context_cache_enabled", False):
+            self._post(client, index, cache, mock_service, **fields)
+            self._post(client, index, cache, mock_service, device_id="other_device_123456789", **fields)
+        
+        assert mock_service.generate_excuses.call_count == 2
+        assert len(cache) == 0
+    
+    async def test_concurrent_misses_coalesced(self, index, cache, mock_service):
+        """Concurrent requests for the same key should share one generation."""
+        import asyncio
+        from httpx import ASGITransport, AsyncClient
+        release = asyncio.Event()
+        
+        async def slow_generate(**kwargs):
+            await release.wait()
+            return [Excuse(text="Shared", tone="test", tip="test")]
+        
+        mock_service.generate_excuses = AsyncMock(side_effect=slow_generate)
+        with patch("app.api.excuse_router.get_excuse_index", return_value=index), \
+             patch("app.api.excuse_router.get_excuse_cache", return_value=cache), \
+             patch("app.api.excuse_router.get_excuse_service", return_value=mock_service):
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                requests = [
+                    asyncio.ensure_future(client.post("/api/generate", json={
+                        "category": "late", "urgency": "normal", "context": context, "device_id": device_id,
+                    }))
+                    for context, device_id in (("traffic", "test_device_123456789"),
+                                               ("Traffic.", "other_device_123456789"))
+                ]
+                await asyncio.sleep(0.05)
+                release.set()
+                responses = await asyncio.gather(*requests)
+        
+        assert [r.json()["excuses"][0]["text"] for r in responses] == ["Shared", "Shared"]
+        mock_service.generate_excuses.assert_called_once()
+    
+    def test_unknown_dimension_rejected(self, client, index, cache, mock_service):
+        """Unknown dimension ids should be rejected without using a token."""
+        response = self._post(client, index, cache, mock_service, scenario="late-work", style="smug")
+        
+        assert response.status_code == 422
+        assert response.json()["detail"] == "Unknown style: smug"
+        mock_service.generate_excuses.assert_not_called()
+    
+    def test_dimension_without_scenario_rejected(self, client, index, cache, mock_service):
+        """Recipient, style or industry alone should be rejected."""
+        response = self._post(client, index, cache, mock_service, recipient="boss")
+        
+        assert response.status_code == 422
+
+
+class TestGenerationMetrics:
+    """Tests for labelled generation latency."""
+    
+    def _count(self, **labels):
+        from prometheus_client import REGISTRY
+        labels = {"tool": "ai-excuse-generator", "category": "late", "language": "en",
+                  "urgency": "normal", "cache": "none", "outcome": "ok", **labels}
+        return REGISTRY.get_sample_value("generation_latency_seconds_count", labels) or 0
+    
+    def _post(self, client, device_id, service, **fields):
+        with patch("app.api.excuse_router.get_excuse_service", return_value=service):
+            return client.post("/api/generate", json={
+                "category": "late", "urgency": "normal", "device_id": device_id, **fields,
+            })
+    
+    def _service(self, **kwargs):
+        service = MagicMock()
+        service.generate_excuses = AsyncMock(**kwargs)
+        return service
+    
+    def test_ok_and_payment_required(self, client, test_device_id):
+        """Successful and refused requests should be recorded by outcome."""
+        service = self._service(return_value=[Excuse(text="t", tone="t", tip="t")])
+        ok, refused = self._count(), self._count(outcome="payment_required")
+        
+        self._post(client, test_device_id, service)
+        self._post(client, test_device_id, service)
+        
+        assert self._count() == ok + 1
+        assert self._count(outcome="payment_required") == refused + 1
+    
+    def test_parse_fallback(self, client, test_device_id):
+        """Unparseable completions should be recorded as parse_fallback."""
+        service = self._service(return_value=[Excuse(text="raw", tone="generated", tip="")])
+        before = self._count(outcome="parse_fallback", language="other")
+        
+        self._post(client, test_device_id, service, language="tlh")
+        
+        assert self._count(outcome="parse_fallback", language="other") == before + 1
+    
+    def test_upstream_error(self, client, test_device_id):
+        """LLM failures should be recorded as upstream_error."""
+        service = self._service(side_effect=RuntimeError("boom"))
+        before = self._count(outcome="upstream_error")
+        
+        self._post(client, test_device_id, service)
+        
+        assert self._count(outcome="upstream_error") == before + 1
+    
+    def test_cache_label_and_exemplar(self, client, test_device_id):
+        """Scenario requests should be labelled by cache result and carry a trace exemplar."""
+        from app.services.excuse_cache import ExcuseCache
+        service = self._service(return_value=[Excuse(text="t", tone="t", tip="t")])
+        before = self._count(cache="miss")
+        
+        with patch("app.api.excuse_router.get_excuse_cache", return_value=ExcuseCache()):
+            response = self._post(client, test_device_id, service, scenario="late-work")
+        
+        assert self._count(cache="miss") == before + 1
+        metrics = client.get("/api/metrics", headers={"Accept": "application/openmetrics-text"}).text
+        assert f'trace_id="{response.headers["x-trace-id"]}"' in metrics
+    
+    def test_usage_events(self, client, test_device_id):
+        """Each request should record a usage event with what paid for it."""
+        usage = MagicMock()
+        service = self._service(return_value=[Excuse(text="t", tone="t", tip="t")])
+        
+        with patch("app.api.excuse_router.get_usage_log", return_value=usage):
+            self._post(client, test_device_id, service, language="zh")
+            self._post(client, test_device_id, service)
+        
+        events = [c.args for c in usage.record.call_args_list]
+        assert [e[:6] for e in events] == [
+            ("late", "normal", "zh", "free_trial", "none", "ok"),
+            ("late", "normal", "en", "none", "none", "payment_required"),
+        ]
+        assert all(e[6] > 0 for e in events)
+
+
 class TestCategories:
     """Tests for GET /api/categories endpoint."""
     
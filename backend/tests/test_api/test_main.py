@@ -1,6 +1,7 @@
 """Tests for main application endpoints."""
 import pytest
 from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
 
 from app.main import app
 
@@ -32,6 +33,107 @@ class TestHealthEndpoint:
         assert data["service"] == "AI Excuse Generator"
 
 
+class TestReadyEndpoint:
+    """Tests for /ready endpoint."""
+    
+    @pytest.fixture(autouse=True)
+    def reset_prober(self):
+        """Reset the readiness prober singleton."""
+        import app.core.readiness as rd
+        rd._readiness_prober = None
+        yield
+        rd._readiness_prober = None
+    
+    def test_ready_returns_503_before_first_probe(self, client):
+        """Should not be ready until dependencies have been probed."""
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "not_ready"
+    
+    def test_ready_returns_200_when_dependencies_up(self, client):
+        """Should be ready once critical probes pass."""
+        from app.core.readiness import get_readiness_prober
+        prober = get_readiness_prober()
+        prober._ready = True
+        prober._results = {"llm": {"ok": True}}
+        
+        response = client.get("/ready")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "ready"
+        assert data["checks"]["llm"]["ok"] == True
+    
+    def test_lifespan_manages_prober(self):
+        """Lifespan should start and stop the prober."""
+        from app.core.readiness import get_readiness_prober
+        prober = get_readiness_prober()
+        
+        with patch.object(prober, "start", new_callable=AsyncMock) as mock_start:
+            with patch.object(prober, "stop", new_callable=AsyncMock) as mock_stop:
+                with TestClient(app):
+                    mock_start.assert_awaited_once()
+                mock_stop.assert_awaited_once()
+
+
+class TestMetricsEndpoint:
+    """Tests for /api/metrics endpoint."""
+    
+    def test_prometheus_text_by_default(self, client):
+        """Plain scrapers should get the Prometheus text format."""
+        response = client.get("/api/metrics")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "generation_latency_seconds" in response.text
+    
+    def test_openmetrics_when_accepted(self, client):
+        """OpenMetrics scrapers should get the OpenMetrics format."""
+        response = client.get("/api/metrics", headers={"Accept": "application/openmetrics-text"})
+        
+        assert response.headers["content-type"].startswith("application/openmetrics-text")
+        assert response.text.endswith("# EOF\n")
+
+
+class TestMiddlewareStack:
+    """Tests for CORS and instrumentation settings."""
+    
+    def test_preflight_from_allowed_origin(self, client):
+        """Allowed origins should get a cacheable preflight answer."""
+        response = client.options(
+            "/api/generate",
+            headers={
+                "Origin": "https://excuse.demo.densematrix.ai",
+                "Access-Control-Request-Method": "POST",
+                "Access-Control-Request-Headers": "content-type",
+            },
+        )
+        
+        assert response.status_code == 200
+        assert response.headers["access-control-allow-origin"] == "https://excuse.demo.densematrix.ai"
+        assert response.headers["access-control-max-age"] == "86400"
+        assert "x-trace-id" not in response.headers
+    
+    def test_preflight_from_other_origin(self, client):
+        """Origins off the allow-list should be refused."""
+        response = client.options(
+            "/api/generate",
+            headers={"Origin": "https://evil.example", "Access-Control-Request-Method": "POST"},
+        )
+        
+        assert response.status_code == 400
+        assert "access-control-allow-origin" not in response.headers
+    
+    def test_probes_not_instrumented(self, client):
+        """Probe and scrape requests should stay out of the HTTP metrics."""
+        client.get("/health")
+        client.get("/api/categories")
+        
+        metrics = client.get("/api/metrics").text
+        assert 'handler="/api/categories"' in metrics
+        assert 'handler="/health"' not in metrics
+        assert 'handler="/api/metrics"' not in metrics
+
+
 class TestRootEndpoint:
     """Tests for / endpoint."""
     
@@ -34,6 +34,7 @@ def mock_creem_settings():
     mock_settings = MagicMock()
     mock_settings.creem_api_key = "creem_test_mock_key"
     mock_settings.creem_webhook_secret = None
+    mock_settings.creem_api_base = None
     mock_settings.creem_product_id_3 = "prod_test_3"
     mock_settings.creem_product_id_10 = "prod_test_10"
     return mock_settings
@@ -270,6 +271,78 @@ class TestWebhook:
             )
         
         assert response.status_code == 200
+    
+    def test_webhook_missing_signature(self, client, test_device_id):
+        """Should reject unsigned webhooks when secret is configured."""
+        payload = {
+            "eventType": "checkout.completed",
+            "object": {
+                "metadata": {
+                    "device_id": test_device_id,
+                    "product_type": "pack_10",
+                },
+            },
+        }
+        
+        mock_settings = MagicMock()
+        mock_settings.creem_webhook_secret = "test_secret"
+        
+        with patch("app.api.payment_router.get_settings", return_value=mock_settings):
+            response = client.post("/api/webhook", json=payload)
+        
+        assert response.status_code == 401
+        assert client.get(f"/api/tokens/{test_device_id}").json()["total_tokens"] == 0
+    
+    def test_webhook_redelivery_credits_once(self, client, test_device_id):
+        """Should credit a redelivered checkout only once."""
+        payload = {
+            "eventType": "checkout.completed",
+            "object": {
+                "id": "ch_redelivered",
+                "metadata": {
+                    "device_id": test_device_id,
+                    "product_type": "pack_10",
+                },
+            },
+        }
+        
+        first = client.post("/api/webhook", json=payload)
+        second = client.post("/api/webhook", json=payload)
+        
+        assert first.json() == {"received": True}
+        assert second.status_code == 200
+        assert second.json()["duplicate"] == True
+        assert client.get(f"/api/tokens/{test_device_id}").json()["total_tokens"] == 10
+    
+    def test_webhook_distinct_checkouts_both_credited(self, client, test_device_id):
+        """Should credit separate checkouts for the same device."""
+        for checkout_id in ("ch_first", "ch_second"):
+            client.post("/api/webhook", json={
+                "eventType": "checkout.completed",
+                "object": {
+                    "id": checkout_id,
+                    "metadata": {"device_id": test_device_id, "product_type": "pack_3"},
+                },
+            })
+        
+        assert client.get(f"/api/tokens/{test_device_id}").json()["total_tokens"] == 6
+
+
+class TestCreemApiBase:
+    """Tests for the Creem API base URL."""
+    
+    def test_key_selects_api(self):
+        """Should pick the test or live API from the key."""
+        from app.api.payment_router import get_creem_api_base
+        
+        assert get_creem_api_base("creem_test_x") == "https://test-api.creem.io/v1"
+        assert get_creem_api_base("creem_live_x") == "https://api.creem.io/v1"
+    
+    def test_override(self):
+        """Should prefer an explicit base URL."""
+        from app.api.payment_router import get_creem_api_base
+        
+        assert get_creem_api_base("creem_live_x", "http://localhost:8082/v1/") == "http://localhost:8082/v1"
 
 
 class TestGetProducts:
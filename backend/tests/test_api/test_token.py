@@ -82,3 +82,66 @@ class TestCanGenerate:
         assert "free_trial_available" in data
         assert "tokens_remaining" in data
         assert "is_unlimited" in data
+
+
+class TestConditionalGet:
+    """Tests for ETag support on the polling endpoints."""
+    
+    @pytest.mark.parametrize("suffix", ["", "/can-generate"])
+    def test_returns_etag(self, client, test_device_id, suffix):
+        """Responses should carry an ETag and require revalidation."""
+        response = client.get(f"/api/tokens/{test_device_id}{suffix}")
+        
+        assert response.status_code == 200
+        assert response.headers["etag"].startswith('W/"')
+        assert response.headers["cache-control"] == "no-cache"
+    
+    @pytest.mark.parametrize("suffix", ["", "/can-generate"])
+    def test_not_modified_when_etag_matches(self, client, test_device_id, suffix):
+        """Should return 304 with no body when nothing changed."""
+        etag = client.get(f"/api/tokens/{test_device_id}{suffix}").headers["etag"]
+        
+        response = client.get(
+            f"/api/tokens/{test_device_id}{suffix}",
+            headers={"If-None-Match": etag},
+        )
+        
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+    
+    def test_not_modified_with_etag_list(self, client, test_device_id):
+        """Should match an ETag inside a list."""
+        etag = client.get(f"/api/tokens/{test_device_id}").headers["etag"]
+        
+        response = client.get(
+            f"/api/tokens/{test_device_id}",
+            headers={"If-None-Match": f'W/"other", {etag}'},
+        )
+        
+        assert response.status_code == 304
+    
+    def test_wildcard_matches(self, client, test_device_id):
+        """If-None-Match: * should match any current representation."""
+        response = client.get(
+            f"/api/tokens/{test_device_id}",
+            headers={"If-None-Match": "*"},
+        )
+        
+        assert response.status_code == 304
+    
+    def test_modified_after_write(self, client, test_device_id):
+        """A write should invalidate the previous ETag."""
+        etag = client.get(f"/api/tokens/{test_device_id}").headers["etag"]
+        
+        from app.services.token_service import get_token_service
+        get_token_service().add_tokens(test_device_id, 10)
+        
+        response = client.get(
+            f"/api/tokens/{test_device_id}",
+            headers={"If-None-Match": etag},
+        )
+        
+        assert response.status_code == 200
+        assert response.json()["total_tokens"] == 10
+        assert response.headers["etag"] != etag
@@ -0,0 +1,164 @@
+"""Tests for response compression."""
+import gzip
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.main import app
+from app.core.compression import CompressionMiddleware, negotiate
+
+JSON = [(b"content-type", b"application/json")]
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+async def _run(body, headers=JSON, accept="gzip", more_body=False, **kwargs):
+    """Run one response through the middleware; returns (start, body messages)."""
+    async def inner(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": list(headers)})
+        await send({"type": "http.response.body", "body": body, "more_body": more_body})
+        if more_body:
+            await send({"type": "http.response.body", "body": b"tail"})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept.encode())]}
+    await CompressionMiddleware(inner, minimum_size=kwargs.pop("minimum_size", 100), **kwargs)(scope, None, send)
+    start, *bodies = sent
+    return dict(start["headers"]), bodies
+
+
+class TestNegotiate:
+    """Tests for Accept-Encoding negotiation."""
+
+    @pytest.mark.parametrize("header,brotli_available,expected", [
+        ("gzip, deflate, br", True, "br"),
+        ("gzip, deflate, br", False, "gzip"),
+        ("br;q=0.5, gzip", True, "gzip"),
+        ("gzip;q=0, identity", False, None),
+        ("*", True, "br"),
+        ("*;q=0.1, gzip;q=0", False, None),
+        ("GZIP ; q=0.8", False, "gzip"),
+        ("gzip;q=oops", False, None),
+        ("", True, None),
+    ])
+    def test_negotiate(self, header, brotli_available, expected):
+        """Should pick the highest-weighted supported encoding."""
+        assert negotiate(header, brotli_available) == expected
+
+
+class TestCompressionMiddleware:
+    """Tests for CompressionMiddleware."""
+
+    async def test_compresses_large_json(self):
+        """Large JSON bodies should be gzipped with matching headers."""
+        body = b'{"excuses": [' + b'"my cat sat on the keyboard", ' * 20 + b'""]}'
+        headers, bodies = await _run(body, JSON + [(b"etag", b'"abc"')])
+
+        assert headers[b"content-encoding"] == b"gzip"
+        assert headers[b"vary"] == b"Accept-Encoding"
+        assert headers[b"etag"] == b'W/"abc"'
+        assert int(headers[b"content-length"]) == len(bodies[0]["body"])
+        assert gzip.decompress(bodies[0]["body"]) == body
+
+    async def test_small_bodies_untouched(self):
+        """Bodies under the threshold should pass through without Vary."""
+        headers, bodies = await _run(b'{"remaining_tokens": 3}')
+
+        assert b"content-encoding" not in headers
+        assert b"vary" not in headers
+        assert bodies[0]["body"] == b'{"remaining_tokens": 3}'
+
+    @pytest.mark.parametrize("headers,more_body", [
+        ([(b"content-type", b"image/png")], False),
+        (JSON + [(b"content-encoding", b"gzip")], False),
+        (JSON, True),
+    ])
+    async def test_passthrough(self, headers, more_body):
+        """Binary, already-encoded and streamed bodies should pass through."""
+        result, bodies = await _run(b"x" * 1000, headers, more_body=more_body)
+
+        assert b"vary" not in result
+        assert [b["body"] for b in bodies][:1] == [b"x" * 1000]
+
+    async def test_not_accepted(self):
+        """Without an accepted encoding the body stays as is but still varies."""
+        headers, bodies = await _run(b"x" * 1000, accept="identity")
+
+        assert headers[b"vary"] == b"Accept-Encoding"
+        assert b"content-encoding" not in headers
+        assert bodies[0]["body"] == b"x" * 1000
+
+    async def test_incompressible_sent_as_is(self):
+        """A body that gzip would grow should go out uncompressed."""
+        body = os.urandom(1000)
+        headers, bodies = await _run(body, [(b"content-type", b"text/plain")])
+
+        assert b"content-encoding" not in headers
+        assert bodies[0]["body"] == body
+
+    async def test_brotli(self):
+        """Brotli should be used when installed and accepted."""
+        with patch("app.core.compression.brotli") as brotli:
+            brotli.compress.return_value = b"tiny"
+            headers, bodies = await _run(b"x" * 1000, accept="br, gzip", brotli_quality=5)
+
+        brotli.compress.assert_called_once_with(b"x" * 1000, quality=5)
+        assert headers[b"content-encoding"] == b"br"
+        assert bodies[0]["body"] == b"tiny"
+
+    def test_etag_bodies_cached(self):
+        """Compressed forms of ETag'd bodies should be reused."""
+        middleware = CompressionMiddleware(None, minimum_size=10)
+        with patch.object(middleware, "compress", wraps=middleware.compress) as compress:
+            first = middleware.compress_cached(b"x" * 100, "gzip")
+            second = middleware.compress_cached(b"x" * 100, "gzip")
+
+        assert first == second
+        assert compress.call_count == 1
+
+    async def test_disabled_and_non_http(self):
+        """Disabled middleware and non-HTTP scopes should go straight through."""
+        calls = []
+
+        async def inner(scope, receive, send):
+            calls.append(send)
+
+        middleware = CompressionMiddleware(inner)
+        await middleware({"type": "lifespan"}, None, "send")
+        middleware.enabled = False
+        await middleware({"type": "http", "headers": []}, None, "send")
+
+        assert calls == ["send", "send"]
+
+
+class TestCompressionEndpoints:
+    """Compression through the app."""
+
+    def test_catalog_compressed(self, client):
+        """Catalogs should be gzipped and revalidate against the weak ETag."""
+        response = client.get("/api/categories", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.json()["categories"]) == 8
+        etag = response.headers["etag"]
+        assert etag.startswith("W/")
+
+        revalidated = client.get("/api/categories", headers={"If-None-Match": etag})
+
+        assert revalidated.status_code == 304
+
+    def test_token_status_uncompressed(self, client):
+        """Small token status responses should not be compressed."""
+        response = client.get("/api/tokens/test_device_123456789", headers={"Accept-Encoding": "gzip"})
+
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
@@ -0,0 +1,142 @@
+"""Tests for the event loop monitor and blocking-call detector."""
+import asyncio
+import logging
+import os
+import socket
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+
+import app.core.loop_monitor as lm
+from app.core.loop_monitor import BlockingCallError, LoopMonitor, blocking_call_detector, get_loop_monitor
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestLoopMonitor:
+    """Tests for LoopMonitor class."""
+
+    @pytest.mark.asyncio
+    async def test_reports_blocking_callback_with_stack(self, caplog):
+        """A stalled loop should be logged with the blocking stack and show up as lag."""
+        monitor = LoopMonitor(interval=0.01, threshold=0.05)
+        await monitor.start()
+        await asyncio.sleep(0.03)
+
+        with caplog.at_level(logging.WARNING, logger="app.core.loop_monitor"):
+            _spin(0.2)
+            await asyncio.sleep(0.03)
+        await monitor.stop()
+
+        assert monitor.blocked == 1
+        assert "Event loop blocked" in caplog.text
+        assert "_spin" in caplog.text
+        assert monitor.quantiles()[0.99] > 0.1
+
+    @pytest.mark.asyncio
+    async def test_start_and_stop_are_idempotent(self):
+        """Repeated start/stop calls should be harmless."""
+        monitor = LoopMonitor(interval=0.01)
+        await monitor.stop()
+        await monitor.start()
+        task = monitor._task
+        await monitor.start()
+
+        assert monitor._task is task
+        await monitor.stop()
+        assert monitor._task is None
+
+    def test_quantiles(self):
+        """Percentiles should come from the recent window."""
+        monitor = LoopMonitor(window=100)
+        assert monitor.quantiles() == {0.5: 0.0, 0.9: 0.0, 0.99: 0.0}
+
+        monitor.lags.extend(i / 1000 for i in range(101, 201))
+
+        quantiles = monitor.quantiles()
+        assert quantiles[0.5] == pytest.approx(0.15, abs=0.002)
+        assert quantiles[0.99] == pytest.approx(0.199, abs=0.001)
+
+    def test_singleton_enables_blocking_check(self):
+        """The singleton should follow settings, including the debug check."""
+        settings = MagicMock(loop_monitor_interval=0.5, loop_block_threshold=0.2, loop_blocking_check=True)
+        lm._loop_monitor = None
+        try:
+            with patch("app.core.loop_monitor.get_settings", return_value=settings), \
+                 patch.object(blocking_call_detector, "enable") as enable:
+                monitor = get_loop_monitor()
+                assert get_loop_monitor() is monitor
+            assert monitor.interval == 0.5
+            enable.assert_called_once_with()
+        finally:
+            lm._loop_monitor = None
+
+
+class TestBlockingCallDetector:
+    """Tests for the audit-hook detector (enabled for every test in conftest)."""
+
+    @pytest.mark.asyncio
+    async def test_sleep_on_loop_raises(self):
+        """time.sleep on the loop should fail the test."""
+        with pytest.raises(BlockingCallError, match="time.sleep"):
+            time.sleep(0.001)
+
+    @pytest.fixture
+    def existing_file(self, tmp_path):
+        path = tmp_path / "data.txt"
+        path.write_bytes(b"x")
+        return path
+
+    @pytest.mark.asyncio
+    async def test_file_writes_flagged_reads_allowed(self, existing_file):
+        """Opening files for writing should be flagged; reads should not."""
+        with pytest.raises(BlockingCallError, match="open"):
+            open(existing_file, "w")
+        with open(existing_file, "rb") as f:
+            assert f.read() == b"x"
+
+    @pytest.mark.asyncio
+    async def test_sockets(self):
+        """Blocking connects should be flagged; non-blocking ones are fine."""
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        address = listener.getsockname()
+        nonblocking, blocking = socket.socket(), socket.socket()
+        try:
+            nonblocking.setblocking(False)
+            nonblocking.connect_ex(address)
+            with pytest.raises(BlockingCallError, match="socket.connect"):
+                blocking.connect(address)
+        finally:
+            for sock in (listener, nonblocking, blocking):
+                sock.close()
+
+    @pytest.mark.asyncio
+    async def test_os_open_flags(self):
+        """Low-level opens should be judged by their flags."""
+        blocking_call_detector._hook("open", ("data.txt", None, os.O_RDONLY))
+        blocking_call_detector._hook("os.listdir", (".",))
+
+        with pytest.raises(BlockingCallError):
+            blocking_call_detector._hook("open", ("data.txt", None, os.O_WRONLY | os.O_CREAT))
+
+    def test_calls_off_the_loop_are_allowed(self):
+        """Blocking calls outside a running loop are not the detector's concern."""
+        time.sleep(0.001)
+
+    @pytest.mark.asyncio
+    async def test_warn_mode_logs(self, caplog):
+        """Warn mode should log the call site instead of raising."""
+        blocking_call_detector.enable(raise_on_violation=False)
+        before = blocking_call_detector.violations
+
+        with caplog.at_level(logging.WARNING, logger="app.core.loop_monitor"):
+            time.sleep(0.001)
+
+        assert blocking_call_detector.violations == before + 1
+        assert "test_warn_mode_logs" in caplog.text
@@ -0,0 +1,94 @@
+"""Tests for the sampling profiler."""
+import asyncio
+import threading
+import time
+import pytest
+
+from app.core.profiler import IDLE_FRAME, SamplingProfiler, profile_event_loop
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def busy_task():
+    for _ in range(20):
+        _spin(0.01)
+        await asyncio.sleep(0)
+
+
+async def waiting_task(event):
+    await event.wait()
+
+
+class TestSamplingProfiler:
+    """Tests for SamplingProfiler class."""
+
+    def test_sample_thread_stack(self):
+        """A sample should record the target thread's stack, outermost first."""
+        profiler = SamplingProfiler(threading.get_ident())
+
+        profiler.sample()
+
+        (stack,) = profiler.stacks
+        assert stack[-1].startswith("SamplingProfiler.sample (core/profiler.py:")
+        assert any("test_sample_thread_stack" in frame for frame in stack)
+        assert profiler.collapsed().endswith(" 1\n")
+
+    def test_unknown_thread_is_skipped(self):
+        """Sampling a thread that doesn't exist should record nothing."""
+        profiler = SamplingProfiler(-1)
+
+        profiler.sample()
+
+        assert profiler.samples == 0
+        assert profiler.collapsed() == ""
+
+    def test_idle_samples_are_hidden_by_default(self):
+        """Samples with no running task should only appear with include_idle."""
+        profiler = SamplingProfiler(threading.get_ident())
+        profiler.stacks[(IDLE_FRAME, "select")] = 3
+        profiler.stacks[("task:handler", "work")] = 2
+
+        assert profiler.collapsed() == "task:handler;work 2\n"
+        assert profiler.collapsed(include_idle=True).startswith("(idle);select 3\n")
+
+
+class TestProfileEventLoop:
+    """Tests for profiling the running loop."""
+
+    @pytest.mark.asyncio
+    async def test_cpu_samples_are_rooted_at_task(self):
+        """On-CPU samples should be attributed to the running task."""
+        task = asyncio.create_task(busy_task())
+
+        collapsed = await profile_event_loop(0.15, rate=200)
+        await task
+
+        assert "task:busy_task;" in collapsed
+        assert "_spin (" in collapsed
+
+    @pytest.mark.asyncio
+    async def test_wall_mode_records_suspended_tasks(self):
+        """Wall mode should include where suspended tasks are waiting."""
+        event = asyncio.Event()
+        task = asyncio.create_task(waiting_task(event))
+        await asyncio.sleep(0)
+
+        collapsed = await profile_event_loop(0.05, rate=200, mode="wall")
+        event.set()
+        await task
+
+        assert "task:waiting_task;(await);waiting_task (" in collapsed
+
+    @pytest.mark.asyncio
+    async def test_one_profile_at_a_time(self):
+        """A second concurrent profile should be refused."""
+        first = asyncio.create_task(profile_event_loop(0.05))
+        await asyncio.sleep(0)
+
+        with pytest.raises(RuntimeError):
+            await profile_event_loop(0.05)
+        await first
@@ -0,0 +1,255 @@
+"""Tests for rate limiting."""
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.main import app
+from app.core.rate_limit import (
+    InMemoryBucketStore,
+    RateLimitBackend,
+    RateLimitMiddleware,
+    RateLimitPolicy,
+    RedisBucketStore,
+    get_client_ip,
+    get_rate_limit_backend,
+)
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_services():
+    """Reset singleton services after each test."""
+    import app.services.token_service as ts
+    ts._token_service = None
+    yield
+    ts._token_service = None
+
+
+class TestInMemoryBucketStore:
+    """Tests for InMemoryBucketStore class."""
+
+    def test_allows_up_to_burst(self):
+        """Should allow exactly burst requests at once."""
+        store = InMemoryBucketStore()
+        results = [store.consume("k", rate=1.0, burst=3, now=100.0) for _ in range(4)]
+
+        assert results[:3] == [0.0, 0.0, 0.0]
+        assert results[3] > 0
+
+    def test_retry_after_matches_refill(self):
+        """Retry delay should be the time until one token refills."""
+        store = InMemoryBucketStore()
+        store.consume("k", rate=0.5, burst=1, now=100.0)
+
+        assert store.consume("k", rate=0.5, burst=1, now=100.0) == pytest.approx(2.0)
+
+    def test_refills_over_time(self):
+        """Buckets should refill at the configured rate."""
+        store = InMemoryBucketStore()
+        store.consume("k", rate=1.0, burst=1, now=100.0)
+
+        assert store.consume("k", rate=1.0, burst=1, now=100.5) > 0
+        assert store.consume("k", rate=1.0, burst=1, now=101.6) == 0.0
+
+    def test_refill_capped_at_burst(self):
+        """Idle buckets should never exceed their capacity."""
+        store = InMemoryBucketStore()
+        store.consume("k", rate=1.0, burst=2, now=0.0)
+        results = [store.consume("k", rate=1.0, burst=2, now=1000.0) for _ in range(3)]
+
+        assert results == [0.0, 0.0, pytest.approx(1.0)]
+
+    def test_keys_are_independent(self):
+        """Different keys should have separate buckets."""
+        store = InMemoryBucketStore()
+        store.consume("a", rate=1.0, burst=1, now=0.0)
+
+        assert store.consume("b", rate=1.0, burst=1, now=0.0) == 0.0
+
+    def test_memory_bounded(self):
+        """Store should evict least recently used buckets past max_keys."""
+        store = InMemoryBucketStore(max_keys=64, shards=4)
+        for i in range(1000):
+            store.consume(f"key-{i}", rate=1.0, burst=1, now=0.0)
+
+        assert len(store) <= 64
+
+    def test_shard_count_rounded_to_power_of_two(self):
+        """Shard selection should use a bit mask."""
+        store = InMemoryBucketStore(shards=10)
+
+        assert len(store._locks) == 16
+
+    @pytest.mark.asyncio
+    async def test_acquire(self):
+        """Async acquire should delegate to consume."""
+        store = InMemoryBucketStore()
+
+        assert await store.acquire("k", 1.0, 1) == 0.0
+        assert await store.acquire("k", 1.0, 1) > 0
+
+
+class TestRedisBucketStore:
+    """Tests for RedisBucketStore class."""
+
+    @pytest.mark.asyncio
+    async def test_acquire_runs_script(self):
+        """Should evaluate the Lua script against the prefixed key."""
+        redis_client = MagicMock()
+        redis_client.eval = AsyncMock(return_value=b"1.5")
+        store = RedisBucketStore(redis_client)
+
+        retry = await store.acquire("generate_ip:1.2.3.4", 0.5, 10)
+
+        assert retry == 1.5
+        args = redis_client.eval.await_args.args
+        assert args[1:] == (1, "ratelimit:generate_ip:1.2.3.4", 0.5, 10)
+
+    @pytest.mark.asyncio
+    async def test_fails_open_when_unreachable(self):
+        """Connection errors should allow the request instead of failing it."""
+        redis_client = MagicMock()
+        redis_client.eval = AsyncMock(side_effect=ConnectionRefusedError("redis down"))
+        store = RedisBucketStore(redis_client)
+
+        assert await store.acquire("generate_ip:1.2.3.4", 0.5, 10) == 0.0
+
+    def test_backend_is_abstract(self):
+        """The backend interface should not be instantiable."""
+        with pytest.raises(TypeError):
+            RateLimitBackend()
+
+
+class TestGetClientIp:
+    """Tests for client address resolution."""
+
+    def test_uses_real_ip_header_behind_proxy(self):
+        """Should use X-Real-IP when trusting the proxy."""
+        scope = {"headers": [(b"x-real-ip", b"9.9.9.9")], "client": ("10.0.0.1", 1234)}
+
+        assert get_client_ip(scope, trust_proxy=True) == "9.9.9.9"
+
+    def test_ignores_header_when_not_trusted(self):
+        """Should use the socket address when not trusting the proxy."""
+        scope = {"headers": [(b"x-real-ip", b"9.9.9.9")], "client": ("10.0.0.1", 1234)}
+
+        assert get_client_ip(scope, trust_proxy=False) == "10.0.0.1"
+
+    def test_missing_client(self):
+        """Should fall back when the server gives no client address."""
+        assert get_client_ip({"headers": []}, trust_proxy=True) == "unknown"
+
+
+class TestRateLimitMiddleware:
+    """Tests for RateLimitMiddleware on the app."""
+
+    def test_polling_device_throttled(self, client):
+        """Aggressive polling of one device should get 429 with Retry-After."""
+        device_id = "test_device_123456789"
+        codes = [client.get(f"/api/tokens/{device_id}/can-generate").status_code for _ in range(15)]
+
+        assert codes[0] == 200
+        assert 429 in codes
+
+        response = client.get(f"/api/tokens/{device_id}")
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        assert "Too many requests" in response.json()["detail"]
+
+    def test_generate_throttled_per_ip_across_devices(self, client):
+        """Rotating device IDs from one address should still be throttled."""
+        with patch("app.api.excuse_router.get_excuse_service") as mock_get_service:
+            mock_service = MagicMock()
+            mock_service.generate_excuses = AsyncMock(return_value=[])
+            mock_get_service.return_value = mock_service
+
+            codes = [
+                client.post(
+                    "/api/generate",
+                    json={"category": "late", "device_id": f"farm_device_{i:010d}"},
+                ).status_code
+                for i in range(15)
+            ]
+
+        assert codes[0] == 200
+        assert codes[-1] == 429
+
+    @pytest.mark.parametrize("device_id", ["short", "d" * 101])
+    def test_malformed_device_id_rejected(self, client, device_id):
+        """Bad device ids in the path should get 400 without taking a bucket."""
+        import app.core.rate_limit as rl
+        response = client.get(f"/api/tokens/{device_id}/can-generate")
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid device_id"
+        assert rl._rate_limit_backend is None
+
+    def test_unmatched_routes_not_limited(self, client):
+        """Routes without a policy should pass through."""
+        codes = {client.get("/api/categories").status_code for _ in range(50)}
+
+        assert codes == {200}
+
+    @pytest.mark.asyncio
+    async def test_disabled_passes_through(self):
+        """Disabled middleware should not consult the backend."""
+        inner = AsyncMock()
+        middleware = RateLimitMiddleware(inner, policies=[
+            RateLimitPolicy("all", ("GET",), r"^/", "ip", 0.001, 1),
+        ])
+        middleware.enabled = False
+        scope = {"type": "http", "method": "GET", "path": "/x", "headers": []}
+
+        for _ in range(3):
+            await middleware(scope, None, None)
+
+        assert inner.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_non_http_scope_passes_through(self):
+        """Lifespan and websocket scopes should bypass the limiter."""
+        inner = AsyncMock()
+        middleware = RateLimitMiddleware(inner)
+
+        await middleware({"type": "lifespan"}, None, None)
+
+        inner.assert_awaited_once()
+
+
+class TestGetRateLimitBackend:
+    """Tests for get_rate_limit_backend singleton."""
+
+    def test_returns_in_memory_by_default(self):
+        """Should use the in-memory store without a Redis URL."""
+        backend = get_rate_limit_backend()
+
+        assert isinstance(backend, InMemoryBucketStore)
+        assert get_rate_limit_backend() is backend
+
+    def test_redis_url_requires_package(self):
+        """Should fail clearly when Redis is configured but unavailable."""
+        mock_settings = MagicMock()
+        mock_settings.rate_limit_redis_url = "redis://localhost:6379/0"
+
+        with patch("app.core.rate_limit.get_settings", return_value=mock_settings):
+            with patch.dict("sys.modules", {"redis": None, "redis.asyncio": None}):
+                with pytest.raises(RuntimeError):
+                    get_rate_limit_backend()
+
+    def test_redis_url_uses_shared_backend(self):
+        """Should build a Redis-backed store when configured."""
+        mock_settings = MagicMock()
+        mock_settings.rate_limit_redis_url = "redis://localhost:6379/0"
+        fake_redis = MagicMock()
+        fake_package = MagicMock(asyncio=fake_redis)
+
+        with patch("app.core.rate_limit.get_settings", return_value=mock_settings):
+            with patch.dict("sys.modules", {"redis": fake_package, "redis.asyncio": fake_redis}):
+                backend = get_rate_limit_backend()
+
+        assert isinstance(backend, RedisBucketStore)
+        fake_redis.from_url.assert_called_once_with("redis://localhost:6379/0")
@@ -0,0 +1,163 @@
+"""Tests for the readiness prober."""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.core.readiness import (
+    ReadinessProber,
+    check_creem,
+    check_llm,
+    check_token_store,
+    get_readiness_prober,
+)
+
+
+async def _ok():
+    return None
+
+
+async def _fail():
+    raise RuntimeError("connection refused")
+
+
+async def _hang():
+    await asyncio.sleep(10)
+
+
+class TestReadinessProber:
+    """Tests for ReadinessProber class."""
+
+    def test_not_ready_before_first_probe(self):
+        """Should report not ready until a probe has completed."""
+        prober = ReadinessProber(checks={"llm": _ok}, critical=["llm"])
+        ready, checks = prober.status()
+
+        assert ready == False
+        assert checks == {}
+
+    @pytest.mark.asyncio
+    async def test_ready_when_critical_checks_pass(self):
+        """Should be ready when all critical checks pass."""
+        prober = ReadinessProber(checks={"llm": _ok, "store": _ok}, critical=["llm", "store"])
+        await prober.probe_once()
+        ready, checks = prober.status()
+
+        assert ready == True
+        assert checks["llm"]["ok"] == True
+        assert "latency_ms" in checks["llm"]
+
+    @pytest.mark.asyncio
+    async def test_not_ready_when_critical_check_fails(self):
+        """Should not be ready when a critical check fails."""
+        prober = ReadinessProber(checks={"llm": _fail}, critical=["llm"])
+        await prober.probe_once()
+        ready, checks = prober.status()
+
+        assert ready == False
+        assert "connection refused" in checks["llm"]["error"]
+
+    @pytest.mark.asyncio
+    async def test_non_critical_failure_keeps_ready(self):
+        """Non-critical failures should be reported but not affect readiness."""
+        prober = ReadinessProber(checks={"llm": _ok, "creem": _fail}, critical=["llm"])
+        await prober.probe_once()
+        ready, checks = prober.status()
+
+        assert ready == True
+        assert checks["creem"]["ok"] == False
+        assert checks["creem"]["critical"] == False
+
+    @pytest.mark.asyncio
+    async def test_check_timeout(self):
+        """Slow checks should time out and count as failures."""
+        prober = ReadinessProber(checks={"llm": _hang}, critical=["llm"], timeout=0.01)
+        await prober.probe_once()
+        ready, checks = prober.status()
+
+        assert ready == False
+        assert "timed out" in checks["llm"]["error"]
+
+    @pytest.mark.asyncio
+    async def test_start_and_stop(self):
+        """Background loop should probe and stop cleanly."""
+        prober = ReadinessProber(checks={"llm": _ok}, critical=["llm"], interval=0.01)
+        await prober.start()
+        await asyncio.sleep(0.05)
+        await prober.stop()
+
+        assert prober.status()[0] == True
+        assert prober._task is None
+
+
+class TestDefaultChecks:
+    """Tests for the built-in dependency checks."""
+
+    @pytest.mark.asyncio
+    async def test_check_llm_lists_models(self):
+        """LLM check should list models via the excuse service client."""
+        mock_service = MagicMock()
+        mock_service.client.models.list = AsyncMock(return_value=[])
+
+        with patch("app.services.excuse_service.get_excuse_service", return_value=mock_service):
+            await check_llm()
+
+        mock_service.client.models.list.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_check_token_store(self):
+        """Token store check should ping the token service."""
+        await check_token_store()
+
+    @pytest.mark.asyncio
+    async def test_check_creem_skipped_without_key(self):
+        """Creem check should be a no-op when payments are not configured."""
+        mock_settings = MagicMock()
+        mock_settings.creem_api_key = None
+
+        with patch("app.core.readiness.get_settings", return_value=mock_settings):
+            with patch("httpx.AsyncClient.get", new_callable=AsyncMock) as mock_get:
+                await check_creem()
+
+        mock_get.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_check_creem_server_error(self):
+        """Creem 5xx responses should fail the check."""
+        mock_settings = MagicMock()
+        mock_settings.creem_api_key = "creem_test_key"
+        mock_settings.creem_product_id_10 = "prod_10"
+        mock_response = MagicMock(status_code=503)
+
+        with patch("app.core.readiness.get_settings", return_value=mock_settings):
+            with patch("httpx.AsyncClient.get", new_callable=AsyncMock, return_value=mock_response):
+                with pytest.raises(RuntimeError):
+                    await check_creem()
+
+    @pytest.mark.asyncio
+    async def test_check_creem_reachable(self):
+        """Creem non-5xx responses should pass the check."""
+        mock_settings = MagicMock()
+        mock_settings.creem_api_key = "creem_test_key"
+        mock_settings.creem_product_id_10 = "prod_10"
+        mock_response = MagicMock(status_code=200)
+
+        with patch("app.core.readiness.get_settings", return_value=mock_settings):
+            with patch("httpx.AsyncClient.get", new_callable=AsyncMock, return_value=mock_response):
+                await check_creem()
+
+
+class TestGetReadinessProberSingleton:
+    """Tests for get_readiness_prober singleton."""
+
+    def test_returns_same_instance(self):
+        """Should return the same instance with default checks."""
+        import app.core.readiness as rd
+        rd._readiness_prober = None  # Reset
+
+        prober1 = get_readiness_prober()
+        prober2 = get_readiness_prober()
+
+        assert prober1 is prober2
+        assert set(prober1.checks) == {"llm", "token_store", "creem"}
+
+        rd._readiness_prober = None  # Clean up
@@ -0,0 +1,172 @@
+"""Tests for request tracing."""
+import json
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import app.core.tracing as tr
+from prometheus_client import REGISTRY
+
+from app.core.metrics import TOOL_SLUG
+from app.core.tracing import JsonlExporter, current_span, get_trace_exporter, parse_traceparent, span
+from app.schemas.excuse import Excuse
+
+
+@pytest.fixture
+def exporter(tmp_path):
+    exporter = JsonlExporter(str(tmp_path / "traces.jsonl"))
+    with patch("app.core.tracing.get_trace_exporter", return_value=exporter):
+        yield exporter
+    exporter.close()
+
+
+def _spans(exporter):
+    exporter.flush()
+    if not os.path.exists(exporter.path):
+        return []
+    with open(exporter.path) as f:
+        return [json.loads(line) for line in f]
+
+
+def _stage_count(stage):
+    labels = {"tool": TOOL_SLUG, "stage": stage}
+    return REGISTRY.get_sample_value("generation_stage_seconds_count", labels) or 0
+
+
+class TestSpans:
+    """Tests for span nesting and export."""
+
+    def test_nested_spans_share_trace(self, exporter):
+        """Child spans should join the parent's trace and export with the root."""
+        with span("outer", route="x") as outer:
+            with span("inner") as inner:
+                assert current_span() is inner
+            assert current_span() is outer
+        assert current_span() is None
+
+        spans = _spans(exporter)
+        assert [s["name"] for s in spans] == ["inner", "outer"]
+        assert spans[0]["traceId"] == spans[1]["traceId"] == outer.trace_id
+        assert spans[0]["parentSpanId"] == outer.span_id
+        assert spans[1]["attributes"] == {"route": "x"}
+        assert spans[1]["endTimeUnixNano"] >= spans[1]["startTimeUnixNano"]
+
+    def test_error_is_recorded(self, exporter):
+        """A raising stage should be marked with the exception type."""
+        with pytest.raises(ValueError):
+            with span("failing"):
+                raise ValueError("boom")
+
+        assert _spans(exporter)[0]["attributes"]["error"] == "ValueError"
+
+    def test_export_is_queued(self, exporter, tmp_path):
+        """Spans should only reach the file when the writer flushes."""
+        with span("queued"):
+            pass
+
+        assert not (tmp_path / "traces.jsonl").exists()
+        assert [s["name"] for s in _spans(exporter)] == ["queued"]
+
+    def test_writer_thread_flushes(self, tmp_path):
+        """The background thread should write queued spans on its own."""
+        import time
+        exporter = JsonlExporter(str(tmp_path / "traces.jsonl"), flush_interval=0.01)
+        exporter.start()
+        exporter.export([tr.Span("threaded")])
+        time.sleep(0.1)
+
+        with open(exporter.path) as f:
+            assert json.loads(f.readline())["name"] == "threaded"
+        exporter.close()
+
+    def test_stage_histogram(self):
+        """Finished spans should be observed in the stage histogram."""
+        before = _stage_count("test.stage")
+
+        with span("test.stage"):
+            pass
+
+        assert _stage_count("test.stage") == before + 1
+
+    def test_parse_traceparent(self):
+        """Valid W3C headers should parse; anything else is ignored."""
+        header = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+
+        assert parse_traceparent(header) == ("a" * 32, "b" * 16)
+        assert parse_traceparent("00-" + "0" * 32 + "-" + "b" * 16 + "-01") == (None, None)
+        assert parse_traceparent("garbage") == (None, None)
+        assert parse_traceparent(None) == (None, None)
+
+
+class TestExporterSingleton:
+    """Tests for get_trace_exporter."""
+
+    def test_disabled_without_path(self):
+        """No exporter should be created when no path is configured."""
+        assert get_trace_exporter() is None
+
+    def test_created_from_settings(self, tmp_path):
+        """A configured path should yield one shared exporter."""
+        settings = MagicMock(
+            trace_export_path=str(tmp_path / "traces.jsonl"), trace_flush_interval=0.01
+        )
+        with patch("app.core.tracing.get_settings", return_value=settings):
+            try:
+                exporter = get_trace_exporter()
+                assert get_trace_exporter() is exporter
+            finally:
+                tr.close_trace_exporter()
+        assert tr._trace_exporter is None
+
+
+class TestTracingMiddleware:
+    """Tests for request-level tracing."""
+
+    def test_response_carries_trace_id(self, client):
+        """Responses should expose the trace id and a traceparent."""
+        response = client.get("/health")
+
+        trace_id = response.headers["x-trace-id"]
+        assert len(trace_id) == 32
+        assert response.headers["traceparent"].startswith(f"00-{trace_id}-")
+
+    def test_incoming_traceparent_is_continued(self, client, exporter):
+        """An upstream trace id should be reused and its span set as parent."""
+        header = "00-" + "c" * 32 + "-" + "d" * 16 + "-01"
+
+        response = client.get("/api/categories", headers={"traceparent": header})
+
+        assert response.headers["x-trace-id"] == "c" * 32
+        root = _spans(exporter)[-1]
+        assert root["name"] == "http.request"
+        assert root["parentSpanId"] == "d" * 16
+        assert root["attributes"]["http.status_code"] == 200
+
+    def test_probes_not_timed_or_exported(self, client, exporter):
+        """Probe and scrape requests should carry a trace id but stay out of the stage metric."""
+        before = _stage_count("http.request")
+
+        for path in ("/health", "/api/metrics"):
+            assert "x-trace-id" in client.get(path).headers
+
+        assert _stage_count("http.request") == before
+        assert _spans(exporter) == []
+
+    def test_generate_stages(self, client, test_device_id, exporter):
+        """Generation should trace token, LLM and response stages in one trace."""
+        service = MagicMock()
+        service.generate_excuses = AsyncMock(return_value=[Excuse(text="t", tone="t", tip="t")])
+
+        with patch("app.api.excuse_router.get_excuse_service", return_value=service):
+            response = client.post("/api/generate", json={
+                "category": "late",
+                "urgency": "normal",
+                "device_id": test_device_id,
+            })
+
+        spans = _spans(exporter)
+        assert {s["traceId"] for s in spans} == {response.headers["x-trace-id"]}
+        names = [s["name"] for s in spans]
+        for stage in ("token.can_generate", "token.use", "excuse.generate", "token.status", "response.build"):
+            assert stage in names
+        assert names[-1] == "http.request"
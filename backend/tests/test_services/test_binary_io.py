@@ -0,0 +1,30 @@
+"""Tests for the shared binary encoding helpers."""
+from array import array
+from unittest.mock import patch
+
+import app.services.binary_io as bio
+from app.services.binary_io import decode_strings, encode_strings, pack, unpack
+
+
+class TestBinaryIO:
+    """Tests for pack/unpack and the string encoding."""
+
+    def test_round_trip(self):
+        """Arrays and strings should decode to what was encoded."""
+        data = encode_strings(["device_a", "デバイス_b"]) + pack(array("H", [1, 65535]))
+        view = memoryview(data)
+
+        strings, used = decode_strings(view, 2)
+
+        assert strings == ["device_a", "デバイス_b"]
+        assert list(unpack("H", view[used:])) == [1, 65535]
+
+    def test_little_endian_on_any_host(self):
+        """Big-endian hosts should write the same bytes and read them back."""
+        values = array("I", [1, 2])
+        with patch.object(bio, "_BIG_ENDIAN", True):
+            swapped = pack(values)
+            assert list(unpack("I", swapped)) == [1, 2]
+
+        assert swapped == array("I", [1 << 24, 2 << 24]).tobytes()
+        assert list(values) == [1, 2]
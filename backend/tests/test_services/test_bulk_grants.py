@@ -0,0 +1,259 @@
+"""Tests for bulk token grants."""
+import asyncio
+
+import pytest
+
+from app.services.bulk_grants import (
+    MAX_ERRORS,
+    Grant,
+    GrantJobs,
+    GrantParser,
+    make_grant,
+    run_grants,
+)
+from app.services.token_ledger import TokenLedger
+from app.services.token_service import MAX_GRANT_MONTHS, AsyncTokenService, TokenService
+from app.services.token_shards import ShardedTokenService
+
+CSV = (
+    "\ufeffdevice_id,tokens,unlimited_months\n"
+    "promo_device_0001,5,\n"
+    '"promo_device_0002",0,2\n'
+    "\n"
+    "promo_device_0003,3,0\n"
+).encode()
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def _parse(parser, data: bytes, step: int):
+    grants = []
+    for i in range(0, len(data), step):
+        grants.extend(parser.feed(data[i:i + step]))
+    return grants + parser.close()
+
+
+class TestGrantParser:
+    """Tests for GrantParser."""
+
+    @pytest.mark.parametrize("step", [1, 7, 1000])
+    def test_csv_in_any_chunking(self, step):
+        """Rows split across chunks should parse the same."""
+        grants = _parse(GrantParser("csv"), CSV, step)
+
+        assert grants == [
+            Grant("promo_device_0001", 5, 0),
+            Grant("promo_device_0002", 0, 2),
+            Grant("promo_device_0003", 3, 0),
+        ]
+
+    def test_jsonl(self):
+        """JSON lines should parse, with absent columns as zero."""
+        data = b'{"device_id": "promo_device_0001", "tokens": 5}\n{"device_id": "promo_device_0002", "unlimited_months": 1}'
+
+        assert _parse(GrantParser("jsonl"), data, 10) == [
+            Grant("promo_device_0001", 5, 0),
+            Grant("promo_device_0002", 0, 1),
+        ]
+
+    def test_invalid_rows_reported(self):
+        """Bad rows should be skipped and reported by line number."""
+        data = (
+            "device_id,tokens\n"
+            "short,5\n"
+            "promo_device_0001,-1\n"
+            "promo_device_0002,0\n"
+            "promo_device_0003,1,extra\n"
+            "promo_device_0004,2\n"
+        ).encode()
+        parser = GrantParser("csv")
+
+        assert _parse(parser, data, 1000) == [Grant("promo_device_0004", 2, 0)]
+        assert parser.error_count == 4
+        assert parser.errors[0] == "line 2: device_id must be 10-100 characters"
+        assert [e.split(":")[0] for e in parser.errors] == ["line 2", "line 3", "line 4", "line 5"]
+
+    def test_invalid_json(self):
+        """Malformed JSON, non-objects and wrong types should be rejected per row."""
+        data = b'not json\n[1]\n{"device_id": "promo_device_0001", "tokens": true}\n{"device_id": "promo_device_0001", "tokens": 1.5}\n\xff\n'
+        parser = GrantParser("jsonl")
+
+        assert _parse(parser, data, 1000) == []
+        assert parser.error_count == 5
+
+    def test_errors_capped(self):
+        """Only the first MAX_ERRORS invalid rows should be kept."""
+        parser = GrantParser("jsonl")
+        parser.feed(b"x\n" * (MAX_ERRORS + 10))
+
+        assert parser.error_count == MAX_ERRORS + 10
+        assert len(parser.errors) == MAX_ERRORS
+
+    def test_bad_header_raises(self):
+        """A CSV header without the needed columns should reject the whole file."""
+        with pytest.raises(ValueError, match="line 1"):
+            GrantParser("csv").feed(b"device,amount\nx,1\n")
+        with pytest.raises(ValueError):
+            GrantParser("xml")
+
+    def test_make_grant(self):
+        """Numeric strings, ints and blanks should all be accepted."""
+        assert make_grant(" promo_device_0001 ", "4", None) == Grant("promo_device_0001", 4, 0)
+        with pytest.raises(ValueError):
+            make_grant(None, 1, 0)
+
+    def test_make_grant_caps_months(self):
+        """Subscriptions longer than MAX_GRANT_MONTHS should be rejected."""
+        assert make_grant("promo_device_0001", 0, MAX_GRANT_MONTHS).unlimited_months == MAX_GRANT_MONTHS
+        with pytest.raises(ValueError, match="unlimited_months must be at most"):
+            make_grant("promo_device_0001", 0, "500000")
+        with pytest.raises(ValueError, match="tokens must be at most"):
+            make_grant("promo_device_0001", "9" * 400, 0)
+
+
+class TestApplyGrants:
+    """Tests for TokenService.apply_grants."""
+
+    def test_applies_once_per_key(self, token_service):
+        """A batch key should apply only once."""
+        grants = [Grant("promo_device_0001", 3, 0), Grant("promo_device_0001", 2, 0)]
+
+        assert token_service.apply_grants("job:0", grants) == True
+        assert token_service.apply_grants("job:0", grants) == False
+        assert token_service.get_token_status("promo_device_0001").total_tokens == 5
+
+    def test_unlimited_and_snapshot(self, token_service):
+        """Grants should show in snapshots and schedule expiry."""
+        token_service.get_status_snapshot("promo_device_0001")
+        token_service.apply_grants("job:0", [Grant("promo_device_0001", 0, 1)])
+
+        assert token_service.get_status_snapshot("promo_device_0001").can_generate == True
+        assert token_service.get_token_status("promo_device_0001").is_unlimited == True
+        assert len(token_service.expiry) == 1
+
+    def test_out_of_range_batch_changes_nothing(self, token_service):
+        """A batch with an out-of-range row should raise before applying any row."""
+        grants = [Grant("promo_device_0001", 5, 0), Grant("promo_device_0002", 0, 500000)]
+
+        with pytest.raises(ValueError):
+            token_service.apply_grants("job:0", grants)
+
+        assert token_service.get_token_status("promo_device_0001").total_tokens == 0
+        assert token_service.apply_grants("job:0", grants[:1]) == True
+        assert token_service.get_token_status("promo_device_0001").total_tokens == 5
+
+    def test_dedupe_bounded(self, token_service):
+        """Only the configured number of batch keys should be remembered."""
+        token_service.settings = token_service.settings.model_copy(update={"bulk_grant_dedupe_max_entries": 2})
+        for i in range(3):
+            token_service.apply_grants(f"job:{i}", [Grant("promo_device_0001", 1, 0)])
+
+        assert token_service.apply_grants("job:0", [Grant("promo_device_0001", 1, 0)]) == True
+        assert token_service.apply_grants("job:2", [Grant("promo_device_0001", 1, 0)]) == False
+
+    def test_durable(self, tmp_path):
+        """Granted tokens and subscriptions should survive a restart."""
+        service = TokenService(ledger=TokenLedger(str(tmp_path)))
+        service.apply_grants("job:0", [Grant("promo_device_0001", 7, 0), Grant("promo_device_0002", 0, 3)])
+        service.close()
+
+        restarted = TokenService(ledger=TokenLedger(str(tmp_path)))
+
+        assert restarted.get_token_status("promo_device_0001").total_tokens == 7
+        assert restarted.get_token_status("promo_device_0002").is_unlimited == True
+        assert restarted.apply_grants("job:0", [Grant("promo_device_0001", 7, 0)]) == False
+        restarted.close()
+
+    def test_sharded_keys_durable(self, tmp_path):
+        """Each shard's ledger should remember its part of a batch across a restart."""
+        def open_service():
+            return ShardedTokenService({
+                f"shard-{i}": TokenService(ledger=TokenLedger(str(tmp_path / f"shard-{i}"))) for i in range(3)
+            })
+        grants = [Grant(f"promo_device_{i:04d}", 1, 0) for i in range(100)]
+        service = open_service()
+        service.apply_grants("job:0", grants)
+        service.close()
+
+        restarted = open_service()
+
+        assert restarted.apply_grants("job:0", grants) == False
+        assert all(restarted.get_token_status(g.device_id).total_tokens == 1 for g in grants)
+        restarted.close()
+
+    def test_sharded(self):
+        """Each shard should apply and remember its part of a batch."""
+        service = ShardedTokenService({f"shard-{i}": TokenService() for i in range(3)})
+        grants = [Grant(f"promo_device_{i:04d}", 1, 0) for i in range(100)]
+
+        assert service.apply_grants("job:0", grants) == True
+        assert service.apply_grants("job:0", grants) == False
+        assert all(len(shard.device_ids()) > 0 for shard in service.shards.values())
+        assert all(service.get_token_status(g.device_id).total_tokens == 1 for g in grants)
+
+    async def test_exact_alongside_use_token(self, token_service):
+        """Batches and concurrent single-device calls should both count exactly."""
+        tokens = AsyncTokenService(token_service, stripes=16, offload=True)
+        devices = [f"promo_device_{i:04d}" for i in range(50)]
+
+        await asyncio.gather(
+            *(tokens.apply_grants(f"job:{i}", [Grant(d, 2, 0) for d in devices]) for i in range(5)),
+            *(tokens.use_token(d) for d in devices for _ in range(3)),
+        )
+
+        statuses = [token_service.get_token_status(d) for d in devices]
+        assert all((s.total_tokens, s.used_tokens, s.free_trial_used) == (10, 2, True) for s in statuses)
+
+
+class TestRunGrants:
+    """Tests for run_grants and the job registry."""
+
+    async def test_batches_and_resubmission(self, token_service):
+        """A resubmitted file should skip every batch already applied."""
+        tokens = AsyncTokenService(token_service)
+        jobs = GrantJobs()
+
+        job = await run_grants(jobs.start("promo"), _chunks(CSV[:30], CSV[30:]), "csv", tokens, batch_size=2)
+        again = await run_grants(jobs.start("promo"), _chunks(CSV), "csv", tokens, batch_size=2)
+
+        assert (job.batches, job.applied, job.skipped, job.tokens) == (2, 3, 0, 8)
+        assert (again.applied, again.skipped) == (0, 3)
+        assert token_service.get_token_status("promo_device_0001").total_tokens == 5
+        assert job.to_dict()["running"] == False
+
+    async def test_partial_retry(self, token_service):
+        """Retrying after an interrupted upload should apply only the missing batches."""
+        tokens = AsyncTokenService(token_service)
+        header, *rows = CSV.decode().splitlines(keepends=True)
+        await run_grants(GrantJobs().start("promo"), _chunks((header + rows[0]).encode()), "csv", tokens, batch_size=1)
+
+        job = await run_grants(GrantJobs().start("promo"), _chunks(CSV), "csv", tokens, batch_size=1)
+
+        assert (job.applied, job.skipped) == (2, 1)
+        assert token_service.get_token_status("promo_device_0001").total_tokens == 5
+
+    async def test_bad_header(self, token_service):
+        """A bad header should fail the job before anything is applied."""
+        job = GrantJobs().start("promo")
+        with pytest.raises(ValueError):
+            await run_grants(job, _chunks(b"id,amount\n"), "csv", AsyncTokenService(token_service), 10)
+
+        assert job.running == False
+        assert job.to_dict()["error"].startswith("line 1")
+        assert token_service.device_ids() == []
+
+    def test_one_running_job_per_key(self):
+        """A key should not run twice at once; finished jobs should be evicted oldest first."""
+        jobs = GrantJobs(max_jobs=2)
+        first = jobs.start("a")
+        with pytest.raises(RuntimeError):
+            jobs.start("a")
+        first.finished = first.started
+        jobs.start("b")
+        jobs.start("c")
+
+        assert jobs.get("a") is None
+        assert jobs.get("c").to_dict()["invalid"] == 0
@@ -0,0 +1,58 @@
+"""Tests for context canonicalization."""
+import pytest
+
+from app.services.context_keys import canonical_context, context_key, intent_tags
+
+
+class TestCanonicalContext:
+    """Tests for canonical_context."""
+
+    @pytest.mark.parametrize("text", ["traffic", "Traffic!", " traffic ", "TRAFFIC...", "ＴＲＡＦＦＩＣ"])
+    def test_case_punctuation_width(self, text):
+        """Case, punctuation, spacing and full-width forms should not matter."""
+        assert canonical_context(text) == "traffic"
+
+    def test_collapses_inner_whitespace(self):
+        """Runs of whitespace and punctuation should become one space."""
+        assert canonical_context("stuck  in\ttraffic -- again") == "stuck in traffic again"
+
+    def test_strips_accents_for_latin_languages(self):
+        """Accents should be dropped for Latin-script languages."""
+        assert canonical_context("Café fermé", "fr") == canonical_context("cafe ferme", "fr") == "cafe ferme"
+        assert canonical_context("Ärger im Büro", "de") == "arger im buro"
+
+    def test_keeps_marks_elsewhere(self):
+        """Combining marks that change meaning should be kept."""
+        assert canonical_context("ガス", "ja") != canonical_context("カス", "ja")
+
+    def test_cjk_width_and_spacing(self):
+        """Half-width katakana should fold and spaces should not matter in Chinese and Japanese."""
+        assert canonical_context("ｶﾞｽ", "ja") == "ガス"
+        assert canonical_context("交通 堵塞！", "zh") == "交通堵塞"
+
+    def test_nothing_left(self):
+        """A context of only punctuation should canonicalize to nothing."""
+        assert canonical_context(" ?! ") == ""
+
+
+class TestIntentTags:
+    """Tests for intent tags and context keys."""
+
+    def test_tags(self):
+        """Known situations should be tagged in any supported language."""
+        assert intent_tags("stuck in a traffic jam") == ("traffic",)
+        assert intent_tags("stau auf der a3") == ("traffic",)
+        assert intent_tags("我发烧了") == ("sick",)
+        assert intent_tags("my cat is ill") == ("pet", "sick")
+
+    def test_whole_words_only(self):
+        """Latin keywords should not match inside other words."""
+        assert intent_tags("my card was declined") == ()
+        assert intent_tags("illegal parking") == ()
+
+    def test_key_uses_tags_when_enabled(self):
+        """Tags should replace the text only when enabled and found."""
+        assert context_key("Stuck in a traffic jam!", "en", intents=True) == "intent:traffic"
+        assert context_key("Stuck in a traffic jam!", "en") == "stuck in a traffic jam"
+        assert context_key("I was abducted", "en", intents=True) == "i was abducted"
+        assert context_key("", "en", intents=True) == ""
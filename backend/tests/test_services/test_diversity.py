@@ -0,0 +1,156 @@
+"""Tests for near-duplicate detection."""
+import pytest
+
+from app.schemas.excuse import Excuse
+from app.services.diversity import DiversityFilter, MinHasher, SimilarityIndex, shingles, similarity
+
+TRAIN = "My train was delayed by a signal failure, so I'll be about twenty minutes late."
+TRAIN_AGAIN = "Sorry, my train was delayed by a signal failure so I will be about twenty minutes late!"
+DOG = "The neighbour's dog got loose and I spent the morning chasing it around the park."
+PIPE = "A pipe burst in the kitchen and I had to wait for the plumber."
+
+
+def _excuse(text):
+    return Excuse(text=text, tone="sincere", tip="")
+
+
+@pytest.fixture
+def hasher():
+    return MinHasher()
+
+
+class TestSimilarity:
+    """Tests for shingling and MinHash signatures."""
+
+    def test_shingles_normalize(self):
+        """Case, punctuation and spacing should not matter."""
+        assert shingles("Hello,  World!") == shingles("hello world")
+        assert shingles("ab") == {"ab"}
+
+    def test_identical_texts(self, hasher):
+        """Identical texts should have similarity 1."""
+        assert similarity(hasher.signature(TRAIN), hasher.signature(TRAIN)) == 1.0
+
+    def test_rewrite_is_similar(self, hasher):
+        """A light rewrite should score above the default threshold."""
+        assert similarity(hasher.signature(TRAIN), hasher.signature(TRAIN_AGAIN)) >= 0.5
+
+    def test_unrelated_is_dissimilar(self, hasher):
+        """Different ideas should score low."""
+        assert similarity(hasher.signature(TRAIN), hasher.signature(DOG)) < 0.3
+
+    def test_cjk(self, hasher):
+        """Texts without spaces should be compared too."""
+        a = hasher.signature("我今天早上发烧了，需要请假休息一天。")
+        b = hasher.signature("我今天早上发烧了，所以需要请假休息。")
+        c = hasher.signature("地铁故障停运了，我被困在隧道里一个小时。")
+
+        assert similarity(a, b) >= 0.5
+        assert similarity(a, c) < 0.3
+
+
+class TestSimilarityIndex:
+    """Tests for the LSH index."""
+
+    def test_finds_near_duplicate(self, hasher):
+        """Should find an indexed near-duplicate."""
+        index = SimilarityIndex()
+        index.add(hasher.signature(TRAIN))
+        index.add(hasher.signature(DOG))
+
+        assert index.most_similar(hasher.signature(TRAIN_AGAIN)) >= 0.5
+        assert index.most_similar(hasher.signature(PIPE)) < 0.5
+
+    def test_empty(self, hasher):
+        """An empty index should report no similarity."""
+        assert SimilarityIndex().most_similar(hasher.signature(TRAIN)) == 0.0
+
+    def test_evicts_oldest(self, hasher):
+        """Only the most recent items should be remembered."""
+        index = SimilarityIndex(max_items=2)
+        for text in (TRAIN, DOG, PIPE):
+            index.add(hasher.signature(text))
+
+        assert len(index) == 2
+        assert index.most_similar(hasher.signature(TRAIN)) < 0.5
+        assert index.most_similar(hasher.signature(DOG)) == 1.0
+        assert all(bucket for table in index._buckets for bucket in table.values())
+
+    def test_shared_buckets(self, hasher):
+        """Items sharing buckets should be found and evicted individually."""
+        index = SimilarityIndex(max_items=4)
+        for text in (TRAIN, TRAIN, TRAIN, DOG, PIPE):
+            index.add(hasher.signature(text))
+
+        assert index.most_similar(hasher.signature(TRAIN)) == 1.0
+        index.add(hasher.signature(DOG))
+        assert index.most_similar(hasher.signature(TRAIN)) == 1.0
+        index.add(hasher.signature(PIPE))
+
+        assert index.most_similar(hasher.signature(TRAIN)) < 0.5
+
+    def test_skips_oversized_buckets(self, hasher):
+        """Buckets over max_bucket should be ignored on lookup."""
+        index = SimilarityIndex(max_bucket=2)
+        for _ in range(3):
+            index.add(hasher.signature(TRAIN))
+
+        assert index.most_similar(hasher.signature(TRAIN)) == 0.0
+
+
+class TestDiversityFilter:
+    """Tests for selecting diverse excuses."""
+
+    def test_drops_duplicates_within_response(self):
+        """Near-duplicates in one response should be dropped."""
+        selection = DiversityFilter().selection("late", "en")
+        selection.offer([_excuse(TRAIN), _excuse(TRAIN_AGAIN), _excuse(DOG)])
+
+        assert [e.text for e, _ in selection.kept] == [TRAIN, DOG]
+        assert len(selection.dropped) == 1
+
+    def test_drops_recently_served(self):
+        """Excuses close to recently served ones should be dropped."""
+        diversity = DiversityFilter()
+        first = diversity.selection("late", "en")
+        first.offer([_excuse(TRAIN)])
+        first.result(1)
+
+        again = diversity.selection("late", "en")
+        again.offer([_excuse(TRAIN_AGAIN), _excuse(DOG)])
+
+        assert [e.text for e, _ in again.kept] == [DOG]
+
+    def test_recent_is_per_category_and_language(self):
+        """Other categories and languages should not be affected."""
+        diversity = DiversityFilter()
+        first = diversity.selection("late", "en")
+        first.offer([_excuse(TRAIN)])
+        first.result(1)
+
+        for category, language in (("meeting", "en"), ("late", "de")):
+            selection = diversity.selection(category, language)
+            selection.offer([_excuse(TRAIN)])
+            assert len(selection.kept) == 1
+
+    def test_avoid_recent_off(self):
+        """Without avoid_recent only the response itself is checked."""
+        diversity = DiversityFilter()
+        first = diversity.selection("late", "en")
+        first.offer([_excuse(TRAIN)])
+        first.result(1)
+
+        selection = diversity.selection("late", "en", avoid_recent=False)
+        selection.offer([_excuse(TRAIN)])
+
+        assert len(selection.kept) == 1
+
+    def test_result_backfills_least_similar(self):
+        """A short selection should be back-filled with the closest-to-unique rejects."""
+        selection = DiversityFilter().selection("late", "en")
+        selection.offer([_excuse(TRAIN), _excuse(TRAIN), _excuse(TRAIN_AGAIN)])
+
+        result = selection.result(2)
+
+        assert [e.text for e in result] == [TRAIN, TRAIN_AGAIN]
+        assert selection.texts() == [TRAIN, TRAIN, TRAIN_AGAIN]
@@ -0,0 +1,148 @@
+"""Tests for the excuse cache and generation single-flight."""
+import asyncio
+
+import pytest
+
+import app.services.excuse_cache as ec
+from app.schemas.excuse import Excuse
+from app.services.excuse_cache import ExcuseCache, SingleFlight, get_excuse_cache, get_single_flight
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def _excuses(text):
+    return [Excuse(text=text, tone="sincere", tip="")]
+
+
+class TestExcuseCache:
+    """Tests for ExcuseCache class."""
+
+    def test_hit_and_miss(self, clock):
+        """Stored entries should be returned until they expire."""
+        cache = ExcuseCache(ttl=10, clock=clock)
+        cache.put("a", _excuses("A"))
+
+        assert cache.get("a")[0].text == "A"
+        assert cache.get("b") is None
+        clock.now = 10
+        assert cache.get("a") is None
+        assert len(cache) == 0
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_evicts_least_recently_used(self, clock):
+        """A full cache should evict the least recently used entry."""
+        cache = ExcuseCache(max_entries=2, clock=clock)
+        cache.put("a", _excuses("A"))
+        cache.put("b", _excuses("B"))
+        cache.get("a")
+        cache.put("c", _excuses("C"))
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+
+    def test_clear(self, clock):
+        """clear() should drop every entry."""
+        cache = ExcuseCache(clock=clock)
+        cache.put("a", _excuses("A"))
+        cache.clear()
+
+        assert len(cache) == 0
+
+    def test_singleton_uses_settings(self):
+        """get_excuse_cache should build one cache from settings."""
+        ec._excuse_cache = None
+        try:
+            cache = get_excuse_cache()
+            assert get_excuse_cache() is cache
+            assert cache.max_entries == 10_000
+        finally:
+            ec._excuse_cache = None
+
+
+class TestSingleFlight:
+    """Tests for coalescing concurrent calls."""
+
+    async def test_concurrent_calls_share_one(self):
+        """Callers arriving while a call runs should get its result."""
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await release.wait()
+            return "result"
+
+        first = asyncio.ensure_future(flight.run("k", fn))
+        second = asyncio.ensure_future(flight.run("k", fn))
+        await asyncio.sleep(0)
+        assert len(flight) == 1
+        release.set()
+
+        assert await first == ("result", False)
+        assert await second == ("result", True)
+        assert calls == [1]
+        assert len(flight) == 0
+
+    async def test_sequential_calls_run_again(self):
+        """A finished call should not be reused."""
+        flight = SingleFlight()
+
+        async def fn():
+            return object()
+
+        (a, _), (b, shared) = await flight.run("k", fn), await flight.run("k", fn)
+
+        assert a is not b
+        assert shared == False
+
+    async def test_errors_reach_every_caller(self):
+        """A failing call should raise for all callers."""
+        flight = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(flight.run("k", fn), flight.run("k", fn), return_exceptions=True)
+
+        assert [str(r) for r in results] == ["boom", "boom"]
+        assert len(flight) == 0
+
+    async def test_cancelled_caller_does_not_cancel_call(self):
+        """A caller going away should leave the call running for the others."""
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def fn():
+            await release.wait()
+            return "result"
+
+        first = asyncio.ensure_future(flight.run("k", fn))
+        second = asyncio.ensure_future(flight.run("k", fn))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await second == ("result", True)
+
+    def test_singleton(self):
+        """get_single_flight should return one instance."""
+        ec._single_flight = None
+        try:
+            assert get_single_flight() is get_single_flight()
+        finally:
+            ec._single_flight = None
@@ -0,0 +1,121 @@
+"""Tests for the memory-mapped excuse index."""
+import json
+import os
+import pytest
+from unittest.mock import patch
+
+import app.services.excuse_index as ei
+from app.services.excuse_index import ExcuseIndex, build_index, get_excuse_index
+
+
+def _excuses(text):
+    return json.dumps([{"text": text, "tone": "sincere", "tip": "Smile"}])
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / "excuse_index.bin")
+
+
+@pytest.fixture(autouse=True)
+def reset_index():
+    ei._excuse_index = None
+    yield
+    ei._excuse_index = None
+
+
+class TestExcuseIndex:
+    """Tests for ExcuseIndex class."""
+
+    def test_lookup_hit_and_miss(self, index_path):
+        """Should return excuses for known keys and None otherwise."""
+        build_index(index_path, [
+            ("late", "normal", "en", "late-work-boss-believable", _excuses("A")),
+            ("late", "normal", "zh", "late-work-boss-believable", _excuses("B")),
+        ])
+        index = ExcuseIndex(index_path)
+
+        assert len(index) == 2
+        assert index.lookup("late", "normal", "en", "late-work-boss-believable")[0].text == "A"
+        assert index.lookup("late", "normal", "zh", "late-work-boss-believable")[0].text == "B"
+        assert index.lookup("late", "urgent", "en", "late-work-boss-believable") is None
+
+    def test_many_records_with_probing(self, index_path):
+        """Every record should be reachable through linear probing."""
+        entries = [("other", "normal", "en", f"scenario-{i}", _excuses(str(i))) for i in range(2000)]
+        build_index(index_path, entries)
+        index = ExcuseIndex(index_path)
+
+        for i in range(2000):
+            assert index.lookup("other", "normal", "en", f"scenario-{i}")[0].text == str(i)
+
+    def test_hash_collision_checks_key(self, index_path):
+        """Equal hashes should not return another key's record."""
+        with patch("app.services.excuse_index._hash", return_value=1):
+            build_index(index_path, [
+                ("late", "normal", "en", "a", _excuses("A")),
+                ("late", "normal", "en", "b", _excuses("B")),
+            ])
+            index = ExcuseIndex(index_path)
+
+            assert index.lookup("late", "normal", "en", "b")[0].text == "B"
+            assert index.lookup("late", "normal", "en", "c") is None
+
+    def test_hot_swap_on_replace(self, index_path):
+        """A rebuilt file should be picked up on the next stat check."""
+        build_index(index_path, [("late", "normal", "en", "s", _excuses("old"))])
+        index = ExcuseIndex(index_path, check_interval=0)
+        assert index.lookup("late", "normal", "en", "s")[0].text == "old"
+
+        build_index(index_path, [("late", "normal", "en", "s", _excuses("new"))])
+
+        assert index.lookup("late", "normal", "en", "s")[0].text == "new"
+
+    def test_stat_checks_are_throttled(self, index_path):
+        """Within the check interval the mapped file should be reused."""
+        build_index(index_path, [("late", "normal", "en", "s", _excuses("old"))])
+        index = ExcuseIndex(index_path, check_interval=3600)
+        index.lookup("late", "normal", "en", "s")
+
+        build_index(index_path, [("late", "normal", "en", "s", _excuses("new"))])
+
+        assert index.lookup("late", "normal", "en", "s")[0].text == "old"
+
+    def test_missing_file(self, index_path):
+        """A missing index should behave as empty."""
+        index = ExcuseIndex(index_path, check_interval=0)
+
+        assert index.lookup("late", "normal", "en", "s") is None
+        assert len(index) == 0
+
+    def test_not_configured(self):
+        """No path should mean no pre-generated excuses."""
+        assert ExcuseIndex(None).lookup("late", "normal", "en", "s") is None
+
+    def test_corrupt_replacement_keeps_current_index(self, index_path):
+        """A bad build should not replace a working index."""
+        build_index(index_path, [("late", "normal", "en", "s", _excuses("old"))])
+        index = ExcuseIndex(index_path, check_interval=0)
+        index.lookup("late", "normal", "en", "s")
+
+        with open(index_path + ".bad", "wb") as f:
+            f.write(b"garbage" * 10)
+        os.replace(index_path + ".bad", index_path)
+
+        assert index.lookup("late", "normal", "en", "s")[0].text == "old"
+
+
+class TestGetExcuseIndexSingleton:
+    """Tests for get_excuse_index singleton."""
+
+    def test_returns_same_instance(self):
+        """Should return the same instance."""
+        assert get_excuse_index() is get_excuse_index()
+
+    def test_uses_configured_path(self, index_path):
+        """Should read the configured index file."""
+        settings = ei.get_settings().model_copy(update={"excuse_index_path": index_path})
+        with patch("app.services.excuse_index.get_settings", return_value=settings):
+            index = get_excuse_index()
+
+        assert index.path == index_path
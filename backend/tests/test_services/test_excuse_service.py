@@ -1,4 +1,5 @@
 """Tests for excuse service."""
+import json
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -115,6 +116,32 @@ class TestExcuseService:
         
         assert len(excuses) >= 1
     
+    @pytest.mark.asyncio
+    async def test_generate_excuses_with_scenario(self, excuse_service):
+        """Should add the scenario fragments to the prompt."""
+        from app.services.scenarios import ScenarioTuple
+        mock_response = MagicMock()
+        mock_response.choices = [
+            MagicMock(message=MagicMock(content='[{"text": "Test", "tone": "test", "tip": "test"}]'))
+        ]
+        
+        with patch.object(
+            excuse_service.client.chat.completions,
+            "create",
+            new_callable=AsyncMock,
+            return_value=mock_response,
+        ) as create:
+            await excuse_service.generate_excuses(
+                category=ExcuseCategory.LATE,
+                urgency=UrgencyLevel.NORMAL,
+                language="en",
+                scenario=ScenarioTuple("late-work", "boss", None, "tech"),
+            )
+        
+        prompt = create.call_args.kwargs["messages"][-1]["content"]
+        assert "late for work (workplace setting)" in prompt
+        assert "deployment issue" in prompt
+    
     @pytest.mark.asyncio
     async def test_generate_excuses_handles_markdown(self, excuse_service):
         """Should handle markdown code blocks in response."""
@@ -192,6 +219,166 @@ class TestExcuseService:
             
             assert len(excuses) >= 1
 
+    
+    @pytest.mark.asyncio
+    async def test_generate_excuses_with_usage(self, excuse_service):
+        """Should return the completion's token usage alongside the excuses."""
+        mock_response = MagicMock()
+        mock_response.choices = [
+            MagicMock(
+                message=MagicMock(
+                    content='[{"text": "Test", "tone": "test", "tip": "test"}]'
+                )
+            )
+        ]
+        mock_response.usage = MagicMock(prompt_tokens=120, completion_tokens=80)
+        
+        with patch.object(
+            excuse_service.client.chat.completions,
+            "create",
+            new_callable=AsyncMock,
+            return_value=mock_response,
+        ):
+            excuses, usage = await excuse_service.generate_excuses_with_usage(
+                category=ExcuseCategory.LATE,
+                urgency=UrgencyLevel.NORMAL,
+            )
+        
+        assert excuses[0].text == "Test"
+        assert usage.prompt_tokens == 120
+        assert usage.completion_tokens == 80
+
+
+def _completion(*texts, prompt_tokens=100, completion_tokens=50):
+    response = MagicMock()
+    content = json.dumps([{"text": t, "tone": "sincere", "tip": "tip"} for t in texts])
+    response.choices = [MagicMock(message=MagicMock(content=content))]
+    response.usage = MagicMock(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return response
+
+
+TRAIN = "My train was delayed by a signal failure, so I'll be about twenty minutes late."
+TRAIN_AGAIN = "Sorry, my train was delayed by a signal failure so I will be about twenty minutes late!"
+DOG = "The neighbour's dog got loose and I spent the morning chasing it around the park."
+PIPE = "A pipe burst in the kitchen and I had to wait for the plumber."
+BATTERY = "My car battery died in the parking garage and roadside assistance is still on the way."
+
+
+class TestDiversity:
+    """Tests for the post-generation diversity stage."""
+    
+    @pytest.mark.asyncio
+    async def test_no_topup_when_diverse(self, excuse_service):
+        """Distinct excuses should be returned after a single call."""
+        with patch.object(
+            excuse_service.client.chat.completions,
+            "create",
+            new_callable=AsyncMock,
+            return_value=_completion(TRAIN, DOG, PIPE),
+        ) as create:
+            excuses = await excuse_service.generate_excuses(ExcuseCategory.LATE, UrgencyLevel.NORMAL)
+        
+        assert [e.text for e in excuses] == [TRAIN, DOG, PIPE]
+        assert create.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_topup_replaces_duplicates(self, excuse_service):
+        """A near-duplicate should be replaced by a top-up completion."""
+        with patch.object(
+            excuse_service.client.chat.completions,
+            "create",
+            new_callable=AsyncMock,
+            side_effect=[_completion(TRAIN, TRAIN_AGAIN, DOG), _completion(PIPE)],
+        ) as create:
+            excuses, usage = await excuse_service.generate_excuses_with_usage(
+                ExcuseCategory.LATE, UrgencyLevel.NORMAL
+            )
+        
+        assert [e.text for e in excuses] == [TRAIN, DOG, PIPE]
+        topup_prompt = create.call_args_list[1].kwargs["messages"][-1]["content"]
+        assert "Generate exactly 1 unique excuses" in topup_prompt
+        assert f"Do not repeat this idea: {TRAIN_AGAIN}" in topup_prompt
+        assert usage.prompt_tokens == 200
+        assert usage.total_tokens == 300
+    
+    @pytest.mark.asyncio
+    async def test_recently_served_replaced(self, excuse_service):
+        """Excuses served recently for the same category should be replaced."""
+        with patch.object(
+            excuse_service.client.chat.completions,
+            "create",
+            new_callable=AsyncMock,
+            side_effect=[_completion(TRAIN, DOG), _completion(TRAIN_AGAIN, PIPE), _completion(BATTERY)],
+        ):
+            await excuse_service.generate_excuses(ExcuseCategory.LATE, UrgencyLevel.NORMAL)
+            excuses = await excuse_service.generate_excuses(ExcuseCategory.LATE, UrgencyLevel.NORMAL)
+        
+        assert [e.text for e in excuses] == [PIPE, BATTERY]
+    
+    @pytest.mark.asyncio
+    async def test_unsupported_languages_share_one_index(self, excuse_service):
+        """Arbitrary language codes should not each grow a recently-served index."""
+        with patch.object(
+            excuse_service.client.chat.completions,
+            "create",
+            new_callable=AsyncMock,
+            return_value=_completion(TRAIN, DOG),
+        ):
+            for i in range(5):
+                await excuse_service.generate_excuses(ExcuseCategory.LATE, UrgencyLevel.NORMAL, language=f"xx-{i}")
+        
+        assert list(excuse_service.diversity._indexes) == [("late", "other")]
+    
+    @pytest.mark.asyncio
+    async def test_avoid_recent_off(self, excuse_service):
+        """Pre-generation can opt out of the recently served check."""
+        with patch.object(
+            excuse_service.client.chat.completions,
+            "create",
+            new_callable=AsyncMock,
+            return_value=_completion(TRAIN, DOG),
+        ) as create:
+            for _ in range(2):
+                excuses, _ = await excuse_service.generate_excuses_with_usage(
+                    ExcuseCategory.LATE, UrgencyLevel.NORMAL, avoid_recent=False
+                )
+        
+        assert [e.text for e in excuses] == [TRAIN, DOG]
+        assert create.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_backfills_when_topups_exhausted(self, excuse_service):
+        """Should keep the requested count even when top-ups repeat themselves."""
+        with patch.object(
+            excuse_service.client.chat.completions,
+            "create",
+            new_callable=AsyncMock,
+            side_effect=[_completion(TRAIN, TRAIN, DOG), _completion(DOG)],
+        ) as create:
+            excuses = await excuse_service.generate_excuses(ExcuseCategory.LATE, UrgencyLevel.NORMAL)
+        
+        assert len(excuses) == 3
+        assert create.call_count == 1 + excuse_service.max_topups
+    
+    @pytest.mark.asyncio
+    async def test_unparseable_topup_ignored(self, excuse_service):
+        """An unparseable top-up should not replace real excuses."""
+        bad = MagicMock()
+        bad.choices = [MagicMock(message=MagicMock(content="not json"))]
+        bad.usage = None
+        with patch.object(
+            excuse_service.client.chat.completions,
+            "create",
+            new_callable=AsyncMock,
+            side_effect=[_completion(TRAIN, TRAIN_AGAIN), bad],
+        ):
+            excuses, usage = await excuse_service.generate_excuses_with_usage(
+                ExcuseCategory.LATE, UrgencyLevel.NORMAL
+            )
+        
+        assert [e.text for e in excuses] == [TRAIN, TRAIN_AGAIN]
+        assert usage.prompt_tokens == 100
+
 
 class TestGetExcuseServiceSingleton:
     """Tests for get_excuse_service singleton."""
@@ -0,0 +1,171 @@
+"""Tests for the subscription expiry scheduler."""
+import asyncio
+import pytest
+
+from app.services.expiry_scheduler import ExpiryScheduler
+
+
+@pytest.fixture
+def fired():
+    return []
+
+
+@pytest.fixture
+def scheduler(fired):
+    return ExpiryScheduler(fired.append, clock=lambda: 0.0)
+
+
+class TestExpiryScheduler:
+    """Tests for ExpiryScheduler class."""
+    
+    def test_fires_in_deadline_order(self, scheduler, fired):
+        """Due expiries should fire earliest first."""
+        scheduler.schedule("b", 20.0)
+        scheduler.schedule("a", 10.0)
+        scheduler.schedule("c", 30.0)
+        
+        assert scheduler.run_pending(now=25.0) == 2
+        assert fired == ["a", "b"]
+        assert len(scheduler) == 1
+    
+    def test_reschedule_skips_stale_entry(self, scheduler, fired):
+        """Only the latest deadline for a device should fire."""
+        scheduler.schedule("a", 10.0)
+        scheduler.schedule("a", 50.0)
+        
+        assert scheduler.run_pending(now=20.0) == 0
+        assert scheduler.run_pending(now=50.0) == 1
+        assert fired == ["a"]
+    
+    def test_cancel(self, scheduler, fired):
+        """Cancelled devices should never fire."""
+        scheduler.schedule("a", 10.0)
+        scheduler.cancel("a")
+        
+        assert scheduler.run_pending(now=100.0) == 0
+        assert fired == []
+    
+    def test_listeners_receive_events(self, scheduler):
+        """Listeners should be notified of each expiry."""
+        events = []
+        scheduler.add_listener(events.append)
+        scheduler.schedule("a", 1.0)
+        
+        scheduler.run_pending(now=1.0)
+        
+        assert events == ["a"]
+    
+    def test_bulk_load(self, scheduler, fired):
+        """Bulk-loaded deadlines should fire like scheduled ones."""
+        scheduler.schedule("existing", 5.0)
+        scheduler.bulk_load((f"device_{i}", float(i)) for i in range(1000, 0, -1))
+        
+        assert len(scheduler) == 1001
+        assert scheduler.run_pending(now=10.0) == 11
+        assert fired[:3] == ["device_1", "device_2", "device_3"]
+        assert "existing" in fired
+    
+    def test_failing_callback_does_not_stop_others(self):
+        """A raising callback should be logged and the other expiries still fire."""
+        fired = []
+        
+        def on_expire(device_id):
+            if device_id == "bad":
+                raise RuntimeError("boom")
+            fired.append(device_id)
+        
+        scheduler = ExpiryScheduler(on_expire, clock=lambda: 0.0)
+        scheduler.add_listener(fired.append)
+        scheduler.schedule("bad", 1.0)
+        scheduler.schedule("good", 2.0)
+        
+        assert scheduler.run_pending(now=5.0) == 2
+        assert fired == ["bad", "good", "good"]
+    
+    @pytest.mark.asyncio
+    async def test_guard_wraps_each_expiry(self):
+        """With a guard set, each expiry should fire through it and the task survive errors."""
+        import time
+        fired = []
+        guarded = []
+        
+        async def guard(device_id, fn, *args):
+            guarded.append(device_id)
+            if device_id == "broken":
+                raise RuntimeError("lock failed")
+            fn(*args)
+        
+        scheduler = ExpiryScheduler(fired.append)
+        scheduler.guard = guard
+        await scheduler.start()
+        scheduler.schedule("broken", time.monotonic() + 0.01)
+        scheduler.schedule("soon", time.monotonic() + 0.02)
+        await asyncio.sleep(0.1)
+        scheduler.schedule("later", time.monotonic() + 0.01)
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        
+        assert guarded == ["broken", "soon", "later"]
+        assert fired == ["soon", "later"]
+    
+    def test_rescheduled_while_guarded_skipped(self, scheduler, fired):
+        """A device rescheduled before its guarded expiry runs should not fire."""
+        scheduler.schedule("a", 1.0)
+        due = scheduler._pop_due(5.0)
+        scheduler.schedule("a", 100.0)
+        
+        scheduler._fire(due[0])
+        
+        assert fired == []
+        assert len(scheduler) == 1
+    
+    @pytest.mark.asyncio
+    async def test_background_task_fires_on_time(self):
+        """The background task should fire expiries without polling reads."""
+        import time
+        fired = []
+        scheduler = ExpiryScheduler(fired.append)
+        await scheduler.start()
+        scheduler.schedule("soon", time.monotonic() + 0.02)
+        
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        
+        assert fired == ["soon"]
+    
+    @pytest.mark.asyncio
+    async def test_earlier_deadline_wakes_task(self):
+        """Scheduling an earlier deadline should wake a sleeping task."""
+        import time
+        fired = []
+        scheduler = ExpiryScheduler(fired.append)
+        scheduler.schedule("late", time.monotonic() + 60)
+        await scheduler.start()
+        await asyncio.sleep(0)
+        
+        scheduler.schedule("soon", time.monotonic() + 0.01)
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        
+        assert fired == ["soon"]
+    
+    @pytest.mark.asyncio
+    async def test_schedule_from_worker_thread(self):
+        """Scheduling from a worker thread should wake the task through the loop."""
+        import time
+        fired = []
+        scheduler = ExpiryScheduler(fired.append)
+        scheduler.schedule("late", time.monotonic() + 60)
+        await scheduler.start()
+        await asyncio.sleep(0)
+        
+        await asyncio.to_thread(scheduler.schedule, "soon", time.monotonic() + 0.01)
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        
+        assert fired == ["soon"]
+    
+    @pytest.mark.asyncio
+    async def test_stop_without_start(self, scheduler):
+        """Stopping an idle scheduler should be a no-op."""
+        await scheduler.stop()
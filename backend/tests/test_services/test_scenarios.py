@@ -0,0 +1,65 @@
+"""Tests for SEO scenario dimensions."""
+import json
+import pytest
+from pathlib import Path
+
+from app.schemas.excuse import ExcuseCategory, UrgencyLevel
+from app.services.scenarios import (
+    INDUSTRIES,
+    RECIPIENTS,
+    SCENARIOS,
+    STYLES,
+    ScenarioTuple,
+    resolve_scenario,
+    scenario_prompt,
+)
+
+DIMENSIONS_PATH = Path(__file__).resolve().parents[3] / "programmatic-seo" / "dimensions.json"
+
+
+class TestScenarios:
+    """Tests for scenario tuples and prompt fragments."""
+
+    def test_resolve_scenario(self):
+        """Known ids should resolve to a tuple with derived category and urgency."""
+        scenario = resolve_scenario("sick-leave", "boss", "funny", None)
+
+        assert scenario == ScenarioTuple("sick-leave", "boss", "funny")
+        assert scenario.key == "sick-leave|boss|funny|"
+        assert scenario.category == ExcuseCategory.SICK_LEAVE
+        assert scenario.urgency == UrgencyLevel.EXTREME
+
+    def test_resolve_rejects_unknown_ids(self):
+        """Unknown ids should raise ValueError naming the dimension."""
+        with pytest.raises(ValueError, match="Unknown industry: mining"):
+            resolve_scenario("late-work", industry="mining")
+        with pytest.raises(ValueError, match="Unknown scenario"):
+            resolve_scenario("late-to-mars")
+
+    def test_urgency_defaults_to_normal(self):
+        """Tuples without a style should be normal urgency."""
+        assert ScenarioTuple("wfh").urgency == UrgencyLevel.NORMAL
+
+    def test_scenario_prompt(self):
+        """The prompt should combine every dimension's fragment."""
+        prompt = scenario_prompt(ScenarioTuple("late-work", "boss", "dramatic", "tech"))
+
+        assert "late for work (workplace setting)" in prompt
+        assert "my boss; use a formal register" in prompt
+        assert "server down" in prompt
+        assert "dramatic" in prompt
+        assert scenario_prompt(ScenarioTuple("late-work")).count("\n") == 0
+
+    @pytest.mark.skipif(not DIMENSIONS_PATH.exists(), reason="programmatic-seo not checked out")
+    def test_matches_seo_dimensions(self):
+        """The backend tables should mirror programmatic-seo/dimensions.json."""
+        dimensions = json.loads(DIMENSIONS_PATH.read_text(encoding="utf-8"))
+
+        assert [s["id"] for s in dimensions["scenarios"]] == list(SCENARIOS)
+        assert [r["id"] for r in dimensions["recipients"]] == list(RECIPIENTS)
+        assert [s["id"] for s in dimensions["styles"]] == list(STYLES)
+        assert [i["id"] for i in dimensions["industries"]] == list(INDUSTRIES)
+        for style in dimensions["styles"]:
+            assert STYLES[style["id"]][1] == style["tone"]
+        for recipient in dimensions["recipients"]:
+            assert RECIPIENTS[recipient["id"]][1] == recipient["formality"]
@@ -0,0 +1,117 @@
+"""Tests for per-device served-excuse history."""
+import pytest
+
+from app.schemas.excuse import Excuse
+from app.services.seen_history import SeenHistory, excuse_hash
+
+
+def _excuses(*texts):
+    return [Excuse(text=t, tone="sincere", tip="") for t in texts]
+
+
+@pytest.fixture
+def history():
+    return SeenHistory(per_device=3, max_devices=2)
+
+
+class TestSeenHistory:
+    """Tests for SeenHistory."""
+
+    def test_unknown_device_sees_everything(self, history):
+        """A device with no history should get every excuse."""
+        excuses = _excuses("a", "b")
+        assert history.unseen("device_1", excuses) == excuses
+
+    def test_served_excuses_filtered(self, history):
+        """Excuses served to a device should be filtered for it only."""
+        history.mark_seen("device_1", _excuses("a", "b"))
+
+        assert [e.text for e in history.unseen("device_1", _excuses("a", "b", "c"))] == ["c"]
+        assert len(history.unseen("device_2", _excuses("a", "b"))) == 2
+
+    def test_hash_ignores_tone_and_tip(self):
+        """The same text should be the same excuse."""
+        assert excuse_hash(Excuse(text="a", tone="x", tip="1")) == excuse_hash(Excuse(text="a", tone="y", tip=""))
+
+    def test_ring_keeps_most_recent(self, history):
+        """Only the last per_device excuses should be remembered."""
+        history.mark_seen("device_1", _excuses("a", "b"))
+        history.mark_seen("device_1", _excuses("c", "d", "a"))
+
+        assert [e.text for e in history.unseen("device_1", _excuses("a", "b", "c", "d"))] == ["b"]
+
+    def test_least_recent_device_evicted(self, history):
+        """Past max_devices the least recently active device should be dropped."""
+        history.mark_seen("device_1", _excuses("a"))
+        history.mark_seen("device_2", _excuses("a"))
+        history.mark_seen("device_1", _excuses("b"))
+        history.mark_seen("device_3", _excuses("a"))
+
+        assert len(history) == 2
+        assert history.unseen("device_2", _excuses("a")) != []
+        assert history.unseen("device_1", _excuses("a")) == []
+
+    def test_forget(self, history):
+        """Forgetting a device should clear its history."""
+        history.mark_seen("device_1", _excuses("a"))
+        history.forget("device_1")
+        history.forget("device_unknown")
+
+        assert len(history) == 0
+
+
+class TestSeenHistoryPersistence:
+    """Tests for saving and loading the history."""
+
+    def test_round_trip(self, tmp_path, history):
+        """A saved history should load back identically."""
+        path = str(tmp_path / "seen.bin")
+        history.mark_seen("device_1", _excuses("a", "b"))
+        history.mark_seen("device_2", _excuses("c"))
+        history.save(path)
+
+        loaded = SeenHistory(per_device=3, max_devices=2)
+        loaded.load(path)
+
+        assert len(loaded) == 2
+        assert loaded.unseen("device_1", _excuses("a", "b", "c")) == _excuses("c")
+        assert loaded.unseen("device_2", _excuses("c")) == []
+
+    def test_missing_file(self, tmp_path, history):
+        """Loading a missing file should leave the history empty."""
+        history.load(str(tmp_path / "missing.bin"))
+        assert len(history) == 0
+
+    def test_smaller_limits_applied(self, tmp_path, history):
+        """Loading into smaller limits should keep the most recent entries."""
+        path = str(tmp_path / "seen.bin")
+        history.mark_seen("device_1", _excuses("a"))
+        history.mark_seen("device_2", _excuses("a", "b", "c"))
+        history.save(path)
+
+        loaded = SeenHistory(per_device=2, max_devices=1)
+        loaded.load(path)
+
+        assert len(loaded) == 1
+        assert len(loaded.unseen("device_1", _excuses("a"))) == 1
+        assert [e.text for e in loaded.unseen("device_2", _excuses("a", "b", "c"))] == ["a"]
+
+    @pytest.mark.parametrize("damage", ["flip", "truncate"])
+    def test_corrupt_file_starts_empty(self, tmp_path, history, caplog, damage):
+        """A corrupted file should be logged and skipped, leaving the history empty."""
+        path = tmp_path / "seen.bin"
+        history.mark_seen("device_1", _excuses("a"))
+        history.save(str(path))
+        data = bytearray(path.read_bytes())
+        if damage == "flip":
+            data[-1] ^= 0xFF
+        else:
+            del data[4:]
+        path.write_bytes(bytes(data))
+        loaded = SeenHistory()
+        loaded.mark_seen("device_2", _excuses("b"))
+
+        loaded.load(str(path))
+
+        assert len(loaded) == 0
+        assert "seen history" in caplog.text
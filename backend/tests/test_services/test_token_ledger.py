@@ -0,0 +1,419 @@
+"""Tests for the token ledger."""
+import os
+import pytest
+from array import array
+from datetime import datetime, timedelta
+
+from app.services.token_ledger import (
+    OP_ADD,
+    OP_CLAIM,
+    OP_FREE_TRIAL,
+    OP_RESET,
+    OP_UNLIMITED,
+    OP_USE,
+    SNAPSHOT_FILE,
+    TokenLedger,
+    apply_block,
+    encode_block,
+    read_blocks,
+    read_snapshot,
+)
+from app.services.token_service import TokenService
+
+
+@pytest.fixture
+def ledger_dir(tmp_path):
+    return str(tmp_path / "ledger")
+
+
+@pytest.fixture
+def test_device_id():
+    return "test_device_123456789"
+
+
+def _log_files(directory):
+    return sorted(f for f in os.listdir(directory) if f.endswith(".log"))
+
+
+class _TornWrites:
+    """A log file whose first write stops halfway with ENOSPC."""
+
+    def __init__(self, f, truncate_fails=False):
+        self.f = f
+        self.truncate_fails = truncate_fails
+        self.failed = False
+
+    def write(self, data):
+        if not self.failed:
+            self.failed = True
+            self.f.write(bytes(data[:len(data) // 2]))
+            raise OSError(28, "No space left on device")
+        return self.f.write(data)
+
+    def truncate(self, size):
+        if self.truncate_fails:
+            raise OSError(5, "Input/output error")
+        return self.f.truncate(size)
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+class TestBlockFormat:
+    """Tests for the binary block encoding."""
+
+    def test_round_trip(self, tmp_path):
+        """Encoded blocks should decode to the same events."""
+        path = tmp_path / "x.log"
+        block = encode_block(
+            ["device_a", "デバイス_b"],
+            bytes([OP_USE, OP_ADD, OP_USE]),
+            array("I", [0, 1, 0]),
+            array("d", [0.0, 10.0, 0.0]),
+        )
+        path.write_bytes(block + block)
+
+        blocks = list(read_blocks(str(path)))
+
+        assert len(blocks) == 2
+        names, ops, idx, values = blocks[0]
+        assert names == ["device_a", "デバイス_b"]
+        assert list(ops) == [OP_USE, OP_ADD, OP_USE]
+        assert list(idx) == [0, 1, 0]
+        assert list(values) == [0.0, 10.0, 0.0]
+
+    def test_torn_tail_ignored(self, tmp_path):
+        """A partially written final block should be skipped."""
+        path = tmp_path / "x.log"
+        block = encode_block(["a"], bytes([OP_USE]), array("I", [0]), array("d", [0.0]))
+        path.write_bytes(block + block[:-3])
+
+        assert len(list(read_blocks(str(path)))) == 1
+
+    def test_corrupt_block_ignored(self, tmp_path):
+        """A block failing its CRC should stop replay of that file."""
+        path = tmp_path / "x.log"
+        block = bytearray(encode_block(["a"], bytes([OP_USE]), array("I", [0]), array("d", [0.0])))
+        block[-1] ^= 0xFF
+        path.write_bytes(bytes(block))
+
+        assert list(read_blocks(str(path))) == []
+
+
+class TestApplyBlock:
+    """Tests for replaying blocks into a table."""
+
+    def test_aggregated_fast_path(self):
+        """Blocks without resets should aggregate counts per device."""
+        table = {}
+        apply_block(
+            table,
+            ["a", "b"],
+            bytes([OP_FREE_TRIAL, OP_ADD, OP_USE, OP_USE, OP_UNLIMITED, OP_USE]),
+            array("I", [0, 0, 0, 0, 1, 1]),
+            array("d", [0, 5, 0, 0, 1234.5, 0]),
+        )
+
+        assert table["a"] == [5, 2, True, False, 0.0]
+        assert table["b"] == [0, 1, False, True, 1234.5]
+
+    def test_reset_is_order_sensitive(self):
+        """Events before a reset should be discarded, events after kept."""
+        table = {}
+        apply_block(
+            table,
+            ["a"],
+            bytes([OP_ADD, OP_USE, OP_RESET, OP_ADD, OP_FREE_TRIAL, OP_UNLIMITED]),
+            array("I", [0] * 6),
+            array("d", [10, 0, 0, 3, 0, 99.0]),
+        )
+
+        assert table["a"] == [3, 0, True, True, 99.0]
+
+    def test_reset_drops_earlier_table_row(self):
+        """A reset should drop state replayed from earlier files."""
+        table = {"a": [10, 4, True, False, 0.0], "b": [1, 0, False, False, 0.0]}
+        apply_block(
+            table,
+            ["a", "b"],
+            bytes([OP_RESET, OP_USE]),
+            array("I", [0, 1]),
+            array("d", [0, 0]),
+        )
+
+        assert "a" not in table
+        assert table["b"] == [1, 1, False, False, 0.0]
+
+
+class TestTokenLedger:
+    """Tests for TokenLedger class."""
+
+    def test_flush_and_load(self, ledger_dir):
+        """Flushed events should be rebuilt on load."""
+        ledger = TokenLedger(ledger_dir)
+        ledger.append(OP_FREE_TRIAL, "device_a")
+        ledger.append(OP_ADD, "device_a", 10)
+        ledger.append(OP_USE, "device_a")
+        ledger.close()
+
+        devices = TokenLedger(ledger_dir).load()
+
+        assert devices["device_a"] == {
+            "total_tokens": 10,
+            "used_tokens": 1,
+            "free_trial_used": True,
+            "is_unlimited": False,
+            "unlimited_until": None,
+        }
+
+    def test_unflushed_events_not_durable(self, ledger_dir):
+        """Events are only durable once flushed."""
+        ledger = TokenLedger(ledger_dir)
+        ledger.append(OP_ADD, "device_a", 10)
+
+        assert TokenLedger(ledger_dir).load() == {}
+        ledger.close()
+
+    def test_compaction_folds_logs_into_snapshot(self, ledger_dir):
+        """Compaction should produce a snapshot and drop closed logs."""
+        ledger = TokenLedger(ledger_dir)
+        for _ in range(5):
+            ledger.append(OP_ADD, "device_a", 2)
+        ledger.compact()
+        ledger.append(OP_USE, "device_a")
+        ledger.close()
+
+        generation, table = read_snapshot(os.path.join(ledger_dir, SNAPSHOT_FILE))
+        assert table["device_a"][0] == 10
+        assert _log_files(ledger_dir) == [f"ledger-{generation:08d}.log"]
+
+        devices = TokenLedger(ledger_dir).load()
+        assert devices["device_a"]["total_tokens"] == 10
+        assert devices["device_a"]["used_tokens"] == 1
+
+    def test_repeated_compaction_and_restarts(self, ledger_dir):
+        """State should survive several restart and compaction cycles."""
+        for cycle in range(3):
+            ledger = TokenLedger(ledger_dir)
+            ledger.append(OP_ADD, "device_a", 1)
+            ledger.append(OP_ADD, f"device_{cycle}", 1)
+            if cycle % 2 == 0:
+                ledger.compact()
+            ledger.close()
+
+        devices = TokenLedger(ledger_dir).load()
+        assert devices["device_a"]["total_tokens"] == 3
+        assert {d for d in devices} == {"device_a", "device_0", "device_1", "device_2"}
+
+    def test_interning_resets_per_generation(self, ledger_dir):
+        """Device indexes must not leak across log generations."""
+        ledger = TokenLedger(ledger_dir)
+        ledger.append(OP_ADD, "device_a", 1)
+        ledger.compact()
+        ledger.append(OP_ADD, "device_b", 5)
+        ledger.close()
+
+        devices = TokenLedger(ledger_dir).load()
+        assert devices["device_a"]["total_tokens"] == 1
+        assert devices["device_b"]["total_tokens"] == 5
+
+    def test_corrupt_snapshot_raises(self, ledger_dir):
+        """A corrupt snapshot should fail loudly rather than lose balances."""
+        ledger = TokenLedger(ledger_dir)
+        ledger.append(OP_ADD, "device_a", 1)
+        ledger.compact()
+        ledger.close()
+        path = os.path.join(ledger_dir, SNAPSHOT_FILE)
+        data = bytearray(open(path, "rb").read())
+        data[-1] ^= 0xFF
+        open(path, "wb").write(bytes(data))
+
+        with pytest.raises(ValueError):
+            TokenLedger(ledger_dir).load()
+
+    def test_background_thread_group_commits(self, ledger_dir):
+        """The flusher thread should persist and compact on its own."""
+        import time
+        ledger = TokenLedger(ledger_dir, flush_interval=0.01, snapshot_events=3)
+        ledger.start()
+        for _ in range(4):
+            ledger.append(OP_ADD, "device_a", 1)
+        time.sleep(0.1)
+
+        assert os.path.exists(os.path.join(ledger_dir, SNAPSHOT_FILE))
+        assert TokenLedger(ledger_dir).load()["device_a"]["total_tokens"] == 4
+        ledger.close()
+
+    def test_checkpoint_after_compaction(self, ledger_dir):
+        """on_checkpoint should run after a compaction even inside the interval."""
+        import time
+        from unittest.mock import MagicMock
+        ledger = TokenLedger(ledger_dir, flush_interval=0.01, snapshot_events=1, checkpoint_interval=3600)
+        ledger.on_checkpoint = MagicMock()
+        ledger.start()
+        time.sleep(0.05)
+        assert ledger.on_checkpoint.call_count == 0
+
+        ledger.append(OP_ADD, "device_a", 1)
+        time.sleep(0.1)
+        ledger.close()
+
+        assert ledger.on_checkpoint.call_count == 1
+
+    def test_failed_write_truncated_and_retried(self, ledger_dir):
+        """A torn write should be cut off and its events written by the next flush."""
+        ledger = TokenLedger(ledger_dir)
+        ledger.append(OP_ADD, "device_a", 1)
+        ledger.flush()
+        ledger._file = _TornWrites(ledger._file)
+        ledger.append(OP_ADD, "device_b", 5)
+
+        with pytest.raises(OSError):
+            ledger.flush()
+        ledger.append(OP_ADD, "device_c", 7)
+        ledger.append(OP_USE, "device_b")
+        ledger.close()
+
+        devices = TokenLedger(ledger_dir).load()
+        assert devices["device_a"]["total_tokens"] == 1
+        assert devices["device_b"]["total_tokens"] == 5
+        assert devices["device_b"]["used_tokens"] == 1
+        assert devices["device_c"]["total_tokens"] == 7
+
+    def test_rotates_when_truncate_fails(self, ledger_dir):
+        """If the torn tail cannot be cut off, later blocks should go to a new log."""
+        ledger = TokenLedger(ledger_dir)
+        ledger.append(OP_ADD, "device_a", 1)
+        ledger.flush()
+        ledger._file = _TornWrites(ledger._file, truncate_fails=True)
+        ledger.append(OP_ADD, "device_a", 2)
+        ledger.append(OP_ADD, "device_b", 5)
+
+        with pytest.raises(OSError):
+            ledger.flush()
+        ledger.append(OP_USE, "device_b")
+        ledger.close()
+
+        assert len(_log_files(ledger_dir)) == 2
+        devices = TokenLedger(ledger_dir).load()
+        assert devices["device_a"]["total_tokens"] == 3
+        assert devices["device_b"]["total_tokens"] == 5
+        assert devices["device_b"]["used_tokens"] == 1
+
+    def test_keys_survive_compaction(self, ledger_dir):
+        """Dedupe keys should replay from logs and snapshots, trimmed to the most recent."""
+        ledger = TokenLedger(ledger_dir, max_keys=2)
+        for checkout_id in ("ch_1", "ch_2", "ch_3"):
+            ledger.append(OP_CLAIM, checkout_id)
+        ledger.append(OP_ADD, "device_a", 1)
+        ledger.compact()
+        ledger.append(OP_CLAIM, "ch_4")
+        ledger.close()
+
+        devices, keys = TokenLedger(ledger_dir).load_state()
+
+        assert list(devices) == ["device_a"]
+        assert keys == {OP_CLAIM: ["ch_2", "ch_3", "ch_4"]}
+
+
+class TestTokenServiceDurability:
+    """Tests for TokenService backed by a ledger."""
+
+    def test_state_rebuilt_after_restart(self, ledger_dir, test_device_id):
+        """Balances should survive a restart."""
+        service = TokenService(ledger=TokenLedger(ledger_dir))
+        service.use_token(test_device_id)  # free trial
+        service.add_tokens(test_device_id, 10)
+        service.use_token(test_device_id)
+        service.close()
+
+        restarted = TokenService(ledger=TokenLedger(ledger_dir))
+        status = restarted.get_token_status(test_device_id)
+
+        assert status.free_trial_used == True
+        assert status.total_tokens == 10
+        assert status.remaining_tokens == 9
+        restarted.close()
+
+    def test_unlimited_rescheduled_after_restart(self, ledger_dir, test_device_id):
+        """Live subscriptions should come back with a scheduled expiry."""
+        service = TokenService(ledger=TokenLedger(ledger_dir))
+        service.set_unlimited(test_device_id)
+        service.close()
+
+        restarted = TokenService(ledger=TokenLedger(ledger_dir))
+
+        assert restarted.get_token_status(test_device_id).is_unlimited == True
+        assert len(restarted.expiry) == 1
+        restarted.close()
+
+    def test_reset_persisted(self, ledger_dir, test_device_id):
+        """Resets should be replayed."""
+        service = TokenService(ledger=TokenLedger(ledger_dir))
+        service.add_tokens(test_device_id, 10)
+        service.reset_device(test_device_id)
+        service.close()
+
+        restarted = TokenService(ledger=TokenLedger(ledger_dir))
+
+        assert restarted.get_token_status(test_device_id).total_tokens == 0
+        restarted.close()
+
+    def test_seen_history_persisted(self, ledger_dir, test_device_id):
+        """Served excuses should be remembered across a restart."""
+        from app.schemas.excuse import Excuse
+        excuses = [Excuse(text="Pre-generated", tone="sincere", tip="")]
+        service = TokenService(ledger=TokenLedger(ledger_dir))
+        service.seen.mark_seen(test_device_id, excuses)
+        service.close()
+
+        restarted = TokenService(ledger=TokenLedger(ledger_dir))
+
+        assert restarted.seen.unseen(test_device_id, excuses) == []
+        restarted.reset_device(test_device_id)
+        assert restarted.seen.unseen(test_device_id, excuses) == excuses
+        restarted.close()
+
+    def test_seen_history_saved_without_close(self, ledger_dir, test_device_id):
+        """The ledger thread should save the seen history, so a crash keeps it."""
+        import time
+        from app.schemas.excuse import Excuse
+        excuses = [Excuse(text="Pre-generated", tone="sincere", tip="")]
+        ledger = TokenLedger(ledger_dir, flush_interval=0.01, checkpoint_interval=0.0)
+        service = TokenService(ledger=ledger)
+        ledger.start()
+        service.seen.mark_seen(test_device_id, excuses)
+        time.sleep(0.1)
+
+        restarted = TokenService(ledger=TokenLedger(ledger_dir))
+
+        assert service.seen.dirty == False
+        assert restarted.seen.unseen(test_device_id, excuses) == []
+        service.close()
+        restarted.close()
+
+    def test_checkout_claims_persisted(self, ledger_dir, test_device_id):
+        """A checkout credited before a restart should not be credited again."""
+        service = TokenService(ledger=TokenLedger(ledger_dir))
+        service.credit_checkout("ch_1", test_device_id, tokens=10)
+        service.close()
+
+        restarted = TokenService(ledger=TokenLedger(ledger_dir))
+
+        assert restarted.credit_checkout("ch_1", test_device_id, tokens=10) == False
+        assert restarted.get_token_status(test_device_id).total_tokens == 10
+        restarted.close()
+
+    def test_get_token_service_uses_configured_ledger(self, ledger_dir):
+        """The singleton should attach a ledger when a directory is configured."""
+        import app.services.token_service as ts
+        from unittest.mock import patch
+
+        settings = ts.get_settings().model_copy(update={"token_ledger_dir": ledger_dir})
+        ts._token_service = None
+        with patch("app.services.token_service.get_settings", return_value=settings):
+            service = ts.get_token_service()
+
+        assert service._ledger is not None
+        service.close()
+        ts._token_service = None
@@ -1,9 +1,12 @@
 """Tests for token service."""
+import asyncio
+import json
+import time
 import pytest
 from datetime import datetime, timedelta
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
-from app.services.token_service import TokenService, get_token_service
+from app.services.token_service import AsyncTokenService, TokenService, get_async_token_service, get_token_service
 
 
 @pytest.fixture
@@ -49,6 +52,7 @@ class TestTokenService:
         
         assert result.success == True
         assert "Free trial" in result.message
+        assert result.source == "free_trial"
         
         status = token_service.get_token_status(test_device_id)
         assert status.free_trial_used == True
@@ -77,6 +81,7 @@ class TestTokenService:
         
         assert result.success == True
         assert result.remaining_tokens == 4
+        assert result.source == "token"
     
     def test_cannot_use_when_no_tokens(self, token_service, test_device_id):
         """Should fail when no tokens remaining."""
@@ -115,11 +120,65 @@ class TestTokenService:
         
         # Manually expire the subscription
         data = token_service._get_device_data(test_device_id)
-        data["unlimited_until"] = datetime.now() - timedelta(days=1)
+        data["unlimited_deadline"] = time.monotonic() - 1
         
         status = token_service.get_token_status(test_device_id)
         assert status.is_unlimited == False
     
+    def test_expired_read_does_not_mutate(self, token_service, test_device_id):
+        """Reads past the deadline should not flip state themselves."""
+        token_service.set_unlimited(test_device_id)
+        data = token_service._get_device_data(test_device_id)
+        data["unlimited_deadline"] = time.monotonic() - 1
+        
+        token_service.get_token_status(test_device_id)
+        
+        assert data["is_unlimited"] == True
+    
+    def test_scheduler_flips_state_at_expiry(self, token_service, test_device_id):
+        """The expiry scheduler should turn unlimited access off."""
+        expired = []
+        token_service.expiry.add_listener(expired.append)
+        token_service.set_unlimited(test_device_id)
+        deadline = token_service._get_device_data(test_device_id)["unlimited_deadline"]
+        
+        assert token_service.expiry.run_pending(now=deadline - 1) == 0
+        assert token_service.expiry.run_pending(now=deadline) == 1
+        
+        data = token_service._get_device_data(test_device_id)
+        assert data["is_unlimited"] == False
+        assert expired == [test_device_id]
+        assert json.loads(token_service.get_status_snapshot(test_device_id).status_json)["is_unlimited"] == False
+    
+    def test_reset_cancels_expiry(self, token_service, test_device_id):
+        """Resetting a device should drop its pending expiry."""
+        token_service.set_unlimited(test_device_id)
+        token_service.reset_device(test_device_id)
+        
+        assert len(token_service.expiry) == 0
+    
+    def test_load_devices(self, token_service):
+        """Bulk-loaded devices should restore balances and live subscriptions."""
+        token_service.load_devices([
+            ("device_paid_123456", {
+                "total_tokens": 10, "used_tokens": 4, "free_trial_used": True,
+                "is_unlimited": False, "unlimited_until": None,
+            }),
+            ("device_live_123456", {
+                "total_tokens": 0, "used_tokens": 0, "free_trial_used": True,
+                "is_unlimited": True, "unlimited_until": datetime.now() + timedelta(days=3),
+            }),
+            ("device_lapsed_1234", {
+                "total_tokens": 0, "used_tokens": 0, "free_trial_used": True,
+                "is_unlimited": True, "unlimited_until": datetime.now() - timedelta(days=3),
+            }),
+        ])
+        
+        assert token_service.get_token_status("device_paid_123456").remaining_tokens == 6
+        assert token_service.get_token_status("device_live_123456").is_unlimited == True
+        assert token_service.get_token_status("device_lapsed_1234").is_unlimited == False
+        assert len(token_service.expiry) == 1
+    
     def test_reset_device(self, token_service, test_device_id):
         """Should be able to reset device data."""
         token_service.add_tokens(test_device_id, 10)
@@ -148,6 +207,96 @@ class TestTokenService:
         
         assert status1.total_tokens == 10
         assert status2.total_tokens == 0
+    
+    def test_credit_checkout_once(self, token_service, test_device_id):
+        """A checkout should only be credited once."""
+        assert token_service.credit_checkout("ch_1", test_device_id, tokens=3) == True
+        assert token_service.credit_checkout("ch_1", test_device_id, tokens=3) == False
+        assert token_service.credit_checkout("ch_2", test_device_id, months=1) == True
+        
+        status = token_service.get_token_status(test_device_id)
+        assert status.total_tokens == 3
+        assert status.is_unlimited == True
+    
+    def test_failed_credit_leaves_checkout_unclaimed(self, token_service, test_device_id):
+        """If crediting raises, a redelivery should still be able to credit."""
+        with patch.object(token_service, "_start_unlimited", side_effect=RuntimeError("boom")):
+            with pytest.raises(RuntimeError):
+                token_service.credit_checkout("ch_1", test_device_id, months=1)
+        
+        assert token_service.credit_checkout("ch_1", test_device_id, months=1) == True
+    
+    def test_claimed_checkouts_bounded(self, token_service, test_device_id):
+        """The oldest claims should be forgotten past the limit."""
+        token_service.settings = MagicMock(webhook_dedupe_max_entries=2)
+        for checkout_id in ("ch_1", "ch_2", "ch_3"):
+            token_service.credit_checkout(checkout_id, test_device_id, tokens=1)
+        
+        assert token_service.credit_checkout("ch_3", test_device_id, tokens=1) == False
+        assert token_service.credit_checkout("ch_1", test_device_id, tokens=1) == True
+
+
+class TestStatusSnapshot:
+    """Tests for pre-serialized status snapshots."""
+    
+    def test_snapshot_matches_status(self, token_service, test_device_id):
+        """Snapshot JSON should match the token status model."""
+        token_service.add_tokens(test_device_id, 3)
+        snapshot = token_service.get_status_snapshot(test_device_id)
+        
+        status = token_service.get_token_status(test_device_id)
+        assert json.loads(snapshot.status_json) == status.model_dump()
+        assert json.loads(snapshot.can_generate_json) == {
+            "can_generate": True,
+            "free_trial_available": True,
+            "tokens_remaining": 3,
+            "is_unlimited": False,
+        }
+    
+    def test_reads_reuse_snapshot(self, token_service, test_device_id):
+        """Repeated reads should return the same snapshot object."""
+        first = token_service.get_status_snapshot(test_device_id)
+        second = token_service.get_status_snapshot(test_device_id)
+        
+        assert first is second
+    
+    def test_writes_bump_version(self, token_service, test_device_id):
+        """Each write should produce a new version and ETag."""
+        before = token_service.get_status_snapshot(test_device_id)
+        token_service.use_token(test_device_id)
+        after_use = token_service.get_status_snapshot(test_device_id)
+        token_service.add_tokens(test_device_id, 1)
+        after_add = token_service.get_status_snapshot(test_device_id)
+        
+        assert before.version < after_use.version < after_add.version
+        assert len({before.etag, after_use.etag, after_add.etag}) == 3
+        assert json.loads(after_use.status_json)["free_trial_used"] == True
+    
+    def test_reset_does_not_reuse_etag(self, token_service, test_device_id):
+        """A reset device should never get back an old ETag."""
+        old = token_service.get_status_snapshot(test_device_id)
+        token_service.reset_device(test_device_id)
+        new = token_service.get_status_snapshot(test_device_id)
+        
+        assert old.etag != new.etag
+    
+    def test_representations_have_distinct_etags(self, token_service, test_device_id):
+        """Status and can-generate bodies should not share a validator."""
+        snapshot = token_service.get_status_snapshot(test_device_id)
+        
+        assert snapshot.etag != snapshot.can_generate_etag
+    
+    def test_unlimited_snapshot_rerendered_after_expiry(self, token_service, test_device_id):
+        """Snapshot should be rebuilt once unlimited access lapses."""
+        token_service.use_token(test_device_id)
+        token_service.set_unlimited(test_device_id)
+        assert token_service.can_generate(test_device_id) == True
+        
+        data = token_service._get_device_data(test_device_id)
+        data["unlimited_deadline"] = time.monotonic() - 1
+        token_service._snapshots[test_device_id].expires_at = data["unlimited_deadline"]
+        
+        assert token_service.can_generate(test_device_id) == False
 
 
 class TestGetTokenServiceSingleton:
@@ -164,3 +313,108 @@ class TestGetTokenServiceSingleton:
         assert service1 is service2
         
         ts._token_service = None  # Clean up
+
+
+class BlockingTokenService(TokenService):
+    """A store that blocks between reading a balance and acting on it, like a database."""
+    
+    def get_token_status(self, device_id: str):
+        status = super().get_token_status(device_id)
+        time.sleep(0.0001)
+        return status
+
+
+class TestAsyncTokenService:
+    """Tests for the async token API."""
+    
+    async def _stress(self, tokens, device_id, calls=10_000, paid=5_000):
+        await tokens.add_tokens(device_id, paid)
+        results = await asyncio.gather(*(tokens.use_token(device_id) for _ in range(calls)))
+        sources = [r.source for r in results if r.success]
+        status = await tokens.get_token_status(device_id)
+        return sources, status
+    
+    async def test_concurrent_generations_exact(self, test_device_id):
+        """10k simultaneous generations for one device should spend exactly what it has."""
+        tokens = AsyncTokenService(TokenService())
+        
+        sources, status = await self._stress(tokens, test_device_id)
+        
+        assert sources.count("free_trial") == 1
+        assert sources.count("token") == 5_000
+        assert len(sources) == 5_001
+        assert status.used_tokens == 5_000
+        assert status.remaining_tokens == 0
+        assert status.free_trial_used == True
+    
+    async def test_offloaded_blocking_store_exact(self, test_device_id):
+        """A blocking store run in worker threads should stay exact under the stripe locks."""
+        tokens = AsyncTokenService(BlockingTokenService(), offload=True)
+        
+        sources, status = await self._stress(tokens, test_device_id, calls=500, paid=200)
+        
+        assert sources.count("free_trial") == 1
+        assert sources.count("token") == 200
+        assert status.used_tokens == 200
+    
+    async def test_other_devices_not_blocked(self):
+        """A held device lock should not stall a device on another stripe."""
+        tokens = AsyncTokenService(TokenService(), stripes=64)
+        first = "device_aaaaaaaaaa"
+        other = next(d for d in (f"device_{i:010d}" for i in range(100)) if tokens.lock(d) is not tokens.lock(first))
+        
+        async with tokens.lock(first):
+            blocked = asyncio.ensure_future(tokens.use_token(first))
+            result = await asyncio.wait_for(tokens.use_token(other), 1)
+            await asyncio.sleep(0)
+            assert blocked.done() == False
+        
+        assert result.source == "free_trial"
+        assert (await blocked).source == "free_trial"
+    
+    async def test_delegates(self, test_device_id):
+        """The async methods should act on the wrapped service."""
+        service = TokenService()
+        tokens = AsyncTokenService(service)
+        
+        assert await tokens.can_generate(test_device_id) == True
+        assert (await tokens.get_status_snapshot(test_device_id)).can_generate == True
+        assert (await tokens.set_unlimited(test_device_id)).is_unlimited == True
+        assert await tokens.credit_checkout("ch_1", test_device_id, tokens=1) == True
+        assert await tokens.credit_checkout("ch_1", test_device_id, tokens=1) == False
+        assert tokens.seen is service.seen
+        await tokens.reset_device(test_device_id)
+        
+        assert service.get_token_status(test_device_id).is_unlimited == False
+    
+    async def test_expiry_under_device_lock(self, test_device_id):
+        """Expiries should wait for the device's lock."""
+        service = TokenService()
+        tokens = AsyncTokenService(service, offload=True)
+        service.set_unlimited(test_device_id)
+        
+        async with tokens.lock(test_device_id):
+            expiring = asyncio.ensure_future(service.expiry.guard(test_device_id, service._expire_unlimited, test_device_id))
+            await asyncio.sleep(0.01)
+            assert expiring.done() == False
+            assert service.get_token_status(test_device_id).is_unlimited == True
+        await expiring
+        
+        assert service.get_token_status(test_device_id).is_unlimited == False
+    
+    def test_singleton_follows_token_service(self):
+        """The async API should be rebuilt when the token service is replaced."""
+        import app.services.token_service as ts
+        ts._token_service = None
+        try:
+            tokens = get_async_token_service()
+            assert get_async_token_service() is tokens
+            assert tokens.service is get_token_service()
+            assert len(tokens._locks) == 1024
+            
+            ts._token_service = None
+            assert get_async_token_service().service is get_token_service()
+            assert get_async_token_service() is not tokens
+        finally:
+            ts._token_service = None
+            ts._async_token_service = None
@@ -0,0 +1,280 @@
+"""Tests for consistent-hash token sharding."""
+from collections import Counter
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.services.token_service as ts
+from app.schemas.excuse import Excuse
+from app.services.token_ledger import TokenLedger
+from app.services.token_service import TokenService
+from app.services.token_shards import HashRing, ProcessShard, ShardedTokenService
+
+DEVICES = [f"shard_device_{i:06d}" for i in range(2_000)]
+
+
+def _local(n, **kwargs):
+    return ShardedTokenService({f"shard-{i}": TokenService(**kwargs) for i in range(n)})
+
+
+class TestHashRing:
+    """Tests for the consistent-hash ring."""
+
+    def test_spreads_keys(self):
+        """Keys should spread roughly evenly over the nodes."""
+        ring = HashRing(["a", "b", "c", "d"])
+        counts = Counter(ring.node_for(d) for d in DEVICES)
+
+        assert set(counts) == {"a", "b", "c", "d"}
+        assert all(0.15 < c / len(DEVICES) < 0.35 for c in counts.values())
+        assert HashRing(["a", "b", "c", "d"]).node_for(DEVICES[0]) == ring.node_for(DEVICES[0])
+
+    def test_adding_node_moves_only_its_share(self):
+        """A new node should take about 1/N of the keys, and only from the others."""
+        ring = HashRing(["a", "b", "c"])
+        before = {d: ring.node_for(d) for d in DEVICES}
+        ring.add("d")
+        moved = [d for d in DEVICES if ring.node_for(d) != before[d]]
+
+        assert all(ring.node_for(d) == "d" for d in moved)
+        assert 0.15 < len(moved) / len(DEVICES) < 0.35
+
+    def test_membership_errors(self):
+        """Duplicate nodes and lookups on an empty ring should fail."""
+        ring = HashRing(["a"])
+        with pytest.raises(ValueError):
+            ring.add("a")
+        ring.remove("a")
+        with pytest.raises(LookupError):
+            ring.node_for("key")
+
+
+class TestShardedTokenService:
+    """Tests for routing, batching and rebalancing."""
+
+    def test_routes_to_owner(self):
+        """Each device's state should live on the shard that owns it only."""
+        service = _local(3)
+        device_id = DEVICES[0]
+
+        assert service.use_token(device_id).source == "free_trial"
+        service.add_tokens(device_id, 2)
+        owner = service.shard_for(device_id)
+
+        assert owner.get_token_status(device_id).total_tokens == 2
+        assert [s for s in service.shards.values() if device_id in s.device_ids()] == [owner]
+        assert service.can_generate(device_id) == True
+        assert service.get_status_snapshot(device_id).can_generate == True
+        assert service.set_unlimited(device_id).is_unlimited == True
+        assert service.credit_checkout("ch_1", device_id, 1) == True
+        assert service.credit_checkout("ch_1", device_id, 1) == False
+        service.reset_device(device_id)
+        assert service.ping() == 0
+
+    def test_batches_keep_order(self):
+        """Batched calls should come back in input order."""
+        service = _local(4)
+        grants = [(d, i % 5 + 1) for i, d in enumerate(DEVICES[:200])]
+
+        statuses = service.grant_tokens(grants)
+        uses = service.use_tokens([d for d, _ in grants] * 2)
+
+        assert [(s.device_id, s.total_tokens) for s in statuses] == grants
+        assert [u.source for u in uses] == ["free_trial"] * 200 + ["token"] * 200
+        assert service.ping() == 200
+
+    def test_load_devices_routes(self):
+        """Bulk-loaded records should land on their owners."""
+        service = _local(3)
+        record = {"total_tokens": 4, "used_tokens": 1, "free_trial_used": True,
+                  "is_unlimited": False, "unlimited_until": None}
+        service.load_devices((d, dict(record)) for d in DEVICES[:50])
+
+        assert all(service.shard_for(d).get_token_status(d).remaining_tokens == 3 for d in DEVICES[:50])
+
+    def test_add_shard_moves_devices_with_state(self):
+        """Devices taken over by a new shard should keep balances, subscriptions and seen history."""
+        service = _local(2)
+        excuses = [Excuse(text="Seen it", tone="t", tip="t")]
+        service.grant_tokens([(d, 3) for d in DEVICES[:300]])
+        service.use_tokens(DEVICES[:300] * 2)
+        service.set_unlimited(DEVICES[0])
+        for d in DEVICES[:300]:
+            service.seen.mark_seen(d, excuses)
+        before = {d: service.get_token_status(d) for d in DEVICES[:300]}
+
+        new = TokenService()
+        moved = service.add_shard("shard-2", new)
+
+        assert 50 < moved < 150
+        assert len(new.device_ids()) == moved
+        assert service.ping() == 300
+        assert {d: service.get_token_status(d) for d in DEVICES[:300]} == before
+        assert all(service.seen.unseen(d, excuses) == [] for d in DEVICES[:300])
+        assert len(service.seen) == 300
+
+    def test_remove_shard(self):
+        """A removed shard's devices should move to the remaining shards."""
+        service = _local(3)
+        service.grant_tokens([(d, 2) for d in DEVICES[:300]])
+
+        removed = service.remove_shard("shard-1")
+
+        assert removed.device_ids() == []
+        assert set(service.shards) == {"shard-0", "shard-2"}
+        assert all(service.get_token_status(d).total_tokens == 2 for d in DEVICES[:300])
+
+    def test_moved_devices_are_durable(self, tmp_path):
+        """Moved devices should be in the new shard's ledger, and gone from the old one's."""
+        dirs = {name: str(tmp_path / name) for name in ("shard-0", "shard-1")}
+        old = TokenService(ledger=TokenLedger(dirs["shard-0"]))
+        old.grant_tokens([(d, 5) for d in DEVICES[:100]])
+        for d in DEVICES[:100]:
+            old.use_token(d)
+            old.use_token(d)
+        service = ShardedTokenService({"shard-0": old})
+        service.add_shard("shard-1", TokenService(ledger=TokenLedger(dirs["shard-1"])))
+        moved = service.shards["shard-1"].device_ids()
+        service.close()
+
+        restarted = {name: TokenService(ledger=TokenLedger(path)) for name, path in dirs.items()}
+
+        assert sorted(restarted["shard-1"].device_ids()) == sorted(moved)
+        assert not set(moved) & set(restarted["shard-0"].device_ids())
+        status = restarted["shard-1"].get_token_status(moved[0])
+        assert (status.total_tokens, status.used_tokens, status.free_trial_used) == (5, 1, True)
+        for shard in restarted.values():
+            shard.close()
+
+    def test_new_owner_flushed_before_drop(self):
+        """Moved devices should be flushed on the new shard before the old shard drops them."""
+        service = _local(1)
+        service.grant_tokens([(d, 2) for d in DEVICES[:100]])
+        calls = MagicMock()
+        new = TokenService()
+        new.flush = calls.flush
+        service.shards["shard-0"].drop_devices = MagicMock(side_effect=lambda ids: calls.drop(ids))
+
+        service.add_shard("shard-1", new)
+
+        assert [c[0] for c in calls.mock_calls] == ["flush", "drop"]
+
+    async def test_expiry_schedulers(self):
+        """Starting the sharded service should start every shard's scheduler."""
+        service = _local(2)
+
+        await service.expiry.start()
+        assert all(s.expiry._task is not None for s in service.shards.values())
+        await service.expiry.stop()
+
+        assert all(s.expiry._task is None for s in service.shards.values())
+
+
+class TestProcessShard:
+    """Tests for shards in worker processes."""
+
+    def test_remote_shards(self):
+        """Calls, batches and seen history should work across processes."""
+        service = ShardedTokenService({"local": TokenService(), "remote": ProcessShard()})
+        try:
+            excuses = [Excuse(text="Seen it", tone="t", tip="t")]
+            service.grant_tokens([(d, 2) for d in DEVICES[:100]])
+            uses = service.use_tokens(DEVICES[:100])
+            remote = next(d for d in DEVICES if service.ring.node_for(d) == "remote")
+            service.seen.mark_seen(remote, excuses)
+
+            assert all(u.source == "free_trial" for u in uses)
+            assert service.get_token_status(remote).total_tokens == 2
+            assert service.seen.unseen(remote, excuses) == []
+            assert len(service.seen) == 1
+            assert service.ping() == 100
+            with pytest.raises(TypeError):
+                service.shards["remote"].add_tokens()
+            assert service.shards["remote"].get_token_status(remote).total_tokens == 2
+            with pytest.raises(AttributeError):
+                service.shards["remote"]._tokens
+        finally:
+            service.close()
+
+
+class TestShardedSingleton:
+    """Tests for TOKEN_SHARDS."""
+
+    def _get(self, **changes):
+        settings = ts.get_settings().model_copy(update=changes)
+        ts._token_service = None
+        with patch("app.services.token_service.get_settings", return_value=settings):
+            return ts.get_token_service()
+
+    def test_shard_count_change_rebalances(self, tmp_path):
+        """Reopening with more shards should move devices onto their new owners."""
+        directory = str(tmp_path / "ledger")
+        try:
+            service = self._get(token_shards=2, token_ledger_dir=directory)
+            service.grant_tokens([(d, 3) for d in DEVICES[:200]])
+            service.close()
+
+            service = self._get(token_shards=3, token_ledger_dir=directory)
+
+            assert set(service.shards) == {"shard-0", "shard-1", "shard-2"}
+            assert len(service.shards["shard-2"].device_ids()) > 0
+            assert all(service.get_token_status(d).total_tokens == 3 for d in DEVICES[:200])
+            service.close()
+        finally:
+            ts._token_service = None
+
+    @pytest.mark.parametrize("counts", [(4, 2, 1), (1, 3, 2)])
+    def test_shard_count_change_keeps_every_device(self, tmp_path, counts):
+        """Lowering or raising the shard count should adopt devices from the old ledgers."""
+        import os
+        directory = str(tmp_path / "ledger")
+        try:
+            service = self._get(token_shards=counts[0], token_ledger_dir=directory)
+            service.grant_tokens([(d, 3) for d in DEVICES[:200]])
+            for d in DEVICES[:200]:
+                service.use_token(d)
+                service.use_token(d)
+            assert service.credit_checkout("ch_1", DEVICES[0], 1) == True
+            service.close()
+
+            for shards in counts[1:]:
+                service = self._get(token_shards=shards, token_ledger_dir=directory)
+
+                assert service.ping() == 200
+                for d in DEVICES[:200]:
+                    status = service.get_token_status(d)
+                    total = 4 if d == DEVICES[0] else 3
+                    assert (status.total_tokens, status.used_tokens, status.free_trial_used) == (total, 1, True)
+                assert service.credit_checkout("ch_1", DEVICES[0], 1) == False
+                service.close()
+
+            assert sorted(n for n in os.listdir(directory) if n.startswith("shard-")) == (
+                [f"shard-{i}" for i in range(counts[-1])] if counts[-1] > 1 else []
+            )
+            assert os.path.isdir(os.path.join(directory, "retired"))
+        finally:
+            ts._token_service = None
+
+    def test_api_on_shards(self, reset_services):
+        """The routes should work unchanged on a sharded service."""
+        from app.main import app
+        ts._token_service = _local(4)
+        service = ts._token_service
+        device_id = DEVICES[0]
+        service.add_tokens(device_id, 1)
+
+        with patch("app.api.excuse_router.get_excuse_service") as mock_get_service:
+            mock_service = MagicMock()
+            mock_service.generate_excuses = AsyncMock(return_value=[Excuse(text="t", tone="t", tip="t")])
+            mock_get_service.return_value = mock_service
+            client = TestClient(app)
+            responses = [
+                client.post("/api/generate", json={"category": "late", "urgency": "normal", "device_id": device_id})
+                for _ in range(3)
+            ]
+            status = client.get(f"/api/tokens/{device_id}").json()
+
+        assert [r.status_code for r in responses] == [200, 200, 402]
+        assert status["used_tokens"] == 1
+        assert service.shard_for(device_id).get_token_status(device_id).used_tokens == 1
@@ -0,0 +1,127 @@
+"""Tests for usage analytics events."""
+from unittest.mock import patch
+
+import pytest
+
+import app.services.usage_events as ue
+from app.services.usage_events import DIMENSIONS, UsageLog, event_files, read_event_file
+
+EVENT = ("late", "normal", "en", "token", "hit", "ok", 0.25)
+DAY = 20_000 * 86400  # 2024-10-04 00:00 UTC
+
+
+def _decode(columns):
+    names = columns.names
+    return [
+        tuple(names[column[i]] for column in columns.dimensions)
+        for i in range(len(columns.timestamps))
+    ]
+
+
+@pytest.fixture
+def clock():
+    now = [DAY + 3600.0]
+    with patch("app.services.usage_events.time.time", lambda: now[0]):
+        yield now
+
+
+class TestUsageLog:
+    """Tests for UsageLog."""
+
+    def test_round_trip(self, tmp_path, clock):
+        """Events should read back column by column across several blocks."""
+        usage = UsageLog(str(tmp_path))
+        usage.record(*EVENT)
+        usage.flush()
+        usage.record("sick_leave", "urgent", "zh", "free_trial", "none", "ok", 1.5)
+        usage.record(*EVENT)
+        usage.close()
+
+        [path] = event_files(str(tmp_path))["20241004"]
+        columns = read_event_file(path)
+
+        assert _decode(columns) == [EVENT[:6], ("sick_leave", "urgent", "zh", "free_trial", "none", "ok"), EVENT[:6]]
+        assert list(columns.latency_ms) == [250.0, 1500.0, 250.0]
+        assert list(columns.timestamps) == [DAY + 3600.0] * 3
+        # Names are written once per file
+        assert len(columns.names) == len(set(columns.names)) == 11
+
+    def test_rotates_at_midnight_and_size(self, tmp_path, clock):
+        """Events should land in their UTC day's file; big files should roll over."""
+        usage = UsageLog(str(tmp_path), max_file_bytes=1)
+        for hour in (22, 23, 24, 25):
+            clock[0] = DAY + hour * 3600
+            usage.record(*EVENT)
+        usage.flush()
+        for _ in range(3):
+            usage.record(*EVENT)
+            usage.flush()
+        usage.close()
+
+        files = event_files(str(tmp_path))
+
+        assert [len(read_event_file(p).timestamps) for p in files["20241004"]] == [2]
+        assert [len(read_event_file(p).timestamps) for p in files["20241005"]] == [2, 1, 1, 1]
+        assert all(_decode(read_event_file(p)) for p in files["20241005"])
+
+    def test_new_file_per_writer(self, tmp_path, clock):
+        """Two writers should never share a file."""
+        first, second = UsageLog(str(tmp_path)), UsageLog(str(tmp_path))
+        for usage in (first, second):
+            usage.record(*EVENT)
+            usage.flush()
+        with patch("app.services.usage_events.os.listdir", return_value=[]):
+            third = UsageLog(str(tmp_path))
+            third.record(*EVENT)
+            third.flush()
+        for usage in (first, second, third):
+            usage.close()
+
+        assert len(event_files(str(tmp_path))["20241004"]) == 3
+
+    def test_torn_block_ignored(self, tmp_path, clock):
+        """A partly written last block should be skipped."""
+        usage = UsageLog(str(tmp_path))
+        for _ in range(2):
+            usage.record(*EVENT)
+            usage.flush()
+        usage.close()
+        [path] = event_files(str(tmp_path))["20241004"]
+        with open(path, "r+b") as f:
+            f.truncate(f.seek(0, 2) - 3)
+
+        assert len(read_event_file(path).timestamps) == 1
+
+    def test_background_writer(self, tmp_path):
+        """The writer thread should flush on its own, and survive a failed flush."""
+        usage = UsageLog(str(tmp_path), flush_interval=0.01)
+        with patch.object(usage, "_open", side_effect=OSError("disk full")):
+            usage.record(*EVENT)
+            usage.start()
+            usage._stop.wait(0.05)
+        usage.record(*EVENT)
+        usage._stop.wait(0.05)
+        usage.close()
+
+        assert sum(len(read_event_file(p).timestamps) for ps in event_files(str(tmp_path)).values() for p in ps) == 1
+
+
+class TestUsageLogSingleton:
+    """Tests for get_usage_log."""
+
+    def test_disabled_without_directory(self):
+        """No directory should mean no events."""
+        assert ue.get_usage_log() is None
+
+    def test_enabled(self, tmp_path):
+        """A configured directory should start a writer, closed by close_usage_log."""
+        settings = ue.get_settings().model_copy(update={"usage_events_dir": str(tmp_path)})
+        with patch("app.services.usage_events.get_settings", return_value=settings):
+            usage = ue.get_usage_log()
+            assert ue.get_usage_log() is usage
+        usage.record(*EVENT)
+        ue.close_usage_log()
+
+        assert ue._usage_log is None
+        assert len(DIMENSIONS) == 6
+        assert sum(len(paths) for paths in event_files(str(tmp_path)).values()) == 1
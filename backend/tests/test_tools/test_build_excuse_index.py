@@ -0,0 +1,36 @@
+"""Tests for the excuse index build tool."""
+import sys
+from unittest.mock import patch
+
+from app.schemas.excuse import Excuse
+from app.services.excuse_index import ExcuseIndex
+from tools import build_excuse_index
+from tools.pregenerate import ExcuseStore, expand_pages, load_dimensions, plan
+
+
+class TestBuildExcuseIndex:
+    """Tests for building the index from a pre-generation store."""
+
+    def test_builds_index_from_store(self, tmp_path, capsys):
+        """Every generated prompt should be indexed by its scenario tuple."""
+        store_path = str(tmp_path / "pregenerated.sqlite")
+        index_path = str(tmp_path / "excuse_index.bin")
+        prompts, rows = plan(expand_pages(load_dimensions())[:3], ["en"])
+        store = ExcuseStore(store_path)
+        store.save_pages(rows)
+        store.save_results(
+            (key, prompt, [Excuse(text=key, tone="sincere", tip="")], 10, 20)
+            for key, prompt in prompts.items()
+        )
+        store.close()
+
+        argv = ["build_excuse_index", "--store", store_path, "--out", index_path]
+        with patch.object(sys, "argv", argv):
+            build_excuse_index.main()
+
+        assert "3 records" in capsys.readouterr().out
+        index = ExcuseIndex(index_path)
+        _, language, key = rows[0]
+        prompt = prompts[key]
+        excuses = index.lookup(prompt.category.value, prompt.urgency.value, language, prompt.scenario.key)
+        assert excuses[0].text == key
@@ -0,0 +1,220 @@
+"""Tests for the fake Creem payment server."""
+import hashlib
+import hmac
+import json
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from tools.fake_creem import FakeCreem, FakeCreemConfig
+
+SECRET = "whsec_test"
+
+
+def _receiver(statuses=()):
+    """A webhook endpoint recording what it receives; answers ``statuses`` in turn, then 200."""
+    app = FastAPI()
+    app.state.received = []
+    pending = list(statuses)
+
+    @app.post("/api/webhook")
+    async def webhook(request: Request):
+        app.state.received.append((dict(request.headers), await request.body()))
+        status = pending.pop(0) if pending else 200
+        return JSONResponse({"received": status == 200}, status_code=status)
+
+    return app
+
+
+def _fake(receiver, **config):
+    config.setdefault("webhook_url", "http://backend/api/webhook")
+    config.setdefault("retry_backoff", 0)
+    return FakeCreem(
+        FakeCreemConfig(**config),
+        webhook_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=receiver)),
+        seed=1,
+    )
+
+
+def _client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://creem")
+
+
+async def _checkout(client, **headers):
+    return await client.post(
+        "/v1/checkouts",
+        json={"product_id": "prod_10", "metadata": {"device_id": "device_1234567890", "product_type": "pack_10"}},
+        headers=headers,
+    )
+
+
+class TestCheckouts:
+    """Tests for /v1/checkouts."""
+
+    async def test_create_checkout(self):
+        """Should return an id and a checkout URL."""
+        fake = _fake(_receiver(), auto_pay=False)
+        async with _client(fake.app) as client:
+            response = await _checkout(client)
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["id"].startswith("ch_")
+        assert data["checkout_url"] == f"http://creem/pay/{data['id']}"
+        assert fake.checkouts[data["id"]]["status"] == "pending"
+
+    async def test_api_key_enforced(self):
+        """Should reject a wrong x-api-key when one is configured."""
+        fake = _fake(_receiver(), auto_pay=False, api_key="creem_test_key")
+        async with _client(fake.app) as client:
+            wrong = await _checkout(client, **{"x-api-key": "nope"})
+            right = await _checkout(client, **{"x-api-key": "creem_test_key"})
+
+        assert wrong.status_code == 403
+        assert right.status_code == 200
+
+    async def test_product_required(self):
+        """Should reject checkouts without a product."""
+        fake = _fake(_receiver(), auto_pay=False)
+        async with _client(fake.app) as client:
+            response = await client.post("/v1/checkouts", json={})
+
+        assert response.status_code == 400
+
+    async def test_pay_unknown_and_twice(self):
+        """Paying an unknown checkout is 404, paying twice is 409."""
+        fake = _fake(_receiver(), auto_pay=False)
+        async with _client(fake.app) as client:
+            checkout_id = (await _checkout(client)).json()["id"]
+            missing = await client.post("/pay/ch_missing")
+            first = await client.post(f"/pay/{checkout_id}")
+            second = await client.post(f"/pay/{checkout_id}")
+            await fake.drain()
+
+        assert missing.status_code == 404
+        assert first.status_code == 200
+        assert second.status_code == 409
+
+
+class TestWebhookDelivery:
+    """Tests for webhook delivery."""
+
+    async def test_signed_completed_event(self):
+        """A paid checkout should be delivered once, signed, with its metadata."""
+        receiver = _receiver()
+        fake = _fake(receiver, webhook_secret=SECRET)
+        async with _client(fake.app) as client:
+            checkout_id = (await _checkout(client)).json()["id"]
+            await fake.drain()
+
+        assert len(receiver.state.received) == 1
+        headers, body = receiver.state.received[0]
+        assert headers["creem-signature"] == hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+        event = json.loads(body)
+        assert event["eventType"] == "checkout.completed"
+        assert event["object"]["id"] == checkout_id
+        assert event["object"]["metadata"]["product_type"] == "pack_10"
+        assert fake.stats["delivered"] == 1
+        assert len(fake.latencies()) == 1
+
+    async def test_duplicates(self):
+        """Should deliver duplicated events twice."""
+        receiver = _receiver()
+        fake = _fake(receiver, duplicate_rate=1.0)
+        async with _client(fake.app) as client:
+            await _checkout(client)
+            await fake.drain()
+
+        assert len(receiver.state.received) == 2
+        assert fake.stats["duplicated"] == 1
+
+    async def test_failed_deliveries_retried(self):
+        """Non-200 answers should be retried until acknowledged."""
+        receiver = _receiver(statuses=[500, 503])
+        fake = _fake(receiver)
+        async with _client(fake.app) as client:
+            await _checkout(client)
+            await fake.drain()
+
+        assert len(receiver.state.received) == 3
+        assert fake.stats["retries"] == 2
+        assert fake.stats["status_500"] == 1
+        assert fake.stats["delivered"] == 1
+
+    async def test_lost_acks_until_gave_up(self):
+        """Processed events whose ack is lost should be resent, up to max_attempts."""
+        receiver = _receiver()
+        fake = _fake(receiver, lost_ack_rate=1.0, max_attempts=3)
+        async with _client(fake.app) as client:
+            await _checkout(client)
+            await fake.drain()
+
+        assert len(receiver.state.received) == 3
+        assert fake.stats["lost_acks"] == 3
+        assert fake.stats["gave_up"] == 1
+        # Crediting latency counts from the first acknowledged delivery
+        assert len(fake.acked_at) == 1
+
+    async def test_connection_errors_retried(self):
+        """Transport errors should count and be retried."""
+        def refuse(request):
+            raise httpx.ConnectError("refused")
+
+        fake = FakeCreem(
+            FakeCreemConfig(max_attempts=2, retry_backoff=0),
+            webhook_client=httpx.AsyncClient(transport=httpx.MockTransport(refuse)),
+        )
+        async with _client(fake.app) as client:
+            await _checkout(client)
+            await fake.drain()
+
+        assert fake.stats["errors"] == 2
+        assert fake.stats["gave_up"] == 1
+
+    def test_rejects_invalid_delay(self):
+        """Invalid delay specs should be rejected."""
+        with pytest.raises(ValueError):
+            FakeCreemConfig(delivery_delay="gamma:1")
+
+
+class TestAgainstBackend:
+    """The backend's checkout and webhook endpoints against the fake."""
+
+    async def test_checkout_credited_exactly_once(self):
+        """Duplicated, retried webhooks should credit each purchase once."""
+        import app.api.payment_router as payment_router
+        import app.services.token_service as ts
+        from app.main import app
+
+        settings = MagicMock()
+        settings.creem_api_key = "creem_test_key"
+        settings.creem_api_base = "http://creem/v1"
+        settings.creem_webhook_secret = SECRET
+        settings.creem_product_id_3 = "prod_3"
+        settings.creem_product_id_10 = "prod_10"
+
+        fake = _fake(app, webhook_secret=SECRET, api_key="creem_test_key",
+                     duplicate_rate=1.0, lost_ack_rate=0.5)
+        ts._token_service = None
+        payment_router._creem_client = _client(fake.app)
+        try:
+            with patch("app.api.payment_router.get_settings", return_value=settings):
+                async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://backend") as client:
+                    for product_type in ("pack_3", "pack_10", "pack_10"):
+                        response = await client.post(
+                            "/api/checkout",
+                            json={"product_type": product_type, "device_id": "device_1234567890"},
+                        )
+                        assert response.status_code == 200
+                    await fake.drain()
+                    status = (await client.get("/api/tokens/device_1234567890")).json()
+        finally:
+            await payment_router.close_creem_client()
+            await fake.aclose()
+            ts._token_service = None
+
+        assert fake.stats["duplicated"] == 3
+        assert status["total_tokens"] == 23
@@ -0,0 +1,172 @@
+"""Tests for the fake OpenAI-compatible LLM server."""
+import asyncio
+import json
+import random
+import httpx
+import openai
+import pytest
+
+from app.schemas.excuse import ExcuseCategory, UrgencyLevel
+from app.services.excuse_service import FALLBACK_TONE, ExcuseService
+from tools.fake_llm_server import FakeLLMConfig, Latency, create_app
+
+MESSAGES = [{"role": "user", "content": "Generate excuses"}]
+
+
+def _client(app, **kwargs):
+    """A real AsyncOpenAI client talking HTTP to the app in-process."""
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake-llm")
+    return openai.AsyncOpenAI(
+        api_key="test", base_url="http://fake-llm/v1", http_client=http_client, max_retries=0, **kwargs
+    )
+
+
+def _app(seed=1, **config):
+    return create_app(FakeLLMConfig(**config), seed=seed)
+
+
+class TestLatency:
+    """Tests for latency distributions."""
+
+    def test_parse_and_sample(self):
+        """Specs should parse and sample non-negative values."""
+        rng = random.Random(1)
+
+        assert Latency("fixed:0.25").sample(rng) == 0.25
+        assert 0.1 <= Latency("uniform:0.1,0.2").sample(rng) <= 0.2
+        assert Latency("normal:0,1").sample(rng) >= 0
+        assert Latency("exponential:0.5").sample(rng) >= 0
+        samples = sorted(Latency("lognormal:1.0,0.5").sample(rng) for _ in range(1001))
+        assert 0.8 < samples[500] < 1.2
+
+    @pytest.mark.parametrize("spec", ["gamma:1", "fixed", "uniform:1", "fixed:x"])
+    def test_rejects_invalid_specs(self, spec):
+        """Unknown kinds and wrong parameter counts should be rejected."""
+        with pytest.raises(ValueError):
+            Latency(spec)
+
+
+class TestChatCompletions:
+    """Tests for /v1/chat/completions."""
+
+    @pytest.mark.asyncio
+    async def test_excuse_service_over_http(self):
+        """ExcuseService should parse the fake's completions and usage."""
+        service = ExcuseService()
+        service.client = _client(_app())
+
+        excuses, usage = await service.generate_excuses_with_usage(ExcuseCategory.LATE, UrgencyLevel.NORMAL)
+
+        assert len(excuses) == 3
+        assert usage.prompt_tokens > 0
+        assert usage.total_tokens == usage.prompt_tokens + usage.completion_tokens
+
+    @pytest.mark.asyncio
+    async def test_streaming(self):
+        """Streamed chunks should reassemble into the completion, with a usage chunk."""
+        client = _client(_app(token_interval=0.001))
+
+        stream = await client.chat.completions.create(
+            model="fake-llm", messages=MESSAGES, stream=True, stream_options={"include_usage": True},
+        )
+        pieces, usage = [], None
+        async for chunk in stream:
+            if chunk.choices:
+                pieces.append(chunk.choices[0].delta.content or "")
+            usage = chunk.usage or usage
+
+        assert len(json.loads("".join(pieces))) == 3
+        assert usage.completion_tokens > 0
+
+    @pytest.mark.asyncio
+    async def test_models(self):
+        """models.list should work for readiness checks."""
+        models = await _client(_app()).models.list()
+
+        assert models.data[0].id == "fake-llm"
+
+    @pytest.mark.asyncio
+    async def test_bad_request(self):
+        """Requests without messages should get a 400."""
+        with pytest.raises(openai.BadRequestError):
+            await _client(_app()).chat.completions.create(model="fake-llm", messages=[])
+
+
+class TestFaultInjection:
+    """Tests for injected failures."""
+
+    @pytest.mark.asyncio
+    async def test_server_error_and_rate_limit(self):
+        """Error and rate-limit faults should surface as the SDK's exceptions."""
+        with pytest.raises(openai.InternalServerError):
+            await _client(_app(error_rate=1)).chat.completions.create(model="m", messages=MESSAGES)
+        with pytest.raises(openai.RateLimitError) as e:
+            await _client(_app(rate_limit_rate=1)).chat.completions.create(model="m", messages=MESSAGES)
+        assert e.value.response.headers["retry-after"] == "1"
+
+    @pytest.mark.asyncio
+    async def test_timeout_hangs(self):
+        """Timeout faults should stall until the caller gives up."""
+        app = _app(timeout_rate=1, hang=30)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(_client(app).chat.completions.create(model="m", messages=MESSAGES), 0.1)
+        assert app.state.stats["timeout"] == 1
+
+    @pytest.mark.asyncio
+    async def test_malformed_completion_hits_fallback(self):
+        """Malformed completions should exercise ExcuseService's fallback."""
+        service = ExcuseService()
+        service.client = _client(_app(malformed_rate=1))
+
+        excuses = await service.generate_excuses(ExcuseCategory.LATE, UrgencyLevel.NORMAL)
+
+        assert excuses[0].tone == FALLBACK_TONE
+
+    @pytest.mark.asyncio
+    async def test_seeded_faults_are_reproducible(self):
+        """The same seed should inject the same faults in the same order."""
+        async def outcomes(app):
+            client = _client(app)
+            results = []
+            for _ in range(20):
+                try:
+                    await client.chat.completions.create(model="m", messages=MESSAGES)
+                    results.append("ok")
+                except openai.APIError as e:
+                    results.append(type(e).__name__)
+            return results
+
+        first = await outcomes(_app(seed=7, error_rate=0.3, rate_limit_rate=0.2))
+        second = await outcomes(_app(seed=7, error_rate=0.3, rate_limit_rate=0.2))
+
+        assert first == second
+        assert {"ok", "InternalServerError", "RateLimitError"} <= set(first)
+
+
+class TestControlEndpoints:
+    """Tests for runtime configuration and stats."""
+
+    @pytest.mark.asyncio
+    async def test_update_config_and_stats(self):
+        """Faults should be switchable at runtime and counted in stats."""
+        app = _app()
+        client = _client(app)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake-llm") as http:
+            await client.chat.completions.create(model="m", messages=MESSAGES)
+            response = await http.post("/_fake/config", json={"error_rate": 1.0})
+            assert response.json()["error_rate"] == 1.0
+            with pytest.raises(openai.InternalServerError):
+                await client.chat.completions.create(model="m", messages=MESSAGES)
+
+            assert (await http.get("/_fake/stats")).json() == {"requests": 2, "ok": 1, "error": 1}
+            assert (await http.get("/_fake/config")).json()["error_rate"] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_invalid_config_rejected(self):
+        """Bad specs and rates adding up past 1 should be rejected."""
+        app = _app()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake-llm") as http:
+            assert (await http.post("/_fake/config", json={"latency": "gamma:1"})).status_code == 422
+            response = await http.post("/_fake/config", json={"error_rate": 0.6, "timeout_rate": 0.6})
+            assert response.status_code == 422
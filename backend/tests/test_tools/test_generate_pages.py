@@ -0,0 +1,181 @@
+"""Tests for the SEO page generator."""
+import copy
+import json
+import pytest
+from pathlib import Path
+
+import tools.generate_pages as gp
+from app.schemas.excuse import Excuse
+from tools.generate_pages import build, render_page, write_sitemaps
+from tools.pregenerate import ExcuseStore, expand_pages, load_dimensions, plan
+
+
+@pytest.fixture
+def dimensions():
+    """A small slice of the real dimensions."""
+    full = load_dimensions()
+    return {
+        **full,
+        "scenarios": full["scenarios"][:3],
+        "recipients": full["recipients"][:2],
+        "styles": full["styles"][:3],
+        "industries": full["industries"][:2],
+    }
+
+
+def _page(dimensions, slug):
+    return {p["slug"]: p for p in expand_pages(dimensions)}[slug]
+
+
+class TestRenderPage:
+    """Tests for page rendering."""
+
+    def test_recipient_page(self, dimensions):
+        """Recipient pages should keep the original copy and link structure."""
+        html = render_page(_page(dimensions, "late-work-boss-believable"), dimensions)
+
+        assert "<title>Believable Excuse for Late for Work to Your Boss | AI Excuse Generator</title>" in html
+        assert '<link rel="canonical" href="https://excuse.demo.densematrix.ai/p/late-work-boss-believable/">' in html
+        assert "category=late" in html
+        assert "/p/late-work-boss-dramatic/" in html
+
+    def test_industry_and_styleless_pages(self, dimensions):
+        """Industry pages and recipient x industry pages should both render."""
+        industry = render_page(_page(dimensions, "late-work-tech-funny"), dimensions)
+        styleless = render_page(_page(dimensions, "late-work-boss-tech"), dimensions)
+
+        assert "Funny Late for Work Excuses for Tech Industry" in industry
+        assert "Late for Work Excuses for Your Boss (Tech Industry)" in styleless
+
+    def test_embeds_escaped_excuses(self, dimensions):
+        """Pre-generated excuses should be embedded and HTML-escaped."""
+        excuses = [{"text": "Traffic <b>jam</b>", "tone": "sincere", "tip": "Be calm"}]
+
+        html = render_page(_page(dimensions, "late-work-boss-believable"), dimensions, excuses)
+
+        assert "Example Excuses" in html
+        assert "Traffic &lt;b&gt;jam&lt;/b&gt;" in html
+
+
+class TestBuild:
+    """Tests for incremental builds."""
+
+    def test_incremental_build(self, dimensions, tmp_path):
+        """Unchanged pages should not be rewritten."""
+        first = build(tmp_path, dimensions, workers=1)
+        second = build(tmp_path, dimensions, workers=1)
+
+        assert first["written"] == first["pages"] == len(expand_pages(dimensions))
+        assert second["written"] == 0
+        assert (tmp_path / "p" / "late-work-boss-believable" / "index.html").exists()
+
+    def test_changed_pages_are_rewritten(self, dimensions, tmp_path):
+        """Only pages whose content changed should be written."""
+        build(tmp_path, dimensions, workers=1)
+        edited = copy.deepcopy(dimensions)
+        edited["scenarios"][2]["keywords"].append("new keyword")
+
+        stats = build(tmp_path, edited, workers=1)
+
+        assert 0 < stats["written"] < stats["pages"]
+
+    def test_force_rewrites_everything(self, dimensions, tmp_path):
+        """--force should rewrite every page."""
+        build(tmp_path, dimensions, workers=1)
+
+        stats = build(tmp_path, dimensions, workers=1, force=True)
+
+        assert stats["written"] == stats["pages"]
+
+    def test_removed_pages_are_deleted(self, dimensions, tmp_path):
+        """Pages dropped from the dimensions should be removed."""
+        build(tmp_path, dimensions, workers=1)
+        smaller = {**dimensions, "recipients": dimensions["recipients"][:1]}
+
+        stats = build(tmp_path, smaller, workers=1)
+
+        assert stats["removed"] > 0
+        assert not (tmp_path / "p" / "late-work-manager-believable").exists()
+
+    def test_unchanged_pages_keep_lastmod(self, dimensions, tmp_path):
+        """Sitemap lastmod should only move for rewritten pages."""
+        site = tmp_path / "site"
+        build(site, dimensions, workers=1)
+        manifest_path = gp.manifest_path(site)
+        manifest = json.loads(manifest_path.read_text())
+        manifest["late-work-boss-believable"][1] = "2020-01-01"
+        manifest_path.write_text(json.dumps(manifest))
+
+        build(site, dimensions, workers=1)
+
+        sitemap = (site / "sitemap-programmatic-1.xml").read_text()
+        assert "<lastmod>2020-01-01</lastmod>" in sitemap
+
+    def test_manifest_kept_outside_output(self, dimensions, tmp_path):
+        """The manifest should not be served; one left in p/ is migrated and removed."""
+        site = tmp_path / "site"
+        build(site, dimensions, workers=1)
+        legacy = site / "p" / gp.LEGACY_MANIFEST_FILE
+        gp.manifest_path(site).rename(legacy)
+
+        stats = build(site, dimensions, workers=1)
+
+        assert stats["written"] == 0
+        assert not legacy.exists()
+        assert gp.manifest_path(site).parent == tmp_path
+        assert not [f for f in site.rglob("*.json")]
+
+    def test_process_pool_build(self, dimensions, tmp_path):
+        """Rendering across worker processes should match a serial build."""
+        stats = build(tmp_path / "pool", dimensions, workers=2, chunk_size=10)
+        build(tmp_path / "serial", dimensions, workers=1)
+
+        page = Path("p") / "late-work-boss-believable" / "index.html"
+        assert stats["written"] == stats["pages"]
+        assert (tmp_path / "pool" / page).read_bytes() == (tmp_path / "serial" / page).read_bytes()
+
+    def test_embeds_store_excuses(self, dimensions, tmp_path):
+        """Pages should embed excuses from a pre-generation store."""
+        prompts, rows = plan(expand_pages(dimensions), ["en"])
+        store = ExcuseStore(str(tmp_path / "pregenerated.sqlite"))
+        store.save_pages(rows)
+        store.save_results(
+            (key, prompt, [Excuse(text="Stored excuse", tone="sincere", tip="")], 1, 1)
+            for key, prompt in prompts.items()
+        )
+        store.close()
+
+        build(tmp_path / "site", dimensions, store_path=str(tmp_path / "pregenerated.sqlite"), workers=1)
+
+        html = (tmp_path / "site" / "p" / "late-work-boss-believable" / "index.html").read_text()
+        assert "Stored excuse" in html
+
+
+class TestSitemaps:
+    """Tests for chunked sitemaps."""
+
+    def test_chunks_by_url_count(self, tmp_path, monkeypatch):
+        """Sitemaps should split at the URL limit and be listed in the index."""
+        monkeypatch.setattr(gp, "SITEMAP_MAX_URLS", 3)
+
+        names = write_sitemaps(tmp_path, ((f"https://x/p/{i}/", "2024-01-01") for i in range(7)), "2024-01-01")
+
+        assert names == [f"sitemap-programmatic-{i}.xml" for i in (1, 2, 3)]
+        assert (tmp_path / "sitemap-programmatic-3.xml").read_text().count("<url>") == 1
+        index = (tmp_path / "sitemap.xml").read_text()
+        assert "sitemap-main.xml" in index
+        assert "sitemap-programmatic-3.xml" in index
+
+    def test_chunks_by_size_and_drops_stale_chunks(self, tmp_path, monkeypatch):
+        """Sitemaps should split before the byte limit; old chunks are removed."""
+        (tmp_path / "sitemap-programmatic-9.xml").write_text("old")
+        (tmp_path / "sitemap-programmatic.xml").write_text("legacy")
+        monkeypatch.setattr(gp, "SITEMAP_MAX_BYTES", 600)
+
+        names = write_sitemaps(tmp_path, ((f"https://x/p/{i}/", "2024-01-01") for i in range(5)), "2024-01-01")
+
+        assert len(names) > 1
+        for name in names:
+            assert len((tmp_path / name).read_bytes()) <= 600
+        assert not (tmp_path / "sitemap-programmatic-9.xml").exists()
+        assert not (tmp_path / "sitemap-programmatic.xml").exists()
@@ -0,0 +1,63 @@
+"""Tests for the bulk grant CLI."""
+import sys
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.services.bulk_grants as bg
+import app.services.token_service as ts
+from app.main import app
+from tools import grant_tokens
+
+
+@pytest.fixture
+def grants_file(tmp_path):
+    path = tmp_path / "grants.csv"
+    path.write_text("device_id,tokens\n" + "".join(f"promo_device_{i:04d},2\n" for i in range(50)))
+    return str(path)
+
+
+@pytest.fixture
+def admin_app():
+    settings = ts.get_settings().model_copy(update={"admin_api_key": "s3cret", "bulk_grant_batch_size": 20})
+    ts._token_service = None
+    bg._grant_jobs = None
+    with patch("app.api.admin_router.get_settings", return_value=settings):
+        yield TestClient(app)
+    ts._token_service = None
+    bg._grant_jobs = None
+
+
+class TestGrantTokensCli:
+    """Tests for tools.grant_tokens."""
+
+    def test_upload_streams_in_chunks(self, grants_file, admin_app):
+        """The file should be applied once per key, with progress for every chunk."""
+        key = grant_tokens.file_key(grants_file)
+        sent = []
+
+        first = grant_tokens.upload(admin_app, grants_file, "s3cret", key, chunk_size=100,
+                                    progress=lambda done, total: sent.append((done, total)))
+        again = grant_tokens.upload(admin_app, grants_file, "s3cret", key)
+
+        assert (first.json()["applied"], first.json()["batches"]) == (50, 3)
+        assert again.json()["skipped"] == 50
+        assert len(sent) > 5 and sent[-1][0] == sent[-1][1]
+        assert ts.get_token_service().get_token_status("promo_device_0049").total_tokens == 2
+
+    def test_file_format(self):
+        """The format should come from the file extension."""
+        assert grant_tokens.file_format("a.CSV") == "csv"
+        assert grant_tokens.file_format("a.ndjson") == "jsonl"
+        with pytest.raises(ValueError):
+            grant_tokens.file_format("a.txt")
+
+    def test_main(self, grants_file, admin_app, capsys):
+        """main() should print the summary and exit 0 when every row applied."""
+        with patch.object(sys, "argv", ["grant_tokens", grants_file, "--admin-key", "s3cret"]), \
+                patch("tools.grant_tokens.httpx.Client", return_value=admin_app):
+            assert grant_tokens.main() == 0
+            assert "applied 50 grants (100 tokens)" in capsys.readouterr().out
+            with patch.object(sys, "argv", ["grant_tokens", grants_file, "--admin-key", "wrong"]):
+                assert grant_tokens.main() == 1
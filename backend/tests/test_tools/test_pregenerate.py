@@ -0,0 +1,172 @@
+"""Tests for the offline pre-generation pipeline."""
+import pytest
+
+from app.schemas.excuse import ExcuseCategory, UrgencyLevel
+from app.services.excuse_service import ExcuseService
+from tools.fake_llm import FakeLLMClient
+from tools.pregenerate import (
+    ExcuseStore,
+    build_prompt,
+    expand_pages,
+    generate_all,
+    load_dimensions,
+    plan,
+)
+
+
+@pytest.fixture
+def dimensions():
+    return load_dimensions()
+
+
+@pytest.fixture
+def fake_service():
+    service = ExcuseService()
+    service.client = FakeLLMClient(latency=0)
+    return service
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ExcuseStore(str(tmp_path / "pregenerated.sqlite"))
+    yield store
+    store.close()
+
+
+class FlakyClient(FakeLLMClient):
+    """Fails the first ``failures`` calls."""
+
+    def __init__(self, failures: int):
+        super().__init__(latency=0)
+        self.failures = failures
+
+    async def _create(self, model, messages, **kwargs):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("upstream error")
+        return await super()._create(model, messages, **kwargs)
+
+
+class TestExpandPages:
+    """Tests for page expansion and prompt planning."""
+
+    def test_expands_all_combinations_without_duplicate_slugs(self, dimensions):
+        """Every combination should be expanded once per unique slug."""
+        pages = expand_pages(dimensions)
+        slugs = [p["slug"] for p in pages]
+
+        # 2,400 + 1,920 + 3,600 minus 300 "creative" style/industry collisions
+        assert len(pages) == 7620
+        assert len(set(slugs)) == len(slugs)
+
+    def test_first_combination_wins_on_slug_collision(self, dimensions):
+        """A colliding slug should keep the page from the earlier combination."""
+        pages = {p["slug"]: p for p in expand_pages(dimensions)}
+        page = pages["late-work-boss-creative"]
+
+        assert page["style"]["id"] == "creative"
+        assert "industry" not in page
+
+    def test_build_prompt_maps_dimensions(self, dimensions):
+        """Pages should map to category, urgency and a scenario tuple."""
+        pages = {p["slug"]: p for p in expand_pages(dimensions)}
+        prompt = build_prompt(pages["sick-leave-tech-dramatic"], "zh")
+
+        assert prompt.category == ExcuseCategory.SICK_LEAVE
+        assert prompt.urgency == UrgencyLevel.URGENT
+        assert prompt.language == "zh"
+        assert prompt.scenario.key == "sick-leave||dramatic|tech"
+
+    def test_plan_dedupes_equivalent_prompts(self, dimensions):
+        """Pages with the same inputs should share one prompt."""
+        page = expand_pages(dimensions)[0]
+        twin = {**page, "slug": "same-prompt-other-slug"}
+
+        prompts, rows = plan([page, twin], ["en", "de"])
+
+        assert len(rows) == 4
+        assert len(prompts) == 2
+        assert rows[0][2] == rows[2][2]
+
+
+class TestGenerateAll:
+    """Tests for the worker pool."""
+
+    @pytest.mark.asyncio
+    async def test_generates_and_stores(self, dimensions, fake_service, store):
+        """Generated excuses should be readable per page."""
+        prompts, rows = plan(expand_pages(dimensions)[:20], ["en"])
+        store.save_pages(rows)
+
+        stats = await generate_all(fake_service, prompts, store, concurrency=4, commit_every=7)
+
+        assert stats.generated == 20
+        assert stats.prompt_tokens > 0
+        assert stats.cost(0.5, 3.0) > 0
+        excuses = store.get(rows[0][0])
+        assert len(excuses) == 3
+        assert len(list(store.iter_pages())) == 20
+        assert {row[3] for row in store.iter_prompts()} == {p.scenario.key for p in prompts.values()}
+
+    @pytest.mark.asyncio
+    async def test_resume_skips_stored_prompts(self, dimensions, fake_service, store):
+        """A rerun should only generate prompts missing from the store."""
+        prompts, rows = plan(expand_pages(dimensions)[:10], ["en"])
+        first = dict(list(prompts.items())[:4])
+        await generate_all(fake_service, first, store)
+
+        done = store.done_keys()
+        todo = {k: p for k, p in prompts.items() if k not in done}
+        stats = await generate_all(fake_service, todo, store)
+
+        assert stats.generated == 6
+        assert fake_service.client.calls == 10
+
+    @pytest.mark.asyncio
+    async def test_retries_transient_failures(self, dimensions, store):
+        """Failed calls should be retried with backoff."""
+        service = ExcuseService()
+        service.client = FlakyClient(failures=2)
+        prompts, _ = plan(expand_pages(dimensions)[:1], ["en"])
+
+        stats = await generate_all(service, prompts, store, max_attempts=3, backoff=0)
+
+        assert stats.generated == 1
+        assert stats.retries == 2
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_attempts(self, dimensions, store):
+        """Prompts that keep failing should be counted and left for a rerun."""
+        service = ExcuseService()
+        service.client = FlakyClient(failures=10)
+        prompts, _ = plan(expand_pages(dimensions)[:1], ["en"])
+
+        stats = await generate_all(service, prompts, store, max_attempts=2, backoff=0)
+
+        assert stats.generated == 0
+        assert stats.failed == 1
+        assert store.done_keys() == set()
+
+    @pytest.mark.asyncio
+    async def test_unparseable_completion_is_retried(self, dimensions, store):
+        """Raw-text fallbacks should not be stored as pre-generated excuses."""
+        service = ExcuseService()
+        client = FakeLLMClient(latency=0)
+        real_create = client._create
+        calls = []
+
+        async def create(model, messages, **kwargs):
+            calls.append(1)
+            response = await real_create(model, messages, **kwargs)
+            if len(calls) == 1:
+                response.choices[0].message.content = "not json"
+            return response
+
+        client.chat.completions.create = create
+        service.client = client
+        prompts, _ = plan(expand_pages(dimensions)[:1], ["en"])
+
+        stats = await generate_all(service, prompts, store, backoff=0)
+
+        assert stats.generated == 1
+        assert len(calls) == 2
@@ -0,0 +1,124 @@
+"""Tests for the traffic replay tool."""
+import asyncio
+import io
+import json
+
+import pytest
+
+from tools.fake_llm_server import FakeLLMConfig, create_app
+from tools.replay import (
+    InFlight, Replay, grant_tokens, install_fake_llm, load_log, parse_ts, print_summary, rss_mb, synthetic_log,
+)
+
+
+@pytest.fixture
+def fresh_app(reset_services):
+    """The app with fresh services and an empty excuse cache."""
+    import app.services.excuse_cache as ec
+    from app.main import app
+
+    ec._excuse_cache = None
+    yield app
+    ec._excuse_cache = None
+
+
+class TestLog:
+    """Tests for reading and generating request logs."""
+
+    def test_parse_ts(self):
+        """Epoch seconds and ISO 8601 should both be accepted."""
+        assert parse_ts(1760864400) == 1760864400.0
+        assert parse_ts("2026-10-19T09:00:00Z") == parse_ts("2026-10-19T09:00:00+00:00")
+
+    def test_load_log_sorts_and_defaults(self, tmp_path):
+        """Records should be sorted by time and default to generate."""
+        path = tmp_path / "traffic.jsonl"
+        path.write_text(
+            json.dumps({"ts": 5, "device_id": "d1", "category": "late"}) + "\n\n"
+            + json.dumps({"ts": "1970-01-01T00:00:01Z", "endpoint": "tokens", "device_id": "d2"}) + "\n"
+        )
+
+        records = load_log(str(path))
+
+        assert [r["ts"] for r in records] == [1.0, 5.0]
+        assert [r["endpoint"] for r in records] == ["tokens", "generate"]
+
+    def test_load_log_rejects_unknown_endpoint(self, tmp_path):
+        """Unknown endpoints should be reported with their line."""
+        path = tmp_path / "traffic.jsonl"
+        path.write_text(json.dumps({"ts": 0, "endpoint": "checkout", "device_id": "d"}) + "\n")
+
+        with pytest.raises(ValueError, match="traffic.jsonl:1"):
+            load_log(str(path))
+
+    def test_synthetic_log(self):
+        """Synthetic traffic should be reproducible, ordered and mostly generations."""
+        records = synthetic_log(500, rate=50, devices=20, seed=3)
+
+        assert records == synthetic_log(500, rate=50, devices=20, seed=3)
+        assert all(a["ts"] <= b["ts"] for a, b in zip(records, records[1:]))
+        assert 5 < records[-1]["ts"] < 15
+        assert len({r["device_id"] for r in records}) <= 20
+        assert 0.7 < sum(r["endpoint"] == "generate" for r in records) / len(records) < 0.9
+
+
+class TestReplay:
+    """Tests for replaying traffic against the app."""
+
+    async def test_in_flight(self):
+        """InFlight should count concurrent and total requests."""
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            await release.wait()
+
+        counter = InFlight(app)
+        calls = [asyncio.ensure_future(counter({"type": "http"}, None, None)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert counter.current == 3
+        release.set()
+        await asyncio.gather(*calls)
+        await counter({"type": "lifespan"}, None, None)
+
+        assert (counter.current, counter.peak, counter.total) == (0, 3, 3)
+
+    async def test_replay(self, fresh_app):
+        """Every record should be sent, and results summarized per endpoint."""
+        records = synthetic_log(60, rate=200, devices=30, seed=1)
+        llm = install_fake_llm(create_app(FakeLLMConfig(latency="fixed:0.01"), seed=1))
+        grant_tokens(records, 5)
+        out = io.StringIO()
+
+        summary = await Replay(fresh_app, records, llm, speed=10, interval=0.05, out=out).run()
+
+        assert summary["requests"] == 60
+        assert sum(e["requests"] for e in summary["endpoints"].values()) == 60
+        generate = summary["endpoints"]["generate"]
+        assert generate["statuses"] == {"200": generate["requests"]}
+        assert summary["llm_calls"] > 0
+        assert summary["llm_peak_in_flight"] >= 1
+        assert sum(summary["cache"].values()) == generate["requests"]
+        assert out.getvalue().count("req/s") >= 1
+
+        report = io.StringIO()
+        print_summary(summary, out=report)
+        assert "hit rate" in report.getvalue()
+
+    def test_grant_tokens(self, reset_services):
+        """Generating devices should get tokens; zero grants nothing."""
+        from app.services.token_service import get_token_service
+        records = [
+            {"ts": 0, "endpoint": "generate", "device_id": "generating_device_1"},
+            {"ts": 1, "endpoint": "tokens", "device_id": "polling_device_123"},
+        ]
+
+        grant_tokens(records, 0)
+        assert get_token_service().get_token_status("generating_device_1").total_tokens == 0
+        grant_tokens(records, 3)
+
+        assert get_token_service().get_token_status("generating_device_1").total_tokens == 3
+        assert get_token_service().get_token_status("polling_device_123").total_tokens == 0
+
+    def test_rss(self):
+        """Memory should be reported in megabytes."""
+        assert rss_mb() > 1
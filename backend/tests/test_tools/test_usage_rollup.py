@@ -0,0 +1,87 @@
+"""Tests for the usage rollup job."""
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from app.services.usage_events import UsageLog
+from tools import usage_rollup
+from tools.usage_rollup import load_rollups, report, rollup
+
+DAY = 20_000 * 86400  # 2024-10-04 00:00 UTC
+
+
+@pytest.fixture
+def events_dir(tmp_path):
+    """Two days of events over three files."""
+    directory = str(tmp_path / "events")
+    now = [DAY + 60.0]
+    with patch("app.services.usage_events.time.time", lambda: now[0]):
+        for _ in range(2):
+            usage = UsageLog(directory)
+            usage.record("late", "normal", "en", "token", "hit", "ok", 0.010)
+            usage.record("late", "normal", "en", "free_trial", "miss", "ok", 1.0)
+            usage.record("late", "normal", "en", "token", "hit", "ok", 0.030)
+            usage.close()
+        now[0] += 86400
+        usage = UsageLog(directory)
+        usage.record("sick_leave", "urgent", "zh", "unlimited", "none", "ok", 2.0)
+        usage.close()
+    return directory
+
+
+class TestRollup:
+    """Tests for building and reading daily rollups."""
+
+    def test_daily_groups(self, events_dir, tmp_path):
+        """Events should be counted per day and dimension tuple, across files."""
+        out = str(tmp_path / "rollups")
+
+        assert rollup(events_dir, out, "csv") == [("2024-10-04", 6), ("2024-10-05", 1)]
+        rows = load_rollups(out)
+
+        assert [(r["day"], r["source"], r["requests"], r["latency_ms_sum"]) for r in rows] == [
+            ("2024-10-04", "free_trial", 2, 2000.0),
+            ("2024-10-04", "token", 4, 80.0),
+            ("2024-10-05", "unlimited", 1, 2000.0),
+        ]
+        assert load_rollups(out, since="2024-10-05")[0]["language"] == "zh"
+        assert load_rollups(out, until="2024-10-04")[-1]["cache"] == "hit"
+
+    def test_only_stale_days_rebuilt(self, events_dir, tmp_path):
+        """A second run should rebuild only days with newer event files."""
+        out = str(tmp_path / "rollups")
+        rollup(events_dir, out, "csv")
+        assert rollup(events_dir, out, "csv") == []
+
+        newest = max(os.path.getmtime(os.path.join(out, name)) for name in os.listdir(out))
+        path = os.path.join(events_dir, sorted(os.listdir(events_dir))[-1])
+        os.utime(path, (newest + 10, newest + 10))
+
+        assert rollup(events_dir, out, "csv") == [("2024-10-05", 1)]
+
+    def test_report(self, events_dir, tmp_path):
+        """Reports should sum rollups by any columns, busiest first."""
+        out = str(tmp_path / "rollups")
+        rollup(events_dir, out, "csv")
+
+        assert report(load_rollups(out), ["paid"]) == [(("paid",), 5, 416.0), (("free",), 2, 1000.0)]
+        assert [key for key, _, _ in report(load_rollups(out), ["category", "language"])] == [
+            ("late", "en"), ("sick_leave", "zh"),
+        ]
+
+    def test_main(self, events_dir, tmp_path, capsys):
+        """The rollup and report commands should print their results."""
+        out = str(tmp_path / "rollups")
+        with patch.object(sys, "argv", ["usage_rollup", "rollup", "--events", events_dir, "--out", out, "--format", "csv"]):
+            assert usage_rollup.main() == 0
+        with patch.object(sys, "argv", ["usage_rollup", "report", "--out", out, "--by", "paid"]):
+            assert usage_rollup.main() == 0
+        with patch.object(sys, "argv", ["usage_rollup", "report", "--out", out, "--by", "device"]):
+            with pytest.raises(SystemExit):
+                usage_rollup.main()
+
+        output = capsys.readouterr().out
+        assert "2 days rebuilt" in output
+        assert "7 requests from 3 rollup rows" in output
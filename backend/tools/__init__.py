@@ -0,0 +1 @@
+# Offline tools
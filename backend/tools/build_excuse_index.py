@@ -0,0 +1,37 @@
+"""
+Build the memory-mapped excuse index from a pre-generation store.
+
+Reads every generated prompt from the SQLite store written by
+``tools.pregenerate`` and writes the index served by the API
+(``EXCUSE_INDEX_PATH``). The new file replaces the old one atomically, so
+running workers pick it up without a restart.
+
+Usage:
+    python -m tools.build_excuse_index [--store pregenerated.sqlite] [--out excuse_index.bin]
+"""
+import argparse
+import os
+import time
+
+from app.services.excuse_index import build_index
+from tools.pregenerate import ExcuseStore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--store", default="pregenerated.sqlite")
+    parser.add_argument("--out", default="excuse_index.bin")
+    args = parser.parse_args()
+
+    store = ExcuseStore(args.store)
+    start = time.perf_counter()
+    try:
+        count = build_index(args.out, store.iter_prompts())
+    finally:
+        store.close()
+    size_mb = os.path.getsize(args.out) / 1e6
+    print(f"index        {count:,} records, {size_mb:.1f} MB, built in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
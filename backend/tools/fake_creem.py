@@ -0,0 +1,255 @@
+"""
+Fake Creem payment API for checkout and webhook tests.
+
+Serves ``POST /v1/checkouts`` (and ``GET /v1/products`` for the readiness
+probe). Every checkout is paid, automatically after ``payment_delay`` or on
+``POST /pay/{checkout_id}``, and the ``checkout.completed`` event is then
+POSTed to the backend's ``/api/webhook``, signed like Creem signs it
+(HMAC-SHA256 of the body in ``creem-signature``).
+
+Delivery misbehaves the way a real provider's does: each attempt waits a
+random ``delivery_delay`` (so events for different checkouts arrive out of
+order), a share of events is delivered twice, a share of acknowledgements is
+"lost" so the event is retried after it was processed, and failed deliveries
+are retried with exponential backoff. ``GET /_fake/stats`` counts attempts.
+
+Point the backend at it with ``CREEM_API_BASE=http://localhost:8082/v1`` and
+the same ``CREEM_WEBHOOK_SECRET`` on both sides.
+
+Usage:
+    python -m tools.fake_creem [--port 8082] [--webhook-url URL] [--secret S]
+                               [--payment-delay fixed:0.5] [--delivery-delay uniform:0,0.2]
+                               [--duplicate-rate 0.1] [--lost-ack-rate 0.05] [--seed N]
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+import httpx
+from fastapi import FastAPI, Header, HTTPException, Request
+from pydantic import BaseModel, Field, field_validator
+
+from tools.fake_llm_server import Latency
+
+
+class FakeCreemConfig(BaseModel):
+    """Runtime behaviour of the fake payment provider."""
+    webhook_url: str = "http://localhost:8000/api/webhook"
+    webhook_secret: Optional[str] = None
+    api_key: Optional[str] = None            # required x-api-key; any key when unset
+    auto_pay: bool = True                    # pay every checkout without POST /pay
+    payment_delay: str = "fixed:0"           # checkout created -> customer pays
+    delivery_delay: str = "fixed:0"          # before each webhook attempt
+    duplicate_rate: float = Field(default=0.0, ge=0, le=1)
+    lost_ack_rate: float = Field(default=0.0, ge=0, le=1)
+    max_attempts: int = Field(default=5, ge=1)
+    retry_backoff: float = Field(default=0.5, ge=0)  # doubled on every retry
+
+    @field_validator("payment_delay", "delivery_delay")
+    @classmethod
+    def _check_latency(cls, value: str) -> str:
+        Latency(value)
+        return value
+
+
+class FakeCreem:
+    """The fake provider: ``app`` serves the API, deliveries run as tasks.
+
+    ``webhook_client`` defaults to a plain ``httpx.AsyncClient``; pass one
+    with an ``ASGITransport`` to deliver straight into an in-process app.
+    """
+
+    def __init__(
+        self,
+        config: Optional[FakeCreemConfig] = None,
+        webhook_client: Optional[httpx.AsyncClient] = None,
+        seed: Optional[int] = None,
+    ):
+        self.config = config or FakeCreemConfig()
+        self.rng = random.Random(seed)
+        self.stats: Counter = Counter()
+        self.checkouts: Dict[str, dict] = {}
+        # checkout id -> perf_counter() of payment and of the first acknowledged delivery
+        self.paid_at: Dict[str, float] = {}
+        self.acked_at: Dict[str, float] = {}
+        self._client = webhook_client
+        self._payment_delay = Latency(self.config.payment_delay)
+        self._delivery_delay = Latency(self.config.delivery_delay)
+        self._tasks: Set[asyncio.Task] = set()
+        self.app = self._create_app()
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _sign(self, body: bytes) -> Optional[str]:
+        if not self.config.webhook_secret:
+            return None
+        return hmac.new(self.config.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+
+    def pay(self, checkout_id: str) -> None:
+        """Complete a checkout and start delivering its webhook."""
+        checkout = self.checkouts[checkout_id]
+        if checkout["status"] == "completed":
+            raise ValueError(f"Checkout already paid: {checkout_id}")
+        checkout["status"] = "completed"
+        self.paid_at[checkout_id] = time.perf_counter()
+        event = {
+            "id": f"evt_{uuid.UUID(int=self.rng.getrandbits(128)).hex}",
+            "eventType": "checkout.completed",
+            "object": {
+                "id": checkout_id,
+                "object": "checkout",
+                "product": checkout["product_id"],
+                "status": "completed",
+                "metadata": checkout["metadata"],
+            },
+        }
+        body = json.dumps(event).encode()
+        copies = 2 if self.rng.random() < self.config.duplicate_rate else 1
+        self.stats["duplicated"] += copies - 1
+        for _ in range(copies):
+            self._spawn(self._deliver(checkout_id, body))
+
+    async def _pay_later(self, checkout_id: str) -> None:
+        await asyncio.sleep(self._payment_delay.sample(self.rng))
+        self.pay(checkout_id)
+
+    async def _deliver(self, checkout_id: str, body: bytes) -> None:
+        config = self.config
+        headers = {"Content-Type": "application/json"}
+        signature = self._sign(body)
+        if signature is not None:
+            headers["creem-signature"] = signature
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10.0)
+
+        for attempt in range(config.max_attempts):
+            delay = self._delivery_delay.sample(self.rng)
+            if attempt:
+                delay += config.retry_backoff * 2 ** (attempt - 1)
+                self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+            self.stats["attempts"] += 1
+            try:
+                response = await self._client.post(config.webhook_url, content=body, headers=headers)
+            except httpx.HTTPError:
+                self.stats["errors"] += 1
+                continue
+            if response.status_code != 200:
+                self.stats[f"status_{response.status_code}"] += 1
+                continue
+            self.acked_at.setdefault(checkout_id, time.perf_counter())
+            if self.rng.random() < config.lost_ack_rate:
+                # The backend processed it, but we retry as if it hadn't
+                self.stats["lost_acks"] += 1
+                continue
+            self.stats["delivered"] += 1
+            return
+        self.stats["gave_up"] += 1
+
+    async def drain(self) -> None:
+        """Wait until every scheduled payment and delivery has finished."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    def latencies(self) -> List[float]:
+        """Seconds from payment to first acknowledged webhook, per checkout."""
+        return [self.acked_at[c] - self.paid_at[c] for c in self.acked_at]
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI(title="Fake Creem")
+
+        @app.post("/v1/checkouts")
+        async def create_checkout(request: Request, x_api_key: Optional[str] = Header(None)):
+            if self.config.api_key and x_api_key != self.config.api_key:
+                raise HTTPException(status_code=403, detail="Invalid API key")
+            body = await request.json()
+            if not body.get("product_id"):
+                raise HTTPException(status_code=400, detail="product_id is required")
+            checkout_id = f"ch_{uuid.UUID(int=self.rng.getrandbits(128)).hex}"
+            self.checkouts[checkout_id] = {
+                "product_id": body["product_id"],
+                "metadata": body.get("metadata") or {},
+                "status": "pending",
+            }
+            self.stats["checkouts"] += 1
+            if self.config.auto_pay:
+                self._spawn(self._pay_later(checkout_id))
+            return {
+                "id": checkout_id,
+                "object": "checkout",
+                "status": "pending",
+                "product": body["product_id"],
+                "checkout_url": f"{request.base_url}pay/{checkout_id}",
+            }
+
+        @app.post("/pay/{checkout_id}")
+        async def pay(checkout_id: str):
+            if checkout_id not in self.checkouts:
+                raise HTTPException(status_code=404, detail="Unknown checkout")
+            try:
+                self.pay(checkout_id)
+            except ValueError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            return {"id": checkout_id, "status": "completed"}
+
+        @app.get("/v1/products")
+        async def list_products():
+            return {"items": []}
+
+        @app.get("/_fake/stats")
+        async def get_stats():
+            return {**self.stats, "in_flight": len(self._tasks)}
+
+        return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--webhook-url", default="http://localhost:8000/api/webhook")
+    parser.add_argument("--secret", default=None, help="webhook signing secret")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--manual-pay", action="store_true", help="wait for POST /pay/{id}")
+    parser.add_argument("--payment-delay", default="fixed:0")
+    parser.add_argument("--delivery-delay", default="fixed:0", help="kind:params, e.g. uniform:0,0.2")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--lost-ack-rate", type=float, default=0.0)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--retry-backoff", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeCreemConfig(
+        webhook_url=args.webhook_url,
+        webhook_secret=args.secret,
+        api_key=args.api_key,
+        auto_pay=not args.manual_pay,
+        payment_delay=args.payment_delay,
+        delivery_delay=args.delivery_delay,
+        duplicate_rate=args.duplicate_rate,
+        lost_ack_rate=args.lost_ack_rate,
+        max_attempts=args.max_attempts,
+        retry_backoff=args.retry_backoff,
+    )
+    uvicorn.run(FakeCreem(config, seed=args.seed).app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
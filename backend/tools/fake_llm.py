@@ -0,0 +1,84 @@
+"""
+Fake LLM for offline runs and tests.
+
+``FakeLLMClient`` stands in for ``AsyncOpenAI`` in-process: it answers
+``chat.completions.create`` with a deterministic JSON array of excuses
+derived from the prompt, after a simulated latency, and reports token usage.
+Tests that need real HTTP, streaming or injected faults use
+``tools.fake_llm_server`` instead.
+"""
+import asyncio
+import hashlib
+import json
+import random
+from types import SimpleNamespace
+from typing import List, Optional
+
+TONES = ["sincere", "apologetic", "humorous", "dramatic"]
+
+# Distinct ideas, so a response doesn't trip the diversity filter on itself
+REASONS = [
+    "my train stopped between stations for forty minutes",
+    "the neighbour's dog got loose and I helped chase it down",
+    "a pipe burst in the kitchen and flooded the floor",
+    "my laptop decided to install updates right before I left",
+    "I was stuck behind a parade nobody told me about",
+    "the babysitter cancelled at the very last second",
+    "a migraine kept me flat on the couch all morning",
+    "my car battery died in the parking garage",
+    "the power went out and my alarm never rang",
+    "I locked my keys inside the apartment",
+    "a client call ran way over and I couldn't hang up",
+    "my phone fell in the sink and stopped working",
+]
+
+
+def fake_excuses(prompt: str, count: int = 3) -> List[dict]:
+    """Deterministic excuses for a prompt."""
+    digest = hashlib.sha1(prompt.encode()).hexdigest()
+    reasons = random.Random(digest).sample(REASONS, min(count, len(REASONS)))
+    return [
+        {
+            "text": f"Sorry, {reason} [{digest[i * 8:i * 8 + 8]}].",
+            "tone": TONES[int(digest[i], 16) % len(TONES)],
+            "tip": "Keep it short.",
+        }
+        for i, reason in enumerate(reasons)
+    ]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+class FakeLLMClient:
+    """Minimal ``AsyncOpenAI`` look-alike for ``ExcuseService``."""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.5, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.models = SimpleNamespace(list=self._list_models)
+
+    async def _list_models(self):
+        return SimpleNamespace(data=[SimpleNamespace(id="fake-llm")])
+
+    async def _create(self, model: str, messages: List[dict], **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * (1 + self._rng.uniform(-self.jitter, self.jitter)))
+        prompt = messages[-1]["content"]
+        content = json.dumps(fake_excuses(prompt), ensure_ascii=False)
+        usage = SimpleNamespace(
+            prompt_tokens=estimate_tokens(prompt),
+            completion_tokens=estimate_tokens(content),
+        )
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop")],
+            usage=usage,
+        )
@@ -0,0 +1,267 @@
+"""
+Fake OpenAI-compatible LLM server for load, chaos and failover tests.
+
+Serves ``POST /v1/chat/completions`` (plain and streamed) and
+``GET /v1/models`` with the deterministic excuses of ``tools.fake_llm``.
+Latency is drawn from a configurable distribution and faults are injected
+at configurable rates: 5xx errors, 429s, requests that hang until the client
+times out, and malformed (non-JSON) completions. Settings can be changed
+while it runs with ``POST /_fake/config``; ``GET /_fake/stats`` counts what
+was served.
+
+Point the backend at it with ``LLM_PROXY_URL=http://localhost:8081/v1``.
+
+Usage:
+    python -m tools.fake_llm_server [--port 8081] [--latency lognormal:0.8,0.5]
+                                    [--token-interval 0.01] [--error-rate 0.02]
+                                    [--rate-limit-rate 0] [--timeout-rate 0.01]
+                                    [--malformed-rate 0.01] [--seed N]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from typing import AsyncIterator, List, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+
+from tools.fake_llm import estimate_tokens, fake_excuses
+
+FAULTS = ("error", "rate_limit", "timeout", "malformed")
+
+# kind -> number of parameters
+LATENCY_KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+
+
+class Latency:
+    """A latency distribution parsed from ``kind:p1[,p2]`` (seconds).
+
+    ``fixed:S``, ``uniform:LO,HI``, ``normal:MEAN,SD``, ``exponential:MEAN``
+    and ``lognormal:MEDIAN,SIGMA`` (the long tail real LLM APIs show).
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, _, params = spec.partition(":")
+        try:
+            values = [float(v) for v in params.split(",")] if params else []
+        except ValueError:
+            values = []
+        if LATENCY_KINDS.get(kind) != len(values):
+            raise ValueError(f"Invalid latency spec: {spec!r}")
+        self.spec = spec
+        self.kind = kind
+        self.params = values
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = p[0] * math.exp(rng.gauss(0.0, p[1]))
+        else:
+            value = rng.expovariate(1.0 / p[0])
+        return max(0.0, value)
+
+
+class FakeLLMConfig(BaseModel):
+    """Runtime behaviour of the fake server."""
+    latency: str = "fixed:0"                # time to first token
+    token_interval: float = Field(default=0.0, ge=0)  # delay between streamed chunks
+    error_rate: float = Field(default=0.0, ge=0, le=1)
+    rate_limit_rate: float = Field(default=0.0, ge=0, le=1)
+    timeout_rate: float = Field(default=0.0, ge=0, le=1)
+    malformed_rate: float = Field(default=0.0, ge=0, le=1)
+    hang: float = Field(default=3600.0, ge=0)  # how long a "timeout" request stalls
+    model: str = "fake-llm"
+
+    @field_validator("latency")
+    @classmethod
+    def _check_latency(cls, value: str) -> str:
+        Latency(value)
+        return value
+
+    def fault_rates(self) -> List[float]:
+        rates = [self.error_rate, self.rate_limit_rate, self.timeout_rate, self.malformed_rate]
+        if sum(rates) > 1:
+            raise ValueError("Fault rates must add up to at most 1")
+        return rates
+
+
+def _error(status: int, message: str, error_type: str, headers: Optional[dict] = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status,
+        content={"error": {"message": message, "type": error_type, "param": None, "code": None}},
+        headers=headers,
+    )
+
+
+def _malformed(content: str, rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        return content[: len(content) // 2]
+    return f"Sure! Here are three excuses you could use:\n{content}"
+
+
+def create_app(config: Optional[FakeLLMConfig] = None, seed: Optional[int] = None) -> FastAPI:
+    """Build the fake server; ``seed`` makes latencies and faults reproducible."""
+    app = FastAPI(title="Fake LLM")
+    app.state.config = config or FakeLLMConfig()
+    app.state.config.fault_rates()
+    app.state.latency = Latency(app.state.config.latency)
+    app.state.rng = random.Random(seed)
+    app.state.stats = Counter()
+
+    def pick_fault() -> Optional[str]:
+        draw = app.state.rng.random()
+        for fault, rate in zip(FAULTS, app.state.config.fault_rates()):
+            if draw < rate:
+                return fault
+            draw -= rate
+        return None
+
+    async def stream(completion_id: str, model: str, content: str, usage: Optional[dict]) -> AsyncIterator[bytes]:
+        def event(delta: dict, finish_reason: Optional[str] = None) -> bytes:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(chunk)}\n\n".encode()
+
+        config = app.state.config
+        await asyncio.sleep(app.state.latency.sample(app.state.rng))
+        yield event({"role": "assistant", "content": ""})
+        for piece in re.findall(r"\S+\s*", content):
+            if config.token_interval:
+                await asyncio.sleep(config.token_interval)
+            yield event({"content": piece})
+        yield event({}, "stop")
+        if usage is not None:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [], "usage": usage}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        try:
+            prompt = body["messages"][-1]["content"]
+        except (KeyError, IndexError, TypeError):
+            return _error(400, "messages must be a non-empty list", "invalid_request_error")
+        config = app.state.config
+        rng = app.state.rng
+        fault = pick_fault()
+        app.state.stats["requests"] += 1
+        app.state.stats[fault or "ok"] += 1
+
+        if fault == "rate_limit":
+            return _error(429, "Injected rate limit", "rate_limit_error", {"Retry-After": "1"})
+        if fault == "timeout":
+            await asyncio.sleep(config.hang)
+        if fault == "error":
+            await asyncio.sleep(app.state.latency.sample(rng))
+            return _error(500, "Injected server error", "server_error")
+
+        content = json.dumps(fake_excuses(prompt), ensure_ascii=False)
+        if fault == "malformed":
+            content = _malformed(content, rng)
+        usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(content)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        model = body.get("model") or config.model
+        completion_id = f"chatcmpl-{uuid.UUID(int=rng.getrandbits(128)).hex}"
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            return StreamingResponse(
+                stream(completion_id, model, content, usage if include_usage else None),
+                media_type="text/event-stream",
+            )
+
+        chunks = len(re.findall(r"\S+\s*", content))
+        await asyncio.sleep(app.state.latency.sample(rng) + chunks * config.token_interval)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }
+
+    @app.get("/v1/models")
+    @app.get("/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": app.state.config.model, "object": "model", "owned_by": "fake"}]}
+
+    @app.get("/_fake/config")
+    async def get_config():
+        return app.state.config
+
+    @app.post("/_fake/config")
+    async def update_config(changes: dict):
+        """Merge ``changes`` into the running config."""
+        try:
+            config = FakeLLMConfig(**{**app.state.config.model_dump(), **changes})
+            config.fault_rates()
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        app.state.config = config
+        app.state.latency = Latency(config.latency)
+        return config
+
+    @app.get("/_fake/stats")
+    async def get_stats():
+        return dict(app.state.stats)
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", default="lognormal:0.8,0.5", help="kind:params, e.g. uniform:0.2,1.5")
+    parser.add_argument("--token-interval", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--hang", type=float, default=3600.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        latency=args.latency,
+        token_interval=args.token_interval,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        timeout_rate=args.timeout_rate,
+        malformed_rate=args.malformed_rate,
+        hang=args.hang,
+    )
+    config.fault_rates()
+    uvicorn.run(create_app(config, args.seed), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+Programmatic SEO page generator.
+
+Pages come from the same combination expansion as ``tools.pregenerate`` (hash-set dedupe on the
+slug), are rendered across a process pool, and are only written when their
+content hash differs from the build manifest, which is kept next to the
+output directory rather than in it, so it is never served. Pages that no
+longer exist are removed. Sitemaps are streamed in chunks that stay under the 50,000-URL /
+50 MB protocol limits, and unchanged pages keep their previous ``lastmod``.
+
+When a pre-generation store is given, each page embeds its example excuses.
+
+Usage:
+    python -m tools.generate_pages [--out ../frontend/public] [--store pregenerated.sqlite]
+                                   [--workers N] [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from html import escape
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.services.excuse_service import LANGUAGE_NAMES
+from tools.pregenerate import (
+    DIMENSIONS_PATH,
+    ExcuseStore,
+    build_prompt,
+    expand_pages,
+    load_dimensions,
+)
+
+TOOL_URL = "https://excuse.demo.densematrix.ai"
+OUTPUT_DIR = Path(__file__).resolve().parents[2] / "frontend" / "public"
+LEGACY_MANIFEST_FILE = ".manifest.json"  # formerly written inside p/
+
+SITEMAP_MAX_URLS = 50_000
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024
+SITEMAP_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+SITEMAP_FOOTER = "</urlset>"
+
+STYLE = """    * { box-sizing: border-box; margin: 0; padding: 0; }
+    body { font-family: 'Courier New', monospace; background: #faf8f5; color: #2d2d2d; line-height: 1.6; padding: 20px; max-width: 800px; margin: 0 auto; }
+    h1 { font-size: 1.8rem; margin-bottom: 1rem; color: #1a1a1a; }
+    h2 { font-size: 1.3rem; margin: 1.5rem 0 0.5rem; color: #333; }
+    p { margin-bottom: 1rem; }
+    .cta { background: #e74c3c; color: white; padding: 15px 30px; text-decoration: none; display: inline-block; margin: 20px 0; border-radius: 5px; font-weight: bold; }
+    .cta:hover { background: #c0392b; }
+    .examples blockquote { border-left: 3px solid #e74c3c; padding: 0.5rem 1rem; margin: 0 0 1rem; background: #fff; }
+    .related { margin-top: 2rem; padding-top: 1rem; border-top: 1px solid #ddd; }
+    .related a { display: inline-block; margin: 5px 10px 5px 0; color: #e74c3c; }
+    footer { margin-top: 2rem; padding-top: 1rem; border-top: 1px solid #ddd; font-size: 0.9rem; color: #666; }"""
+
+# Set per worker process by _init_worker
+_dimensions: dict = {}
+_out_dir: Path = OUTPUT_DIR
+_manifest: Dict[str, list] = {}
+_force = False
+
+
+def page_copy(page: dict) -> Tuple[str, str, str, str]:
+    """Return ``(title, description, h1, context)`` for a page."""
+    scenario = page["scenario"]["name_en"]
+    style = page.get("style")
+    recipient = page.get("recipient")
+    industry = page.get("industry")
+    if style and recipient:
+        return (
+            f"{style['name_en']} Excuse for {scenario} to Your {recipient['name_en']} | AI Excuse Generator",
+            f"Need a {style['name_en'].lower()} excuse for {scenario.lower()}? Our AI generates perfect "
+            f"excuses for telling your {recipient['name_en'].lower()}. Try free!",
+            f"{style['name_en']} Excuses for {scenario} ({recipient['name_en']})",
+            recipient["name_en"],
+        )
+    if style:
+        return (
+            f"{style['name_en']} {scenario} Excuse for {industry['name_en']} | AI Excuse Generator",
+            f"Generate {style['name_en'].lower()} excuses for {scenario.lower()} in the "
+            f"{industry['name_en'].lower()}. AI-powered excuse generator. Try free!",
+            f"{style['name_en']} {scenario} Excuses for {industry['name_en']}",
+            industry["name_en"],
+        )
+    return (
+        f"{scenario} Excuse for Your {recipient['name_en']} in {industry['name_en']} | AI Excuse Generator",
+        f"Generate excuses for {scenario.lower()} to tell your {recipient['name_en'].lower()} in the "
+        f"{industry['name_en'].lower()}. AI-powered excuse generator. Try free!",
+        f"{scenario} Excuses for Your {recipient['name_en']} ({industry['name_en']})",
+        recipient["name_en"],
+    )
+
+
+def related_links(page: dict, dimensions: dict) -> List[Tuple[str, str]]:
+    """Internal links: same scenario in other styles, same style in other scenarios."""
+    scenario = page["scenario"]
+    style = page.get("style") or dimensions["styles"][0]
+    middle = (page.get("recipient") or page.get("industry"))["id"]
+    links = []
+    for other in [s for s in dimensions["styles"] if s["id"] != style["id"]][:2]:
+        links.append((f"{scenario['id']}-{middle}-{other['id']}", f"{other['name_en']} {scenario['name_en']} Excuse"))
+    for other in [s for s in dimensions["scenarios"] if s["id"] != scenario["id"]][:2]:
+        links.append((f"{other['id']}-{middle}-{style['id']}", f"{style['name_en']} {other['name_en']} Excuse"))
+    return links
+
+
+def render_page(page: dict, dimensions: dict, excuses: Optional[List[dict]] = None) -> str:
+    """Render one landing page."""
+    scenario = page["scenario"]
+    style = page.get("style")
+    recipient = page.get("recipient")
+    industry = page.get("industry")
+    url = f"{TOOL_URL}/p/{page['slug']}/"
+    title, description, h1, context = page_copy(page)
+    style_word = style["name_en"].lower() if style else "perfect"
+    keywords = ", ".join(scenario["keywords"])
+    audience = (
+        f"communicating with your {recipient['name_en'].lower()}" if recipient
+        else f"the {industry['name_en'].lower()}"
+    )
+    made_for = (
+        f"customized excuses for telling your {recipient['name_en'].lower()}" if recipient
+        else f"industry-specific excuses perfect for {industry['name_en'].lower()} professionals"
+    )
+    # Category and urgency match the pre-generated prompt so the CTA hits the index
+    prompt = build_prompt(page)
+    cta = f"{TOOL_URL}?scenario={scenario['id']}"
+    if style:
+        cta += f"&style={style['id']}"
+    if recipient:
+        cta += f"&recipient={recipient['id']}"
+    if industry:
+        cta += f"&industry={industry['id']}"
+    cta += f"&category={prompt.category.value}&urgency={prompt.urgency.value}"
+    languages = ", ".join(LANGUAGE_NAMES.values())
+
+    examples = ""
+    if excuses:
+        quotes = "\n    ".join(
+            f"<blockquote><p>{escape(e['text'])}</p><small>{escape(e.get('tip', ''))}</small></blockquote>"
+            for e in excuses
+        )
+        examples = f"""
+  <div class="examples">
+    <h2>Example Excuses</h2>
+    {quotes}
+  </div>
+  """
+
+    json_ld = json.dumps({
+        "@context": "https://schema.org",
+        "@type": "WebApplication",
+        "name": f"AI Excuse Generator - {h1}",
+        "description": description,
+        "url": url,
+        "applicationCategory": "UtilityApplication",
+        "operatingSystem": "Web",
+        "offers": {"@type": "Offer", "price": "0", "priceCurrency": "USD"},
+        "author": {"@type": "Organization", "name": "DenseMatrix", "url": "https://densematrix.ai"},
+    }, indent=2).replace("\n", "\n  ")
+
+    related = "\n    ".join(
+        f'<a href="{TOOL_URL}/p/{slug}/">{label}</a>' for slug, label in related_links(page, dimensions)
+    )
+
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="UTF-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1.0">
+  <title>{title}</title>
+  <meta name="description" content="{description}">
+  <meta name="keywords" content="{keywords}, {style_word} excuse, {context.lower()} excuse">
+  <link rel="canonical" href="{url}">
+
+  <!-- Open Graph -->
+  <meta property="og:title" content="{title}">
+  <meta property="og:description" content="{description}">
+  <meta property="og:url" content="{url}">
+  <meta property="og:type" content="website">
+  <meta property="og:image" content="{TOOL_URL}/og-image.png">
+  <meta property="og:site_name" content="AI Excuse Generator">
+
+  <!-- Twitter Card -->
+  <meta name="twitter:card" content="summary_large_image">
+  <meta name="twitter:title" content="{title}">
+  <meta name="twitter:description" content="{description}">
+
+  <!-- JSON-LD -->
+  <script type="application/ld+json">
+  {json_ld}
+  </script>
+
+  <!-- GA4 -->
+  <script async src="https://www.googletagmanager.com/gtag/js?id=G-P4ZLGKH1E1"></script>
+  <script>
+    window.dataLayer = window.dataLayer || [];
+    function gtag(){{dataLayer.push(arguments);}}
+    gtag('js', new Date());
+    gtag('config', 'G-P4ZLGKH1E1', {{
+      'custom_map': {{'dimension1': 'tool_name'}}
+    }});
+    gtag('event', 'page_view', {{
+      'tool_name': 'excuse-generator',
+      'page_type': 'programmatic_seo'
+    }});
+  </script>
+
+  <style>
+{STYLE}
+  </style>
+</head>
+<body>
+  <h1>{h1}</h1>
+
+  <p>Looking for the perfect <strong>{style_word}</strong> excuse for <strong>{scenario['name_en'].lower()}</strong>?
+  Our AI-powered excuse generator creates {made_for}.</p>
+  {examples}
+  <h2>Why Use Our AI Excuse Generator?</h2>
+  <p>Sometimes life happens and you need a good excuse. Whether it's {', '.join(scenario['keywords'][:3])},
+  our AI understands the nuances of {audience}
+  and generates {style_word} excuses that actually work, in {languages}.</p>
+
+  <h2>How It Works</h2>
+  <p>1. Select your situation ({scenario['name_en']})<br>
+  2. Choose your tone{f" ({style['name_en']})" if style else ""}<br>
+  3. Get an AI-generated excuse instantly<br>
+  4. Copy and use!</p>
+
+  <a href="{escape(cta)}" class="cta">
+    Generate Your {style['name_en'] + ' ' if style else ''}Excuse Now →
+  </a>
+
+  <div class="related">
+    <h2>Related Excuses</h2>
+    {related}
+  </div>
+
+  <footer>
+    <p>© 2024 <a href="https://densematrix.ai">DenseMatrix</a> | <a href="{TOOL_URL}">AI Excuse Generator</a></p>
+  </footer>
+</body>
+</html>"""
+
+
+def _init_worker(dimensions: dict, out_dir: Path, manifest: Dict[str, list], force: bool) -> None:
+    global _dimensions, _out_dir, _manifest, _force
+    _dimensions, _out_dir, _manifest, _force = dimensions, out_dir, manifest, force
+
+
+def _build_chunk(chunk: List[Tuple[dict, Optional[List[dict]]]]) -> List[Tuple[str, str, bool]]:
+    """Render a chunk of pages; write only those whose content changed."""
+    results = []
+    for page, excuses in chunk:
+        html = render_page(page, _dimensions, excuses).encode()
+        digest = hashlib.sha256(html).hexdigest()[:16]
+        path = _out_dir / "p" / page["slug"] / "index.html"
+        previous = _manifest.get(page["slug"])
+        changed = _force or previous is None or previous[0] != digest or not path.exists()
+        if changed:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(html)
+        results.append((page["slug"], digest, changed))
+    return results
+
+
+def _chunks(items: list, size: int) -> Iterable[list]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def write_sitemaps(out_dir: Path, entries: Iterable[Tuple[str, str]], today: str) -> List[str]:
+    """Stream ``(url, lastmod)`` entries into size-limited sitemap chunks.
+
+    Also writes ``sitemap-main.xml`` and the ``sitemap.xml`` index. Returns
+    the chunk file names.
+    """
+    names: List[str] = []
+    f = None
+    count = size = 0
+    footer = len(SITEMAP_FOOTER.encode())
+    for url, lastmod in entries:
+        line = (
+            f"  <url>\n    <loc>{url}</loc>\n    <lastmod>{lastmod}</lastmod>\n"
+            f"    <changefreq>monthly</changefreq>\n    <priority>0.6</priority>\n  </url>\n"
+        ).encode()
+        if f is None or count >= SITEMAP_MAX_URLS or size + len(line) + footer > SITEMAP_MAX_BYTES:
+            if f is not None:
+                f.write(SITEMAP_FOOTER.encode())
+                f.close()
+            names.append(f"sitemap-programmatic-{len(names) + 1}.xml")
+            f = open(out_dir / names[-1], "wb")
+            f.write(SITEMAP_HEADER.encode())
+            count, size = 0, len(SITEMAP_HEADER.encode())
+        f.write(line)
+        count += 1
+        size += len(line)
+    if f is not None:
+        f.write(SITEMAP_FOOTER.encode())
+        f.close()
+
+    # Drop chunks left over from a larger previous build, and the single
+    # sitemap-programmatic.xml of the old Node generator
+    for stale in out_dir.glob("sitemap-programmatic*.xml"):
+        if stale.name not in names:
+            stale.unlink()
+
+    (out_dir / "sitemap-main.xml").write_text(
+        f"{SITEMAP_HEADER}  <url>\n    <loc>{TOOL_URL}</loc>\n    <lastmod>{today}</lastmod>\n"
+        f"    <changefreq>weekly</changefreq>\n    <priority>1.0</priority>\n  </url>\n{SITEMAP_FOOTER}"
+    )
+    sitemaps = "".join(
+        f"  <sitemap><loc>{TOOL_URL}/{name}</loc></sitemap>\n" for name in ["sitemap-main.xml", *names]
+    )
+    (out_dir / "sitemap.xml").write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n{sitemaps}</sitemapindex>'
+    )
+    return names
+
+
+def manifest_path(out_dir: Path) -> Path:
+    """The build manifest for ``out_dir``: a hidden sibling file, outside the served tree."""
+    return out_dir.with_name(f".{out_dir.name}.manifest.json")
+
+
+def build(
+    out_dir: Path = OUTPUT_DIR,
+    dimensions: Optional[dict] = None,
+    store_path: Optional[str] = None,
+    workers: Optional[int] = None,
+    force: bool = False,
+    chunk_size: int = 250,
+) -> dict:
+    """Build all pages and sitemaps; returns build statistics."""
+    started = time.perf_counter()
+    dimensions = dimensions or load_dimensions()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_file = manifest_path(out_dir)
+    legacy_path = out_dir / "p" / LEGACY_MANIFEST_FILE
+    manifest: Dict[str, list] = {}
+    if manifest_file.exists():
+        manifest = json.loads(manifest_file.read_text())
+    elif legacy_path.exists():
+        manifest = json.loads(legacy_path.read_text())
+
+    excuses: Dict[str, List[dict]] = {}
+    if store_path:
+        store = ExcuseStore(store_path)
+        try:
+            excuses = {
+                slug: json.loads(payload)
+                for slug, language, _, _, payload in store.iter_pages()
+                if language == "en"
+            }
+        finally:
+            store.close()
+
+    pages = expand_pages(dimensions)
+    tasks = list(_chunks([(page, excuses.get(page["slug"])) for page in pages], chunk_size))
+    init_args = (dimensions, out_dir, manifest, force)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(*init_args)
+        results = [_build_chunk(chunk) for chunk in tasks]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=init_args) as pool:
+            results = list(pool.map(_build_chunk, tasks))
+
+    today = date.today().isoformat()
+    new_manifest = {}
+    written = 0
+    for chunk in results:
+        for slug, digest, changed in chunk:
+            new_manifest[slug] = [digest, today if changed else manifest[slug][1]]
+            written += changed
+
+    removed = 0
+    for slug in manifest.keys() - new_manifest.keys():
+        path = out_dir / "p" / slug / "index.html"
+        if path.exists():
+            path.unlink()
+            removed += 1
+        try:
+            path.parent.rmdir()
+        except OSError:
+            pass
+
+    sitemaps = write_sitemaps(
+        out_dir, ((f"{TOOL_URL}/p/{slug}/", lastmod) for slug, (_, lastmod) in new_manifest.items()), today
+    )
+    tmp = manifest_file.with_suffix(".tmp")
+    tmp.write_text(json.dumps(new_manifest, separators=(",", ":")))
+    os.replace(tmp, manifest_file)
+    legacy_path.unlink(missing_ok=True)
+
+    return {
+        "pages": len(pages),
+        "written": written,
+        "unchanged": len(pages) - written,
+        "removed": removed,
+        "sitemaps": len(sitemaps),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dimensions", default=str(DIMENSIONS_PATH))
+    parser.add_argument("--out", default=str(OUTPUT_DIR))
+    parser.add_argument("--store", default=None, help="pre-generation store to embed excuses from")
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="rewrite every page")
+    args = parser.parse_args()
+
+    stats = build(
+        Path(args.out), load_dimensions(Path(args.dimensions)), args.store, args.workers, args.force,
+    )
+    print(f"pages        {stats['pages']:,} ({stats['written']:,} written, {stats['unchanged']:,} unchanged, "
+          f"{stats['removed']:,} removed)")
+    print(f"sitemaps     {stats['sitemaps']} chunk(s)")
+    print(f"built in     {stats['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
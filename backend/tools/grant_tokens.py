@@ -0,0 +1,116 @@
+"""
+Bulk token grants from a CSV or JSON-lines file.
+
+Streams the file to ``POST /api/admin/grants`` in chunks, printing upload
+progress, and prints the server's summary. The idempotency key defaults to
+the SHA-256 of the file, so rerunning an interrupted or timed-out upload
+applies only the batches that didn't make it; pass ``--key`` to grant the
+same file twice on purpose.
+
+CSV files need a header row: ``device_id`` plus ``tokens`` and/or
+``unlimited_months``. JSON-lines rows use the same keys.
+
+Usage:
+    python -m tools.grant_tokens grants.csv [--url http://localhost:8000]
+        [--admin-key KEY] [--key KEY] [--chunk-kb 256]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+from typing import Iterator
+
+import httpx
+
+CONTENT_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+def file_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"Can't tell the format of {path}; use .csv or .jsonl")
+
+
+def file_key(path: str) -> str:
+    """Default idempotency key: the SHA-256 of the file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_chunks(path: str, chunk_size: int, progress=None) -> Iterator[bytes]:
+    """The file in chunks, reporting bytes sent so far."""
+    total = os.path.getsize(path)
+    sent = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            yield chunk
+            sent += len(chunk)
+            if progress is not None:
+                progress(sent, total)
+
+
+def upload(
+    client: httpx.Client, path: str, admin_key: str, key: str,
+    chunk_size: int = 256 * 1024, progress=None,
+) -> httpx.Response:
+    """Stream a grant file to the bulk grant endpoint."""
+    fmt = file_format(path)
+    return client.post(
+        "/api/admin/grants",
+        content=read_chunks(path, chunk_size, progress),
+        headers={
+            "X-Admin-Key": admin_key,
+            "Idempotency-Key": key,
+            "Content-Type": CONTENT_TYPES[fmt],
+        },
+        params={"format": fmt},
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--admin-key", default=os.environ.get("ADMIN_API_KEY"))
+    parser.add_argument("--key", help="idempotency key; defaults to the file's SHA-256")
+    parser.add_argument("--chunk-kb", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    args = parser.parse_args()
+    if not args.admin_key:
+        parser.error("--admin-key or ADMIN_API_KEY is required")
+
+    key = args.key or file_key(args.path)
+    start = time.monotonic()
+    last = [0.0]
+
+    def progress(sent: int, total: int) -> None:
+        now = time.monotonic()
+        if now - last[0] >= 1.0 or sent == total:
+            last[0] = now
+            print(f"  sent {sent / 1e6:,.1f}/{total / 1e6:,.1f} MB ({sent / max(total, 1):.0%}) "
+                  f"in {now - start:.1f}s", file=sys.stderr)
+
+    print(f"key {key}", file=sys.stderr)
+    with httpx.Client(base_url=args.url, timeout=args.timeout) as client:
+        response = upload(client, args.path, args.admin_key, key, args.chunk_kb * 1024, progress)
+    if response.status_code != 200:
+        print(f"FAIL: {response.status_code} {response.text}")
+        return 1
+    summary = response.json()
+    print(f"applied {summary['applied']:,} grants ({summary['tokens']:,} tokens), "
+          f"skipped {summary['skipped']:,} already applied, {summary['invalid']:,} invalid, "
+          f"{summary['batches']:,} batches in {summary['seconds']:.1f}s")
+    for error in summary["errors"]:
+        print(f"  {error}")
+    return 1 if summary["invalid"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
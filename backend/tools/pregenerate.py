@@ -0,0 +1,321 @@
+"""
+Offline excuse pre-generation for the programmatic SEO pages.
+
+Expands the page combinations in ``programmatic-seo/dimensions.json``, maps
+each page to the ``ExcuseService`` inputs it implies, deduplicates pages that
+would send the same prompt, and generates the remaining prompts through a
+bounded pool of async workers. Results land in a SQLite store that is also
+the checkpoint: rerunning skips every prompt already stored.
+
+Usage:
+    python -m tools.pregenerate [--out pregenerated.sqlite] [--languages en,zh]
+                                [--concurrency 16] [--limit N] [--fake-llm]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.schemas.excuse import Excuse, ExcuseCategory, UrgencyLevel
+from app.services.excuse_service import FALLBACK_TONE, ExcuseService
+from app.services.scenarios import ScenarioTuple, resolve_scenario
+
+DIMENSIONS_PATH = Path(__file__).resolve().parents[2] / "programmatic-seo" / "dimensions.json"
+
+# Page dimension names as they appear in slugs and prompt context
+DIMENSION_FIELDS = {
+    "scenarios": "scenario",
+    "recipients": "recipient",
+    "styles": "style",
+    "industries": "industry",
+}
+
+
+class Prompt(NamedTuple):
+    """The ``ExcuseService`` inputs for one page."""
+    category: ExcuseCategory
+    urgency: UrgencyLevel
+    language: str
+    scenario: ScenarioTuple
+
+    @property
+    def key(self) -> str:
+        """Stable identity of the prompt; equal inputs share a key."""
+        canonical = "\x1f".join((self.category.value, self.urgency.value, self.language, self.scenario.key))
+        return hashlib.sha1(canonical.encode()).hexdigest()[:20]
+
+
+def load_dimensions(path: Path = DIMENSIONS_PATH) -> dict:
+    """Load the SEO dimension definitions."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def expand_pages(dimensions: dict) -> List[dict]:
+    """Expand every configured combination into pages, first slug wins."""
+    pages = []
+    seen = set()
+    for combination in dimensions["combinations"]:
+        stack = [({}, [])]
+        for dimension in combination:
+            field = DIMENSION_FIELDS[dimension]
+            stack = [
+                ({**page, field: value}, ids + [value["id"]])
+                for page, ids in stack
+                for value in dimensions[dimension]
+            ]
+        for page, ids in stack:
+            slug = "-".join(ids)
+            if slug not in seen:
+                seen.add(slug)
+                pages.append({"slug": slug, **page})
+    return pages
+
+
+def build_prompt(page: dict, language: str = "en") -> Prompt:
+    """Map a page to the generation inputs it implies.
+
+    Category comes from the scenario and urgency from the style, the same
+    values the page's call-to-action sends to the API.
+    """
+    scenario = resolve_scenario(*(
+        page[field]["id"] if page.get(field) else None
+        for field in ("scenario", "recipient", "style", "industry")
+    ))
+    return Prompt(
+        category=scenario.category,
+        urgency=scenario.urgency,
+        language=language,
+        scenario=scenario,
+    )
+
+
+def plan(pages: Iterable[dict], languages: List[str]) -> Tuple[Dict[str, Prompt], List[Tuple[str, str, str]]]:
+    """Return unique prompts by key and ``(slug, language, key)`` page rows."""
+    prompts: Dict[str, Prompt] = {}
+    rows = []
+    for page in pages:
+        for language in languages:
+            prompt = build_prompt(page, language)
+            key = prompt.key
+            prompts.setdefault(key, prompt)
+            rows.append((page["slug"], language, key))
+    return prompts, rows
+
+
+class ExcuseStore:
+    """SQLite store of pre-generated excuses, shared by the page and API builders."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS prompts (
+            key TEXT PRIMARY KEY,
+            category TEXT NOT NULL,
+            urgency TEXT NOT NULL,
+            language TEXT NOT NULL,
+            scenario TEXT NOT NULL,
+            excuses TEXT NOT NULL,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            completion_tokens INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS pages (
+            slug TEXT NOT NULL,
+            language TEXT NOT NULL,
+            key TEXT NOT NULL,
+            PRIMARY KEY (slug, language)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+
+    def done_keys(self) -> set:
+        """Keys of prompts that already have excuses."""
+        return {key for (key,) in self._db.execute("SELECT key FROM prompts")}
+
+    def save_pages(self, rows: Iterable[Tuple[str, str, str]]) -> None:
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?)", rows)
+
+    def save_results(self, results: Iterable[Tuple[str, Prompt, List[Excuse], int, int]]) -> None:
+        now = time.time()
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO prompts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        key, prompt.category.value, prompt.urgency.value, prompt.language, prompt.scenario.key,
+                        json.dumps([e.model_dump() for e in excuses], ensure_ascii=False, separators=(",", ":")),
+                        prompt_tokens, completion_tokens, now,
+                    )
+                    for key, prompt, excuses, prompt_tokens, completion_tokens in results
+                ),
+            )
+
+    def get(self, slug: str, language: str = "en") -> Optional[List[Excuse]]:
+        """Excuses for a page, if generated."""
+        row = self._db.execute(
+            "SELECT p.excuses FROM pages g JOIN prompts p ON p.key = g.key WHERE g.slug = ? AND g.language = ?",
+            (slug, language),
+        ).fetchone()
+        return [Excuse(**e) for e in json.loads(row[0])] if row else None
+
+    def iter_pages(self) -> Iterator[Tuple[str, str, str, str, str]]:
+        """Yield ``(slug, language, category, urgency, excuses_json)`` for generated pages."""
+        yield from self._db.execute(
+            "SELECT g.slug, g.language, p.category, p.urgency, p.excuses "
+            "FROM pages g JOIN prompts p ON p.key = g.key ORDER BY g.slug, g.language"
+        )
+
+    def iter_prompts(self) -> Iterator[Tuple[str, str, str, str, str]]:
+        """Yield ``(category, urgency, language, scenario_key, excuses_json)`` for generated prompts."""
+        yield from self._db.execute(
+            "SELECT category, urgency, language, scenario, excuses FROM prompts ORDER BY key"
+        )
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class PregenStats:
+    """Counters for one run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.generated = 0
+        self.failed = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def cost(self, input_price: float, output_price: float) -> float:
+        """Cost in dollars given per-million-token prices."""
+        return (self.prompt_tokens * input_price + self.completion_tokens * output_price) / 1e6
+
+
+async def generate_all(
+    service: ExcuseService,
+    prompts: Dict[str, Prompt],
+    store: ExcuseStore,
+    concurrency: int = 16,
+    max_attempts: int = 3,
+    backoff: float = 0.5,
+    commit_every: int = 50,
+    on_progress=None,
+) -> PregenStats:
+    """Generate every prompt not yet in the store with a bounded worker pool."""
+    stats = PregenStats()
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in prompts.items():
+        queue.put_nowait(item)
+    pending: list = []
+
+    def commit() -> None:
+        if pending:
+            store.save_results(pending)
+            pending.clear()
+
+    async def worker() -> None:
+        while True:
+            try:
+                key, prompt = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            for attempt in range(max_attempts):
+                try:
+                    excuses, usage = await service.generate_excuses_with_usage(
+                        prompt.category, prompt.urgency, None, prompt.language,
+                        scenario=prompt.scenario, avoid_recent=False,
+                    )
+                    if len(excuses) == 1 and excuses[0].tone == FALLBACK_TONE:
+                        raise ValueError("unparseable completion")
+                except Exception:
+                    if attempt + 1 == max_attempts:
+                        stats.failed += 1
+                        break
+                    stats.retries += 1
+                    await asyncio.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+                    continue
+                prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+                completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+                stats.generated += 1
+                stats.prompt_tokens += prompt_tokens
+                stats.completion_tokens += completion_tokens
+                pending.append((key, prompt, excuses, prompt_tokens, completion_tokens))
+                if len(pending) >= commit_every:
+                    commit()
+                if on_progress is not None:
+                    on_progress(stats)
+                break
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(prompts)) or 1)))
+    finally:
+        # Whatever finished is checkpointed, even on interrupt
+        commit()
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dimensions", default=str(DIMENSIONS_PATH))
+    parser.add_argument("--out", default="pregenerated.sqlite")
+    parser.add_argument("--languages", default="en", help="comma-separated language codes")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=0, help="generate at most N new prompts")
+    parser.add_argument("--input-price", type=float, default=0.50, help="$ per 1M prompt tokens")
+    parser.add_argument("--output-price", type=float, default=3.00, help="$ per 1M completion tokens")
+    parser.add_argument("--fake-llm", action="store_true", help="use the in-process fake LLM")
+    parser.add_argument("--fake-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    pages = expand_pages(load_dimensions(Path(args.dimensions)))
+    prompts, rows = plan(pages, args.languages.split(","))
+    store = ExcuseStore(args.out)
+    store.save_pages(rows)
+    done = store.done_keys()
+    todo = {key: prompt for key, prompt in prompts.items() if key not in done}
+    print(f"pages        {len(rows):,} ({len(pages):,} slugs x {len(args.languages.split(','))} languages)")
+    print(f"prompts      {len(prompts):,} unique, {len(prompts) - len(todo):,} already stored, {len(todo):,} to generate")
+    if args.limit:
+        todo = dict(list(todo.items())[:args.limit])
+
+    service = ExcuseService()
+    if args.fake_llm:
+        from tools.fake_llm import FakeLLMClient
+        service.client = FakeLLMClient(latency=args.fake_latency)
+
+    def progress(stats: PregenStats) -> None:
+        if stats.generated % 500 == 0:
+            print(f"  {stats.generated:,}/{len(todo):,} ({stats.generated / stats.elapsed:.1f}/s)")
+
+    try:
+        stats = asyncio.run(generate_all(
+            service, todo, store,
+            concurrency=args.concurrency, max_attempts=args.max_attempts, on_progress=progress,
+        ))
+    finally:
+        store.close()
+
+    print(f"generated    {stats.generated:,} in {stats.elapsed:.1f}s "
+          f"({stats.generated / stats.elapsed:.1f} prompts/s), {stats.failed} failed, {stats.retries} retries")
+    print(f"tokens       {stats.prompt_tokens:,} in / {stats.completion_tokens:,} out, "
+          f"${stats.cost(args.input_price, args.output_price):.2f}")
+
+
+if __name__ == "__main__":
+    main()
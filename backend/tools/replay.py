@@ -0,0 +1,401 @@
+"""
+Replay recorded traffic against the app for capacity planning.
+
+Reads a JSON-lines log of ``/api/generate`` and token-status requests and
+replays it against the app in-process (no sockets) at ``--speed`` times the
+recorded rate, with the LLM served by ``tools.fake_llm_server``. Arrivals
+are open-loop: each request is sent at its compressed recorded time whether
+or not earlier ones have finished, as real users would. Every ``--interval``
+seconds it prints throughput, latency percentiles, cache results, LLM calls
+in flight, TokenService size and process memory, then a summary per
+endpoint.
+
+Log records, one per line::
+
+    {"ts": 1760864400.25, "endpoint": "generate", "device_id": "...",
+     "category": "late", "urgency": "normal", "language": "en", "context": "traffic"}
+    {"ts": "2026-10-19T09:00:01Z", "endpoint": "tokens", "device_id": "..."}
+
+``endpoint`` is ``generate`` (the default), ``tokens`` or ``can_generate``.
+The other fields of a generate record are sent as its body, except ``ip``,
+which is sent as ``X-Real-IP`` (one stable address per device if missing) so
+per-address rate limits apply as they would behind the proxy. ``ts`` is
+epoch seconds or ISO 8601.
+
+Only arrivals are compressed: the fake LLM keeps its real-world latency, so
+at 10x the app sees ten times the recorded load against the same LLM
+response times.
+
+Usage:
+    python -m tools.replay LOG [--speed 10] [--llm-latency lognormal:0.8,0.5]
+        [--llm-error-rate 0] [--tokens-per-device 10] [--no-rate-limit]
+        [--interval 1] [--json-out report.jsonl] [--slo-p99 SECONDS]
+    python -m tools.replay --synthetic 10000 --rate 50 [--devices 2000] [--speed 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List
+
+import httpx
+
+ENDPOINTS = {
+    "generate": ("POST", "/api/generate"),
+    "tokens": ("GET", "/api/tokens/{device_id}"),
+    "can_generate": ("GET", "/api/tokens/{device_id}/can-generate"),
+}
+
+# Synthetic traffic: (context, weight); most requests carry no context
+SYNTHETIC_CONTEXTS = [
+    ("", 60), ("traffic", 8), ("Traffic jam!", 4), ("my train was cancelled", 5),
+    ("I'm sick", 5), ("overslept", 4), ("my dog ate my homework", 3), ("internet is down", 3),
+]
+SYNTHETIC_CATEGORIES = ["late", "sick_leave", "decline", "forgot", "deadline", "meeting", "homework", "other"]
+SYNTHETIC_LANGUAGES = [("en", 70), ("de", 8), ("fr", 6), ("es", 6), ("zh", 5), ("ja", 5)]
+
+
+def parse_ts(value) -> float:
+    """Epoch seconds from a number or an ISO 8601 string."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def load_log(path: str) -> List[dict]:
+    """Read a request log, sorted by time."""
+    records = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            endpoint = record.setdefault("endpoint", "generate")
+            if endpoint not in ENDPOINTS:
+                raise ValueError(f"{path}:{number}: unknown endpoint {endpoint!r}")
+            record["ts"] = parse_ts(record["ts"])
+            records.append(record)
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def synthetic_log(count: int, rate: float, devices: int = 1_000, seed: int = 42) -> List[dict]:
+    """Poisson arrivals at ``rate`` per second: mostly generations, some token-status polls."""
+    rng = random.Random(seed)
+    contexts, context_weights = zip(*SYNTHETIC_CONTEXTS)
+    languages, language_weights = zip(*SYNTHETIC_LANGUAGES)
+    records = []
+    ts = 0.0
+    for _ in range(count):
+        ts += rng.expovariate(rate)
+        device_id = f"replay_device_{rng.randrange(devices):08d}"
+        if rng.random() < 0.2:
+            records.append({"ts": ts, "endpoint": rng.choice(["tokens", "can_generate"]), "device_id": device_id})
+            continue
+        records.append({
+            "ts": ts,
+            "endpoint": "generate",
+            "device_id": device_id,
+            "category": rng.choice(SYNTHETIC_CATEGORIES),
+            "urgency": "normal" if rng.random() < 0.7 else rng.choice(["urgent", "extreme"]),
+            "language": rng.choices(languages, language_weights)[0],
+            "context": rng.choices(contexts, context_weights)[0],
+        })
+    return records
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[round(q * (len(ordered) - 1))]
+
+
+def rss_mb() -> float:
+    """Current resident set size, or the peak where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def cache_counts() -> Counter:
+    """Generation requests so far by ``cache`` label."""
+    from app.core.metrics import GENERATION_LATENCY
+
+    counts = Counter()
+    for metric in GENERATION_LATENCY.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_count"):
+                counts[sample.labels["cache"]] += sample.value
+    return counts
+
+
+class InFlight:
+    """ASGI wrapper counting concurrent requests to the wrapped app."""
+
+    def __init__(self, app):
+        self.app = app
+        self.current = 0
+        self.peak = 0
+        self.total = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.current += 1
+        self.total += 1
+        self.peak = max(self.peak, self.current)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.current -= 1
+
+
+class Replay:
+    """Replays records against ``app`` and samples how it copes."""
+
+    def __init__(
+        self,
+        app,
+        records: List[dict],
+        llm: InFlight,
+        speed: float = 1.0,
+        interval: float = 1.0,
+        out=sys.stdout,
+    ):
+        self.app = app
+        self.records = records
+        self.llm = llm
+        self.speed = speed
+        self.interval = interval
+        self.out = out
+        self.samples: List[dict] = []
+        self.latencies: Dict[str, List[float]] = {name: [] for name in ENDPOINTS}
+        self.statuses: Dict[str, Counter] = {name: Counter() for name in ENDPOINTS}
+        self.max_lag = 0.0
+        self._window: List[float] = []
+        self._cache_base = Counter()
+        self._last_sample = 0.0
+        self._sent = 0
+        self._done = 0
+
+    async def _send(self, client: httpx.AsyncClient, record: dict) -> None:
+        endpoint = record["endpoint"]
+        method, path = ENDPOINTS[endpoint]
+        device_id = record["device_id"]
+        ip = record.get("ip")
+        if ip is None:
+            h = zlib.crc32(device_id.encode())
+            ip = f"10.{h >> 16 & 255}.{h >> 8 & 255}.{h & 255}"
+        body = None
+        if endpoint == "generate":
+            body = {k: v for k, v in record.items() if k not in ("ts", "endpoint", "ip")}
+        start = time.perf_counter()
+        try:
+            response = await client.request(
+                method, path.format(device_id=device_id), json=body, headers={"X-Real-IP": ip},
+            )
+            status = response.status_code
+        except Exception:
+            status = "error"
+        elapsed = time.perf_counter() - start
+        self.latencies[endpoint].append(elapsed)
+        self.statuses[endpoint][status] += 1
+        self._window.append(elapsed)
+        self._done += 1
+
+    def sample(self, elapsed: float) -> dict:
+        """Record and print one row of the time series."""
+        from app.services.excuse_cache import get_excuse_cache, get_single_flight
+        from app.services.token_service import get_token_service
+
+        tokens = get_token_service()
+        window, self._window = self._window, []
+        period, self._last_sample = elapsed - self._last_sample, elapsed
+        row = {
+            "t": round(elapsed, 2),
+            "sent": self._sent,
+            "done": self._done,
+            "rps": round(len(window) / period, 1) if period > 0 else 0.0,
+            "p50_ms": round(percentile(window, 0.5) * 1000, 1),
+            "p95_ms": round(percentile(window, 0.95) * 1000, 1),
+            "cache": dict(cache_counts() - self._cache_base),
+            "llm_in_flight": self.llm.current,
+            "llm_peak": self.llm.peak,
+            "coalescing": len(get_single_flight()),
+            "cache_entries": len(get_excuse_cache()),
+            "devices": tokens.ping(),
+            "seen_devices": len(tokens.seen),
+            "rss_mb": round(rss_mb(), 1),
+            "lag_ms": round(self.max_lag * 1000, 1),
+        }
+        self.samples.append(row)
+        cache = row["cache"]
+        print(
+            f"{row['t']:7.1f}s  {row['done']:>8,}/{row['sent']:<8,} {row['rps']:8.1f} req/s  "
+            f"p50 {row['p50_ms']:7.1f}ms  p95 {row['p95_ms']:7.1f}ms  "
+            f"hit {cache.get('hit', 0):>6,.0f} miss {cache.get('miss', 0):>6,.0f} "
+            f"coalesced {cache.get('coalesced', 0):>5,.0f}  llm {row['llm_in_flight']:>4}  "
+            f"devices {row['devices']:>7,}  rss {row['rss_mb']:7.1f}MB  lag {row['lag_ms']:6.1f}ms",
+            file=self.out,
+        )
+        return row
+
+    async def _sampler(self, started: float) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.sample(time.perf_counter() - started)
+
+    async def run(self) -> dict:
+        """Replay every record and return the summary."""
+        tasks = []
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://replay") as client:
+            self._cache_base = cache_counts()
+            started = time.perf_counter()
+            sampler = asyncio.ensure_future(self._sampler(started))
+            t0 = self.records[0]["ts"] if self.records else 0.0
+            for record in self.records:
+                due = started + (record["ts"] - t0) / self.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.max_lag = max(self.max_lag, time.perf_counter() - due)
+                tasks.append(asyncio.ensure_future(self._send(client, record)))
+                self._sent += 1
+            await asyncio.gather(*tasks)
+            sampler.cancel()
+            elapsed = time.perf_counter() - started
+            self.sample(elapsed)
+        return self.summary(elapsed)
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, latencies in self.latencies.items():
+            if not latencies:
+                continue
+            endpoints[name] = {
+                "requests": len(latencies),
+                "statuses": {str(k): v for k, v in self.statuses[name].items()},
+                "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+                "max_ms": round(max(latencies) * 1000, 1),
+            }
+        cache = cache_counts() - self._cache_base
+        cacheable = cache["hit"] + cache["miss"] + cache["coalesced"]
+        return {
+            "requests": self._done,
+            "seconds": round(elapsed, 2),
+            "speed": self.speed,
+            "rps": round(self._done / elapsed, 1) if elapsed else 0.0,
+            "endpoints": endpoints,
+            "cache": dict(cache),
+            "cache_hit_rate": round(cache["hit"] / cacheable, 3) if cacheable else 0.0,
+            "llm_calls": self.llm.total,
+            "llm_peak_in_flight": self.llm.peak,
+            "peak_rss_mb": max((s["rss_mb"] for s in self.samples), default=0.0),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+        }
+
+
+def print_summary(summary: dict, out=sys.stdout) -> None:
+    print(f"\n{summary['requests']:,} requests in {summary['seconds']}s at {summary['speed']}x "
+          f"({summary['rps']:,} req/s), max schedule lag {summary['max_lag_ms']}ms", file=out)
+    for name, stats in summary["endpoints"].items():
+        statuses = " ".join(f"{k}:{v}" for k, v in sorted(stats["statuses"].items()))
+        print(f"{name:<13} {stats['requests']:>8,}  p50 {stats['p50_ms']:7.1f}ms  p95 {stats['p95_ms']:7.1f}ms  "
+              f"p99 {stats['p99_ms']:7.1f}ms  max {stats['max_ms']:7.1f}ms  [{statuses}]", file=out)
+    cache = summary["cache"]
+    print(f"cache         hit rate {summary['cache_hit_rate']:.1%} "
+          f"(hit {cache.get('hit', 0):,.0f}, miss {cache.get('miss', 0):,.0f}, "
+          f"coalesced {cache.get('coalesced', 0):,.0f}, uncacheable {cache.get('none', 0):,.0f})", file=out)
+    print(f"llm           {summary['llm_calls']:,} calls, peak {summary['llm_peak_in_flight']} in flight", file=out)
+    print(f"memory        peak rss {summary['peak_rss_mb']}MB", file=out)
+
+
+def install_fake_llm(llm_app) -> InFlight:
+    """Point the excuse service at an in-process LLM app; returns its in-flight counter."""
+    from openai import AsyncOpenAI
+
+    from app.services.excuse_service import get_excuse_service
+
+    llm = InFlight(llm_app)
+    get_excuse_service().client = AsyncOpenAI(
+        base_url="http://llm/v1",
+        api_key="fake",
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=llm)),
+    )
+    return llm
+
+
+def grant_tokens(records: List[dict], amount: int) -> None:
+    """Give every device that generates ``amount`` tokens up front."""
+    if amount <= 0:
+        return
+    from app.services.token_service import get_token_service
+
+    tokens = get_token_service()
+    for device_id in {r["device_id"] for r in records if r["endpoint"] == "generate"}:
+        tokens.add_tokens(device_id, amount)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("log", nargs="?", help="JSON-lines request log")
+    parser.add_argument("--synthetic", type=int, help="replay N synthetic requests instead of a log")
+    parser.add_argument("--rate", type=float, default=20.0, help="synthetic arrivals per second, before --speed")
+    parser.add_argument("--devices", type=int, default=1_000, help="synthetic device count")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression, e.g. 10 or 100")
+    parser.add_argument("--llm-latency", default="lognormal:0.8,0.5")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--tokens-per-device", type=int, default=10,
+                        help="tokens granted to each generating device up front (0: free trial only)")
+    parser.add_argument("--no-rate-limit", action="store_true")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between samples")
+    parser.add_argument("--json-out", help="write samples and the summary as JSON lines")
+    parser.add_argument("--slo-p99", type=float, help="exit non-zero if generate p99 exceeds this (seconds)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if (args.log is None) == (args.synthetic is None):
+        parser.error("give either a LOG or --synthetic N")
+
+    # Configure the app before it is imported
+    if args.no_rate_limit:
+        os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ.pop("TOKEN_LEDGER_DIR", None)
+    from app.main import app
+    from tools.fake_llm_server import FakeLLMConfig, create_app
+
+    records = load_log(args.log) if args.log else synthetic_log(args.synthetic, args.rate, args.devices, args.seed)
+    llm = install_fake_llm(create_app(
+        FakeLLMConfig(latency=args.llm_latency, error_rate=args.llm_error_rate), seed=args.seed,
+    ))
+    grant_tokens(records, args.tokens_per_device)
+    replay = Replay(app, records, llm, speed=args.speed, interval=args.interval)
+    summary = asyncio.run(replay.run())
+    print_summary(summary)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            for row in replay.samples:
+                f.write(json.dumps(row) + "\n")
+            f.write(json.dumps({"summary": summary}) + "\n")
+    generate = summary["endpoints"].get("generate")
+    if args.slo_p99 is not None and generate and generate["p99_ms"] > args.slo_p99 * 1000:
+        print(f"FAIL: generate p99 exceeds {args.slo_p99}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,11 @@ export interface GenerateRequest {
   context: string
   language: string
   device_id: string
+  // SEO landing-page dimensions, passed through from the page's link
+  scenario?: string
+  recipient?: string
+  style?: string
+  industry?: string
 }
 
 export interface GenerateResponse {
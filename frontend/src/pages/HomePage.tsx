@@ -1,5 +1,6 @@
-import { useEffect, useCallback } from 'react'
+import { useEffect, useCallback, useMemo } from 'react'
 import { useTranslation } from 'react-i18next'
+import { useSearchParams } from 'react-router-dom'
 import { motion } from 'framer-motion'
 import { CategorySelector } from '../components/CategorySelector'
 import { UrgencySelector } from '../components/UrgencySelector'
@@ -7,6 +8,7 @@ import { GenerateButton } from '../components/GenerateButton'
 import { ExcuseCard } from '../components/ExcuseCard'
 import { TokenStatus } from '../components/TokenStatus'
 import { useExcuseStore } from '../store/useExcuseStore'
+import type { ExcuseCategory, UrgencyLevel } from '../store/useExcuseStore'
 import { useTokenStore } from '../store/useTokenStore'
 import { excuseApi } from '../api/excuseApi'
 import { getDeviceFingerprint } from '../api/fingerprint'
@@ -31,6 +33,26 @@ export function HomePage() {
 
   const { deviceId, setDeviceId, setTokenStatus, canGenerate } = useTokenStore()
 
+  // Visitors from SEO pages arrive with their scenario tuple in the URL
+  const [searchParams] = useSearchParams()
+  const scenario = useMemo(() => {
+    const id = searchParams.get('scenario')
+    if (!id) return {}
+    return {
+      scenario: id,
+      recipient: searchParams.get('recipient') ?? undefined,
+      style: searchParams.get('style') ?? undefined,
+      industry: searchParams.get('industry') ?? undefined,
+    }
+  }, [searchParams])
+
+  useEffect(() => {
+    const landingCategory = searchParams.get('category')
+    const landingUrgency = searchParams.get('urgency')
+    if (landingCategory) setCategory(landingCategory as ExcuseCategory)
+    if (landingUrgency) setUrgency(landingUrgency as UrgencyLevel)
+  }, [searchParams, setCategory, setUrgency])
+
   // Initialize device fingerprint
   useEffect(() => {
     const initFingerprint = async () => {
@@ -72,6 +94,7 @@ export function HomePage() {
         context,
         language: i18n.language,
         device_id: deviceId,
+        ...scenario,
       })
       setExcuses(response.excuses, response.tokens_remaining)
 
@@ -82,7 +105,7 @@ export function HomePage() {
       const message = err instanceof Error ? err.message : t('errors.generic')
       setError(message)
     }
-  }, [category, urgency, context, deviceId, i18n.language, canGenerate, setLoading, setExcuses, setError, setTokenStatus, t])
+  }, [category, urgency, context, scenario, deviceId, i18n.language, canGenerate, setLoading, setExcuses, setError, setTokenStatus, t])
 
   return (
     <div className="home-page container" data-testid="home-page">